@@ -234,6 +234,19 @@ async def get_current_user_optional(
         return None
 
 
+async def get_websocket_user(db: Session, token: Optional[str]) -> Optional[User]:
+    """
+    Пользователь WebSocket соединения по токену из query-параметра
+
+    Те же проверки, что и для HTTP запросов: черный список токенов,
+    активность и блокировка пользователя. None - подключение запрещено.
+    """
+    if not token:
+        return None
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return await get_current_user_optional(credentials, db)
+
+
 async def get_optional_admin_user_for_create(
     db: Annotated[Session, Depends(get_db)],
     credentials: Optional[Annotated[HTTPAuthorizationCredentials, Depends(optional_security)]] = None
@@ -5,6 +5,8 @@ from app.api.v1 import (
     # users,  # Отключено
     admin,
     admin_statistics,
+    admin_archive,
+    admin_media,
     # user_extended,  # Отключено
     # favorites,  # Отключено
     profile,
@@ -34,6 +36,8 @@ api_router.include_router(auth.router, prefix="/auth", tags=["Авторизац
 # api_router.include_router(users.router, prefix="/users", tags=["Пользователи"])  # Отключено
 api_router.include_router(admin.router, prefix="/admin", tags=["Администрирование"])
 api_router.include_router(admin_statistics.router, prefix="/admin/statistics", tags=["Админ: Статистика"])
+api_router.include_router(admin_archive.router, prefix="/admin/archive", tags=["Админ: Архивы"])
+api_router.include_router(admin_media.router, prefix="/admin/media", tags=["Админ: Медиа"])
 
 # Расширенные эндпоинты пользователя
 # api_router.include_router(user_extended.router, prefix="/user", tags=["Пользователь (расширенный)"])  # Отключено
@@ -42,6 +42,7 @@ from app.services.notification_service.crud import (
     create_notification,
     get_all_notifications,
     delete_notification_admin,
+    get_notification_by_id,
 )
 # Импортируем менеджер WebSocket соединений
 from app.api.v1.notifications import manager as notification_manager
@@ -71,8 +72,7 @@ from app.services.profile_service.crud import (
     create_profile,
     update_profile,
 )
-from pathlib import Path
-import os
+from app.services.media_service.crud import release_media
 
 router = APIRouter()
 
@@ -932,39 +932,6 @@ async def admin_update_user_documents(
         )
 
 
-def delete_file_by_url(file_url: str) -> bool:
-    """
-    Удаление файла по его URL
-    
-    Args:
-        file_url: URL файла (например, http://localhost:8000/uploads/passports/1_abc123.jpg)
-    
-    Returns:
-        True если файл удален, False если файл не найден
-    """
-    try:
-        # Извлекаем путь к файлу из URL
-        if not file_url or not file_url.startswith(settings.BASE_URL):
-            return False
-        
-        # Убираем BASE_URL и получаем относительный путь
-        relative_path = file_url.replace(settings.BASE_URL, "")
-        if relative_path.startswith("/"):
-            relative_path = relative_path[1:]
-        
-        # Полный путь к файлу
-        file_path = Path(relative_path)
-        
-        # Проверяем существование файла
-        if file_path.exists() and file_path.is_file():
-            file_path.unlink()
-            return True
-        return False
-    except Exception as e:
-        print(f"Error deleting file {file_url}: {str(e)}")
-        return False
-
-
 # ==================== Admin Document Verification ====================
 
 @router.post("/user/documents/passport/approve", response_model=UpdateResponse)
@@ -1093,7 +1060,7 @@ async def admin_reject_passport(
         
         # Удаляем файл, если он существует
         if profile.passport_image_url:
-            delete_file_by_url(profile.passport_image_url)
+            release_media(db, profile.passport_image_url)
         
         # Сбрасываем данные паспорта
         updated_profile = update_profile(
@@ -1271,7 +1238,7 @@ async def admin_reject_driving_license(
         
         # Удаляем файл, если он существует
         if profile.driving_license_image_url:
-            delete_file_by_url(profile.driving_license_image_url)
+            release_media(db, profile.driving_license_image_url)
         
         # Сбрасываем данные водительских прав
         updated_profile = update_profile(
@@ -1363,8 +1330,9 @@ async def create_notification_admin(
                     "notification": notification_data
                 }
             )
+            await notification_manager.publish_counters(notification.user_id, db)
         else:
-            # Глобальное уведомление
+            # Глобальное уведомление: доставка идет в фоне, прогресс - в /admin/notifications/broadcasts
             await notification_manager.send_global_notification({
                 "type": "notification",
                 "notification": notification_data
@@ -1423,6 +1391,35 @@ async def get_all_notifications_admin(
         )
 
 
+@router.get("/notifications/broadcasts", response_model=dict)
+async def get_notification_broadcasts_admin(
+    current_admin: Annotated[User, Depends(get_current_admin_user)],
+    broadcast_id: Optional[str] = Query(None, description="ID рассылки")
+):
+    """
+    Прогресс рассылок глобальных уведомлений по WebSocket
+    
+    Доступно только администраторам.
+    Показывает последние рассылки текущего воркера: статус, всего получателей,
+    отправлено и ошибок.
+    """
+    jobs = list(notification_manager.fanout.jobs.values())
+    if broadcast_id:
+        jobs = [job for job in jobs if job.id == broadcast_id]
+        if not jobs:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Рассылка не найдена"
+            )
+    
+    return {
+        "broadcasts": [job.to_dict() for job in reversed(jobs)],
+        "pending_connections": sum(
+            job.total - job.sent - job.failed for job in jobs if job.status in ("queued", "running")
+        )
+    }
+
+
 @router.delete("/notification/{notification_id}", response_model=dict)
 async def delete_notification_by_admin(
     notification_id: int,
@@ -1436,6 +1433,7 @@ async def delete_notification_by_admin(
     Удаляет уведомление полностью из БД, включая все связанные записи.
     Можно удалять как персональные, так и глобальные уведомления.
     """
+    notification = get_notification_by_id(db, notification_id)
     deleted = delete_notification_admin(db, notification_id)
     
     if not deleted:
@@ -1444,6 +1442,9 @@ async def delete_notification_by_admin(
             detail="Уведомление не найдено"
         )
     
+    # Счетчики затронутых пользователей пересчитаются при следующем обращении
+    await notification_manager.invalidate_counters(notification.user_id if notification else None)
+    
     return {
         "success": True,
         "message": "Уведомление успешно удалено",
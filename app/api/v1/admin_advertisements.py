@@ -4,8 +4,6 @@ API эндпоинты для рекламы (администраторские
 from typing import Annotated, Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from pathlib import Path
-import uuid
 
 from app.database import get_db
 from app.models.user import User
@@ -36,29 +34,11 @@ from app.schemas.advertisement import (
 )
 from app.models.advertisement import AdvertisementClick
 from app.core.config import settings
+from app.services.media_service.uploads import save_upload
+from app.api.v1.advertisements import publish_advertisements_changed
 
 router = APIRouter()
 
-# Директория для загрузки изображений рекламы
-ADVERTISEMENT_IMAGES_DIR = Path(settings.UPLOAD_DIR) / "advertisements"
-ADVERTISEMENT_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def save_uploaded_image(file: UploadFile) -> str:
-    """Сохранение загруженного изображения и возврат URL"""
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{uuid.uuid4().hex}{file_extension}"
-    file_path = ADVERTISEMENT_IMAGES_DIR / unique_filename
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    # Возвращаем URL
-    relative_path = f"uploads/advertisements/{unique_filename}"
-    return f"{settings.BASE_URL}/{relative_path}"
-
-
 @router.post("/", response_model=AdvertisementResponse, status_code=status.HTTP_201_CREATED)
 async def admin_create_advertisement(
     advertisement_data: AdvertisementCreate,
@@ -71,6 +51,7 @@ async def admin_create_advertisement(
         advertisement_data=advertisement_data,
         created_by_admin_id=current_user.id
     )
+    await publish_advertisements_changed()
     
     return AdvertisementResponse.model_validate(advertisement)
 
@@ -78,6 +59,7 @@ async def admin_create_advertisement(
 @router.post("/upload-image", status_code=status.HTTP_201_CREATED)
 async def admin_upload_advertisement_image(
     current_user: Annotated[User, Depends(get_current_admin_user)],
+    db: Annotated[Session, Depends(get_db)],
     file: Annotated[UploadFile, File(...)]
 ):
     """Загрузка изображения для рекламы"""
@@ -89,7 +71,7 @@ async def admin_upload_advertisement_image(
         )
     
     # Сохраняем файл
-    image_url = save_uploaded_image(file)
+    image_url = (await save_upload(db, file)).url
     
     return {"image_url": image_url}
 
@@ -166,6 +148,7 @@ async def admin_update_advertisement(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Реклама не найдена"
         )
+    await publish_advertisements_changed()
     
     return AdvertisementResponse.model_validate(advertisement)
 
@@ -183,6 +166,7 @@ async def admin_delete_advertisement(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Реклама не найдена"
         )
+    await publish_advertisements_changed()
     return None
 
 
@@ -0,0 +1,96 @@
+"""
+API эндпоинты архивов растущих таблиц (администраторские)
+"""
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.database import get_db, SessionLocal
+from app.core.config import settings
+from app.core.periodic import PeriodicJob
+from app.core.archive import hot_cutoff, archived_months
+from app.models.user import User
+from app.models.advertisement import AdvertisementViewArchive, AdvertisementClickArchive
+from app.models.global_chat import GlobalChatMessageArchive, GlobalChatMonthlySummary
+from app.api.deps import get_current_admin_user
+from app.services.advertisement_service.crud import rotate_advertisement_events
+from app.services.global_chat_service.crud import rotate_chat_messages
+
+router = APIRouter()
+
+
+def rotate_archives_once(bind=None) -> dict:
+    """Перенос старых событий рекламы и сообщений чата в архивы"""
+    db = Session(bind=bind) if bind is not None else SessionLocal()
+    try:
+        return {
+            "advertisement_events": rotate_advertisement_events(db),
+            "global_chat_messages": rotate_chat_messages(db),
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# Раз в ARCHIVE_ROTATION_INTERVAL переносит старые просмотры, клики и
+# сообщения чата в помесячные архивы и удаляет месяцы старше срока хранения.
+# При одновременном запуске на нескольких воркерах повторный перенос тех же
+# строк отклоняется первичным ключом архива, и порция откатывается.
+archive_job = PeriodicJob("Archive rotation", rotate_archives_once, lambda: settings.ARCHIVE_ROTATION_INTERVAL)
+
+
+@router.get("/", response_model=dict)
+async def get_archive_status(
+    current_user: Annotated[User, Depends(get_current_admin_user)],
+    db: Annotated[Session, Depends(get_db)]
+):
+    """
+    Состояние архивов
+
+    Граница горячих таблиц, месяцы в архивах, итоги удаленных месяцев чата
+    и результат последней ротации этого воркера.
+    """
+    summaries = db.query(GlobalChatMonthlySummary).order_by(GlobalChatMonthlySummary.month.desc()).all()
+    return {
+        "advertisement_events": {
+            "hot_since": hot_cutoff(settings.AD_EVENTS_HOT_MONTHS),
+            "retention_since": hot_cutoff(settings.AD_EVENTS_RETENTION_MONTHS),
+            "views_archive_months": archived_months(db, AdvertisementViewArchive.__table__),
+            "clicks_archive_months": archived_months(db, AdvertisementClickArchive.__table__),
+        },
+        "global_chat_messages": {
+            "hot_since": hot_cutoff(settings.CHAT_HOT_MONTHS),
+            "retention_since": hot_cutoff(settings.CHAT_ARCHIVE_RETENTION_MONTHS),
+            "archive_months": archived_months(db, GlobalChatMessageArchive.__table__),
+            "monthly_summaries": [
+                {
+                    "month": summary.month,
+                    "messages": summary.messages,
+                    "deleted_messages": summary.deleted_messages,
+                    "media_messages": summary.media_messages,
+                    "senders": summary.senders,
+                }
+                for summary in summaries
+            ],
+        },
+        "last_run": archive_job.last_run,
+        "last_result": archive_job.last_result,
+    }
+
+
+@router.post("/rotate", response_model=dict)
+async def rotate_archives(
+    current_user: Annotated[User, Depends(get_current_admin_user)],
+    db: Annotated[Session, Depends(get_db)]
+):
+    """Немедленная ротация архивов (обычно выполняется в фоне)"""
+    try:
+        return await archive_job.run(bind=db.get_bind())
+    except Exception as e:
+        print(f"Error rotating archives: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка ротации архивов"
+        )
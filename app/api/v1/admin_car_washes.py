@@ -4,8 +4,6 @@ API эндпоинты для автомоек (администраторски
 from typing import Annotated, Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from pathlib import Path
-import uuid
 
 from app.database import get_db
 from app.models.user import User
@@ -38,30 +36,11 @@ from app.schemas.car_wash import (
     CarWashServiceResponse,
 )
 from app.core.config import settings
+from app.services.media_service.uploads import save_upload
 from app.models.car_wash import CarWashStatus
 
 router = APIRouter()
 
-# Директория для загрузки фотографий автомоек
-CAR_WASH_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "car_washes"
-CAR_WASH_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def save_uploaded_photo(file: UploadFile, car_wash_id: int) -> str:
-    """Сохранение загруженной фотографии и возврат URL"""
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{car_wash_id}_{uuid.uuid4().hex}{file_extension}"
-    file_path = CAR_WASH_PHOTOS_DIR / unique_filename
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    # Возвращаем URL
-    relative_path = f"uploads/car_washes/{unique_filename}"
-    return f"{settings.BASE_URL}/{relative_path}"
-
-
 @router.post("/", response_model=CarWashResponse, status_code=status.HTTP_201_CREATED)
 async def admin_create_car_wash(
     car_wash_data: CarWashCreate,
@@ -270,7 +249,7 @@ async def admin_upload_car_wash_photo(
             detail=f"Недопустимый тип файла. Разрешены: {', '.join(settings.ALLOWED_IMAGE_TYPES)}"
         )
     
-    photo_url = save_uploaded_photo(file, car_wash_id)
+    photo_url = (await save_upload(db, file, variants=True)).url
     
     photo = add_car_wash_photo(
         db=db,
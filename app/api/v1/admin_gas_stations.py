@@ -4,8 +4,6 @@ API эндпоинты для заправочных станций (админ
 from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from pathlib import Path
-import uuid
 
 from app.database import get_db
 from app.models.user import User
@@ -38,30 +36,11 @@ from app.schemas.gas_station import (
     FuelPriceCreate,
 )
 from app.core.config import settings
+from app.services.media_service.uploads import save_upload
 from app.models.gas_station import StationStatus
 
 router = APIRouter()
 
-# Директория для загрузки фотографий станций
-GAS_STATION_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "gas_stations"
-GAS_STATION_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def save_uploaded_photo(file: UploadFile, station_id: int) -> str:
-    """Сохранение загруженной фотографии и возврат URL"""
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{station_id}_{uuid.uuid4().hex}{file_extension}"
-    file_path = GAS_STATION_PHOTOS_DIR / unique_filename
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    # Возвращаем URL
-    relative_path = f"uploads/gas_stations/{unique_filename}"
-    return f"{settings.BASE_URL}/{relative_path}"
-
-
 @router.post("/", response_model=GasStationResponse, status_code=status.HTTP_201_CREATED)
 async def admin_create_station(
     station_data: GasStationCreate,
@@ -256,7 +235,7 @@ async def admin_upload_station_photo(
         )
     
     # Сохраняем файл
-    photo_url = save_uploaded_photo(file, station_id)
+    photo_url = (await save_upload(db, file, variants=True)).url
     
     # Добавляем в БД
     photo = add_gas_station_photo(
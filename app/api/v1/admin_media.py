@@ -0,0 +1,69 @@
+"""
+API эндпоинты хранилища загруженных файлов (администраторские)
+"""
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.database import get_db, SessionLocal
+from app.core.config import settings
+from app.core.periodic import PeriodicJob
+from app.models.user import User
+from app.api.deps import get_current_admin_user
+from app.core.media_files import media_access_stats
+from app.services.media_service.crud import sweep_media, get_media_stats
+
+router = APIRouter()
+
+
+def sweep_storage(bind=None, grace_seconds: Optional[int] = None) -> dict:
+    """Очистка хранилища в собственной сессии"""
+    db = Session(bind=bind) if bind is not None else SessionLocal()
+    try:
+        return sweep_media(db, grace_seconds)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# Раз в MEDIA_SWEEP_INTERVAL удаляет файлы, на которые не осталось ссылок,
+# и незарегистрированные файлы оборванных загрузок
+media_sweep_job = PeriodicJob("Media sweep", sweep_storage, lambda: settings.MEDIA_SWEEP_INTERVAL)
+
+
+@router.get("/", response_model=dict)
+async def get_media_status(
+    current_user: Annotated[User, Depends(get_current_admin_user)],
+    db: Annotated[Session, Depends(get_db)]
+):
+    """
+    Состояние хранилища
+
+    Количество файлов и ссылок, объем, экономия от дедупликации, результат
+    последней очистки и счетчики раздачи /uploads этого воркера
+    (запросы, байты и коды ответов по директориям).
+    """
+    return {
+        **get_media_stats(db),
+        "last_sweep": media_sweep_job.last_run,
+        "last_sweep_result": media_sweep_job.last_result,
+        "access": media_access_stats.snapshot(),
+    }
+
+
+@router.post("/sweep", response_model=dict)
+async def sweep_media_files(
+    current_user: Annotated[User, Depends(get_current_admin_user)],
+    db: Annotated[Session, Depends(get_db)]
+):
+    """Немедленная очистка хранилища (обычно выполняется в фоне)"""
+    try:
+        return await media_sweep_job.run(bind=db.get_bind())
+    except Exception as e:
+        print(f"Error sweeping media: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка очистки хранилища"
+        )
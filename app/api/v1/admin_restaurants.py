@@ -4,8 +4,6 @@ API эндпоинты для ресторанов (администраторс
 from typing import Annotated, Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from pathlib import Path
-import uuid
 
 from app.database import get_db
 from app.models.user import User
@@ -48,37 +46,11 @@ from app.schemas.restaurant import (
     MenuItemUpdate,
 )
 from app.core.config import settings
+from app.services.media_service.uploads import save_upload
 from app.models.restaurant import RestaurantStatus
 
 router = APIRouter()
 
-# Директория для загрузки фотографий ресторанов
-RESTAURANT_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "restaurants"
-RESTAURANT_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-MENU_ITEM_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "restaurants" / "menu_items"
-MENU_ITEM_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def save_uploaded_photo(file: UploadFile, restaurant_id: int, is_menu_item: bool = False) -> str:
-    """Сохранение загруженной фотографии и возврат URL"""
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{restaurant_id}_{uuid.uuid4().hex}{file_extension}"
-    
-    if is_menu_item:
-        file_path = MENU_ITEM_PHOTOS_DIR / unique_filename
-        relative_path = f"uploads/restaurants/menu_items/{unique_filename}"
-    else:
-        file_path = RESTAURANT_PHOTOS_DIR / unique_filename
-        relative_path = f"uploads/restaurants/{unique_filename}"
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    return f"{settings.BASE_URL}/{relative_path}"
-
-
 @router.post("/", response_model=RestaurantResponse, status_code=status.HTTP_201_CREATED)
 async def admin_create_restaurant(
     restaurant_data: RestaurantCreate,
@@ -283,7 +255,7 @@ async def admin_upload_restaurant_photo(
         )
     
     # Сохраняем файл
-    photo_url = save_uploaded_photo(file, restaurant_id, is_menu_item=False)
+    photo_url = (await save_upload(db, file, variants=True)).url
     
     # Добавляем в БД
     photo = add_restaurant_photo(
@@ -3,16 +3,22 @@ API эндпоинты для статистики администратора
 """
 from typing import Annotated, Optional
 from datetime import datetime
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
+from app.core.config import settings
+from app.core.periodic import PeriodicJob
+from app.core.swr_cache import StaleWhileRevalidateCache
 from app.models.user import User
 from app.api.deps import get_current_admin_user
 from app.schemas.admin_statistics import (
     DashboardResponse,
     KPIsResponse,
+    KPIValue,
     CategoryMetricsResponse,
+    CategoryMetric,
     RevenueChartResponse,
     NewUsersChartResponse,
     UserActivityChartResponse,
@@ -34,141 +40,136 @@ from app.services.admin_statistics_service.crud import (
     get_category_completeness,
     get_recent_actions,
     get_order_statistics,
-    get_system_activity
+    get_system_activity,
+    get_category_sections,
+    get_activity_sections,
+    refresh_statistics_rollups,
+    rebuild_statistics_rollups,
+    has_statistics_rollups,
 )
 
 router = APIRouter()
 
 
-@router.get("/dashboard", response_model=DashboardResponse)
-async def get_dashboard(
-    current_admin: Annotated[User, Depends(get_current_admin_user)],
-    db: Annotated[Session, Depends(get_db)],
-    start_date: Optional[datetime] = Query(None, description="Начальная дата периода"),
-    end_date: Optional[datetime] = Query(None, description="Конечная дата периода"),
-    period_days: int = Query(7, ge=1, le=365, description="Количество дней для периода (по умолчанию 7)")
-):
+def refresh_rollups() -> int:
     """
-    Получение полного дашборда администратора
+    Обновление дневных и часовых агрегатов статистики
     
-    Возвращает все данные для отображения дашборда:
-    - KPI показатели
-    - Метрики по категориям
-    - Графики (выручка, новые пользователи, активность)
-    - Распределение по категориям
-    - Последние транзакции
-    - Заполненность категорий
-    - Последние действия
-    - Статистика заказов
-    - Активность системы
+    Без агрегатов пересчитывает всю историю, иначе - текущий день. Пересчет
+    идемпотентен, поэтому параллельный запуск на нескольких воркерах безопасен.
     """
+    db = SessionLocal()
     try:
-        kpis = get_kpis(db, start_date, end_date, period_days)
-    except Exception as e:
-        import traceback
-        print(f"Error getting KPIs: {str(e)}")
-        print(traceback.format_exc())
-        # Используем значения по умолчанию
-        from app.schemas.admin_statistics import KPIValue
-        kpis = KPIsResponse(
-            total_users=KPIValue(value=0),
-            active_users=KPIValue(value=0),
-            total_requests=KPIValue(value=0),
-            revenue=KPIValue(value=0)
-        )
-    
-    try:
-        category_metrics = get_category_metrics(db, start_date, end_date)
-    except Exception as e:
-        import traceback
-        print(f"Error getting category metrics: {str(e)}")
-        print(traceback.format_exc())
-        from app.schemas.admin_statistics import CategoryMetric
-        category_metrics = CategoryMetricsResponse(
-            gas_stations=CategoryMetric(total=0, active=0, change=0),
-            restaurants=CategoryMetric(total=0, active=0, change=0),
-            service_stations=CategoryMetric(total=0, active=0, change=0),
-            car_washes=CategoryMetric(total=0, active=0, change=0),
-            electric_stations=CategoryMetric(total=0, active=0, change=0)
-        )
-    
-    try:
-        revenue_chart = get_revenue_chart(db, start_date, end_date, period_days)
-    except Exception as e:
-        import traceback
-        print(f"Error getting revenue chart: {str(e)}")
-        print(traceback.format_exc())
-        revenue_chart = RevenueChartResponse(labels=[], revenue=[], orders=[])
-    
-    try:
-        new_users_chart = get_new_users_chart(db, start_date, end_date, period_days)
-    except Exception as e:
-        import traceback
-        print(f"Error getting new users chart: {str(e)}")
-        print(traceback.format_exc())
-        new_users_chart = NewUsersChartResponse(labels=[], users=[])
-    
-    try:
-        user_activity_chart = get_user_activity_chart(db, start_date, end_date)
-    except Exception as e:
-        import traceback
-        print(f"Error getting user activity chart: {str(e)}")
-        print(traceback.format_exc())
-        user_activity_chart = UserActivityChartResponse(labels=[], activity=[])
-    
-    try:
-        category_distribution = get_category_distribution(db)
-    except Exception as e:
-        import traceback
-        print(f"Error getting category distribution: {str(e)}")
-        print(traceback.format_exc())
-        category_distribution = CategoryDistributionResponse(categories=[])
+        if not has_statistics_rollups(db):
+            return rebuild_statistics_rollups(db)
+        return refresh_statistics_rollups(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+rollup_job = PeriodicJob(
+    "Statistics rollup", refresh_rollups, lambda: settings.STATISTICS_ROLLUP_INTERVAL, run_at_start=True
+)
+
+
+def _run_section(name: str, func, default, bind):
+    """
+    Выполнение одной части дашборда в собственной сессии (отдельное соединение из пула)
     
+    Ошибка части не ломает дашборд - возвращается значение по умолчанию
+    """
+    session = Session(bind=bind, autocommit=False, autoflush=False)
     try:
-        latest_transactions = get_latest_transactions(db, limit=5)
+        return func(session)
     except Exception as e:
         import traceback
-        print(f"Error getting latest transactions: {str(e)}")
+        print(f"Error getting {name}: {str(e)}")
         print(traceback.format_exc())
-        latest_transactions = LatestTransactionsResponse(transactions=[], total=0)
+        return default
+    finally:
+        session.close()
+
+
+def _dashboard_cache_key(start_date: Optional[datetime], end_date: Optional[datetime], period_days: int) -> tuple:
+    """Ключ кэша: даты округляются до интервала, чтобы близкие запросы попадали в одну запись"""
+    bucket = settings.DASHBOARD_CACHE_BUCKET_SECONDS
     
-    try:
-        category_completeness = get_category_completeness(db)
-    except Exception as e:
-        import traceback
-        print(f"Error getting category completeness: {str(e)}")
-        print(traceback.format_exc())
-        category_completeness = CategoryCompletenessResponse(categories=[])
+    def round_date(value: Optional[datetime]):
+        if value is None:
+            return None
+        return int(value.timestamp()) // bucket
     
-    try:
-        recent_actions = get_recent_actions(db, limit=5)
-    except Exception as e:
-        import traceback
-        print(f"Error getting recent actions: {str(e)}")
-        print(traceback.format_exc())
-        recent_actions = RecentActionsResponse(actions=[], total=0)
+    return round_date(start_date), round_date(end_date), period_days
+
+
+async def _compute_dashboard(
+    bind,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    period_days: int
+) -> DashboardResponse:
+    """Расчет дашборда: независимые части параллельно, каждая в своем соединении"""
+    sections = [
+        ("KPIs", lambda s: get_kpis(s, start_date, end_date, period_days), KPIsResponse(
+            total_users=KPIValue(value=0),
+            active_users=KPIValue(value=0),
+            total_requests=KPIValue(value=0),
+            revenue=KPIValue(value=0)
+        )),
+        ("category metrics", lambda s: get_category_sections(s, start_date, end_date), (
+            CategoryMetricsResponse(
+                gas_stations=CategoryMetric(total=0, active=0, change=0),
+                restaurants=CategoryMetric(total=0, active=0, change=0),
+                service_stations=CategoryMetric(total=0, active=0, change=0),
+                car_washes=CategoryMetric(total=0, active=0, change=0),
+                electric_stations=CategoryMetric(total=0, active=0, change=0)
+            ),
+            CategoryDistributionResponse(categories=[]),
+            CategoryCompletenessResponse(categories=[])
+        )),
+        ("revenue chart", lambda s: get_revenue_chart(s, start_date, end_date, period_days),
+            RevenueChartResponse(labels=[], revenue=[], orders=[])),
+        ("new users chart", lambda s: get_new_users_chart(s, start_date, end_date, period_days),
+            NewUsersChartResponse(labels=[], users=[])),
+        ("user activity chart", lambda s: get_user_activity_chart(s, start_date, end_date),
+            UserActivityChartResponse(labels=[], activity=[])),
+        ("latest transactions", lambda s: get_latest_transactions(s, limit=5),
+            LatestTransactionsResponse(transactions=[], total=0)),
+        ("recent actions", lambda s: get_recent_actions(s, limit=5),
+            RecentActionsResponse(actions=[], total=0)),
+        ("order statistics", lambda s: get_activity_sections(s, start_date, end_date), (
+            OrderStatisticsResponse(total_orders=0, statuses=[]),
+            SystemActivityResponse(
+                total_activity=KPIValue(value=0),
+                average_check=KPIValue(value=0),
+                conversion=0.0,
+                satisfaction=0.0
+            )
+        )),
+    ]
     
-    try:
-        order_statistics = get_order_statistics(db, start_date, end_date)
-    except Exception as e:
-        import traceback
-        print(f"Error getting order statistics: {str(e)}")
-        print(traceback.format_exc())
-        order_statistics = OrderStatisticsResponse(total_orders=0, statuses=[])
+    if bind.dialect.name == "sqlite":
+        # SQLite - одно соединение, параллельные запросы не дают выигрыша
+        results = [_run_section(name, func, default, bind) for name, func, default in sections]
+    else:
+        results = await asyncio.gather(*(
+            asyncio.to_thread(_run_section, name, func, default, bind)
+            for name, func, default in sections
+        ))
     
-    try:
-        system_activity = get_system_activity(db, start_date, end_date)
-    except Exception as e:
-        import traceback
-        print(f"Error getting system activity: {str(e)}")
-        print(traceback.format_exc())
-        from app.schemas.admin_statistics import KPIValue
-        system_activity = SystemActivityResponse(
-            total_activity=KPIValue(value=0),
-            average_check=KPIValue(value=0),
-            conversion=0.0,
-            satisfaction=0.0
-        )
+    (
+        kpis,
+        (category_metrics, category_distribution, category_completeness),
+        revenue_chart,
+        new_users_chart,
+        user_activity_chart,
+        latest_transactions,
+        recent_actions,
+        (order_statistics, system_activity),
+    ) = results
     
     return DashboardResponse(
         kpis=kpis,
@@ -185,6 +186,48 @@ async def get_dashboard(
     )
 
 
+# Кэш дашборда: несколько админов с автообновлением получают одно вычисление
+dashboard_cache = StaleWhileRevalidateCache(
+    fresh_seconds=settings.DASHBOARD_CACHE_TTL,
+    max_stale_seconds=settings.DASHBOARD_CACHE_MAX_STALE
+)
+
+
+@router.get("/dashboard", response_model=DashboardResponse)
+async def get_dashboard(
+    current_admin: Annotated[User, Depends(get_current_admin_user)],
+    db: Annotated[Session, Depends(get_db)],
+    start_date: Optional[datetime] = Query(None, description="Начальная дата периода"),
+    end_date: Optional[datetime] = Query(None, description="Конечная дата периода"),
+    period_days: int = Query(7, ge=1, le=365, description="Количество дней для периода (по умолчанию 7)"),
+    refresh: bool = Query(False, description="Пересчитать, не используя кэш")
+):
+    """
+    Получение полного дашборда администратора
+    
+    Возвращает все данные для отображения дашборда:
+    - KPI показатели
+    - Метрики по категориям
+    - Графики (выручка, новые пользователи, активность)
+    - Распределение по категориям
+    - Последние транзакции
+    - Заполненность категорий
+    - Последние действия
+    - Статистика заказов
+    - Активность системы
+    
+    Результат кэшируется: слегка устаревшие данные отдаются сразу и
+    обновляются в фоне. Время расчета - в поле computed_at.
+    """
+    bind = db.get_bind()
+    dashboard, computed_at = await dashboard_cache.get(
+        _dashboard_cache_key(start_date, end_date, period_days),
+        lambda: _compute_dashboard(bind, start_date, end_date, period_days),
+        force=refresh
+    )
+    return dashboard.model_copy(update={"computed_at": computed_at})
+
+
 @router.get("/kpis", response_model=KPIsResponse)
 async def get_kpis_endpoint(
     current_admin: Annotated[User, Depends(get_current_admin_user)],
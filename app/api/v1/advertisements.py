@@ -1,18 +1,27 @@
 """
 API эндпоинты для рекламы (клиентские)
 """
+from datetime import datetime, timezone
 from typing import Annotated, Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models.user import User
 from app.api.deps import get_current_user_optional
+from app.core.config import settings
+from app.core.periodic import PeriodicJob
+from app.core.batch_writer import BatchWriter, BatchWriterOverloaded
+from app.core.pubsub import pubsub, WORKER_ID
 from app.services.advertisement_service.crud import (
-    get_active_advertisements_for_position,
-    create_advertisement_view,
-    create_advertisement_click,
+    select_advertisements_for_position,
+    record_served_view,
+    rebuild_serving_state,
+    advertisement_exists,
+    persist_advertisement_events,
+    build_advertisement_event,
 )
+from app.services.advertisement_service.serving_index import advertisement_index
 from app.schemas.advertisement import (
     AdvertisementForClientResponse,
     AdvertisementViewCreate,
@@ -23,21 +32,113 @@ from app.models.advertisement import AdvertisementPosition
 
 router = APIRouter()
 
+ADVERTISEMENTS_CHANNEL = "advertisements"
+
+# Буфер событий показов и кликов: пакетная запись в фоне
+ad_event_writer = BatchWriter(
+    persist_advertisement_events,
+    name="advertisement_events",
+    interval_ms=settings.AD_EVENTS_FLUSH_INTERVAL_MS,
+    max_batch=settings.AD_EVENTS_FLUSH_MAX,
+    max_queue=settings.AD_EVENTS_QUEUE_MAX,
+)
+
+
+def _enqueue_event(event: dict):
+    """Постановка события в буфер; при переполнении - 503"""
+    try:
+        ad_event_writer.submit_nowait(event)
+    except BatchWriterOverloaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, повторите позже",
+            headers={"Retry-After": "1"}
+        )
+
+
+def _user_key(request: Request, current_user: Optional[User]) -> Optional[str]:
+    """Ключ частотных ограничений: пользователь, для анонимных - IP"""
+    if current_user:
+        return f"user:{current_user.id}"
+    if request.client:
+        return f"ip:{request.client.host}"
+    return None
+
+
+async def publish_advertisements_changed():
+    """Сообщение другим воркерам об изменении рекламы (индекс этого воркера уже перестроен)"""
+    await pubsub.publish(ADVERTISEMENTS_CHANNEL, {"type": "changed", "origin": WORKER_ID})
+
+
+async def _handle_advertisements_event(event: dict):
+    if event.get("type") == "changed" and event.get("origin") != WORKER_ID:
+        # Перестроится из БД при следующем запросе выдачи
+        advertisement_index.invalidate()
+
+
+pubsub.subscribe(ADVERTISEMENTS_CHANNEL, _handle_advertisements_event)
+
+
+class AdvertisementIndexRefresh:
+    """
+    Таймер индекса выдачи
+    
+    Просыпается на ближайшей границе окна показа и продвигает индекс в памяти.
+    Не реже AD_INDEX_REFRESH_INTERVAL индекс перестраивается из БД - на случай
+    потерянного события шины, заодно синхронизируется пейсинг.
+    """
+    
+    def __init__(self):
+        self.last_rebuild: Optional[datetime] = None
+    
+    def delay(self) -> float:
+        """Пауза до ближайшей границы окна или планового перестроения"""
+        now = datetime.now(timezone.utc)
+        if self.last_rebuild is None:
+            self.last_rebuild = now
+        delay = settings.AD_INDEX_REFRESH_INTERVAL - (now - self.last_rebuild).total_seconds()
+        boundary = advertisement_index.next_boundary
+        if boundary is not None:
+            delay = min(delay, (boundary - now).total_seconds())
+        return delay
+    
+    def refresh(self):
+        now = datetime.now(timezone.utc)
+        if (now - self.last_rebuild).total_seconds() < settings.AD_INDEX_REFRESH_INTERVAL:
+            advertisement_index.advance(now)
+            return
+        # Время фиксируется и при ошибке, чтобы не повторять перестроение без паузы
+        self.last_rebuild = now
+        db = SessionLocal()
+        try:
+            rebuild_serving_state(db)
+        finally:
+            db.close()
+
+
+ad_index_refresh = AdvertisementIndexRefresh()
+ad_index_job = PeriodicJob("Advertisement index refresh", ad_index_refresh.refresh, ad_index_refresh.delay)
+
 
 @router.get("/", response_model=List[AdvertisementForClientResponse])
 async def get_advertisements(
+    request: Request,
     position: AdvertisementPositionEnum = Query(..., description="Позиция рекламы в приложении"),
+    limit: int = Query(settings.AD_SELECTION_DEFAULT_LIMIT, ge=1, le=20, description="Количество реклам"),
+    device_type: Optional[str] = Query(None, description="Тип устройства (mobile, tablet, desktop)"),
+    app_version: Optional[str] = Query(None, description="Версия приложения"),
     current_user: Annotated[Optional[User], Depends(get_current_user_optional)] = None,
     db: Annotated[Session, Depends(get_db)] = None
 ):
     """
-    Получение активных рекламных блоков для определенной позиции
+    Получение рекламных блоков для определенной позиции
     
     Этот эндпоинт используется клиентским приложением для получения рекламы,
     которую нужно показать пользователю на определенной странице.
+    Сервер выбирает до limit реклам: случайно с весом по приоритету, с учетом
+    частотных ограничений, пейсинга и условий показа (show_conditions).
+    Выдача идет из индекса в памяти, без запросов к БД.
     """
-    from app.services.advertisement_service.crud import get_active_advertisements_for_position
-    
     # Определяем целевую аудиторию (можно расширить логику)
     target_audience = None
     if current_user:
@@ -45,14 +146,17 @@ async def get_advertisements(
         # Например, если у пользователя есть премиум подписка
         target_audience = "all"
     
-    advertisements = get_active_advertisements_for_position(
+    advertisements = select_advertisements_for_position(
         db=db,
         position=position,
-        user_id=current_user.id if current_user else None,
-        target_audience=target_audience
+        limit=limit,
+        user_key=_user_key(request, current_user),
+        target_audience=target_audience,
+        device_type=device_type,
+        app_version=app_version
     )
     
-    return [AdvertisementForClientResponse.model_validate(ad) for ad in advertisements]
+    return [entry.payload for entry in advertisements]
 
 
 @router.post("/{advertisement_id}/view", status_code=status.HTTP_201_CREATED)
@@ -70,13 +174,11 @@ async def register_advertisement_view(
     Регистрация просмотра рекламы
     
     Этот эндпоинт вызывается клиентским приложением каждый раз,
-    когда реклама показывается пользователю.
+    когда реклама показывается пользователю. Просмотр ставится в буфер
+    и записывается в БД пакетом.
     """
-    from app.services.advertisement_service.crud import get_advertisement_by_id
-    
-    # Проверяем существование рекламы
-    advertisement = get_advertisement_by_id(db, advertisement_id)
-    if not advertisement:
+    # Проверяем существование рекламы (по индексу выдачи)
+    if not advertisement_exists(db, advertisement_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Реклама не найдена"
@@ -98,12 +200,14 @@ async def register_advertisement_view(
         app_version=app_version
     )
     
-    create_advertisement_view(
-        db=db,
-        advertisement_id=advertisement_id,
-        view_data=view_data,
+    # Запись выполняется пакетом в фоне
+    _enqueue_event(build_advertisement_event(
+        "view",
+        advertisement_id,
+        view_data,
         user_id=current_user.id if current_user else None
-    )
+    ))
+    record_served_view(advertisement_id, _user_key(request, current_user))
     
     return {"message": "Просмотр зарегистрирован", "advertisement_id": advertisement_id}
 
@@ -122,13 +226,10 @@ async def register_advertisement_click(
     Регистрация клика по рекламе
     
     Этот эндпоинт вызывается клиентским приложением когда пользователь
-    кликает на рекламу.
+    кликает на рекламу. Клик ставится в буфер и записывается в БД пакетом.
     """
-    from app.services.advertisement_service.crud import get_advertisement_by_id
-    
-    # Проверяем существование рекламы
-    advertisement = get_advertisement_by_id(db, advertisement_id)
-    if not advertisement:
+    # Проверяем существование рекламы (по индексу выдачи)
+    if not advertisement_exists(db, advertisement_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Реклама не найдена"
@@ -149,12 +250,13 @@ async def register_advertisement_click(
         device_type=device_type
     )
     
-    create_advertisement_click(
-        db=db,
-        advertisement_id=advertisement_id,
-        click_data=click_data,
+    # Запись выполняется пакетом в фоне
+    _enqueue_event(build_advertisement_event(
+        "click",
+        advertisement_id,
+        click_data,
         user_id=current_user.id if current_user else None
-    )
+    ))
     
     return {"message": "Клик зарегистрирован", "advertisement_id": advertisement_id}
 
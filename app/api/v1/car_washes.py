@@ -4,8 +4,6 @@ API эндпоинты для автомоек (пользовательские
 from typing import Annotated, Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from pathlib import Path
-import uuid
 
 from app.database import get_db
 from app.models.user import User
@@ -41,30 +39,12 @@ from app.schemas.car_wash import (
     BulkCarWashServiceUpdate,
 )
 from app.core.config import settings
+from app.core.media import thumbnail_url
+from app.services.media_service.uploads import save_upload
 from app.models.car_wash import CarWashStatus
 
 router = APIRouter()
 
-# Директория для загрузки фотографий автомоек
-CAR_WASH_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "car_washes"
-CAR_WASH_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def save_uploaded_photo(file: UploadFile, car_wash_id: int) -> str:
-    """Сохранение загруженной фотографии и возврат URL"""
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{car_wash_id}_{uuid.uuid4().hex}{file_extension}"
-    file_path = CAR_WASH_PHOTOS_DIR / unique_filename
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    # Возвращаем URL
-    relative_path = f"uploads/car_washes/{unique_filename}"
-    return f"{settings.BASE_URL}/{relative_path}"
-
-
 @router.post("/", response_model=CarWashResponse, status_code=status.HTTP_201_CREATED)
 async def create_car_wash_endpoint(
     car_wash_data: CarWashCreate,
@@ -104,7 +84,8 @@ async def list_car_washes(
     search_query: Optional[str] = Query(None),
     latitude: Optional[float] = Query(None, ge=-90, le=90),
     longitude: Optional[float] = Query(None, ge=-180, le=180),
-    radius_km: Optional[float] = Query(None, gt=0)
+    radius_km: Optional[float] = Query(None, gt=0),
+    full_size_photos: bool = Query(False, description="main_photo в исходном размере вместо миниатюры")
 ):
     """Получение списка автомоек с фильтрацией"""
     filters = CarWashFilter(
@@ -136,7 +117,10 @@ async def list_car_washes(
         # Находим главную фотографию
         main_photo = next((p for p in car_wash.photos if p.is_main), None)
         if main_photo:
-            car_wash_dict["main_photo"] = main_photo.photo_url
+            car_wash_dict["main_photo"] = (
+                main_photo.photo_url if full_size_photos
+                else thumbnail_url(main_photo.photo_url, settings.IMAGE_LIST_THUMBNAIL_SIZE)
+            )
         car_wash_responses.append(CarWashResponse(**car_wash_dict))
     
     return CarWashListResponse(
@@ -223,7 +207,7 @@ async def upload_car_wash_photo(
         )
     
     # Сохраняем файл
-    photo_url = save_uploaded_photo(file, car_wash_id)
+    photo_url = (await save_upload(db, file, variants=True)).url
     
     # Добавляем в БД
     photo = add_car_wash_photo(
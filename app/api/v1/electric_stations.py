@@ -4,8 +4,6 @@ API эндпоинты для электрозаправок (пользоват
 from typing import Annotated, Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from pathlib import Path
-import uuid
 
 from app.database import get_db
 from app.models.user import User
@@ -40,30 +38,12 @@ from app.schemas.electric_station import (
     BulkChargingPointUpdate,
 )
 from app.core.config import settings
+from app.core.media import thumbnail_url
+from app.services.media_service.uploads import save_upload
 from app.models.electric_station import ElectricStationStatus
 
 router = APIRouter()
 
-# Директория для загрузки фотографий электрозаправок
-ELECTRIC_STATION_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "electric_stations"
-ELECTRIC_STATION_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def save_uploaded_photo(file: UploadFile, station_id: int) -> str:
-    """Сохранение загруженной фотографии и возврат URL"""
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{station_id}_{uuid.uuid4().hex}{file_extension}"
-    file_path = ELECTRIC_STATION_PHOTOS_DIR / unique_filename
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    # Возвращаем URL
-    relative_path = f"uploads/electric_stations/{unique_filename}"
-    return f"{settings.BASE_URL}/{relative_path}"
-
-
 @router.post("/", response_model=ElectricStationResponse, status_code=status.HTTP_201_CREATED)
 async def create_electric_station_endpoint(
     station_data: ElectricStationCreate,
@@ -108,7 +88,8 @@ async def list_electric_stations(
     search_query: Optional[str] = Query(None),
     latitude: Optional[float] = Query(None, ge=-90, le=90),
     longitude: Optional[float] = Query(None, ge=-180, le=180),
-    radius_km: Optional[float] = Query(None, gt=0)
+    radius_km: Optional[float] = Query(None, gt=0),
+    full_size_photos: bool = Query(False, description="main_photo в исходном размере вместо миниатюры")
 ):
     """Получение списка электрозаправок с фильтрацией"""
     filters = ElectricStationFilter(
@@ -145,7 +126,10 @@ async def list_electric_stations(
         # Находим главную фотографию
         main_photo = next((p for p in station.photos if p.is_main), None)
         if main_photo:
-            station_dict["main_photo"] = main_photo.photo_url
+            station_dict["main_photo"] = (
+                main_photo.photo_url if full_size_photos
+                else thumbnail_url(main_photo.photo_url, settings.IMAGE_LIST_THUMBNAIL_SIZE)
+            )
         station_responses.append(ElectricStationResponse(**station_dict))
     
     return ElectricStationListResponse(
@@ -232,7 +216,7 @@ async def upload_electric_station_photo(
         )
     
     # Сохраняем файл
-    photo_url = save_uploaded_photo(file, station_id)
+    photo_url = (await save_upload(db, file, variants=True)).url
     
     # Добавляем в БД
     photo = add_electric_station_photo(
@@ -4,8 +4,6 @@ API эндпоинты для заправочных станций (польз
 from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from pathlib import Path
-import uuid
 
 from app.database import get_db
 from app.models.user import User
@@ -39,30 +37,12 @@ from app.schemas.gas_station import (
     BulkFuelPriceUpdate,
 )
 from app.core.config import settings
+from app.core.media import thumbnail_url
+from app.services.media_service.uploads import save_upload
 from app.models.gas_station import StationStatus
 
 router = APIRouter()
 
-# Директория для загрузки фотографий станций
-GAS_STATION_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "gas_stations"
-GAS_STATION_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def save_uploaded_photo(file: UploadFile, station_id: int) -> str:
-    """Сохранение загруженной фотографии и возврат URL"""
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{station_id}_{uuid.uuid4().hex}{file_extension}"
-    file_path = GAS_STATION_PHOTOS_DIR / unique_filename
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    # Возвращаем URL
-    relative_path = f"uploads/gas_stations/{unique_filename}"
-    return f"{settings.BASE_URL}/{relative_path}"
-
-
 @router.post("/", response_model=GasStationResponse, status_code=status.HTTP_201_CREATED)
 async def create_station(
     station_data: GasStationCreate,
@@ -95,7 +75,8 @@ async def list_stations(
     search_query: Optional[str] = Query(None),
     latitude: Optional[float] = Query(None, ge=-90, le=90),
     longitude: Optional[float] = Query(None, ge=-180, le=180),
-    radius_km: Optional[float] = Query(None, gt=0)
+    radius_km: Optional[float] = Query(None, gt=0),
+    full_size_photos: bool = Query(False, description="main_photo в исходном размере вместо миниатюры")
 ):
     """Получение списка заправочных станций с фильтрацией"""
     filters = GasStationFilter(
@@ -119,7 +100,10 @@ async def list_stations(
         # Находим главную фотографию
         main_photo = next((p for p in station.photos if p.is_main), None)
         if main_photo:
-            station_dict["main_photo"] = main_photo.photo_url
+            station_dict["main_photo"] = (
+                main_photo.photo_url if full_size_photos
+                else thumbnail_url(main_photo.photo_url, settings.IMAGE_LIST_THUMBNAIL_SIZE)
+            )
         station_responses.append(GasStationResponse(**station_dict))
     
     return GasStationListResponse(
@@ -206,7 +190,7 @@ async def upload_station_photo(
         )
     
     # Сохраняем файл
-    photo_url = save_uploaded_photo(file, station_id)
+    photo_url = (await save_upload(db, file, variants=True)).url
     
     # Добавляем в БД
     photo = add_gas_station_photo(
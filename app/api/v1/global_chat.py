@@ -4,15 +4,17 @@ API эндпоинты для глобального чата
 from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect, UploadFile, File
 from sqlalchemy.orm import Session
+from pydantic import ValidationError
+import asyncio
 import json
+import logging
 import os
-import uuid
-from pathlib import Path
+import time
 from datetime import datetime
 
 from app.database import get_db
-from app.models.user import User
-from app.api.deps import get_current_active_user
+from app.models.user import User, BlacklistedToken
+from app.api.deps import get_current_active_user, get_websocket_user
 from app.services.global_chat_service.crud import (
     create_message,
     get_messages,
@@ -20,14 +22,19 @@ from app.services.global_chat_service.crud import (
     block_user,
     unblock_user,
     get_blocked_users as get_blocked_users_crud,
+    get_blocked_user_ids,
     clear_chat_history_for_user,
     delete_message,
+    get_approximate_message_count,
+    create_messages_bulk,
 )
+from app.services.user_service.crud import get_users_extended_by_ids
 from app.schemas.global_chat import (
     GlobalChatMessageCreate,
     GlobalChatMessageResponse,
     GlobalChatMessageListResponse,
     GlobalChatSearchResponse,
+    GlobalChatSearchResult,
     UserBlockCreate,
     UserBlockResponse,
     BlockedUsersListResponse,
@@ -36,128 +43,399 @@ from app.schemas.global_chat import (
     MessageType,
 )
 from app.core.config import settings
+from app.core.pubsub import pubsub, WORKER_ID
+from app.core.presence import PresenceRegistry
+from app.core.batch_writer import BatchWriter, BatchWriterOverloaded
+from app.core.periodic import PeriodicJob
+from app.core.rate_limit import RateLimitStore
+from app.core.media import image_variants, thumbnail_url
+from app.services.media_service.uploads import save_upload, StoredUpload, UploadTooLarge
 
-router = APIRouter()
-
-# Директория для загрузки файлов чата
-CHAT_UPLOAD_DIR = Path(settings.UPLOAD_DIR) / "global_chat"
-CHAT_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+logger = logging.getLogger(__name__)
 
-# Поддиректории для разных типов файлов
-CHAT_IMAGES_DIR = CHAT_UPLOAD_DIR / "images"
-CHAT_VIDEOS_DIR = CHAT_UPLOAD_DIR / "videos"
-CHAT_FILES_DIR = CHAT_UPLOAD_DIR / "files"
-CHAT_AUDIO_DIR = CHAT_UPLOAD_DIR / "audio"
+router = APIRouter()
 
-CHAT_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
-CHAT_VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
-CHAT_FILES_DIR.mkdir(parents=True, exist_ok=True)
-CHAT_AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+# Канал шины pub/sub для событий глобального чата
+GLOBAL_CHAT_CHANNEL = "global_chat"
 
 
 # Менеджер WebSocket соединений для глобального чата
 class GlobalChatConnectionManager:
-    """Менеджер WebSocket соединений для глобального чата"""
+    """
+    Менеджер WebSocket соединений для глобального чата
+    
+    - Несколько устройств на пользователя (PresenceRegistry)
+    - Heartbeat: сервер периодически шлет ping, молчащие соединения закрываются
+    - Онлайн-счетчик рассылается не чаще одного раза за интервал
+    - Счетчик суммируется по всем воркерам через шину pub/sub
+    - Блокировки: сообщения от заблокированных авторов не доставляются
+      (множества заблокированных хранятся в памяти для подключенных пользователей)
+    - Токены и статус пользователей перепроверяются раз в CHAT_AUTH_RECHECK_INTERVAL:
+      соединения после выхода из аккаунта или блокировки закрываются
+    """
     
     def __init__(self):
-        # Словарь: user_id -> WebSocket соединение
-        self.active_connections: dict[int, WebSocket] = {}
-        # Счетчик онлайн пользователей
-        self.online_count = 0
-    
-    async def connect(self, websocket: WebSocket, user_id: int):
+        self.presence = PresenceRegistry(heartbeat_timeout=settings.CHAT_HEARTBEAT_TIMEOUT)
+        # Идентификатор воркера для событий присутствия
+        self.worker_id = WORKER_ID
+        # Словарь: worker_id -> (онлайн на воркере, время последнего события)
+        self._worker_counts: dict[str, tuple[int, float]] = {}
+        self._last_broadcast_count: Optional[int] = None
+        self._last_presence_publish = 0.0
+        self._last_heartbeat = 0.0
+        self._last_auth_check = time.monotonic()
+        # Фоновый цикл: не более одной рассылки онлайн-счетчика за интервал
+        self._presence_job = PeriodicJob(
+            "Global chat presence", self.presence_tick, lambda: settings.CHAT_ONLINE_BROADCAST_INTERVAL
+        )
+        # Словарь: user_id подключенного пользователя -> ID заблокированных им пользователей
+        self.blocked_ids: dict[int, set[int]] = {}
+        # Словарь: соединение -> (user_id, токен подключения) для перепроверки
+        self.connection_tokens: dict[WebSocket, tuple[int, str]] = {}
+    
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        blocked_ids: Optional[set[int]] = None,
+        token: Optional[str] = None
+    ):
         """Подключение пользователя к глобальному чату"""
         await websocket.accept()
-        
-        if user_id not in self.active_connections:
-            self.online_count += 1
-            # Уведомляем всех о новом пользователе онлайн
-            await self.broadcast_online_count()
-        
-        self.active_connections[user_id] = websocket
-    
-    def disconnect(self, user_id: int):
-        """Отключение пользователя от глобального чата"""
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            self.online_count = max(0, self.online_count - 1)
+        # Рассылка онлайн-счетчика произойдет в фоновом цикле
+        self.presence.add(user_id, websocket)
+        if blocked_ids is not None:
+            self.blocked_ids[user_id] = set(blocked_ids)
+        if token:
+            self.connection_tokens[websocket] = (user_id, token)
+    
+    def disconnect(self, user_id: int, websocket: Optional[WebSocket] = None):
+        """Отключение соединения пользователя (или всех его соединений)"""
+        if websocket is not None:
+            self.connection_tokens.pop(websocket, None)
+        else:
+            for connection, (connection_user_id, _) in list(self.connection_tokens.items()):
+                if connection_user_id == user_id:
+                    del self.connection_tokens[connection]
+        if self.presence.remove(user_id, websocket):
+            self.blocked_ids.pop(user_id, None)
+    
+    def touch(self, user_id: int, websocket: WebSocket):
+        """Отметка активности соединения"""
+        self.presence.touch(user_id, websocket)
     
     async def send_message(self, message_data: dict, exclude_user_id: Optional[int] = None):
-        """Отправка сообщения всем подключенным пользователям"""
+        """Отправка сообщения всем подключенным пользователям (на всех воркерах)"""
+        await pubsub.publish(GLOBAL_CHAT_CHANNEL, {
+            "event": "new_message",
+            "message": message_data,
+            "exclude_user_id": exclude_user_id
+        })
+    
+    async def handle_event(self, event: dict):
+        """Обработка события из шины pub/sub"""
+        event_type = event.get("event")
+        if event_type == "new_message":
+            await self._deliver_message(event.get("message"), event.get("exclude_user_id"))
+        elif event_type == "presence":
+            self._worker_counts[event["worker_id"]] = (int(event.get("online_count", 0)), time.monotonic())
+        elif event_type == "block":
+            self._apply_block(event["blocker_id"], event["blocked_id"], event["is_blocked"])
+    
+    async def update_block(self, blocker_id: int, blocked_id: int, is_blocked: bool):
+        """Синхронизация блокировки с множествами в памяти на всех воркерах"""
+        await pubsub.publish(GLOBAL_CHAT_CHANNEL, {
+            "event": "block",
+            "blocker_id": blocker_id,
+            "blocked_id": blocked_id,
+            "is_blocked": is_blocked
+        })
+    
+    def _apply_block(self, blocker_id: int, blocked_id: int, is_blocked: bool):
+        """Обновление множества заблокированных (только для подключенных к этому воркеру)"""
+        if not self.presence.is_online(blocker_id):
+            return
+        blocked = self.blocked_ids.setdefault(blocker_id, set())
+        if is_blocked:
+            blocked.add(blocked_id)
+        else:
+            blocked.discard(blocked_id)
+    
+    async def _send_to_all(
+        self,
+        payload: dict,
+        exclude_user_id: Optional[int] = None,
+        author_id: Optional[int] = None
+    ):
+        """Отправка payload всем сокетам текущего воркера (кроме заблокировавших автора)"""
         disconnected = []
         
-        for user_id, connection in list(self.active_connections.items()):
+        for user_id, connection in self.presence.connections():
             if exclude_user_id and user_id == exclude_user_id:
                 continue
+            if author_id is not None and author_id in self.blocked_ids.get(user_id, ()):
+                continue
             
             try:
-                await connection.send_json({
-                    "type": "new_message",
-                    "message": message_data
-                })
+                await connection.send_json(payload)
             except Exception:
-                disconnected.append(user_id)
-        
-        # Удаляем отключенные соединения
-        for user_id in disconnected:
-            self.disconnect(user_id)
+                disconnected.append((user_id, connection))
         
-        # Обновляем счетчик онлайн
-        if disconnected:
-            await self.broadcast_online_count()
+        # Удаляем отключенные соединения (счетчик обновится в фоновом цикле)
+        for user_id, connection in disconnected:
+            self.disconnect(user_id, connection)
+    
+    async def _deliver_message(self, message_data: dict, exclude_user_id: Optional[int] = None):
+        """Доставка сообщения сокетам текущего воркера"""
+        await self._send_to_all(
+            {
+                "type": "new_message",
+                "message": message_data
+            },
+            exclude_user_id=exclude_user_id,
+            author_id=message_data.get("user_id") if message_data else None
+        )
     
     async def broadcast_online_count(self):
         """Отправка обновленного количества онлайн пользователей"""
-        message = {
+        online_count = self.get_online_count()
+        self._last_broadcast_count = online_count
+        await self._send_to_all({
             "type": "online_count",
-            "online_count": self.online_count,
+            "online_count": online_count,
             "timestamp": datetime.now().isoformat()
-        }
-        
-        disconnected = []
-        for user_id, connection in list(self.active_connections.items()):
+        })
+    
+    def get_online_count(self) -> int:
+        """Получение текущего количества онлайн пользователей (по всем воркерам)"""
+        ttl = settings.CHAT_HEARTBEAT_INTERVAL * 3
+        now = time.monotonic()
+        remote = sum(
+            count for worker_id, (count, seen_at) in self._worker_counts.items()
+            if worker_id != self.worker_id and now - seen_at <= ttl
+        )
+        return self.presence.online_count + remote
+    
+    async def _publish_presence(self, force: bool = False):
+        """Публикация количества пользователей на этом воркере"""
+        if not (self.presence.dirty or force):
+            return
+        self.presence.dirty = False
+        self._last_presence_publish = time.monotonic()
+        await pubsub.publish(GLOBAL_CHAT_CHANNEL, {
+            "event": "presence",
+            "worker_id": self.worker_id,
+            "online_count": self.presence.online_count
+        })
+    
+    async def _send_heartbeats(self):
+        """Отправка ping всем соединениям и закрытие устаревших"""
+        for user_id, websocket in self.presence.expire_stale():
             try:
-                await connection.send_json(message)
+                await websocket.close(code=1001, reason="Heartbeat timeout")
             except Exception:
-                disconnected.append(user_id)
-        
-        for user_id in disconnected:
-            self.disconnect(user_id)
+                pass
+        await self._send_to_all({"type": "ping"})
+    
+    def _find_revoked(self, connections: list[tuple[WebSocket, int, str]]) -> list[tuple[WebSocket, int]]:
+        """Соединения с токеном из черного списка или неактивным/заблокированным пользователем"""
+        db = next(get_db())
+        try:
+            tokens = {token for _, _, token in connections}
+            user_ids = {user_id for _, user_id, _ in connections}
+            revoked_tokens = {
+                row[0] for row in db.query(BlacklistedToken.token).filter(BlacklistedToken.token.in_(tokens))
+            }
+            allowed_ids = {
+                row[0] for row in db.query(User.id).filter(
+                    User.id.in_(user_ids),
+                    User.is_active == True,
+                    User.is_blocked == False
+                )
+            }
+        finally:
+            db.close()
+        return [
+            (websocket, user_id) for websocket, user_id, token in connections
+            if token in revoked_tokens or user_id not in allowed_ids
+        ]
+    
+    async def revalidate_connections(self) -> int:
+        """Закрытие соединений, потерявших право писать в чат"""
+        connections = [
+            (websocket, user_id, token) for websocket, (user_id, token) in self.connection_tokens.items()
+        ]
+        if not connections:
+            return 0
+        revoked = await asyncio.to_thread(self._find_revoked, connections)
+        for websocket, user_id in revoked:
+            self.disconnect(user_id, websocket)
+            try:
+                await websocket.close(code=1008, reason="Session revoked")
+            except Exception:
+                pass
+        return len(revoked)
+    
+    async def presence_tick(self):
+        """Один шаг фонового цикла: heartbeat, перепроверка доступа, присутствие, онлайн-счетчик"""
+        now = time.monotonic()
+        if now - self._last_auth_check >= settings.CHAT_AUTH_RECHECK_INTERVAL:
+            self._last_auth_check = now
+            await self.revalidate_connections()
+        if now - self._last_heartbeat >= settings.CHAT_HEARTBEAT_INTERVAL:
+            self._last_heartbeat = now
+            await self._send_heartbeats()
+        await self._publish_presence(
+            force=now - self._last_presence_publish >= settings.CHAT_HEARTBEAT_INTERVAL
+        )
+        if self.get_online_count() != self._last_broadcast_count:
+            await self.broadcast_online_count()
     
-    def get_online_count(self) -> int:
-        """Получение текущего количества онлайн пользователей"""
-        return len(self.active_connections)
+    async def start(self):
+        """Запуск фонового цикла присутствия"""
+        await self._presence_job.start()
+    
+    async def stop(self):
+        """Остановка фонового цикла присутствия"""
+        await self._presence_job.stop()
 
 
 # Глобальный менеджер соединений
 global_chat_manager = GlobalChatConnectionManager()
+pubsub.subscribe(GLOBAL_CHAT_CHANNEL, global_chat_manager.handle_event)
+
+
+async def save_chat_file(db: Session, file: UploadFile, file_type: str) -> StoredUpload:
+    """Сохранение файла для глобального чата (лимит размера по типу файла)"""
+    return await save_upload(
+        db,
+        file,
+        kind="chat_image" if file_type == "image" else file_type,
+        default_extension=".bin",
+        variants=file_type == "image"
+    )
 
 
-def save_chat_file(file: UploadFile, file_type: str, user_id: int) -> str:
-    """Сохранение файла для глобального чата"""
-    # Определяем директорию по типу файла
-    if file_type == "image":
-        upload_dir = CHAT_IMAGES_DIR
-    elif file_type == "video":
-        upload_dir = CHAT_VIDEOS_DIR
-    elif file_type == "audio":
-        upload_dir = CHAT_AUDIO_DIR
-    else:
-        upload_dir = CHAT_FILES_DIR
+def build_message_responses(db: Session, messages: list) -> list[GlobalChatMessageResponse]:
+    """Формирование ответов для списка сообщений (пользователи загружаются одним запросом)"""
+    users = get_users_extended_by_ids(db, [msg.user_id for msg in messages])
     
-    # Генерируем уникальное имя файла
-    file_extension = Path(file.filename).suffix if file.filename else ".bin"
-    unique_filename = f"{user_id}_{uuid.uuid4().hex}{file_extension}"
-    file_path = upload_dir / unique_filename
+    messages_response = []
+    for msg in messages:
+        user_extended = users.get(msg.user_id)
+        messages_response.append(GlobalChatMessageResponse(
+            id=msg.id,
+            user_id=msg.user_id,
+            user_name=user_extended.name if user_extended else None,
+            user_avatar=thumbnail_url(user_extended.avatar, settings.IMAGE_AVATAR_THUMBNAIL_SIZE) if user_extended else None,
+            message=msg.message,
+            message_type=msg.message_type,
+            attachments=msg.attachments,
+            extra_metadata=msg.extra_metadata,
+            created_at=msg.created_at,
+            updated_at=msg.updated_at
+        ))
+    return messages_response
+
+
+def _persist_message_batch(db: Session, items: list) -> list[dict]:
+    """Запись пакета сообщений из WebSocket одной транзакцией"""
+    messages = create_messages_bulk(db, items)
+    return [response.model_dump(mode="json") for response in build_message_responses(db, messages)]
+
+
+# Лимит отправки сообщений через WebSocket (ключ - соединение)
+chat_send_limiter = RateLimitStore()
+
+
+def _connection_key(user_id: int, websocket: WebSocket) -> str:
+    return f"{user_id}:{id(websocket)}"
+
+
+# Пакетная запись сообщений, отправленных через WebSocket (group commit)
+message_writer = BatchWriter(
+    _persist_message_batch,
+    name="global_chat_writer",
+    interval_ms=settings.CHAT_WRITE_BATCH_INTERVAL_MS,
+    max_batch=settings.CHAT_WRITE_BATCH_MAX,
+)
+
+
+async def handle_client_message(websocket: WebSocket, user_id: int, data: str):
+    """
+    Обработка JSON-команды клиента в WebSocket
+    
+    {"type": "send_message", "client_id": "...", "message": "...", "message_type": "text",
+     "attachments": [...], "extra_metadata": {...}}
     
-    # Сохраняем файл
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
+    Ответ отправителю: {"type": "message_ack", "client_id": "...", "message": {...}}
+    или {"type": "message_error", "client_id": "...", "detail": "..."}
     
-    # Генерируем URL
-    relative_path = f"{settings.UPLOAD_DIR}/global_chat/{upload_dir.name}/{unique_filename}"
-    return f"{settings.BASE_URL}/{relative_path}"
+    Не более CHAT_WS_SEND_RATE_LIMIT сообщений за CHAT_WS_SEND_RATE_WINDOW
+    на соединение (сокет не проходит через RateLimitMiddleware).
+    """
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        await websocket.send_json({"type": "error", "detail": "Неверный формат сообщения"})
+        return
+    
+    if not isinstance(payload, dict) or payload.get("type") != "send_message":
+        await websocket.send_json({"type": "error", "detail": "Неподдерживаемая команда"})
+        return
+    
+    client_id = payload.get("client_id")
+    allowed, _ = chat_send_limiter.is_allowed(
+        _connection_key(user_id, websocket),
+        settings.CHAT_WS_SEND_RATE_LIMIT,
+        settings.CHAT_WS_SEND_RATE_WINDOW
+    )
+    if not allowed:
+        await websocket.send_json({
+            "type": "message_error",
+            "client_id": client_id,
+            "detail": "Слишком много сообщений, повторите позже"
+        })
+        return
+    
+    try:
+        message_data = GlobalChatMessageCreate(**{
+            key: payload[key]
+            for key in ("message", "message_type", "attachments", "extra_metadata")
+            if key in payload
+        })
+    except ValidationError as e:
+        await websocket.send_json({
+            "type": "message_error",
+            "client_id": client_id,
+            "detail": "; ".join(error.get("msg", "") for error in e.errors())
+        })
+        return
+    
+    try:
+        message = await message_writer.submit((user_id, message_data))
+    except BatchWriterOverloaded:
+        await websocket.send_json({
+            "type": "message_error",
+            "client_id": client_id,
+            "detail": "Сервер перегружен, повторите отправку позже"
+        })
+        return
+    except Exception as e:
+        logger.error(f"Global chat message persist error: {str(e)}")
+        await websocket.send_json({
+            "type": "message_error",
+            "client_id": client_id,
+            "detail": "Не удалось сохранить сообщение"
+        })
+        return
+    
+    await websocket.send_json({
+        "type": "message_ack",
+        "client_id": client_id,
+        "message": message
+    })
+    await global_chat_manager.send_message(message, exclude_user_id=user_id)
 
 
 @router.websocket("/ws")
@@ -166,42 +444,33 @@ async def websocket_global_chat(websocket: WebSocket, token: str = None):
     WebSocket эндпоинт для глобального чата
     
     Подключение: ws://127.0.0.1:8000/api/v1/global-chat/ws?token=<jwt_token>
+    
+    Сервер периодически отправляет {"type": "ping"}; клиент отвечает текстом "pong"
+    (или шлет "ping" сам). Соединения без активности закрываются по таймауту.
+    
+    Отправка сообщений через сокет: JSON {"type": "send_message", "client_id": ...}
+    (см. handle_client_message). Сообщения сохраняются пакетами и рассылаются всем.
     """
     user_id = None
     db = None
     
     try:
-        # Валидация токена
-        if token:
-            from jose import jwt
-            from app.core.config import settings
-            try:
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-                sub = payload.get("sub")
-                if isinstance(sub, str) and ":" in sub:
-                    user_id = int(sub.split(":")[1])
-                else:
-                    from app.crud.user import get_user_by_phone_number
-                    db = next(get_db())
-                    try:
-                        user = get_user_by_phone_number(db, sub)
-                        if user:
-                            user_id = user.id
-                    finally:
-                        if db:
-                            db.close()
-                            db = None
-            except Exception as e:
-                print(f"WebSocket auth error: {str(e)}")
-                await websocket.close(code=1008, reason="Invalid token")
+        # Те же проверки, что и для HTTP: черный список, активность, блокировка
+        db = next(get_db())
+        try:
+            user = await get_websocket_user(db, token)
+            if user is None:
+                await websocket.close(code=1008, reason="Unauthorized")
                 return
-        
-        if not user_id:
-            await websocket.close(code=1008, reason="Unauthorized")
-            return
+            user_id = user.id
+            # Загружаем блокировки один раз на подключение
+            blocked_ids = get_blocked_user_ids(db, user_id)
+        finally:
+            db.close()
+            db = None
         
         # Подключаемся
-        await global_chat_manager.connect(websocket, user_id)
+        await global_chat_manager.connect(websocket, user_id, blocked_ids, token)
         
         # Отправляем приветственное сообщение
         await websocket.send_json({
@@ -216,8 +485,13 @@ async def websocket_global_chat(websocket: WebSocket, token: str = None):
         while True:
             try:
                 data = await websocket.receive_text()
+                global_chat_manager.touch(user_id, websocket)
                 if data == "ping":
                     await websocket.send_json({"type": "pong"})
+                elif data == "pong":
+                    continue
+                else:
+                    await handle_client_message(websocket, user_id, data)
             except WebSocketDisconnect:
                 break
                 
@@ -230,9 +504,9 @@ async def websocket_global_chat(websocket: WebSocket, token: str = None):
             except:
                 pass
         if user_id:
-            global_chat_manager.disconnect(user_id)
-            # Уведомляем остальных об изменении количества онлайн
-            await global_chat_manager.broadcast_online_count()
+            # Остальные узнают об изменении онлайн-счетчика из фонового цикла
+            global_chat_manager.disconnect(user_id, websocket)
+            chat_send_limiter.reset(_connection_key(user_id, websocket))
 
 
 # ==================== REST API Endpoints ====================
@@ -255,7 +529,7 @@ async def send_message(
         id=message.id,
         user_id=message.user_id,
         user_name=user_extended.name if user_extended else None,
-        user_avatar=user_extended.avatar if user_extended else None,
+        user_avatar=thumbnail_url(user_extended.avatar, settings.IMAGE_AVATAR_THUMBNAIL_SIZE) if user_extended else None,
         message=message.message,
         message_type=message.message_type,
         attachments=message.attachments,
@@ -289,21 +563,10 @@ async def upload_file(
             detail=f"Неподдерживаемый тип файла. Разрешены: {', '.join(allowed_types)}"
         )
     
-    # Проверка размера файла
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    
-    max_size = 50 * 1024 * 1024  # 50 MB
-    if file_size > max_size:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Файл слишком большой. Максимальный размер: {max_size / 1024 / 1024}MB"
-        )
-    
-    # Сохраняем файл
+    # Сохраняем файл (размер проверяется при записи)
     try:
-        file_url = save_chat_file(file, file_type, current_user.id)
+        stored = await save_chat_file(db, file, file_type)
+        file_url = stored.url
         
         # Определяем MessageType
         message_type_map = {
@@ -317,15 +580,27 @@ async def upload_file(
             url=file_url,
             type=file_type,
             name=file.filename,
-            size=file_size
+            size=stored.size
         )
         
+        # Миниатюры изображения попадают во вложение сообщения, поэтому
+        # ждем их (ограниченно); не успевшие - клиент покажет оригинал
+        if stored.variants_task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(stored.variants_task), settings.CHAT_IMAGE_VARIANT_WAIT)
+            except asyncio.TimeoutError:
+                pass
+            attachment_info.variants = image_variants(file_url)
+            attachment_info.thumbnail = attachment_info.variants.get(str(settings.IMAGE_LIST_THUMBNAIL_SIZE))
+        
         return {
             "success": True,
             "file_url": file_url,
             "attachment": attachment_info.model_dump(),
             "message_type": message_type_map[file_type].value
         }
+    except UploadTooLarge:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -337,36 +612,36 @@ async def upload_file(
 async def get_chat_messages(
     current_user: Annotated[User, Depends(get_current_active_user)],
     db: Annotated[Session, Depends(get_db)],
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000)
+    skip: int = Query(0, ge=0, description="Устарело: используйте before_id"),
+    limit: int = Query(100, ge=1, le=1000),
+    before_id: Optional[int] = Query(None, ge=1, description="Сообщения старше указанного ID"),
+    after_id: Optional[int] = Query(None, ge=0, description="Сообщения новее указанного ID (догрузка)"),
+    include_total: bool = Query(False, description="Вернуть приблизительное общее количество")
 ):
-    """Получение сообщений глобального чата"""
-    messages, total = get_messages(db, current_user.id, skip=skip, limit=limit)
-    
-    # Получаем информацию о пользователях
-    from app.services.user_service.crud import get_user_extended_by_id
+    """
+    Получение сообщений глобального чата
     
-    messages_response = []
-    for msg in messages:
-        user_extended = get_user_extended_by_id(db, msg.user_id)
-        messages_response.append(GlobalChatMessageResponse(
-            id=msg.id,
-            user_id=msg.user_id,
-            user_name=user_extended.name if user_extended else None,
-            user_avatar=user_extended.avatar if user_extended else None,
-            message=msg.message,
-            message_type=msg.message_type,
-            attachments=msg.attachments,
-            extra_metadata=msg.extra_metadata,
-            created_at=msg.created_at,
-            updated_at=msg.updated_at
-        ))
+    Сообщения возвращаются от новых к старым. Для прокрутки вверх передайте
+    next_before_id из предыдущего ответа в before_id, для догрузки после
+    переподключения - latest_id в after_id.
+    """
+    messages, has_more = get_messages(
+        db,
+        current_user.id,
+        skip=skip,
+        limit=limit,
+        before_id=before_id,
+        after_id=after_id
+    )
     
     return GlobalChatMessageListResponse(
-        messages=messages_response,
-        total=total,
+        messages=build_message_responses(db, messages),
+        total=get_approximate_message_count(db) if include_total else None,
         skip=skip,
         limit=limit,
+        has_more=has_more,
+        next_before_id=messages[-1].id if messages else None,
+        latest_id=messages[0].id if messages else after_id,
         online_count=global_chat_manager.get_online_count()
     )
 
@@ -379,30 +654,17 @@ async def search_chat_messages(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000)
 ):
-    """Поиск сообщений в глобальном чате"""
-    messages, total = search_messages(db, current_user.id, query, skip=skip, limit=limit)
+    """Полнотекстовый поиск сообщений в глобальном чате (по релевантности, с подсветкой)"""
+    results, total = search_messages(db, current_user.id, query, skip=skip, limit=limit)
     
-    # Получаем информацию о пользователях
-    from app.services.user_service.crud import get_user_extended_by_id
-    
-    messages_response = []
-    for msg in messages:
-        user_extended = get_user_extended_by_id(db, msg.user_id)
-        messages_response.append(GlobalChatMessageResponse(
-            id=msg.id,
-            user_id=msg.user_id,
-            user_name=user_extended.name if user_extended else None,
-            user_avatar=user_extended.avatar if user_extended else None,
-            message=msg.message,
-            message_type=msg.message_type,
-            attachments=msg.attachments,
-            extra_metadata=msg.extra_metadata,
-            created_at=msg.created_at,
-            updated_at=msg.updated_at
-        ))
+    messages_response = build_message_responses(db, [message for message, _ in results])
+    search_results = [
+        GlobalChatSearchResult(**response.model_dump(), snippet=snippet)
+        for response, (_, snippet) in zip(messages_response, results)
+    ]
     
     return GlobalChatSearchResponse(
-        messages=messages_response,
+        messages=search_results,
         total=total,
         query=query,
         skip=skip,
@@ -436,6 +698,8 @@ async def block_user_endpoint(
             detail="Не удалось заблокировать пользователя (возможно, уже заблокирован или попытка заблокировать себя)"
         )
     
+    await global_chat_manager.update_block(current_user.id, block_data.blocked_user_id, True)
+    
     # Получаем информацию о заблокированном пользователе
     from app.services.user_service.crud import get_user_extended_by_id
     blocked_user_extended = get_user_extended_by_id(db, block_data.blocked_user_id)
@@ -464,6 +728,8 @@ async def unblock_user_endpoint(
             detail="Пользователь не найден в списке заблокированных"
         )
     
+    await global_chat_manager.update_block(current_user.id, blocked_user_id, False)
+    
     return {
         "success": True,
         "message": "Пользователь разблокирован"
@@ -4,19 +4,21 @@ API эндпоинты для уведомлений пользователей
 from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
+import asyncio
 import json
+import uuid
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models.user import User
 from app.api.deps import get_current_active_user
 from app.services.notification_service.crud import (
     get_user_notifications,
-    get_unread_count,
     mark_notification_as_read,
     mark_all_as_read,
     delete_notification,
     delete_all_user_notifications,
     get_notification_by_id,
+    get_notification_counts,
 )
 from app.schemas.notification import (
     NotificationResponse,
@@ -24,9 +26,17 @@ from app.schemas.notification import (
     NotificationStatsResponse,
     NotificationUpdate,
 )
+from app.core.pubsub import pubsub
+from app.core.config import settings
+from app.core.unread_counters import UnreadCounterCache
+from app.core.fanout import FanoutDispatcher
+from app.core.periodic import PeriodicJob
 
 router = APIRouter()
 
+# Канал шины pub/sub для уведомлений
+NOTIFICATIONS_CHANNEL = "notifications"
+
 
 # Менеджер WebSocket соединений
 class ConnectionManager:
@@ -37,6 +47,21 @@ class ConnectionManager:
         self.active_connections: dict[int, list[WebSocket]] = {}
         # Список соединений для глобальных уведомлений (все пользователи)
         self.global_connections: list[WebSocket] = []
+        # Кэш счетчиков (всего / непрочитанных) для бейджа
+        self.counters = UnreadCounterCache(ttl_seconds=settings.NOTIFICATION_COUNTER_TTL_SECONDS)
+        # Периодическая сверка счетчиков подключенных пользователей с БД
+        self._reconcile_job = PeriodicJob(
+            "Notification counters reconcile",
+            self.reconcile_counters,
+            lambda: settings.NOTIFICATION_COUNTER_RECONCILE_INTERVAL,
+        )
+        # Фоновая порционная рассылка глобальных уведомлений
+        self.fanout = FanoutDispatcher(
+            name="notifications_fanout",
+            chunk_size=settings.NOTIFICATION_FANOUT_CHUNK_SIZE,
+            concurrency=settings.NOTIFICATION_FANOUT_CONCURRENCY,
+            rate_per_second=settings.NOTIFICATION_FANOUT_RATE,
+        )
     
     async def connect(self, websocket: WebSocket, user_id: Optional[int] = None):
         """Подключение пользователя к WebSocket"""
@@ -61,7 +86,83 @@ class ConnectionManager:
                 self.global_connections.remove(websocket)
     
     async def send_personal_notification(self, user_id: int, message: dict):
-        """Отправка персонального уведомления пользователю"""
+        """Отправка персонального уведомления пользователю (на всех воркерах)"""
+        await pubsub.publish(NOTIFICATIONS_CHANNEL, {
+            "event": "personal",
+            "user_id": user_id,
+            "message": message
+        })
+    
+    async def send_global_notification(self, message: dict) -> str:
+        """
+        Отправка глобального уведомления всем пользователям (на всех воркерах)
+        
+        Не ждет доставки: каждый воркер ставит рассылку в очередь фонового
+        диспетчера. Возвращает ID рассылки для отслеживания прогресса
+        """
+        broadcast_id = uuid.uuid4().hex
+        await pubsub.publish(NOTIFICATIONS_CHANNEL, {
+            "event": "global",
+            "broadcast_id": broadcast_id,
+            "message": message
+        })
+        return broadcast_id
+    
+    async def publish_counters(self, user_id: int, db: Session):
+        """Пересчет счетчиков пользователя из БД и рассылка на все воркеры"""
+        total, unread = get_notification_counts(db, user_id)
+        await pubsub.publish(NOTIFICATIONS_CHANNEL, {
+            "event": "counters",
+            "user_id": user_id,
+            "total": total,
+            "unread": unread
+        })
+    
+    async def invalidate_counters(self, user_id: Optional[int] = None):
+        """Сброс закэшированных счетчиков (пользователя или всех) на всех воркерах"""
+        await pubsub.publish(NOTIFICATIONS_CHANNEL, {
+            "event": "invalidate_counters",
+            "user_id": user_id
+        })
+    
+    def get_counters(self, user_id: int, db: Session) -> tuple[int, int]:
+        """Счетчики (всего, непрочитанных): из кэша, при промахе - из БД"""
+        counts = self.counters.get(user_id)
+        if counts is None:
+            counts = get_notification_counts(db, user_id)
+            self.counters.set(user_id, *counts)
+        return counts
+    
+    async def handle_event(self, event: dict):
+        """Обработка события из шины pub/sub"""
+        event_type = event.get("event")
+        if event_type == "personal":
+            await self._deliver_personal(event.get("user_id"), event.get("message"))
+        elif event_type == "global":
+            # Новое глобальное уведомление увеличивает счетчики всех пользователей
+            self.counters.add_global()
+            await self._deliver_global(event.get("message"), event.get("broadcast_id"))
+        elif event_type == "counters":
+            user_id = event.get("user_id")
+            self.counters.set(user_id, event.get("total", 0), event.get("unread", 0))
+            await self._push_counters(user_id)
+        elif event_type == "invalidate_counters":
+            self.counters.invalidate(event.get("user_id"))
+    
+    def _counters_message(self, user_id: int) -> Optional[dict]:
+        counts = self.counters.get(user_id)
+        if counts is None:
+            return None
+        return {"type": "unread_count", "total": counts[0], "unread_count": counts[1]}
+    
+    async def _push_counters(self, user_id: int):
+        """Отправка актуальных счетчиков сокетам пользователя на текущем воркере"""
+        message = self._counters_message(user_id)
+        if message is not None:
+            await self._deliver_personal(user_id, message)
+    
+    async def _deliver_personal(self, user_id: int, message: dict):
+        """Доставка персонального уведомления сокетам текущего воркера"""
         if user_id in self.active_connections:
             disconnected = []
             for connection in self.active_connections[user_id]:
@@ -74,32 +175,68 @@ class ConnectionManager:
             for conn in disconnected:
                 self.active_connections[user_id].remove(conn)
     
-    async def send_global_notification(self, message: dict):
-        """Отправка глобального уведомления всем пользователям"""
-        disconnected = []
-        for connection in self.global_connections:
+    async def _deliver_global(self, message: dict, broadcast_id: Optional[str] = None):
+        """
+        Доставка глобального уведомления сокетам текущего воркера
+        
+        Рассылка выполняется фоновым диспетчером порциями; здесь только
+        снимается список получателей
+        """
+        targets = [(None, connection) for connection in self.global_connections]
+        for user_id, connections in self.active_connections.items():
+            targets.extend((user_id, connection) for connection in connections)
+        
+        async def send(target) -> bool:
+            user_id, connection = target
+            user_message = message
+            if user_id is not None:
+                # Вместе с уведомлением отправляем новый счетчик непрочитанных
+                counters = self._counters_message(user_id)
+                if counters:
+                    user_message = {**message, "unread_count": counters["unread_count"]}
             try:
-                await connection.send_json(message)
+                await connection.send_json(user_message)
+                return True
             except Exception:
-                disconnected.append(connection)
+                self.disconnect(connection, user_id)
+                return False
         
-        # Также отправляем всем персональным соединениям
-        for user_id, connections in list(self.active_connections.items()):
-            for connection in connections:
-                try:
-                    await connection.send_json(message)
-                except Exception:
-                    if connection in connections:
-                        connections.remove(connection)
-        
-        # Удаляем отключенные соединения
-        for conn in disconnected:
-            if conn in self.global_connections:
-                self.global_connections.remove(conn)
+        return self.fanout.submit(broadcast_id or uuid.uuid4().hex, targets, send)
+    
+    def _load_counters(self, user_ids: list[int]) -> dict[int, tuple[int, int]]:
+        db = SessionLocal()
+        try:
+            return {user_id: get_notification_counts(db, user_id) for user_id in user_ids}
+        finally:
+            db.close()
+    
+    async def reconcile_counters(self):
+        """Сверка счетчиков подключенных пользователей с БД (исправление расхождений)"""
+        self.counters.expire_stale()
+        user_ids = list(self.active_connections.keys())
+        if not user_ids:
+            return
+        fresh = await asyncio.to_thread(self._load_counters, user_ids)
+        for user_id, counts in fresh.items():
+            previous = self.counters.get(user_id)
+            self.counters.set(user_id, *counts)
+            if previous != counts:
+                await self._push_counters(user_id)
+    
+    async def start(self):
+        """Запуск периодической сверки счетчиков и диспетчера рассылок"""
+        await self.fanout.start()
+        await self._reconcile_job.start()
+    
+    async def stop(self):
+        """Остановка периодической сверки счетчиков и диспетчера рассылок"""
+        await self.fanout.stop()
+        await self._reconcile_job.stop()
 
 
 # Глобальный менеджер соединений
 manager = ConnectionManager()
+pubsub.subscribe(NOTIFICATIONS_CHANNEL, manager.handle_event)
 
 
 @router.websocket("/ws/notifications")
@@ -154,6 +291,15 @@ async def websocket_notifications(websocket: WebSocket, token: str = None):
             "message": "Подключено к системе уведомлений"
         })
         
+        # Текущие счетчики для бейджа; дальше они приходят при каждом изменении
+        if user_id:
+            db = SessionLocal()
+            try:
+                total, unread = manager.get_counters(user_id, db)
+            finally:
+                db.close()
+            await websocket.send_json({"type": "unread_count", "total": total, "unread_count": unread})
+        
         # Ожидаем сообщения от клиента (для поддержания соединения)
         while True:
             try:
@@ -194,7 +340,7 @@ async def get_notifications(
             unread_only=unread_only
         )
         
-        unread_count = get_unread_count(db, current_user.id)
+        _, unread_count = manager.get_counters(current_user.id, db)
         
         return NotificationListResponse(
             notifications=[NotificationResponse.model_validate(n) for n in notifications],
@@ -218,11 +364,14 @@ async def get_notification_stats(
     current_user: Annotated[User, Depends(get_current_active_user)],
     db: Annotated[Session, Depends(get_db)]
 ):
-    """Получение статистики уведомлений пользователя"""
+    """
+    Получение статистики уведомлений пользователя
+    
+    Значения берутся из кэша счетчиков (O(1)); при промахе считаются агрегатами в БД
+    """
     try:
-        all_notifications, total = get_user_notifications(db, current_user.id, skip=0, limit=10000)
-        unread = get_unread_count(db, current_user.id)
-        read = total - unread
+        total, unread = manager.get_counters(current_user.id, db)
+        read = max(total - unread, 0)
         
         return NotificationStatsResponse(
             total=total,
@@ -251,6 +400,8 @@ async def mark_as_read(
             detail="Уведомление не найдено или недоступно"
         )
     
+    await manager.publish_counters(current_user.id, db)
+    
     return NotificationResponse.model_validate(notification)
 
 
@@ -261,6 +412,7 @@ async def mark_all_notifications_as_read(
 ):
     """Отметить все уведомления как прочитанные"""
     count = mark_all_as_read(db, current_user.id)
+    await manager.publish_counters(current_user.id, db)
     
     return {
         "success": True,
@@ -295,6 +447,8 @@ async def delete_user_notification(
     else:
         message = "Уведомление удалено"
     
+    await manager.publish_counters(current_user.id, db)
+    
     return {
         "success": True,
         "message": message,
@@ -314,6 +468,7 @@ async def delete_all_notifications(
     - Все глобальные уведомления скрываются для этого пользователя
     """
     count = delete_all_user_notifications(db, current_user.id)
+    await manager.publish_counters(current_user.id, db)
     
     return {
         "success": True,
@@ -5,9 +5,6 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
-import os
-import uuid
-from pathlib import Path
 
 from app.database import get_db
 from app.models.user import User
@@ -35,76 +32,9 @@ from app.schemas.user_extended import (
 
 router = APIRouter()
 
-# Создаем директорию для загрузки файлов, если её нет
 from app.core.config import settings
-UPLOAD_DIR = Path(settings.UPLOAD_DIR)
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-PASSPORT_DIR = UPLOAD_DIR / "passports"
-DRIVING_LICENSE_DIR = UPLOAD_DIR / "driving_licenses"
-AVATAR_DIR = UPLOAD_DIR / "avatars"
-PASSPORT_DIR.mkdir(parents=True, exist_ok=True)
-DRIVING_LICENSE_DIR.mkdir(parents=True, exist_ok=True)
-AVATAR_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def delete_file_by_url(file_url: str) -> bool:
-    """
-    Удаление файла по его URL
-    
-    Args:
-        file_url: URL файла (например, http://localhost:8000/uploads/avatars/1_abc123.jpg)
-    
-    Returns:
-        True если файл удален, False если файл не найден
-    """
-    try:
-        # Извлекаем путь к файлу из URL
-        if not file_url or not file_url.startswith(settings.BASE_URL):
-            return False
-        
-        # Убираем BASE_URL и получаем относительный путь
-        relative_path = file_url.replace(settings.BASE_URL, "")
-        if relative_path.startswith("/"):
-            relative_path = relative_path[1:]
-        
-        # Полный путь к файлу
-        file_path = Path(relative_path)
-        
-        # Проверяем существование файла
-        if file_path.exists() and file_path.is_file():
-            file_path.unlink()
-            return True
-        return False
-    except Exception as e:
-        print(f"Error deleting file {file_url}: {str(e)}")
-        return False
-
-
-def save_uploaded_file(file: UploadFile, directory: Path, user_id: int) -> str:
-    """
-    Сохранение загруженного файла и возврат URL
-    
-    Args:
-        file: Загруженный файл
-        directory: Директория для сохранения
-        user_id: ID пользователя
-    
-    Returns:
-        URL сохраненного файла
-    """
-    # Генерируем уникальное имя файла
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{user_id}_{uuid.uuid4().hex}{file_extension}"
-    file_path = directory / unique_filename
-    
-    # Сохраняем файл
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    # Возвращаем относительный путь для URL
-    relative_path = f"/{settings.UPLOAD_DIR}/{directory.name}/{unique_filename}"
-    return f"{settings.BASE_URL}{relative_path}"
+from app.services.media_service.uploads import save_upload, UploadTooLarge
+from app.services.media_service.crud import release_media
 
 
 @router.get("", response_model=ProfileWithUserDataResponse)
@@ -290,17 +220,6 @@ async def update_passport_photo(
             detail=f"Неподдерживаемый тип файла. Разрешены: {', '.join(settings.ALLOWED_IMAGE_TYPES)}"
         )
     
-    # Проверка размера файла
-    file.file.seek(0, 2)  # Перемещаемся в конец файла
-    file_size = file.file.tell()
-    file.file.seek(0)  # Возвращаемся в начало
-    
-    if file_size > settings.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Файл слишком большой. Максимальный размер: {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
-        )
-    
     user_extended = get_user_extended_by_id(db, current_user.id)
     
     if not user_extended:
@@ -315,13 +234,19 @@ async def update_passport_photo(
     
     # Сохраняем файл
     try:
-        image_url = save_uploaded_file(file, PASSPORT_DIR, current_user.id)
+        image_url = (await save_upload(db, file)).url
+    except UploadTooLarge:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при сохранении файла: {str(e)}"
         )
     
+    # Предыдущий файл больше не нужен профилю
+    if profile.passport_image_url:
+        release_media(db, profile.passport_image_url)
+    
     # Обновляем профиль
     profile_update = UserProfileUpdate(
         passport_image_url=image_url,
@@ -360,17 +285,6 @@ async def update_driving_license_photo(
             detail=f"Неподдерживаемый тип файла. Разрешены: {', '.join(settings.ALLOWED_IMAGE_TYPES)}"
         )
     
-    # Проверка размера файла
-    file.file.seek(0, 2)  # Перемещаемся в конец файла
-    file_size = file.file.tell()
-    file.file.seek(0)  # Возвращаемся в начало
-    
-    if file_size > settings.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Файл слишком большой. Максимальный размер: {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
-        )
-    
     user_extended = get_user_extended_by_id(db, current_user.id)
     
     if not user_extended:
@@ -385,13 +299,19 @@ async def update_driving_license_photo(
     
     # Сохраняем файл
     try:
-        image_url = save_uploaded_file(file, DRIVING_LICENSE_DIR, current_user.id)
+        image_url = (await save_upload(db, file)).url
+    except UploadTooLarge:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при сохранении файла: {str(e)}"
         )
     
+    # Предыдущий файл больше не нужен профилю
+    if profile.driving_license_image_url:
+        release_media(db, profile.driving_license_image_url)
+    
     # Обновляем профиль
     profile_update = UserProfileUpdate(
         driving_license_image_url=image_url,
@@ -471,17 +391,6 @@ async def update_avatar(
             detail=f"Неподдерживаемый тип файла. Разрешены: {', '.join(settings.ALLOWED_IMAGE_TYPES)}"
         )
     
-    # Проверка размера файла
-    file.file.seek(0, 2)  # Перемещаемся в конец файла
-    file_size = file.file.tell()
-    file.file.seek(0)  # Возвращаемся в начало
-    
-    if file_size > settings.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Файл слишком большой. Максимальный размер: {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
-        )
-    
     user_extended = get_user_extended_by_id(db, current_user.id)
     
     if not user_extended:
@@ -492,11 +401,13 @@ async def update_avatar(
     
     # Удаляем старый аватар, если он существует
     if user_extended.avatar:
-        delete_file_by_url(user_extended.avatar)
+        release_media(db, user_extended.avatar)
     
     # Сохраняем новый файл
     try:
-        image_url = save_uploaded_file(file, AVATAR_DIR, current_user.id)
+        image_url = (await save_upload(db, file, variants=True)).url
+    except UploadTooLarge:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
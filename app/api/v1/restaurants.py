@@ -4,8 +4,6 @@ API эндпоинты для ресторанов (пользовательск
 from typing import Annotated, Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from pathlib import Path
-import uuid
 
 from app.database import get_db
 from app.models.user import User
@@ -48,38 +46,12 @@ from app.schemas.restaurant import (
     MenuItemUpdate,
 )
 from app.core.config import settings
+from app.core.media import thumbnail_url
+from app.services.media_service.uploads import save_upload
 from app.models.restaurant import RestaurantStatus
 
 router = APIRouter()
 
-# Директория для загрузки фотографий ресторанов
-RESTAURANT_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "restaurants"
-RESTAURANT_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-# Директория для загрузки фотографий блюд
-MENU_ITEM_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "restaurants" / "menu_items"
-MENU_ITEM_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def save_uploaded_photo(file: UploadFile, restaurant_id: int, is_menu_item: bool = False) -> str:
-    """Сохранение загруженной фотографии и возврат URL"""
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{restaurant_id}_{uuid.uuid4().hex}{file_extension}"
-    
-    if is_menu_item:
-        file_path = MENU_ITEM_PHOTOS_DIR / unique_filename
-        relative_path = f"uploads/restaurants/menu_items/{unique_filename}"
-    else:
-        file_path = RESTAURANT_PHOTOS_DIR / unique_filename
-        relative_path = f"uploads/restaurants/{unique_filename}"
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    return f"{settings.BASE_URL}/{relative_path}"
-
-
 @router.post("/", response_model=RestaurantResponse, status_code=status.HTTP_201_CREATED)
 async def create_restaurant_endpoint(
     restaurant_data: RestaurantCreate,
@@ -116,7 +88,8 @@ async def list_restaurants(
     search_query: Optional[str] = Query(None),
     latitude: Optional[float] = Query(None, ge=-90, le=90),
     longitude: Optional[float] = Query(None, ge=-180, le=180),
-    radius_km: Optional[float] = Query(None, gt=0)
+    radius_km: Optional[float] = Query(None, gt=0),
+    full_size_photos: bool = Query(False, description="main_photo в исходном размере вместо миниатюры")
 ):
     """Получение списка ресторанов с фильтрацией"""
     filters = RestaurantFilter(
@@ -145,7 +118,10 @@ async def list_restaurants(
         # Находим главную фотографию
         main_photo = next((p for p in restaurant.photos if p.is_main), None)
         if main_photo:
-            restaurant_dict["main_photo"] = main_photo.photo_url
+            restaurant_dict["main_photo"] = (
+                main_photo.photo_url if full_size_photos
+                else thumbnail_url(main_photo.photo_url, settings.IMAGE_LIST_THUMBNAIL_SIZE)
+            )
         restaurant_responses.append(RestaurantResponse(**restaurant_dict))
     
     return RestaurantListResponse(
@@ -232,7 +208,7 @@ async def upload_restaurant_photo(
         )
     
     # Сохраняем файл
-    photo_url = save_uploaded_photo(file, restaurant_id, is_menu_item=False)
+    photo_url = (await save_upload(db, file, variants=True)).url
     
     # Добавляем в БД
     photo = add_restaurant_photo(
@@ -4,8 +4,6 @@ API эндпоинты для станций технического обслу
 from typing import Annotated, Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from pathlib import Path
-import uuid
 
 from app.database import get_db
 from app.models.user import User
@@ -41,30 +39,12 @@ from app.schemas.service_station import (
     BulkServicePriceUpdate,
 )
 from app.core.config import settings
+from app.core.media import thumbnail_url
+from app.services.media_service.uploads import save_upload
 from app.models.service_station import ServiceStationStatus
 
 router = APIRouter()
 
-# Директория для загрузки фотографий СТО
-SERVICE_STATION_PHOTOS_DIR = Path(settings.UPLOAD_DIR) / "service_stations"
-SERVICE_STATION_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def save_uploaded_photo(file: UploadFile, station_id: int) -> str:
-    """Сохранение загруженной фотографии и возврат URL"""
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{station_id}_{uuid.uuid4().hex}{file_extension}"
-    file_path = SERVICE_STATION_PHOTOS_DIR / unique_filename
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    # Возвращаем URL
-    relative_path = f"uploads/service_stations/{unique_filename}"
-    return f"{settings.BASE_URL}/{relative_path}"
-
-
 @router.post("/", response_model=ServiceStationResponse, status_code=status.HTTP_201_CREATED)
 async def create_service_station_endpoint(
     station_data: ServiceStationCreate,
@@ -101,7 +81,8 @@ async def list_service_stations(
     search_query: Optional[str] = Query(None),
     latitude: Optional[float] = Query(None, ge=-90, le=90),
     longitude: Optional[float] = Query(None, ge=-180, le=180),
-    radius_km: Optional[float] = Query(None, gt=0)
+    radius_km: Optional[float] = Query(None, gt=0),
+    full_size_photos: bool = Query(False, description="main_photo в исходном размере вместо миниатюры")
 ):
     """Получение списка СТО с фильтрацией"""
     filters = ServiceStationFilter(
@@ -130,7 +111,10 @@ async def list_service_stations(
         # Находим главную фотографию
         main_photo = next((p for p in station.photos if p.is_main), None)
         if main_photo:
-            station_dict["main_photo"] = main_photo.photo_url
+            station_dict["main_photo"] = (
+                main_photo.photo_url if full_size_photos
+                else thumbnail_url(main_photo.photo_url, settings.IMAGE_LIST_THUMBNAIL_SIZE)
+            )
         station_responses.append(ServiceStationResponse(**station_dict))
     
     return ServiceStationListResponse(
@@ -217,7 +201,7 @@ async def upload_service_station_photo(
         )
     
     # Сохраняем файл
-    photo_url = save_uploaded_photo(file, station_id)
+    photo_url = (await save_upload(db, file, variants=True)).url
     
     # Добавляем в БД
     photo = add_service_station_photo(
@@ -4,9 +4,11 @@ API эндпоинты для технической поддержки
 from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
+import asyncio
 import json
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
+from app.core.config import settings
 from app.models.user import User
 from app.api.deps import get_current_active_user, get_current_admin_user
 from app.services.support_service.crud import (
@@ -20,7 +22,9 @@ from app.services.support_service.crud import (
     mark_ticket_as_read,
     get_unread_tickets_count,
     get_ticket_stats,
+    get_cached_ticket_stats,
 )
+from app.services.support_service.counters import ticket_counters
 from app.schemas.support import (
     SupportTicketCreate,
     SupportTicketUpdate,
@@ -32,9 +36,14 @@ from app.schemas.support import (
     SupportMessageResponse,
 )
 from app.models.support import TicketStatus
+from app.core.pubsub import pubsub, WORKER_ID
+from app.core.periodic import PeriodicJob
 
 router = APIRouter()
 
+# Канал шины pub/sub для чата поддержки
+SUPPORT_CHANNEL = "support"
+
 
 # Менеджер WebSocket соединений для поддержки
 class SupportConnectionManager:
@@ -47,6 +56,10 @@ class SupportConnectionManager:
         self.user_connections: dict[int, list[WebSocket]] = {}
         # Список администраторов
         self.admin_connections: list[WebSocket] = []
+        # Периодическая сверка счетчиков тикетов с БД
+        self._reconcile_job = PeriodicJob(
+            "Support stats reconcile", self.reconcile_stats, lambda: settings.SUPPORT_STATS_RECONCILE_INTERVAL
+        )
     
     async def connect_to_ticket(self, websocket: WebSocket, ticket_id: int, user_id: int, is_admin: bool = False):
         """Подключение к чату тикета"""
@@ -85,7 +98,98 @@ class SupportConnectionManager:
                     del self.user_connections[user_id]
     
     async def send_message_to_ticket(self, ticket_id: int, message: dict):
-        """Отправка сообщения в чат тикета"""
+        """Отправка сообщения в чат тикета (на всех воркерах)"""
+        await pubsub.publish(SUPPORT_CHANNEL, {
+            "event": "ticket_message",
+            "ticket_id": ticket_id,
+            "message": message
+        })
+    
+    async def notify_new_ticket(self, user_id: int, ticket_data: dict):
+        """Уведомление пользователя о новом тикете (на всех воркерах)"""
+        await pubsub.publish(SUPPORT_CHANNEL, {
+            "event": "user_ticket",
+            "user_id": user_id,
+            "ticket": ticket_data
+        })
+    
+    async def notify_new_message_to_admins(self, ticket_data: dict):
+        """Уведомление администраторов о новом сообщении (на всех воркерах)"""
+        await pubsub.publish(SUPPORT_CHANNEL, {
+            "event": "admin_message",
+            "ticket": ticket_data
+        })
+    
+    async def connect_admin(self, websocket: WebSocket):
+        """Подключение панели администратора (счетчики и уведомления)"""
+        await websocket.accept()
+        if websocket not in self.admin_connections:
+            self.admin_connections.append(websocket)
+    
+    def disconnect_admin(self, websocket: WebSocket):
+        if websocket in self.admin_connections:
+            self.admin_connections.remove(websocket)
+    
+    async def publish_stats(self):
+        """
+        Публикация изменений счетчиков тикетов (на всех воркерах)
+        
+        Вызывается после CRUD операций: изменения уже применены к счетчикам
+        этого воркера, остальные воркеры применяют их из события
+        """
+        delta = ticket_counters.take_pending()
+        if delta:
+            await pubsub.publish(SUPPORT_CHANNEL, {
+                "event": "stats_delta",
+                "delta": delta,
+                "origin": WORKER_ID
+            })
+    
+    async def handle_event(self, event: dict):
+        """Обработка события из шины pub/sub"""
+        event_type = event.get("event")
+        if event_type == "ticket_message":
+            await self._deliver_to_ticket(event.get("ticket_id"), event.get("message"))
+        elif event_type == "user_ticket":
+            await self._deliver_new_ticket(event.get("user_id"), event.get("ticket"))
+        elif event_type == "admin_message":
+            await self._deliver_to_admins(event.get("ticket"))
+        elif event_type == "stats_delta":
+            if event.get("origin") != WORKER_ID:
+                ticket_counters.apply(event.get("delta") or {})
+            await self._push_stats()
+    
+    async def _push_stats(self):
+        """Отправка счетчиков тикетов администраторам на текущем воркере"""
+        stats = ticket_counters.snapshot()
+        if stats is None:
+            return
+        await self._send_to_admins({"type": "ticket_stats", "stats": stats})
+    
+    def _load_stats(self) -> dict:
+        db = SessionLocal()
+        try:
+            return get_ticket_stats(db)
+        finally:
+            db.close()
+    
+    async def reconcile_stats(self):
+        """Сверка счетчиков с БД (исправление расхождений)"""
+        previous = ticket_counters.snapshot()
+        stats = await asyncio.to_thread(self._load_stats)
+        ticket_counters.load(stats)
+        if ticket_counters.snapshot() != previous:
+            await self._push_stats()
+    
+    async def start(self):
+        """Запуск периодической сверки счетчиков"""
+        await self._reconcile_job.start()
+    
+    async def stop(self):
+        await self._reconcile_job.stop()
+    
+    async def _deliver_to_ticket(self, ticket_id: int, message: dict):
+        """Доставка сообщения тикета сокетам текущего воркера"""
         if ticket_id in self.ticket_connections:
             disconnected = []
             for connection in self.ticket_connections[ticket_id]:
@@ -98,8 +202,8 @@ class SupportConnectionManager:
             for conn in disconnected:
                 self.ticket_connections[ticket_id].remove(conn)
     
-    async def notify_new_ticket(self, user_id: int, ticket_data: dict):
-        """Уведомление пользователя о новом тикете"""
+    async def _deliver_new_ticket(self, user_id: int, ticket_data: dict):
+        """Доставка уведомления о тикете сокетам пользователя на текущем воркере"""
         if user_id in self.user_connections:
             disconnected = []
             for connection in self.user_connections[user_id]:
@@ -114,15 +218,18 @@ class SupportConnectionManager:
             for conn in disconnected:
                 self.user_connections[user_id].remove(conn)
     
-    async def notify_new_message_to_admins(self, ticket_data: dict):
-        """Уведомление администраторов о новом сообщении"""
+    async def _deliver_to_admins(self, ticket_data: dict):
+        """Доставка уведомления администраторам на текущем воркере"""
+        await self._send_to_admins({
+            "type": "new_message",
+            "ticket": ticket_data
+        })
+    
+    async def _send_to_admins(self, message: dict):
         disconnected = []
-        for connection in self.admin_connections:
+        for connection in list(self.admin_connections):
             try:
-                await connection.send_json({
-                    "type": "new_message",
-                    "ticket": ticket_data
-                })
+                await connection.send_json(message)
             except Exception:
                 disconnected.append(connection)
         
@@ -133,6 +240,69 @@ class SupportConnectionManager:
 
 # Глобальный менеджер соединений
 support_manager = SupportConnectionManager()
+pubsub.subscribe(SUPPORT_CHANNEL, support_manager.handle_event)
+
+
+def _resolve_websocket_user(token: str) -> tuple[Optional[int], bool]:
+    """Пользователь WebSocket по JWT токену: (user_id, is_admin)"""
+    from jose import jwt
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    sub = payload.get("sub")
+    db = next(get_db())
+    try:
+        if isinstance(sub, str) and ":" in sub:
+            from app.crud.user import get_user_by_id
+            user_id = int(sub.split(":")[1])
+            user = get_user_by_id(db, user_id)
+            return user_id, bool(user and user.is_admin)
+        from app.crud.user import get_user_by_phone_number
+        user = get_user_by_phone_number(db, sub)
+        if user:
+            return user.id, user.is_admin
+        return None, False
+    finally:
+        db.close()
+
+
+@router.websocket("/ws/admin")
+async def websocket_admin_panel(websocket: WebSocket, token: str = None):
+    """
+    WebSocket панели поддержки администратора
+    
+    Подключение: ws://127.0.0.1:8000/api/v1/support/ws/admin?token=<jwt_token>
+    Сразу после подключения и при каждом изменении приходит
+    {"type": "ticket_stats", "stats": {...}}; также приходят уведомления
+    о новых тикетах и сообщениях.
+    """
+    try:
+        user_id, is_admin = _resolve_websocket_user(token) if token else (None, False)
+    except Exception as e:
+        print(f"WebSocket auth error: {str(e)}")
+        await websocket.close(code=1008, reason="Invalid token")
+        return
+    if not user_id or not is_admin:
+        await websocket.close(code=1008, reason="Unauthorized")
+        return
+    
+    await support_manager.connect_admin(websocket)
+    try:
+        db = next(get_db())
+        try:
+            stats = get_cached_ticket_stats(db)
+        finally:
+            db.close()
+        await websocket.send_json({"type": "ticket_stats", "stats": stats})
+        
+        while True:
+            data = await websocket.receive_text()
+            if data == "ping":
+                await websocket.send_json({"type": "pong"})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket error: {str(e)}")
+    finally:
+        support_manager.disconnect_admin(websocket)
 
 
 @router.websocket("/ws/ticket/{ticket_id}")
@@ -153,36 +323,10 @@ async def websocket_ticket_chat(
     try:
         # Валидация токена
         if token:
-            from jose import jwt
-            from app.core.config import settings
             try:
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-                sub = payload.get("sub")
-                if isinstance(sub, str) and ":" in sub:
-                    user_id = int(sub.split(":")[1])
-                    # Получаем информацию о пользователе для проверки is_admin
-                    db = next(get_db())
-                    try:
-                        from app.crud.user import get_user_by_id
-                        user = get_user_by_id(db, user_id)
-                        if user:
-                            is_admin = user.is_admin
-                    finally:
-                        db.close()
-                else:
-                    from app.crud.user import get_user_by_phone_number
-                    db = next(get_db())
-                    try:
-                        user = get_user_by_phone_number(db, sub)
-                        if user:
-                            user_id = user.id
-                            is_admin = user.is_admin
-                    finally:
-                        db.close()
+                user_id, is_admin = _resolve_websocket_user(token)
             except Exception as e:
                 print(f"WebSocket auth error: {str(e)}")
-                if db:
-                    db.close()
                 await websocket.close(code=1008, reason="Invalid token")
                 return
         
@@ -257,6 +401,7 @@ async def create_support_ticket(
     # Уведомляем администраторов через WebSocket
     ticket_response = SupportTicketResponse.model_validate(ticket)
     await support_manager.notify_new_message_to_admins(ticket_response.model_dump())
+    await support_manager.publish_stats()
     
     return ticket_response
 
@@ -365,6 +510,7 @@ async def send_message(
     if ticket:
         ticket_response = SupportTicketResponse.model_validate(ticket)
         await support_manager.notify_new_message_to_admins(ticket_response.model_dump())
+    await support_manager.publish_stats()
     
     return message_response
 
@@ -432,6 +578,7 @@ async def get_admin_ticket_with_messages(
     
     # Отмечаем как прочитанный для администратора
     mark_ticket_as_read(db, ticket_id, current_admin.id, is_admin=True)
+    await support_manager.publish_stats()
     
     response = SupportTicketWithMessagesResponse.model_validate(ticket)
     response.messages = [SupportMessageResponse.model_validate(m) for m in messages]
@@ -479,6 +626,7 @@ async def send_admin_message(
     if ticket:
         ticket_response = SupportTicketResponse.model_validate(ticket)
         await support_manager.notify_new_ticket(ticket.user_id, ticket_response.model_dump())
+    await support_manager.publish_stats()
     
     return message_response
 
@@ -498,6 +646,7 @@ async def update_support_ticket(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Тикет не найден"
         )
+    await support_manager.publish_stats()
     
     return SupportTicketResponse.model_validate(ticket)
 
@@ -516,6 +665,7 @@ async def mark_admin_ticket_as_read(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Тикет не найден"
         )
+    await support_manager.publish_stats()
     
     return {
         "success": True,
@@ -528,7 +678,11 @@ async def get_support_stats(
     current_admin: Annotated[User, Depends(get_current_admin_user)],
     db: Annotated[Session, Depends(get_db)]
 ):
-    """Получение статистики тикетов"""
-    stats = get_ticket_stats(db)
+    """
+    Получение статистики тикетов
+    
+    Значения из счетчиков; изменения также приходят в /ws/admin
+    """
+    stats = get_cached_ticket_stats(db)
     return SupportTicketStatsResponse(**stats)
 
@@ -0,0 +1,125 @@
+"""
+Помесячные архивы для растущих append-only таблиц
+
+Горячая таблица хранит последние месяцы, старые строки переносятся в архивную
+таблицу с колонкой month (первое число месяца). В PostgreSQL архив -
+секционированная по month таблица (PARTITION BY RANGE): секция месяца
+создается перед переносом, а удаление месяца по сроку хранения - DROP
+секции. В остальных СУБД (SQLite) архив - обычная таблица, удаление месяца -
+DELETE по индексу month.
+"""
+import logging
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import Column, Date, insert, select, delete, func, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value) -> date:
+    """Первое число месяца для даты/времени"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def hot_cutoff(hot_months: int, now: Optional[datetime] = None) -> date:
+    """Начало самого старого месяца горячей таблицы (текущий месяц + hot_months - 1 предыдущих)"""
+    now = now or datetime.now(timezone.utc)
+    return add_months(month_start(now), -(max(hot_months, 1) - 1))
+
+
+def month_column() -> Column:
+    """Колонка ключа секции архивной таблицы"""
+    return Column(Date, primary_key=True, nullable=False, index=True)
+
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_{month:%Y%m}"
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def ensure_month_partition(db: Session, archive_table, month: date):
+    """Создание секции месяца (только PostgreSQL)"""
+    if not _is_postgres(db):
+        return
+    name = partition_name(archive_table.name, month)
+    db.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{archive_table.name}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def drop_month(db: Session, archive_table, month: date):
+    """Удаление месяца архива: DROP секции или DELETE по month"""
+    if _is_postgres(db):
+        db.execute(text(f'DROP TABLE IF EXISTS "{partition_name(archive_table.name, month)}"'))
+    else:
+        db.execute(delete(archive_table).where(archive_table.c.month == month))
+
+
+def archived_months(db: Session, archive_table) -> List[date]:
+    return [row[0] for row in db.execute(
+        select(archive_table.c.month).distinct().order_by(archive_table.c.month)
+    )]
+
+
+def move_to_archive(
+    db: Session,
+    hot_table,
+    archive_table,
+    time_column: str,
+    cutoff: date,
+    batch_size: int = 10000,
+    before_delete=None
+) -> int:
+    """
+    Перенос строк старше cutoff из горячей таблицы в архив
+
+    Переносится порциями по id (вставка в архив и удаление из горячей таблицы
+    в одной транзакции на порцию); before_delete(db, ids) вызывается перед удалением порции из
+    горячей таблицы - для зависимых строк. Возвращает количество строк.
+    """
+    cutoff_time = datetime(cutoff.year, cutoff.month, cutoff.day, tzinfo=timezone.utc)
+    time_attr = hot_table.c[time_column]
+    columns = [column.name for column in hot_table.columns]
+    moved = 0
+
+    while True:
+        ids = list(db.execute(
+            select(hot_table.c.id).where(time_attr < cutoff_time).order_by(hot_table.c.id).limit(batch_size)
+        ).scalars())
+        if not ids:
+            break
+
+        # Месяцы порции: секции нужны до вставки
+        months = db.execute(
+            select(func.min(time_attr), func.max(time_attr)).where(hot_table.c.id.in_(ids))
+        ).one()
+        month = month_start(months[0])
+        while month <= month_start(months[1]):
+            ensure_month_partition(db, archive_table, month)
+            month = add_months(month, 1)
+
+        rows = db.execute(select(hot_table).where(hot_table.c.id.in_(ids))).mappings().all()
+        db.execute(insert(archive_table), [
+            {**{name: row[name] for name in columns}, "month": month_start(row[time_column])}
+            for row in rows
+        ])
+        if before_delete is not None:
+            before_delete(db, ids)
+        db.execute(delete(hot_table).where(hot_table.c.id.in_(ids)))
+        db.commit()
+        moved += len(ids)
+
+    if moved:
+        logger.info(f"{hot_table.name}: перенесено в архив {moved} строк старше {cutoff}")
+    return moved
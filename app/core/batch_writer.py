@@ -0,0 +1,157 @@
+"""
+Пакетная запись в БД (group commit)
+
+Элементы копятся в ограниченной очереди и сбрасываются одним вызовом persist
+каждые interval_ms миллисекунд или при накоплении max_batch элементов.
+Запись выполняется в пуле потоков, чтобы не блокировать event loop.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Сигнал остановки в очереди
+_STOP = object()
+
+
+class BatchWriterOverloaded(Exception):
+    """Очередь записи переполнена (backpressure)"""
+
+
+class BatchWriter:
+    """
+    Буфер записи с групповыми коммитами
+
+    persist(db, items) получает сессию и список элементов пакета, выполняет
+    запись (с commit) и возвращает список результатов той же длины (или None,
+    если результаты не нужны).
+    """
+
+    def __init__(
+        self,
+        persist: Callable[[Any, List[Any]], Optional[List[Any]]],
+        name: str = "batch_writer",
+        interval_ms: int = 10,
+        max_batch: int = 500,
+        max_queue: int = 10000,
+        session_factory: Callable[[], Any] = None,
+    ):
+        self.persist = persist
+        self.name = name
+        self.interval = interval_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.session_factory = session_factory or (lambda: SessionLocal(expire_on_commit=False))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Статистика
+        self.flushed_batches = 0
+        self.flushed_items = 0
+        self.failed_items = 0
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Новый event loop (перезапуск приложения, тестовый клиент) - новая очередь
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _put(self, item: Any, future: Optional[asyncio.Future]):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            raise BatchWriterOverloaded(f"{self.name}: очередь записи переполнена")
+
+    async def submit(self, item: Any) -> Any:
+        """Добавление элемента и ожидание результата записи"""
+        future = asyncio.get_running_loop().create_future()
+        self._put(item, future)
+        return await future
+
+    def submit_nowait(self, item: Any):
+        """Добавление элемента без ожидания записи (fire-and-forget)"""
+        self._put(item, None)
+
+    async def start(self):
+        self._ensure_started()
+
+    async def stop(self):
+        """Остановка с записью всех накопленных элементов"""
+        if self._task is not None and not self._task.done() and self._loop is asyncio.get_running_loop():
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+
+    def _drain(self, limit: int) -> Tuple[List[Tuple[Any, Optional[asyncio.Future]]], bool]:
+        """Забрать из очереди до limit элементов; второй результат - встречен ли сигнал остановки"""
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            entry = self._queue.get_nowait()
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    async def _run(self):
+        """Цикл: ждем первый элемент, копим пакет в течение interval, пишем одним вызовом"""
+        while True:
+            first = await self._queue.get()
+            if first is _STOP:
+                stopping = True
+                batch = []
+            else:
+                # Окно группового коммита (пропускаем, если пакет уже набран)
+                if self._queue.qsize() + 1 < self.max_batch:
+                    await asyncio.sleep(self.interval)
+                rest, stopping = self._drain(self.max_batch - 1)
+                batch = [first] + rest
+            await self._flush(batch)
+
+            if stopping:
+                # Дописываем остаток очереди и выходим
+                while not self._queue.empty():
+                    rest, _ = self._drain(self.max_batch)
+                    await self._flush(rest)
+                return
+
+    def _persist_sync(self, items: List[Any]) -> Optional[List[Any]]:
+        db = self.session_factory()
+        try:
+            return self.persist(db, items)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _flush(self, batch: List[Tuple[Any, Optional[asyncio.Future]]]):
+        if not batch:
+            return
+        items = [item for item, _ in batch]
+        try:
+            results = await asyncio.to_thread(self._persist_sync, items)
+        except Exception as e:
+            self.failed_items += len(batch)
+            logger.error(f"{self.name}: ошибка записи пакета из {len(batch)} элементов: {str(e)}")
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        self.flushed_batches += 1
+        self.flushed_items += len(batch)
+        for index, (_, future) in enumerate(batch):
+            if future is not None and not future.done():
+                future.set_result(results[index] if results is not None else None)
@@ -41,10 +41,81 @@ class Settings(BaseSettings):
     
     # Redis для rate limiting (опционально)
     REDIS_URL: str = ""  # Если не указан, используется in-memory хранилище
-    
+
+    # Real-time шина событий между воркерами (WebSocket чат, уведомления, поддержка)
+    PUBSUB_BACKEND: str = ""  # redis / postgres / memory. Пусто - redis при наличии REDIS_URL, иначе memory
+    PUBSUB_CHANNEL_PREFIX: str = "pocho"
+    PUBSUB_RECONNECT_MIN_DELAY: float = 0.5  # Первая пауза перед переподключением LISTEN (сек)
+    PUBSUB_RECONNECT_MAX_DELAY: float = 30.0  # Максимальная пауза перед переподключением (сек)
+
+    # Присутствие в глобальном чате
+    CHAT_HEARTBEAT_INTERVAL: int = 25  # Секунд между ping от сервера
+    CHAT_HEARTBEAT_TIMEOUT: int = 75  # Соединение без активности дольше - закрывается
+    CHAT_ONLINE_BROADCAST_INTERVAL: float = 2.0  # Не чаще одной рассылки онлайн-счетчика за интервал (сек)
+    CHAT_TOTAL_CACHE_SECONDS: int = 60  # Время жизни кэша приблизительного количества сообщений
+    CHAT_WRITE_BATCH_INTERVAL_MS: int = 5  # Окно группового коммита сообщений из WebSocket
+    CHAT_WRITE_BATCH_MAX: int = 200  # Максимум сообщений в одном коммите
+    CHAT_WS_SEND_RATE_LIMIT: int = 20  # Сообщений через WebSocket за окно на одно соединение
+    CHAT_WS_SEND_RATE_WINDOW: int = 10  # Окно лимита отправки через WebSocket (сек)
+    CHAT_AUTH_RECHECK_INTERVAL: int = 30  # Период перепроверки токенов и блокировок подключенных (сек)
+
+    # Счетчики уведомлений (бейдж непрочитанных)
+    NOTIFICATION_COUNTER_TTL_SECONDS: int = 600  # Время жизни закэшированного счетчика
+    NOTIFICATION_COUNTER_RECONCILE_INTERVAL: int = 300  # Сверка счетчиков подключенных пользователей с БД (сек)
+
+    # Рассылка глобальных уведомлений по WebSocket (фоновая, порциями)
+    NOTIFICATION_FANOUT_CHUNK_SIZE: int = 500  # Соединений в одной порции
+    NOTIFICATION_FANOUT_CONCURRENCY: int = 100  # Одновременных отправок внутри порции
+    NOTIFICATION_FANOUT_RATE: float = 5000  # Сообщений в секунду на воркер (0 - без ограничения)
+
+    # Прием просмотров и кликов рекламы (буфер с пакетной записью)
+    AD_EVENTS_FLUSH_INTERVAL_MS: int = 200  # Сброс буфера не реже чем раз в интервал
+    AD_EVENTS_FLUSH_MAX: int = 1000  # Или при накоплении стольких событий
+    AD_EVENTS_QUEUE_MAX: int = 50000  # Больше событий в очереди - 503 (backpressure)
+    AD_INDEX_REFRESH_INTERVAL: int = 300  # Полное перестроение индекса выдачи рекламы из БД (сек)
+    AD_SELECTION_DEFAULT_LIMIT: int = 3  # Реклам в ответе на позицию по умолчанию
+    AD_FREQUENCY_CAP_ENTRIES: int = 100000  # Пар (пользователь, реклама) в памяти частотных ограничений
+    AD_STATS_UNIQUES_CACHE_SIZE: int = 10000  # Реклам в кэше скетчей уникальных пользователей за прошедшие дни
+
+    # Поддержка
+    SUPPORT_STATS_RECONCILE_INTERVAL: int = 300  # Сверка счетчиков тикетов с БД (сек)
+
+    # Архивы растущих таблиц (просмотры/клики рекламы, глобальный чат), по месяцам
+    AD_EVENTS_HOT_MONTHS: int = 3  # Месяцев событий рекламы в основной таблице (включая текущий)
+    AD_EVENTS_RETENTION_MONTHS: int = 24  # Дольше события удаляются, остаются дневные счетчики
+    CHAT_HOT_MONTHS: int = 12  # Месяцев сообщений в ленте чата
+    CHAT_ARCHIVE_RETENTION_MONTHS: int = 36  # Дольше сообщения удаляются, остаются итоги месяца
+    ARCHIVE_ROTATION_INTERVAL: int = 3600  # Проверка ротации (сек)
+    ARCHIVE_BATCH_SIZE: int = 10000  # Строк в одной транзакции переноса
+
+    # Статистика администратора
+    STATISTICS_ROLLUP_INTERVAL: int = 60  # Пересчет дневных/часовых агрегатов текущего дня (сек)
+    DASHBOARD_CACHE_TTL: int = 30  # Дашборд считается свежим (сек)
+    DASHBOARD_CACHE_MAX_STALE: int = 300  # Дольше устаревший дашборд пересчитывается синхронно (сек)
+    DASHBOARD_CACHE_BUCKET_SECONDS: int = 60  # Округление дат периода в ключе кэша (сек)
+
     # File Upload Settings
     UPLOAD_DIR: str = "uploads"  # Директория для загрузки файлов
-    MAX_FILE_SIZE: int = 5 * 1024 * 1024  # 5MB максимальный размер файла
+    MAX_FILE_SIZE: int = 5 * 1024 * 1024  # 5MB максимальный размер файла (фото, аватары, документы)
+    MAX_CHAT_IMAGE_SIZE: int = 10 * 1024 * 1024  # Изображение в глобальном чате
+    MAX_CHAT_VIDEO_SIZE: int = 50 * 1024 * 1024  # Видео в глобальном чате
+    MAX_CHAT_AUDIO_SIZE: int = 20 * 1024 * 1024  # Аудио в глобальном чате
+    MAX_CHAT_FILE_SIZE: int = 50 * 1024 * 1024  # Прочие файлы в глобальном чате
+    MAX_UPLOAD_REQUEST_SIZE: int = 51 * 1024 * 1024  # Максимальный размер multipart запроса с файлом
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Размер порции при записи загрузки на диск (байт)
+    IMAGE_VARIANT_SIZES: list = [128, 512, 1024]  # Размеры миниатюр WebP по длинной стороне (px)
+    IMAGE_VARIANT_QUALITY: int = 80  # Качество WebP миниатюр
+    IMAGE_VARIANT_WORKERS: int = 2  # Процессов генерации миниатюр
+    IMAGE_LIST_THUMBNAIL_SIZE: int = 512  # Размер main_photo в списках заведений
+    IMAGE_AVATAR_THUMBNAIL_SIZE: int = 128  # Размер аватаров в сообщениях чата
+    IMAGE_VARIANT_CACHE_SIZE: int = 50000  # Оригиналов в кэше готовых миниатюр (на воркер)
+    IMAGE_VARIANT_RECHECK: int = 300  # Повторная проверка диска для оригинала без полного набора миниатюр (сек)
+    CHAT_IMAGE_VARIANT_WAIT: float = 5.0  # Ожидание миниатюр изображения чата перед ответом (сек)
+    MEDIA_SWEEP_INTERVAL: int = 3600  # Период очистки хранилища от файлов без ссылок (сек)
+    MEDIA_ORPHAN_GRACE: int = 24 * 3600  # Файл без ссылок или незарегистрированный удаляется спустя (сек)
+    MEDIA_CACHE_MAX_AGE: int = 3600  # Кэширование файлов старой схемы (файлы хранилища неизменяемы)
+    MEDIA_CHUNK_SIZE: int = 256 * 1024  # Размер порции при отдаче файла (байт)
+    MEDIA_ACCEL_REDIRECT_PREFIX: str = ""  # internal location nginx для X-Accel-Redirect (например /_uploads), пусто - отдает приложение
     ALLOWED_IMAGE_TYPES: list = ["image/jpeg", "image/jpg", "image/png", "image/webp"]
     BASE_URL: str = "http://localhost:8000"  # Базовый URL для генерации ссылок на файлы
     
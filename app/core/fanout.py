@@ -0,0 +1,161 @@
+"""
+Фоновая рассылка сообщений большому числу WebSocket соединений
+
+Рассылки ставятся в очередь и выполняются одной фоновой задачей: получатели
+обрабатываются порциями с ограниченной параллельностью и ограничением
+скорости отправки, между порциями управление возвращается event loop.
+По каждой рассылке ведется прогресс (отправлено / ошибок / всего).
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastJob:
+    """Рассылка и ее прогресс"""
+
+    def __init__(self, job_id: str, targets: List[Any], send: Callable[[Any], Awaitable[bool]]):
+        self.id = job_id
+        self.targets = targets
+        self.send = send
+        self.total = len(targets)
+        self.sent = 0
+        self.failed = 0
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class FanoutDispatcher:
+    """
+    Очередь рассылок с порционной отправкой
+
+    send(target) отправляет сообщение одному получателю и возвращает True при успехе.
+    rate_per_second=0 отключает ограничение скорости.
+    """
+
+    def __init__(
+        self,
+        name: str = "fanout",
+        chunk_size: int = 500,
+        concurrency: int = 100,
+        rate_per_second: float = 0,
+        history_size: int = 50,
+    ):
+        self.name = name
+        self.chunk_size = max(chunk_size, 1)
+        self.concurrency = max(concurrency, 1)
+        self.rate = rate_per_second
+        self.history_size = history_size
+        self.jobs: "OrderedDict[str, BroadcastJob]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Новый event loop (перезапуск приложения, тестовый клиент) - новая очередь
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, job_id: str, targets: List[Any], send: Callable[[Any], Awaitable[bool]]) -> BroadcastJob:
+        """Постановка рассылки в очередь (не ждет отправки)"""
+        self._ensure_started()
+        job = BroadcastJob(job_id, targets, send)
+        self.jobs[job_id] = job
+        while len(self.jobs) > self.history_size:
+            self.jobs.popitem(last=False)
+        self._queue.put_nowait(job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[BroadcastJob]:
+        return self.jobs.get(job_id)
+
+    async def join(self):
+        """Ожидание завершения всех поставленных рассылок"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def start(self):
+        self._ensure_started()
+
+    async def stop(self):
+        """Остановка; незавершенные рассылки прерываются (соединения все равно закрываются)"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            if self._loop is not asyncio.get_running_loop():
+                # Задача другого event loop - дождаться ее отмены здесь нельзя
+                self._task = None
+                return
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                job.status = "failed"
+                logger.error(f"{self.name}: ошибка рассылки {job.id}: {str(e)}")
+            finally:
+                job.targets = []
+                job.finished_at = datetime.now(timezone.utc)
+                self._queue.task_done()
+
+    async def _process(self, job: BroadcastJob):
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+
+        async def send_one(target) -> bool:
+            async with semaphore:
+                try:
+                    return bool(await job.send(target))
+                except Exception:
+                    return False
+
+        for offset in range(0, job.total, self.chunk_size):
+            chunk = job.targets[offset:offset + self.chunk_size]
+            results = await asyncio.gather(*(send_one(target) for target in chunk))
+            delivered = sum(1 for result in results if result)
+            job.sent += delivered
+            job.failed += len(results) - delivered
+
+            # Ограничение скорости: не быстрее rate сообщений в секунду
+            delay = 0.0
+            if self.rate:
+                delay = (job.sent + job.failed) / self.rate - (time.monotonic() - started)
+            await asyncio.sleep(max(delay, 0))
+
+        job.status = "done"
+        logger.info(
+            f"{self.name}: рассылка {job.id} завершена: отправлено {job.sent}, "
+            f"ошибок {job.failed} из {job.total} за {time.monotonic() - started:.2f}с"
+        )
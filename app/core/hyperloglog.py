@@ -0,0 +1,75 @@
+"""
+HyperLogLog - компактная оценка количества уникальных значений
+
+Скетч занимает 2^precision байт, объединяется с другими скетчами (merge) без
+потери точности и хранится в БД как bytes. Стандартная ошибка ~1.04/sqrt(2^p):
+для precision=11 (2 КБ) - около 2.3%. Малые множества считаются точно через
+linear counting.
+"""
+import hashlib
+import math
+from typing import Iterable, Optional
+
+
+class HyperLogLog:
+    """Скетч HyperLogLog с регистрами в bytearray"""
+
+    def __init__(self, precision: int = 11, registers: Optional[bytes] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision должен быть от 4 до 16")
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is not None and len(registers) != self.size:
+            raise ValueError("Размер регистров не соответствует precision")
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes], precision: int = 11) -> "HyperLogLog":
+        """Восстановление из bytes (пустое значение - пустой скетч)"""
+        if not data:
+            return cls(precision)
+        return cls(precision=len(data).bit_length() - 1, registers=data)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    def add(self, value) -> bool:
+        """Добавление значения; True, если скетч изменился"""
+        digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        # Позиция первой единицы в оставшихся битах
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def update(self, values: Iterable) -> "HyperLogLog":
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Объединение (поэлементный максимум регистров)"""
+        if other.precision != self.precision:
+            raise ValueError("Нельзя объединить скетчи разной точности")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        """Оценка количества уникальных значений"""
+        m = self.size
+        zeros = self.registers.count(0)
+        if zeros == m:
+            return 0
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting для малых множеств
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self) -> int:
+        return self.count()
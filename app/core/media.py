@@ -0,0 +1,148 @@
+"""
+URL и пути медиафайлов
+
+Файлы лежат в UPLOAD_DIR и отдаются под префиксом /uploads. Новые загрузки
+хранятся по SHA-256 содержимого в дереве media/ab/cd/<sha256><ext>, старые -
+в директориях по назначению (avatars, gas_stations, ...). Производные
+изображения (WebP уменьшенные по длинной стороне) лежат рядом с оригиналом:
+gas_stations/7_abc.jpg -> gas_stations/7_abc.512.webp, поэтому их URL
+вычисляются из URL оригинала без обращения к БД. Какие из них уже созданы,
+запоминает variant_lookup, чтобы ответы со списками не проверяли диск.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Префикс URL, под которым смонтирована директория загрузок
+MEDIA_URL_PREFIX = "uploads"
+
+# Поддиректория UPLOAD_DIR контентно-адресуемого хранилища
+MEDIA_STORE_SUBDIR = "media"
+
+
+def media_url(relative_path: str) -> str:
+    """Публичный URL файла по пути относительно UPLOAD_DIR"""
+    return f"{settings.BASE_URL}/{MEDIA_URL_PREFIX}/{relative_path}"
+
+
+def relative_media_path(url: Optional[str]) -> Optional[str]:
+    """Путь относительно UPLOAD_DIR для URL нашего файла (иначе None)"""
+    prefix = f"{settings.BASE_URL}/{MEDIA_URL_PREFIX}/"
+    if not url or not url.startswith(prefix):
+        return None
+    relative_path = url[len(prefix):]
+    if not relative_path or ".." in Path(relative_path).parts:
+        return None
+    return relative_path
+
+
+def media_path(relative_path: str) -> Path:
+    return Path(settings.UPLOAD_DIR) / relative_path
+
+
+def store_relative_path(sha256: str, extension: str) -> str:
+    """Путь файла в хранилище по хешу (два уровня шардирования)"""
+    return f"{MEDIA_STORE_SUBDIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def variant_relative_path(relative_path: str, size: int) -> str:
+    """Путь производного WebP изображения размера size"""
+    stem, _ = os.path.splitext(relative_path)
+    return f"{stem}.{size}.webp"
+
+
+def media_file_paths(relative_path: str) -> List[Path]:
+    """Файл и его производные изображения"""
+    return [media_path(relative_path)] + [
+        media_path(variant_relative_path(relative_path, size)) for size in settings.IMAGE_VARIANT_SIZES
+    ]
+
+
+class VariantLookup:
+    """
+    Готовые производные изображения по пути оригинала (в пределах воркера)
+
+    Диск проверяется при первом обращении к оригиналу. Полный набор размеров
+    запоминается до вытеснения из кэша: миниатюры не меняются, а удаление
+    файлов сообщает forget. Неполный набор перепроверяется не чаще раза в
+    IMAGE_VARIANT_RECHECK - миниатюры могут создаваться на другом воркере.
+    Конвейер этого воркера отмечает созданные размеры сразу (mark_ready).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # путь оригинала -> (готовые размеры, время проверки диска; None - набор полный)
+        self._entries: "OrderedDict[str, Tuple[FrozenSet[int], Optional[float]]]" = OrderedDict()
+
+    def _store(self, key: str, sizes: FrozenSet[int]):
+        complete = sizes.issuperset(settings.IMAGE_VARIANT_SIZES)
+        self._entries[key] = (sizes, None if complete else time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def ready(self, path: Path) -> FrozenSet[int]:
+        """Размеры, для которых миниатюры оригинала path созданы"""
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                sizes, checked_at = entry
+                if checked_at is None or time.monotonic() - checked_at < settings.IMAGE_VARIANT_RECHECK:
+                    self._entries.move_to_end(key)
+                    return sizes
+        sizes = frozenset(
+            size for size in settings.IMAGE_VARIANT_SIZES
+            if Path(variant_relative_path(key, size)).is_file()
+        )
+        with self._lock:
+            self._store(key, sizes)
+        return sizes
+
+    def mark_ready(self, path: Path, sizes: Iterable[int]):
+        """Миниатюры оригинала path созданы (вызывается после генерации)"""
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            self._store(key, frozenset(sizes) | (entry[0] if entry is not None else frozenset()))
+
+    def forget(self, path: Path):
+        """Файлы оригинала path удалены"""
+        with self._lock:
+            self._entries.pop(str(path), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+variant_lookup = VariantLookup(settings.IMAGE_VARIANT_CACHE_SIZE)
+
+
+def image_variants(url: Optional[str]) -> Dict[str, str]:
+    """Готовые производные изображения: размер -> URL (пусто, если еще не созданы)"""
+    relative_path = relative_media_path(url)
+    if relative_path is None:
+        return {}
+    ready = variant_lookup.ready(media_path(relative_path))
+    return {
+        str(size): media_url(variant_relative_path(relative_path, size))
+        for size in settings.IMAGE_VARIANT_SIZES
+        if size in ready
+    }
+
+
+def thumbnail_url(url: Optional[str], size: int) -> Optional[str]:
+    """URL производного изображения size, если оно готово, иначе исходный URL"""
+    relative_path = relative_media_path(url)
+    if relative_path is None:
+        return url
+    if size in variant_lookup.ready(media_path(relative_path)):
+        return media_url(variant_relative_path(relative_path, size))
+    return url
@@ -0,0 +1,307 @@
+"""
+Раздача загруженных файлов (/uploads)
+
+StaticFiles дополнен тем, что нужно медиа:
+- файлы хранилища (media/<sha256>...) неизменяемы: Cache-Control
+  immutable на год и сильный ETag из хеша, клиенты и CDN не перепроверяют их;
+- файлы старой схемы кэшируются на MEDIA_CACHE_MAX_AGE с перепроверкой по ETag;
+- запросы Range (один диапазон) и If-Range - перемотка видео и аудио чата;
+- предварительно сжатые копии (<file>.br, <file>.gz) для текстовых типов;
+- при MEDIA_ACCEL_REDIRECT_PREFIX тело отдает nginx (X-Accel-Redirect,
+  sendfile без копирования), приложение формирует только заголовки;
+- счетчики запросов и переданных байт по директориям (media_access_stats).
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from typing import Dict, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.media import MEDIA_STORE_SUBDIR
+
+logger = logging.getLogger(__name__)
+
+# Кэширование неизменяемых файлов хранилища (год - максимум по RFC 9111)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Предварительно сжатые копии: Content-Encoding -> расширение файла
+PRECOMPRESSED_ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+COMPRESSIBLE_TYPES = {"application/json", "application/javascript", "image/svg+xml", "application/xml"}
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class MediaAccessStats:
+    """Счетчики раздачи файлов по директориям (в пределах воркера)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, group: str, status_code: int, sent_bytes: int = 0, precompressed: bool = False):
+        with self._lock:
+            counters = self._groups[group]
+            counters["requests"] += 1
+            counters[str(status_code)] += 1
+            counters["bytes"] += sent_bytes
+            if precompressed:
+                counters["precompressed"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {group: dict(counters) for group, counters in self._groups.items()}
+
+    def reset(self):
+        with self._lock:
+            self._groups.clear()
+
+
+media_access_stats = MediaAccessStats()
+
+
+def access_group(relative_path: str) -> str:
+    """Директория для метрик: media, avatars, global_chat/videos, ..."""
+    parts = relative_path.replace(os.sep, "/").split("/")
+    if len(parts) > 2 and parts[0] == "global_chat":
+        return "/".join(parts[:2])
+    return parts[0] if len(parts) > 1 else "."
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Диапазон из заголовка Range: (start, end) включительно
+
+    None - заголовок не поддерживается (несколько диапазонов, другие единицы)
+    и отдается весь файл. ValueError - диапазон не пересекается с файлом (416).
+    """
+    match = _RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N - последние N байт
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if start >= size:
+        raise ValueError(header)
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Слабое сравнение для If-None-Match (список или *)"""
+    if header.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+class MediaFileResponse(FileResponse):
+    """Файл целиком или диапазон байт; с X-Accel-Redirect тело отдает nginx"""
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        method: str,
+        headers: Dict[str, str],
+        media_type: Optional[str],
+        group: str,
+        byte_range: Optional[Tuple[int, int]] = None,
+        accel_redirect: Optional[str] = None,
+    ):
+        super().__init__(
+            path,
+            status_code=206 if byte_range else 200,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+            method=method,
+        )
+        self.group = group
+        self.byte_range = byte_range
+        self.accel_redirect = accel_redirect
+        if accel_redirect:
+            # Диапазоны и длину обрабатывает nginx по исходному запросу
+            self.headers["x-accel-redirect"] = accel_redirect
+            del self.headers["content-length"]
+        elif byte_range:
+            start, end = byte_range
+            self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+            self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        sent = 0
+        try:
+            if self.send_header_only or self.accel_redirect:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            start, end = self.byte_range or (0, self.stat_result.st_size - 1)
+            remaining = end - start + 1
+            chunk_size = settings.MEDIA_CHUNK_SIZE
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                if start:
+                    await file.seek(start)
+                while remaining > 0:
+                    chunk = await file.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    sent += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0 or not sent:
+                # Пустой файл или файл укоротился во время отдачи - закрываем ответ
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            media_access_stats.record(
+                self.group, self.status_code, sent, precompressed="content-encoding" in self.headers
+            )
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles для директории загрузок"""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            media_access_stats.record(access_group(path), e.status_code)
+            raise
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        relative_path = os.path.relpath(full_path, os.path.realpath(self.directory)).replace(os.sep, "/")
+        group = access_group(relative_path)
+        immutable = relative_path.startswith(f"{MEDIA_STORE_SUBDIR}/")
+        media_type = guess_type(full_path)[0] or "application/octet-stream"
+
+        headers = {"accept-ranges": "bytes"}
+        encoding = None
+        if media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES:
+            headers["vary"] = "Accept-Encoding"
+            # Копии отдаются только целиком: диапазоны относятся к исходному файлу
+            if "range" not in request_headers:
+                encoding, full_path, stat_result = self._precompressed(full_path, stat_result, request_headers)
+                if encoding:
+                    relative_path += dict(PRECOMPRESSED_ENCODINGS)[encoding]
+                    headers["content-encoding"] = encoding
+                    headers.pop("accept-ranges")
+
+        etag = self._etag(relative_path, stat_result, immutable)
+        headers["etag"] = etag
+        headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        headers["cache-control"] = (
+            IMMUTABLE_CACHE_CONTROL if immutable else f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+        )
+
+        if self._not_modified(request_headers, etag, stat_result):
+            media_access_stats.record(group, 304)
+            return Response(status_code=304, headers={
+                key: value for key, value in headers.items() if key in ("etag", "cache-control", "vary")
+            })
+
+        accel_redirect = None
+        if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            accel_redirect = f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{relative_path}"
+
+        byte_range = None
+        range_header = request_headers.get("range")
+        if range_header and not encoding and not accel_redirect and self._if_range(request_headers, etag, headers):
+            try:
+                byte_range = parse_range(range_header, stat_result.st_size)
+            except ValueError:
+                media_access_stats.record(group, 416)
+                return Response(status_code=416, headers={
+                    "content-range": f"bytes */{stat_result.st_size}",
+                    "accept-ranges": "bytes",
+                })
+            if byte_range == (0, stat_result.st_size - 1):
+                byte_range = None
+
+        return MediaFileResponse(
+            full_path,
+            stat_result,
+            scope["method"],
+            headers,
+            media_type,
+            group,
+            byte_range=byte_range,
+            accel_redirect=accel_redirect,
+        )
+
+    def _precompressed(self, full_path: str, stat_result: os.stat_result, request_headers: Headers):
+        accepted = {
+            token.split(";")[0].strip().lower()
+            for token in request_headers.get("accept-encoding", "").split(",")
+        }
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                compressed_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            # Копия старше оригинала - устарела
+            if compressed_stat.st_mtime >= stat_result.st_mtime:
+                return encoding, full_path + suffix, compressed_stat
+        return None, full_path, stat_result
+
+    @staticmethod
+    def _etag(relative_path: str, stat_result: os.stat_result, immutable: bool) -> str:
+        if immutable:
+            # Имя файла хранилища содержит хеш содержимого (и размер миниатюры)
+            return f'"{os.path.basename(relative_path)}"'
+        base = f"{relative_path}-{stat_result.st_mtime_ns}-{stat_result.st_size}"
+        return f'"{hashlib.md5(base.encode(), usedforsecurity=False).hexdigest()}"'
+
+    @staticmethod
+    def _not_modified(request_headers: Headers, etag: str, stat_result: os.stat_result) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-Modified-Since игнорируется при наличии If-None-Match (RFC 9110)
+            return _etag_matches(if_none_match, etag)
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= int(stat_result.st_mtime)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    @staticmethod
+    def _if_range(request_headers: Headers, etag: str, headers: Dict[str, str]) -> bool:
+        """Диапазон применяется, если If-Range нет или представление не изменилось"""
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            # If-Range требует сильного сравнения
+            return if_range == etag
+        return if_range == headers["last-modified"]
@@ -0,0 +1,83 @@
+"""
+Периодические фоновые задачи воркера
+
+PeriodicJob вызывает func раз в interval секунд, пока приложение работает
+(start/stop из обработчиков startup/shutdown). Синхронная func выполняется
+в пуле потоков, чтобы не блокировать event loop, корутинная - в самом loop.
+Тот же запуск доступен вручную через run() (эндпоинты "выполнить сейчас"):
+запуски одного воркера не пересекаются, ошибка фонового запуска только
+логируется и не останавливает цикл.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """
+    Периодическая задача
+
+    interval - пауза между запусками в секундах или функция без аргументов,
+    возвращающая паузу (значение настройки читается на каждой итерации,
+    задержка может зависеть от состояния). run_at_start=True - первый запуск
+    сразу при старте, иначе после первой паузы.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        interval: Union[float, Callable[[], float]],
+        run_at_start: bool = False,
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.run_at_start = run_at_start
+        self.last_run: Optional[datetime] = None
+        self.last_result: Any = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def _delay(self) -> float:
+        interval = self.interval() if callable(self.interval) else self.interval
+        return max(interval, 0)
+
+    async def run(self, *args, **kwargs) -> Any:
+        """Немедленный запуск (аргументы передаются в func)"""
+        async with self._lock:
+            if asyncio.iscoroutinefunction(self.func):
+                result = await self.func(*args, **kwargs)
+            else:
+                result = await asyncio.to_thread(self.func, *args, **kwargs)
+            self.last_run = datetime.utcnow()
+            self.last_result = result
+            return result
+
+    async def _loop(self):
+        if not self.run_at_start:
+            await asyncio.sleep(self._delay())
+        while True:
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.name} error: {str(e)}")
+            await asyncio.sleep(self._delay())
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,98 @@
+"""
+Реестр присутствия пользователей для WebSocket соединений
+
+- Несколько соединений (устройств) на одного пользователя
+- Heartbeat: соединения без активности дольше таймаута считаются устаревшими
+- Флаг изменений для объединения (coalescing) рассылок онлайн-счетчика
+"""
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+
+class PresenceRegistry:
+    """Реестр активных соединений: user_id -> {WebSocket: время последней активности}"""
+
+    def __init__(self, heartbeat_timeout: float = 60.0):
+        self.heartbeat_timeout = heartbeat_timeout
+        self._connections: Dict[int, Dict[WebSocket, float]] = {}
+        # Есть изменения онлайн-счетчика, еще не разосланные клиентам
+        self.dirty = False
+
+    def add(self, user_id: int, websocket: WebSocket) -> bool:
+        """
+        Регистрация соединения
+
+        Возвращает True, если пользователь только что появился онлайн
+        """
+        sockets = self._connections.get(user_id)
+        is_new_user = sockets is None
+        if is_new_user:
+            sockets = self._connections[user_id] = {}
+            self.dirty = True
+        sockets[websocket] = time.monotonic()
+        return is_new_user
+
+    def remove(self, user_id: int, websocket: Optional[WebSocket] = None) -> bool:
+        """
+        Удаление соединения (или всех соединений пользователя, если websocket не указан)
+
+        Возвращает True, если у пользователя не осталось соединений
+        """
+        sockets = self._connections.get(user_id)
+        if sockets is None:
+            return False
+        if websocket is None:
+            sockets.clear()
+        else:
+            sockets.pop(websocket, None)
+        if not sockets:
+            del self._connections[user_id]
+            self.dirty = True
+            return True
+        return False
+
+    def touch(self, user_id: int, websocket: WebSocket):
+        """Отметка активности соединения (любое входящее сообщение, pong)"""
+        sockets = self._connections.get(user_id)
+        if sockets is not None and websocket in sockets:
+            sockets[websocket] = time.monotonic()
+
+    def expire_stale(self) -> List[Tuple[int, WebSocket]]:
+        """Удаление соединений без активности дольше heartbeat_timeout"""
+        deadline = time.monotonic() - self.heartbeat_timeout
+        stale = [
+            (user_id, websocket)
+            for user_id, sockets in self._connections.items()
+            for websocket, last_seen in sockets.items()
+            if last_seen < deadline
+        ]
+        for user_id, websocket in stale:
+            self.remove(user_id, websocket)
+        return stale
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self._connections
+
+    def user_ids(self) -> List[int]:
+        return list(self._connections.keys())
+
+    def connections(self) -> Iterator[Tuple[int, WebSocket]]:
+        """Снимок всех пар (user_id, WebSocket)"""
+        for user_id, sockets in list(self._connections.items()):
+            for websocket in list(sockets.keys()):
+                yield user_id, websocket
+
+    def user_connections(self, user_id: int) -> List[WebSocket]:
+        return list(self._connections.get(user_id, {}).keys())
+
+    @property
+    def online_count(self) -> int:
+        """Количество уникальных пользователей онлайн"""
+        return len(self._connections)
+
+    @property
+    def connection_count(self) -> int:
+        """Общее количество соединений (все устройства)"""
+        return sum(len(sockets) for sockets in self._connections.values())
@@ -0,0 +1,335 @@
+"""
+Шина pub/sub для real-time событий (чат, уведомления, поддержка)
+
+WebSocket соединения живут в памяти конкретного воркера, поэтому события
+публикуются через общую шину, а каждый воркер доставляет их своим сокетам.
+
+Поддерживаемые бэкенды:
+- redis: Redis pub/sub (используется, если указан REDIS_URL)
+- postgres: PostgreSQL LISTEN/NOTIFY
+- memory: in-process доставка (один воркер, тесты)
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Идентификатор воркера: по нему обработчики пропускают собственные события
+WORKER_ID = uuid.uuid4().hex
+
+# Обработчик события: получает десериализованное сообщение
+EventHandler = Callable[[dict], Awaitable[None]]
+
+
+class PubSubBackend:
+    """Базовый класс шины pub/sub"""
+
+    name = "base"
+
+    def __init__(self, channel_prefix: str = ""):
+        self.channel_prefix = channel_prefix
+        # Словарь: канал -> список обработчиков
+        self._handlers: Dict[str, List[EventHandler]] = {}
+        self._started = False
+
+    def _full_channel(self, channel: str) -> str:
+        """Имя канала с префиксом приложения"""
+        if self.channel_prefix:
+            return f"{self.channel_prefix}_{channel}"
+        return channel
+
+    def _short_channel(self, full_channel: str) -> str:
+        """Имя канала без префикса приложения"""
+        prefix = f"{self.channel_prefix}_" if self.channel_prefix else ""
+        if prefix and full_channel.startswith(prefix):
+            return full_channel[len(prefix):]
+        return full_channel
+
+    def subscribe(self, channel: str, handler: EventHandler):
+        """Регистрация обработчика событий канала"""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    @property
+    def channels(self) -> List[str]:
+        return list(self._handlers.keys())
+
+    async def _dispatch(self, channel: str, message: dict):
+        """Локальная доставка события всем обработчикам канала"""
+        for handler in list(self._handlers.get(channel, [])):
+            try:
+                await handler(message)
+            except Exception as e:
+                logger.error(f"PubSub handler error on channel '{channel}': {str(e)}")
+
+    async def start(self):
+        """Запуск шины (подключение к брокеру, подписка на каналы)"""
+        self._started = True
+
+    async def stop(self):
+        """Остановка шины"""
+        self._started = False
+
+    async def publish(self, channel: str, message: dict):
+        """Публикация события в канал"""
+        raise NotImplementedError
+
+
+class InMemoryPubSub(PubSubBackend):
+    """In-process шина: события доставляются сразу в текущем воркере"""
+
+    name = "memory"
+
+    async def publish(self, channel: str, message: dict):
+        # Сериализуем так же, как внешние бэкенды, чтобы поведение совпадало
+        payload = json.loads(json.dumps(message, default=str))
+        await self._dispatch(channel, payload)
+
+
+class RedisPubSub(PubSubBackend):
+    """Шина на Redis pub/sub"""
+
+    name = "redis"
+
+    def __init__(self, redis_url: str, channel_prefix: str = ""):
+        super().__init__(channel_prefix)
+        self.redis_url = redis_url
+        self._redis = None
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        import redis.asyncio as aioredis
+
+        self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        self._pubsub = self._redis.pubsub()
+        full_channels = [self._full_channel(c) for c in self.channels]
+        if full_channels:
+            await self._pubsub.subscribe(*full_channels)
+        self._listener_task = asyncio.create_task(self._listen())
+        await super().start()
+        logger.info(f"Redis pub/sub started, channels: {full_channels}")
+
+    async def _listen(self):
+        """Чтение событий из Redis и локальная доставка"""
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    try:
+                        message = json.loads(item["data"])
+                    except (TypeError, ValueError):
+                        logger.warning(f"Invalid pub/sub payload on {item.get('channel')}")
+                        continue
+                    await self._dispatch(self._short_channel(item["channel"]), message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis pub/sub listener error: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener_task = None
+        if self._pubsub:
+            await self._pubsub.close()
+            self._pubsub = None
+        if self._redis:
+            await self._redis.close()
+            self._redis = None
+        await super().stop()
+
+    async def publish(self, channel: str, message: dict):
+        if not self._redis:
+            # Шина не запущена (например, скрипт вне приложения) - доставляем локально
+            await self._dispatch(channel, json.loads(json.dumps(message, default=str)))
+            return
+        try:
+            await self._redis.publish(self._full_channel(channel), json.dumps(message, default=str))
+        except Exception as e:
+            # Событие не должно ломать запрос, данные которого уже сохранены
+            logger.error(f"Redis publish error on '{channel}': {str(e)}")
+
+
+class PostgresPubSub(PubSubBackend):
+    """
+    Шина на PostgreSQL LISTEN/NOTIFY
+
+    - При обрыве соединения LISTEN переподключается с нарастающей паузой и
+      заново подписывается на все каналы; события за время обрыва теряются.
+    - Размер payload NOTIFY ограничен (NOTIFY_MAX_PAYLOAD): большие события
+      доставляются только сокетам текущего воркера, в лог пишется ошибка.
+    """
+
+    name = "postgres"
+
+    # PostgreSQL принимает payload короче 8000 байт
+    NOTIFY_MAX_PAYLOAD = 7999
+
+    def __init__(self, database_url: str, channel_prefix: str = ""):
+        super().__init__(channel_prefix)
+        self.database_url = database_url
+        self._listen_conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    def _dsn(self) -> str:
+        """DSN для psycopg2 (без указания драйвера SQLAlchemy)"""
+        from sqlalchemy.engine import make_url
+
+        url = make_url(self.database_url).set(drivername="postgresql")
+        return url.render_as_string(hide_password=False)
+
+    def _connect(self):
+        """Соединение LISTEN, подписанное на все каналы (блокирующее)"""
+        import psycopg2
+        import psycopg2.extensions
+
+        # keepalive: молча оборванное соединение обнаружится и вызовет переподключение
+        conn = psycopg2.connect(self._dsn(), keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                for channel in self.channels:
+                    cursor.execute(f'LISTEN "{self._full_channel(channel)}"')
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _attach(self, conn):
+        self._listen_conn = conn
+        self._loop.add_reader(conn.fileno(), self._on_notify)
+
+    def _detach(self):
+        """Снятие колбэка и закрытие соединения LISTEN"""
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is None:
+            return
+        try:
+            self._loop.remove_reader(conn.fileno())
+        except Exception:
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._attach(self._connect())
+        await super().start()
+        logger.info(f"PostgreSQL LISTEN/NOTIFY started, channels: {self.channels}")
+
+    def _on_notify(self):
+        """Колбэк event loop: соединение LISTEN готово к чтению"""
+        try:
+            self._listen_conn.poll()
+        except Exception as e:
+            logger.error(f"PostgreSQL LISTEN connection error: {str(e)}")
+            self._detach()
+            if self._reconnect_task is None or self._reconnect_task.done():
+                self._reconnect_task = asyncio.ensure_future(self._reconnect())
+            return
+        while self._listen_conn.notifies:
+            notify = self._listen_conn.notifies.pop(0)
+            try:
+                message = json.loads(notify.payload)
+            except (TypeError, ValueError):
+                logger.warning(f"Invalid pub/sub payload on {notify.channel}")
+                continue
+            asyncio.ensure_future(self._dispatch(self._short_channel(notify.channel), message))
+
+    async def _reconnect(self):
+        """Переподключение LISTEN с нарастающей паузой"""
+        delay = settings.PUBSUB_RECONNECT_MIN_DELAY
+        while self._started:
+            await asyncio.sleep(delay)
+            try:
+                conn = await asyncio.to_thread(self._connect)
+            except Exception as e:
+                logger.error(f"PostgreSQL LISTEN reconnect failed: {str(e)}")
+                delay = min(delay * 2, settings.PUBSUB_RECONNECT_MAX_DELAY)
+                continue
+            if not self._started:
+                conn.close()
+                return
+            self._attach(conn)
+            logger.info(f"PostgreSQL LISTEN reconnected, channels: {self.channels}")
+            return
+
+    async def stop(self):
+        await super().stop()
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            try:
+                await self._reconnect_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reconnect_task = None
+        self._detach()
+
+    def _notify(self, channel: str, payload: str):
+        """Синхронная отправка NOTIFY через пул соединений приложения"""
+        from sqlalchemy import text
+        from app.database import engine
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+            conn.commit()
+
+    async def publish(self, channel: str, message: dict):
+        payload = json.dumps(message, default=str)
+        if not self._started:
+            await self._dispatch(channel, json.loads(payload))
+            return
+        if len(payload.encode("utf-8")) > self.NOTIFY_MAX_PAYLOAD:
+            # Другие воркеры событие не получат; свои сокеты - получат
+            logger.error(
+                f"PubSub payload on '{channel}' exceeds NOTIFY limit "
+                f"({len(payload.encode('utf-8'))} bytes), delivered to this worker only"
+            )
+            await self._dispatch(channel, json.loads(payload))
+            return
+        try:
+            await asyncio.to_thread(self._notify, self._full_channel(channel), payload)
+        except Exception as e:
+            # Событие не должно ломать запрос, данные которого уже сохранены
+            logger.error(f"PostgreSQL NOTIFY error on '{channel}': {str(e)}")
+
+
+def create_pubsub_backend() -> PubSubBackend:
+    """
+    Создание шины по настройкам
+
+    PUBSUB_BACKEND: redis / postgres / memory.
+    Если не указан - redis при наличии REDIS_URL, иначе memory.
+    """
+    backend = (settings.PUBSUB_BACKEND or "").lower()
+    if not backend:
+        backend = "redis" if settings.REDIS_URL else "memory"
+
+    prefix = settings.PUBSUB_CHANNEL_PREFIX
+    if backend == "redis":
+        if not settings.REDIS_URL:
+            raise ValueError("PUBSUB_BACKEND=redis требует REDIS_URL")
+        return RedisPubSub(settings.REDIS_URL, channel_prefix=prefix)
+    if backend == "postgres":
+        return PostgresPubSub(settings.DATABASE_URL, channel_prefix=prefix)
+    if backend == "memory":
+        return InMemoryPubSub(channel_prefix=prefix)
+    raise ValueError(f"Неизвестный PUBSUB_BACKEND: {backend}")
+
+
+# Глобальная шина событий
+pubsub = create_pubsub_backend()
@@ -38,11 +38,15 @@ class RequestSizeMiddleware(BaseHTTPMiddleware):
     
     async def dispatch(self, request: Request, call_next):
         content_length = request.headers.get("content-length")
+        # Загрузки файлов ограничиваются по виду файла при записи на диск
+        max_size = settings.MAX_REQUEST_SIZE
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            max_size = settings.MAX_UPLOAD_REQUEST_SIZE
         
         if content_length:
             try:
                 size = int(content_length)
-                if size > settings.MAX_REQUEST_SIZE:
+                if size > max_size:
                     logger.warning(f"Request too large: {size} bytes from {request.client.host if request.client else 'unknown'}")
                     return JSONResponse(
                         status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
@@ -0,0 +1,74 @@
+"""
+Кэш "stale-while-revalidate" для тяжелых вычислений (дашборды, статистика)
+
+- Свежее значение отдается сразу.
+- Устаревшее (но не старше max_stale) тоже отдается сразу, а обновление
+  запускается одной фоновой задачей на ключ.
+- При отсутствии значения одновременные запросы ждут одно вычисление
+  (без лавины одинаковых запросов к БД).
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StaleWhileRevalidateCache:
+    """Значения с временем вычисления по ключу"""
+
+    def __init__(self, fresh_seconds: float = 30, max_stale_seconds: float = 300, max_entries: int = 100):
+        self.fresh_seconds = fresh_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.max_entries = max_entries
+        # key -> (значение, время вычисления UTC, monotonic время вычисления)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, datetime, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]], force: bool = False) -> Tuple[Any, datetime]:
+        """Значение и время его вычисления"""
+        entry = None if force else self._entries.get(key)
+        if entry is not None:
+            value, computed_at, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.fresh_seconds:
+                return value, computed_at
+            if age < self.max_stale_seconds:
+                # Отдаем устаревшее, обновляем в фоне
+                self._start_refresh(key, compute)
+                return value, computed_at
+        task = self._start_refresh(key, compute)
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def _start_refresh(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.create_task(self._refresh(key, compute))
+            # Ошибка фонового обновления уже залогирована; помечаем ее как полученную
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return task
+
+    async def _refresh(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, datetime]:
+        try:
+            value = await compute()
+            computed_at = datetime.now(timezone.utc)
+            self._entries[key] = (value, computed_at, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return value, computed_at
+        except Exception as e:
+            logger.error(f"Cache refresh error for {key}: {str(e)}")
+            raise
+        finally:
+            self._inflight.pop(key, None)
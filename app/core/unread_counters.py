@@ -0,0 +1,59 @@
+"""
+Кэш счетчиков уведомлений пользователей (всего / непрочитанных)
+
+Счетчики хранятся в памяти воркера и согласуются между воркерами через
+события шины pub/sub. Глобальное уведомление увеличивает счетчики всех
+пользователей за O(1): вместо обхода записей растет общий номер глобальных
+рассылок, а значение пользователя вычисляется относительно номера на момент
+последней записи. Записи живут ограниченное время, расхождения исправляет
+периодическая сверка с БД.
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class UnreadCounterCache:
+    """Счетчики (total, unread) по user_id с O(1) увеличением для всех пользователей"""
+
+    def __init__(self, ttl_seconds: float = 600):
+        self.ttl = ttl_seconds
+        # user_id -> (total, unread, global_seq на момент записи, время записи)
+        self._entries: Dict[int, Tuple[int, int, int, float]] = {}
+        self._global_seq = 0
+
+    def get(self, user_id: int) -> Optional[Tuple[int, int]]:
+        """Текущие (total, unread) или None, если значения нет или оно устарело"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        total, unread, seq, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[user_id]
+            return None
+        delta = self._global_seq - seq
+        return total + delta, unread + delta
+
+    def set(self, user_id: int, total: int, unread: int):
+        self._entries[user_id] = (max(total, 0), max(unread, 0), self._global_seq, time.monotonic())
+
+    def add_global(self, count: int = 1):
+        """Новые глобальные уведомления: +count ко всем закэшированным счетчикам"""
+        self._global_seq += count
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Сброс значения пользователя (или всех при user_id=None)"""
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def expire_stale(self) -> List[int]:
+        """Удаление устаревших записей, возвращает их user_id"""
+        now = time.monotonic()
+        stale = [user_id for user_id, entry in self._entries.items() if now - entry[3] > self.ttl]
+        for user_id in stale:
+            del self._entries[user_id]
+        return stale
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+import logging
+
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -17,6 +19,8 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
 
 def get_db():
     """Dependency для получения сессии базы данных"""
@@ -27,5 +31,27 @@ def get_db():
         db.close()
 
 
-
-
+def create_missing_indexes(bind=None):
+    """
+    Создание индексов, объявленных в моделях, но отсутствующих в БД
+
+    create_all не добавляет новые индексы в уже существующие таблицы
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            # Индексы только для определенного диалекта (Index.ddl_if)
+            ddl_if = getattr(index, "_ddl_if", None)
+            if ddl_if is not None and ddl_if.dialect and ddl_if.dialect != bind.dialect.name:
+                continue
+            try:
+                index.create(bind=bind)
+                logger.info(f"Created index {index.name} on {table.name}")
+            except Exception as e:
+                logger.warning(f"Could not create index {index.name} on {table.name}: {str(e)}")
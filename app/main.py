@@ -2,29 +2,43 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
-from fastapi.staticfiles import StaticFiles
 from fastapi import status
 import logging
 from pathlib import Path
 
 from app.core.config import settings
-from app.database import engine, Base
+from app.database import engine, Base, create_missing_indexes
 from app.api.v1 import api_router
+from app.api.v1.global_chat import global_chat_manager, message_writer
+from app.api.v1.notifications import manager as notification_manager
+from app.api.v1.support import support_manager
+from app.api.v1.admin_statistics import rollup_job
+from app.api.v1.admin_archive import archive_job
+from app.api.v1.admin_media import media_sweep_job
+from app.api.v1.advertisements import ad_event_writer, ad_index_job
 from app.models import (
     User, VerificationCode, BlacklistedToken,
     UserExtended, UserProfile, UserFavorite,
     UserAchievement, UserNotification, Transaction, UserStatistics,
-    Notification, NotificationReadStatus,
+    Notification, NotificationReadStatus, NotificationUserState,
     SupportTicket, SupportMessage,
-    GlobalChatMessage, UserBlock, HiddenGlobalChatMessage,
+    GlobalChatMessage, UserBlock, HiddenGlobalChatMessage, GlobalChatUserState,
+    GlobalChatMessageArchive, GlobalChatMonthlySummary,
     GasStation, FuelPrice, GasStationPhoto, Review,
     Restaurant, MenuCategory, MenuItem, RestaurantPhoto, RestaurantReview,
     ServiceStation, ServicePrice, ServiceStationPhoto, ServiceStationReview,
     CarWash, CarWashService, CarWashPhoto, CarWashReview,
-    Advertisement, AdvertisementView, AdvertisementClick,
-    ElectricStation, ChargingPoint, ElectricStationPhoto, ElectricStationReview
+    Advertisement, AdvertisementView, AdvertisementClick, AdvertisementDailyStats,
+    AdvertisementViewArchive, AdvertisementClickArchive,
+    ElectricStation, ChargingPoint, ElectricStationPhoto, ElectricStationReview,
+    DailyStatisticsRollup, HourlyStatisticsRollup,
+    MediaFile
 )
 from app.core.rate_limit import RateLimitMiddleware
+from app.core.pubsub import pubsub
+from app.core.media_files import MediaFiles
+from app.services.media_service.uploads import UploadTooLarge
+from app.services.media_service.derivatives import image_pipeline
 from app.core.security_middleware import (
     SecurityHeadersMiddleware,
     RequestSizeMiddleware,
@@ -38,6 +52,7 @@ logging.basicConfig(
 )
 
 Base.metadata.create_all(bind=engine)
+create_missing_indexes()
 
 app = FastAPI(
     title="Pocho Backend API",
@@ -100,7 +115,41 @@ subdirs = [
 for subdir in subdirs:
     (upload_dir / subdir).mkdir(parents=True, exist_ok=True)
 
-app.mount("/uploads", StaticFiles(directory=str(upload_dir)), name="uploads")
+# Кэширование, Range и метрики раздачи - см. app.core.media_files
+app.mount("/uploads", MediaFiles(directory=str(upload_dir)), name="uploads")
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Запуск фоновых компонентов приложения"""
+    # Шина событий для WebSocket (подписки регистрируются при импорте роутеров)
+    await pubsub.start()
+    await global_chat_manager.start()
+    await notification_manager.start()
+    await support_manager.start()
+    await rollup_job.start()
+    await ad_index_job.start()
+    await archive_job.start()
+    await media_sweep_job.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Остановка фоновых компонентов приложения"""
+    await global_chat_manager.stop()
+    await notification_manager.stop()
+    await support_manager.stop()
+    await rollup_job.stop()
+    await ad_index_job.stop()
+    await archive_job.stop()
+    await media_sweep_job.stop()
+    # Дописываем сообщения чата, ожидающие группового коммита
+    await message_writer.stop()
+    # Дописываем накопленные просмотры и клики рекламы
+    await ad_event_writer.stop()
+    # Дожидаемся поставленных миниатюр изображений
+    await image_pipeline.stop()
+    await pubsub.stop()
 
 
 @app.exception_handler(RequestValidationError)
@@ -135,6 +184,15 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    """Файл превысил лимит своего вида (проверяется при записи на диск)"""
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"detail": f"Файл слишком большой. Максимальный размер: {exc.limit / 1024 / 1024}MB"}
+    )
+
+
 @app.get("/")
 async def root():
     """Корневой эндпоинт"""
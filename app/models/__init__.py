@@ -8,9 +8,18 @@ from app.models.user_extended import (
     Transaction,
     UserStatistics,
 )
-from app.models.notification import Notification, NotificationReadStatus
+from app.models.notification import Notification, NotificationReadStatus, NotificationUserState
 from app.models.support import SupportTicket, SupportMessage, TicketStatus, TicketPriority
-from app.models.global_chat import GlobalChatMessage, UserBlock, HiddenGlobalChatMessage, MessageType
+from app.models.global_chat import (
+    GlobalChatMessage,
+    UserBlock,
+    HiddenGlobalChatMessage,
+    GlobalChatUserState,
+    GlobalChatMessageArchive,
+    HiddenGlobalChatMessageArchive,
+    GlobalChatMonthlySummary,
+    MessageType,
+)
 from app.models.gas_station import (
     GasStation,
     FuelPrice,
@@ -48,10 +57,15 @@ from app.models.advertisement import (
     Advertisement,
     AdvertisementView,
     AdvertisementClick,
+    AdvertisementDailyStats,
+    AdvertisementViewArchive,
+    AdvertisementClickArchive,
     AdvertisementType,
     AdvertisementStatus,
     AdvertisementPosition,
 )
+from app.models.statistics_rollup import DailyStatisticsRollup, HourlyStatisticsRollup
+from app.models.media import MediaFile
 from app.models.electric_station import (
     ElectricStation,
     ChargingPoint,
@@ -75,6 +89,7 @@ __all__ = [
     "UserStatistics",
     "Notification",
     "NotificationReadStatus",
+    "NotificationUserState",
     "SupportTicket",
     "SupportMessage",
     "TicketStatus",
@@ -82,6 +97,10 @@ __all__ = [
     "GlobalChatMessage",
     "UserBlock",
     "HiddenGlobalChatMessage",
+    "GlobalChatUserState",
+    "GlobalChatMessageArchive",
+    "HiddenGlobalChatMessageArchive",
+    "GlobalChatMonthlySummary",
     "MessageType",
     "GasStation",
     "FuelPrice",
@@ -111,6 +130,9 @@ __all__ = [
     "Advertisement",
     "AdvertisementView",
     "AdvertisementClick",
+    "AdvertisementDailyStats",
+    "AdvertisementViewArchive",
+    "AdvertisementClickArchive",
     "AdvertisementType",
     "AdvertisementStatus",
     "AdvertisementPosition",
@@ -121,4 +143,7 @@ __all__ = [
     "ConnectorType",
     "ElectricStationStatus",
     "ChargingPointStatus",
+    "DailyStatisticsRollup",
+    "HourlyStatisticsRollup",
+    "MediaFile",
 ]
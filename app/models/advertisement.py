@@ -1,12 +1,13 @@
 """
 Модели для рекламных блоков
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, Index
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Text, ForeignKey, Enum, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
 
 from app.database import Base
+from app.core.archive import month_column
 
 
 class AdvertisementType(str, enum.Enum):
@@ -86,6 +87,7 @@ class Advertisement(Base):
     
     # Связи
     views = relationship("AdvertisementView", back_populates="advertisement", cascade="all, delete-orphan")
+    daily_stats = relationship("AdvertisementDailyStats", cascade="all, delete-orphan")
     
     # Индексы
     __table_args__ = (
@@ -151,4 +153,72 @@ class AdvertisementClick(Base):
     )
 
 
+class AdvertisementDailyStats(Base):
+    """
+    Дневные счетчики рекламы
+    
+    Поддерживаются при записи просмотров и кликов. Уникальные пользователи
+    хранятся скетчами HyperLogLog: скетчи дней объединяются для любого периода.
+    """
+    __tablename__ = "advertisement_daily_stats"
 
+    id = Column(Integer, primary_key=True, index=True)
+    advertisement_id = Column(Integer, ForeignKey("advertisements.id", ondelete="CASCADE"), nullable=False, index=True)
+    day = Column(Date, nullable=False)  # День (UTC)
+    
+    views = Column(Integer, default=0, nullable=False)
+    clicks = Column(Integer, default=0, nullable=False)
+    
+    # Скетчи HyperLogLog уникальных авторизованных пользователей
+    unique_viewers_hll = Column(LargeBinary, nullable=True)
+    unique_clickers_hll = Column(LargeBinary, nullable=True)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint('advertisement_id', 'day', name='uq_advertisement_daily_stats'),
+    )
+
+
+class AdvertisementViewArchive(Base):
+    """
+    Архив просмотров рекламы старше горячего окна
+    
+    Помесячные секции (PostgreSQL); удаляются по сроку хранения, итоги
+    остаются в дневных счетчиках
+    """
+    __tablename__ = "advertisement_views_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    month = month_column()  # Первое число месяца просмотра (ключ секции)
+    advertisement_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    ip_address = Column(String, nullable=True)
+    user_agent = Column(String, nullable=True)
+    device_type = Column(String, nullable=True)
+    app_version = Column(String, nullable=True)
+    viewed_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        Index('idx_advertisement_view_archive_ad', 'advertisement_id', 'month', 'viewed_at'),
+        {"postgresql_partition_by": "RANGE (month)"},
+    )
+
+
+class AdvertisementClickArchive(Base):
+    """Архив кликов по рекламе старше горячего окна (помесячные секции)"""
+    __tablename__ = "advertisement_clicks_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    month = month_column()  # Первое число месяца клика (ключ секции)
+    advertisement_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    ip_address = Column(String, nullable=True)
+    user_agent = Column(String, nullable=True)
+    device_type = Column(String, nullable=True)
+    clicked_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        Index('idx_advertisement_click_archive_ad', 'advertisement_id', 'month', 'clicked_at'),
+        {"postgresql_partition_by": "RANGE (month)"},
+    )
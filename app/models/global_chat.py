@@ -1,12 +1,13 @@
 """
 Модели для глобального чата
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, UniqueConstraint, Enum as SQLEnum
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Text, ForeignKey, JSON, UniqueConstraint, Index, DDL, event, Enum as SQLEnum
+from sqlalchemy.sql import func, text, literal_column
 from sqlalchemy.orm import relationship
 import enum
 
 from app.database import Base
+from app.core.archive import month_column
 
 
 class MessageType(str, enum.Enum):
@@ -18,6 +19,22 @@ class MessageType(str, enum.Enum):
     AUDIO = "audio"  # Аудио
 
 
+# Конфигурация полнотекстового поиска PostgreSQL: без стемминга,
+# одинаково работает для русского и узбекского (латиница/кириллица) текста
+SEARCH_TEXT_CONFIG = "simple"
+
+# Таблица FTS5 для SQLite (локальная разработка и тесты)
+SQLITE_FTS_TABLE = "global_chat_messages_fts"
+
+
+def message_search_vector(message):
+    """Выражение tsvector текста сообщения (совпадает с выражением GIN индексов)"""
+    return func.to_tsvector(
+        literal_column(f"'{SEARCH_TEXT_CONFIG}'"),
+        func.coalesce(message, literal_column("''"))
+    )
+
+
 class GlobalChatMessage(Base):
     """
     Сообщение в глобальном чате
@@ -52,10 +69,52 @@ class GlobalChatMessage(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)  # Мягкое удаление (для всех)
     
+    # Частичный индекс по неудаленным сообщениям для keyset-пагинации (id < курсор ORDER BY id DESC)
+    # GIN индекс полнотекстового поиска (только PostgreSQL, для SQLite - FTS5 таблица ниже)
+    __table_args__ = (
+        Index(
+            "ix_global_chat_messages_live_id",
+            "id",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_global_chat_messages_fts",
+            message_search_vector(message),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
+    
     # Связи
     user = relationship("User", backref="global_chat_messages")
     hidden_for_users = relationship("HiddenGlobalChatMessage", back_populates="message", cascade="all, delete-orphan")
 
+    @classmethod
+    def search_vector(cls):
+        """Выражение tsvector, совпадающее с выражением GIN индекса"""
+        return message_search_vector(cls.message)
+
+
+# FTS5 индекс для SQLite, синхронизируется триггерами (external content table)
+_sqlite_fts_ddl = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5("
+    f"message, content='global_chat_messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai AFTER INSERT ON global_chat_messages BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, message) VALUES (new.id, new.message); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad AFTER DELETE ON global_chat_messages BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, message) VALUES ('delete', old.id, old.message); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au AFTER UPDATE OF message ON global_chat_messages BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, message) VALUES ('delete', old.id, old.message); "
+    f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, message) VALUES (new.id, new.message); END",
+]
+for _statement in _sqlite_fts_ddl:
+    event.listen(GlobalChatMessage.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(
+    GlobalChatMessage.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}").execute_if(dialect="sqlite")
+)
+
 
 class UserBlock(Base):
     """
@@ -98,11 +157,103 @@ class HiddenGlobalChatMessage(Base):
     hidden_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # Уникальность: одно сообщение может быть скрыто для пользователя только один раз
+    # Индекс (user_id, message_id) обслуживает анти-join при выборке сообщений пользователя
     __table_args__ = (
         UniqueConstraint('message_id', 'user_id', name='uq_hidden_message_user'),
+        Index('ix_hidden_global_chat_user_message', 'user_id', 'message_id'),
     )
     
     # Связи
     message = relationship("GlobalChatMessage", back_populates="hidden_for_users")
     user = relationship("User", backref="hidden_global_chat_messages")
 
+
+
+class GlobalChatUserState(Base):
+    """
+    Состояние глобального чата для конкретного пользователя
+
+    Очистка истории хранится как водяной знак: сообщения с id < cleared_before_id
+    скрыты для пользователя. Очистка - запись одной строки вместо строки на сообщение.
+    """
+    __tablename__ = "global_chat_user_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)
+
+    # Сообщения с id меньше этого значения скрыты для пользователя
+    cleared_before_id = Column(Integer, nullable=False, default=0)
+    cleared_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Временные метки
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Связи
+    user = relationship("User", backref="global_chat_state")
+
+
+class GlobalChatMessageArchive(Base):
+    """
+    Архив сообщений глобального чата старше горячего окна
+    
+    Лента и поиск продолжаются в архиве, когда горячая таблица исчерпана;
+    помесячные секции (PostgreSQL) удаляются по сроку хранения после
+    подсчета итогов месяца
+    """
+    __tablename__ = "global_chat_messages_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    month = month_column()  # Первое число месяца сообщения (ключ секции)
+    user_id = Column(Integer, nullable=False, index=True)
+    message_type = Column(SQLEnum(MessageType), nullable=False)
+    message = Column(Text, nullable=True)
+    attachments = Column(JSON, nullable=True)
+    extra_metadata = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+
+    # GIN индекс поиска создается на секционированной таблице и наследуется секциями
+    __table_args__ = (
+        Index(
+            "ix_global_chat_messages_archive_fts",
+            message_search_vector(message),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        {"postgresql_partition_by": "RANGE (month)"},
+    )
+
+    @classmethod
+    def search_vector(cls):
+        """Выражение tsvector, совпадающее с выражением GIN индекса"""
+        return message_search_vector(cls.message)
+
+
+class HiddenGlobalChatMessageArchive(Base):
+    """
+    Скрытые для пользователя архивные сообщения
+
+    Строки hidden_global_chat_messages переносятся сюда при ротации (исходные
+    ссылаются на горячую таблицу) и удаляются вместе с месяцем архива.
+    """
+    __tablename__ = "hidden_global_chat_messages_archive"
+
+    # Первичный ключ (user_id, message_id) обслуживает анти-join выборок пользователя
+    user_id = Column(Integer, primary_key=True)
+    message_id = Column(Integer, primary_key=True, index=True)
+
+
+class GlobalChatMonthlySummary(Base):
+    """Итоги месяца глобального чата (сохраняются перед удалением архива)"""
+    __tablename__ = "global_chat_monthly_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    month = Column(Date, unique=True, nullable=False, index=True)
+
+    messages = Column(Integer, default=0, nullable=False)  # Все сообщения, включая удаленные
+    deleted_messages = Column(Integer, default=0, nullable=False)
+    media_messages = Column(Integer, default=0, nullable=False)  # Не текстовые сообщения
+    senders = Column(Integer, default=0, nullable=False)  # Уникальные авторы
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,32 @@
+"""
+Файлы контентно-адресуемого хранилища загрузок
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class MediaFile(Base):
+    """
+    Загруженный файл, хранящийся по SHA-256 содержимого
+
+    Одинаковые загрузки ссылаются на один файл: ref_count - количество
+    ссылок на него (фотографии, аватары, документы, вложения). Файл с нулевым
+    счетчиком удаляется фоновой очисткой после MEDIA_ORPHAN_GRACE.
+    """
+    __tablename__ = "media_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False, index=True)
+    relative_path = Column(String, unique=True, nullable=False)  # Путь относительно UPLOAD_DIR
+    size = Column(BigInteger, nullable=False)
+
+    ref_count = Column(Integer, default=0, nullable=False)
+    released_at = Column(DateTime(timezone=True), nullable=True)  # Когда ссылок не осталось
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_media_files_released", "ref_count", "released_at"),
+    )
@@ -82,3 +82,25 @@ class NotificationReadStatus(Base):
     notification = relationship("Notification", back_populates="read_statuses")
     user = relationship("User", backref="notification_read_statuses")
 
+
+class NotificationUserState(Base):
+    """
+    Водяные знаки глобальных уведомлений для пользователя
+
+    - Глобальные уведомления с id <= read_up_to_id считаются прочитанными
+    - Глобальные уведомления с id <= cleared_up_to_id скрыты (удалены пользователем)
+
+    Выше водяных знаков действуют точечные исключения из NotificationReadStatus.
+    "Прочитать все" и "удалить все" - запись одной строки.
+    """
+    __tablename__ = "notification_user_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)
+    read_up_to_id = Column(Integer, nullable=False, default=0)
+    cleared_up_to_id = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Связи
+    user = relationship("User", backref="notification_state")
@@ -0,0 +1,41 @@
+"""
+Агрегаты статистики по дням и часам (rollup) для дашборда администратора
+"""
+from sqlalchemy import Column, Integer, Float, Date, DateTime
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class StatisticsRollupMixin:
+    """Счетчики одного интервала (дня или часа)"""
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Пользователи
+    new_users = Column(Integer, default=0, nullable=False)
+    active_users = Column(Integer, default=0, nullable=False)  # Уникальные пользователи с транзакциями
+
+    # Транзакции
+    transactions = Column(Integer, default=0, nullable=False)  # Все транзакции
+    orders = Column(Integer, default=0, nullable=False)  # Транзакции с положительной суммой
+    revenue = Column(Float, default=0.0, nullable=False)  # Сумма положительных транзакций
+    completed = Column(Integer, default=0, nullable=False)  # purchase с положительной суммой
+    processing = Column(Integer, default=0, nullable=False)  # pending, processing
+    cancelled = Column(Integer, default=0, nullable=False)  # cancelled, refunded
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class DailyStatisticsRollup(StatisticsRollupMixin, Base):
+    """Статистика за день (UTC)"""
+    __tablename__ = "statistics_daily_rollups"
+
+    day = Column(Date, unique=True, nullable=False, index=True)
+
+
+class HourlyStatisticsRollup(StatisticsRollupMixin, Base):
+    """Статистика за час (UTC, начало часа)"""
+    __tablename__ = "statistics_hourly_rollups"
+
+    hour = Column(DateTime, unique=True, nullable=False, index=True)
@@ -230,6 +230,7 @@ class DashboardResponse(BaseModel):
     recent_actions: RecentActionsResponse
     order_statistics: OrderStatisticsResponse
     system_activity: SystemActivityResponse
+    computed_at: Optional[datetime] = Field(None, description="Время расчета данных (UTC)")
 
     class Config:
         from_attributes = True
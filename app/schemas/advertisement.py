@@ -1,7 +1,8 @@
 """
 Схемы для рекламных блоков
 """
-from pydantic import BaseModel, Field
+import json
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 from typing import Optional, List
 from enum import Enum
@@ -91,6 +92,35 @@ class AdvertisementClickResponse(BaseModel):
 
 # ==================== Advertisement ====================
 
+class AdvertisementShowConditions(BaseModel):
+    """Условия показа рекламы (show_conditions, JSON объект)"""
+    max_per_user: Optional[int] = Field(None, ge=1, description="Показов одному пользователю за окно")
+    cap_window_hours: float = Field(24, gt=0, description="Окно частотного ограничения (часы)")
+    daily_views_target: Optional[int] = Field(None, ge=1, description="Цель просмотров в день (пейсинг)")
+    min_app_version: Optional[str] = Field(None, description="Минимальная версия приложения")
+    device_types: Optional[List[str]] = Field(None, description="Типы устройств")
+
+    @field_validator("device_types", mode="before")
+    @classmethod
+    def single_device_type(cls, value):
+        # Одно значение строкой - список из одного типа, а не поиск подстроки
+        return [value] if isinstance(value, str) else value
+
+
+def validate_show_conditions(value: Optional[str]) -> Optional[str]:
+    """Проверка JSON условий показа при создании и обновлении рекламы"""
+    if not value:
+        return value
+    try:
+        conditions = json.loads(value)
+    except ValueError:
+        raise ValueError("show_conditions должен быть JSON")
+    if not isinstance(conditions, dict):
+        raise ValueError("show_conditions должен быть JSON объектом")
+    AdvertisementShowConditions.model_validate(conditions)
+    return value
+
+
 class AdvertisementBase(BaseModel):
     """Базовая схема рекламы"""
     title: str = Field(..., min_length=1, max_length=255, description="Заголовок рекламы")
@@ -112,7 +142,11 @@ class AdvertisementBase(BaseModel):
 
 class AdvertisementCreate(AdvertisementBase):
     """Схема создания рекламы"""
-    pass
+
+    @field_validator("show_conditions")
+    @classmethod
+    def check_show_conditions(cls, value: Optional[str]) -> Optional[str]:
+        return validate_show_conditions(value)
 
 
 class AdvertisementUpdate(BaseModel):
@@ -133,6 +167,11 @@ class AdvertisementUpdate(BaseModel):
     target_audience: Optional[str] = None
     show_conditions: Optional[str] = None
 
+    @field_validator("show_conditions")
+    @classmethod
+    def check_show_conditions(cls, value: Optional[str]) -> Optional[str]:
+        return validate_show_conditions(value)
+
 
 class AdvertisementResponse(AdvertisementBase):
     """Схема ответа с рекламой"""
@@ -1,11 +1,13 @@
 """
 Схемы для заправочных станций
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from enum import Enum
 
+from app.core.media import image_variants
+
 
 class FuelTypeEnum(str, Enum):
     """Типы топлива"""
@@ -73,6 +75,13 @@ class GasStationPhotoResponse(GasStationPhotoBase):
     id: int
     gas_station_id: int
     created_at: datetime
+    variants: Dict[str, str] = {}  # Миниатюры WebP: размер -> URL
+    
+    @model_validator(mode="after")
+    def fill_variants(self):
+        if not self.variants:
+            self.variants = image_variants(self.photo_url)
+        return self
     
     class Config:
         from_attributes = True
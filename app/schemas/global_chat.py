@@ -13,7 +13,8 @@ class AttachmentInfo(BaseModel):
     type: str = Field(..., description="Тип файла: image, video, file, audio")
     name: Optional[str] = Field(None, description="Имя файла")
     size: Optional[int] = Field(None, description="Размер файла в байтах")
-    thumbnail: Optional[str] = Field(None, description="URL превью (для видео)")
+    thumbnail: Optional[str] = Field(None, description="URL превью (для видео и изображений)")
+    variants: Optional[Dict[str, str]] = Field(None, description="Миниатюры изображения WebP: размер -> URL")
 
 
 class GlobalChatMessageBase(BaseModel):
@@ -43,17 +44,25 @@ class GlobalChatMessageResponse(GlobalChatMessageBase):
 
 
 class GlobalChatMessageListResponse(BaseModel):
-    """Схема списка сообщений"""
+    """Схема списка сообщений (keyset-пагинация)"""
     messages: List[GlobalChatMessageResponse]
-    total: int
+    total: Optional[int] = Field(None, description="Приблизительное количество сообщений (только при include_total=true)")
     skip: int
     limit: int
+    has_more: bool = Field(False, description="Есть еще сообщения в направлении пагинации")
+    next_before_id: Optional[int] = Field(None, description="Курсор before_id для следующей (более старой) страницы")
+    latest_id: Optional[int] = Field(None, description="ID самого нового сообщения на странице (курсор after_id)")
     online_count: int = Field(..., description="Количество пользователей онлайн")
 
 
+class GlobalChatSearchResult(GlobalChatMessageResponse):
+    """Сообщение в результатах поиска"""
+    snippet: Optional[str] = Field(None, description="Фрагмент текста с подсветкой совпадений (<b>...</b>)")
+
+
 class GlobalChatSearchResponse(BaseModel):
-    """Схема результатов поиска"""
-    messages: List[GlobalChatMessageResponse]
+    """Схема результатов поиска (по релевантности)"""
+    messages: List[GlobalChatSearchResult]
     total: int
     query: str
     skip: int
@@ -1,11 +1,13 @@
 """
 Схемы для ресторанов
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from enum import Enum
 
+from app.core.media import image_variants
+
 
 class CuisineTypeEnum(str, Enum):
     """Типы кухни"""
@@ -129,6 +131,13 @@ class RestaurantPhotoResponse(RestaurantPhotoBase):
     id: int
     restaurant_id: int
     created_at: datetime
+    variants: Dict[str, str] = {}  # Миниатюры WebP: размер -> URL
+    
+    @model_validator(mode="after")
+    def fill_variants(self):
+        if not self.variants:
+            self.variants = image_variants(self.photo_url)
+        return self
     
     class Config:
         from_attributes = True
@@ -1,11 +1,13 @@
 """
 Схемы для станций технического обслуживания (СТО)
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from enum import Enum
 
+from app.core.media import image_variants
+
 
 class ServiceTypeEnum(str, Enum):
     """Типы услуг СТО"""
@@ -85,6 +87,13 @@ class ServiceStationPhotoResponse(ServiceStationPhotoBase):
     id: int
     service_station_id: int
     created_at: datetime
+    variants: Dict[str, str] = {}  # Миниатюры WebP: размер -> URL
+    
+    @model_validator(mode="after")
+    def fill_variants(self):
+        if not self.variants:
+            self.variants = image_variants(self.photo_url)
+        return self
     
     class Config:
         from_attributes = True
@@ -84,8 +84,10 @@ class SupportTicketStatsResponse(BaseModel):
     total: int
     open: int
     in_progress: int
+    waiting_for_user: int = 0
     resolved: int
     closed: int
+    unread: int = 0  # Не прочитаны администратором
 
 
 
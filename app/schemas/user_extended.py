@@ -1,11 +1,13 @@
 """
 Схемы для расширенной модели пользователя
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from decimal import Decimal
 
+from app.core.media import image_variants
+
 
 # ==================== User Extended ====================
 
@@ -315,6 +317,13 @@ class ProfileWithUserDataResponse(BaseModel):
     total_stations_visited: int = 0
     total_spent: float = 0.0
     profile: Optional[UserProfileResponse] = None
+    avatar_variants: Dict[str, str] = {}  # Миниатюры аватара WebP: размер -> URL
+
+    @model_validator(mode="after")
+    def fill_avatar_variants(self):
+        if not self.avatar_variants:
+            self.avatar_variants = image_variants(self.avatar)
+        return self
 
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -1,10 +1,11 @@
 """
 CRUD операции для статистики администратора
 """
-from typing import Optional, Tuple, List
-from datetime import datetime, timedelta
+from typing import Optional, Tuple, List, Dict
+from datetime import datetime, timedelta, date, time
+from types import SimpleNamespace
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, case, extract
+from sqlalchemy import func, and_, or_, case, extract, select, literal, union_all, String
 from sqlalchemy.sql import label
 
 from app.models.user import User
@@ -14,6 +15,7 @@ from app.models.restaurant import Restaurant, RestaurantStatus
 from app.models.service_station import ServiceStation, ServiceStationStatus
 from app.models.car_wash import CarWash, CarWashStatus
 from app.models.electric_station import ElectricStation, ElectricStationStatus
+from app.models.statistics_rollup import DailyStatisticsRollup, HourlyStatisticsRollup
 from app.schemas.admin_statistics import (
     KPIsResponse, KPIValue,
     CategoryMetricsResponse, CategoryMetric,
@@ -43,6 +45,288 @@ def calculate_change_percent(current: float, previous: float) -> Optional[float]
     return ((current - previous) / previous) * 100
 
 
+# ==================== Aggregates ====================
+
+# Категории заведений: ключ, модель, статус "одобрено"
+CATEGORY_MODELS = [
+    ("gas_stations", GasStation, StationStatus.APPROVED),
+    ("restaurants", Restaurant, RestaurantStatus.APPROVED),
+    ("service_stations", ServiceStation, ServiceStationStatus.APPROVED),
+    ("car_washes", CarWash, CarWashStatus.APPROVED),
+    ("electric_stations", ElectricStation, ElectricStationStatus.APPROVED),
+]
+
+
+def get_category_counts(db: Session, start_date: datetime, end_date: datetime) -> Dict[str, Tuple[int, int, int]]:
+    """
+    Счетчики всех категорий одним запросом (UNION ALL с условной агрегацией)
+    
+    Возвращает {категория: (всего, одобрено, добавлено за период)}
+    """
+    selects = [
+        select(
+            literal(key).label("category"),
+            func.count(model.id).label("total"),
+            func.count(model.id).filter(model.status == approved).label("active"),
+            func.count(model.id).filter(
+                and_(model.created_at >= start_date, model.created_at <= end_date)
+            ).label("added")
+        )
+        for key, model, approved in CATEGORY_MODELS
+    ]
+    rows = db.execute(union_all(*selects)).all()
+    counts = {key: (0, 0, 0) for key, _, _ in CATEGORY_MODELS}
+    for row in rows:
+        counts[row.category] = (int(row.total or 0), int(row.active or 0), int(row.added or 0))
+    return counts
+
+
+def get_transaction_aggregates(db: Session, previous_start: datetime, start_date: datetime, end_date: datetime):
+    """
+    Агрегаты транзакций за период и предыдущий период одним запросом
+    
+    Поля: period_count, previous_count, period_revenue, previous_revenue,
+    period_avg, previous_avg, period_users, completed, processing, cancelled
+    """
+    in_period = and_(Transaction.created_at >= start_date, Transaction.created_at <= end_date)
+    in_previous = and_(Transaction.created_at >= previous_start, Transaction.created_at < start_date)
+    positive = Transaction.amount > 0
+    
+    return db.query(
+        func.count(Transaction.id).filter(in_period).label("period_count"),
+        func.count(Transaction.id).filter(in_previous).label("previous_count"),
+        func.coalesce(func.sum(Transaction.amount).filter(and_(in_period, positive)), 0).label("period_revenue"),
+        func.coalesce(func.sum(Transaction.amount).filter(and_(in_previous, positive)), 0).label("previous_revenue"),
+        func.coalesce(func.avg(Transaction.amount).filter(and_(in_period, positive)), 0).label("period_avg"),
+        func.coalesce(func.avg(Transaction.amount).filter(and_(in_previous, positive)), 0).label("previous_avg"),
+        func.count(func.distinct(Transaction.user_id)).filter(in_period).label("period_users"),
+        func.count(Transaction.id).filter(
+            and_(in_period, Transaction.type == "purchase", positive)
+        ).label("completed"),
+        func.count(Transaction.id).filter(
+            and_(in_period, Transaction.type.in_(["pending", "processing"]))
+        ).label("processing"),
+        func.count(Transaction.id).filter(
+            and_(in_period, Transaction.type.in_(["cancelled", "refunded"]))
+        ).label("cancelled"),
+    ).filter(
+        Transaction.created_at >= previous_start,
+        Transaction.created_at <= end_date
+    ).one()
+
+
+def get_user_aggregates(db: Session, previous_start: datetime, start_date: datetime, end_date: datetime):
+    """
+    Счетчики пользователей одним запросом
+    
+    Поля: total, total_previous, total_period, active, active_previous, active_period
+    """
+    # Активные пользователи - используем left join для пользователей без UserExtended
+    is_active = and_(User.is_active == True, User.is_blocked == False)
+    no_extended = UserExtended.id == None  # Пользователи без UserExtended считаем активными если они активны
+    user_id = func.distinct(User.id)
+    
+    return db.query(
+        func.count(user_id).label("total"),
+        func.count(user_id).filter(User.created_at < previous_start).label("total_previous"),
+        func.count(user_id).filter(
+            and_(User.created_at >= start_date, User.created_at <= end_date)
+        ).label("total_period"),
+        func.count(user_id).filter(
+            and_(is_active, or_(UserExtended.updated_at >= start_date, no_extended))
+        ).label("active"),
+        func.count(user_id).filter(
+            and_(
+                is_active,
+                or_(
+                    and_(UserExtended.updated_at >= previous_start, UserExtended.updated_at < start_date),
+                    no_extended
+                )
+            )
+        ).label("active_previous"),
+        func.count(user_id).filter(
+            and_(
+                is_active,
+                or_(
+                    and_(UserExtended.updated_at >= start_date, UserExtended.updated_at <= end_date),
+                    no_extended
+                )
+            )
+        ).label("active_period"),
+    ).outerjoin(
+        UserExtended, User.id == UserExtended.user_id
+    ).one()
+
+
+# ==================== Rollups ====================
+# Дневные и часовые агрегаты транзакций и регистраций. Графики и статистика
+# заказов читают их вместо исходных строк; обновляет фоновая задача.
+
+ROLLUP_FIELDS = (
+    "new_users", "active_users", "transactions", "orders",
+    "revenue", "completed", "processing", "cancelled",
+)
+
+
+def _as_date(value) -> date:
+    """func.date возвращает date (PostgreSQL) или строку (SQLite)"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _floor_day(value: datetime) -> datetime:
+    return datetime.combine(value.date(), time.min)
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def _collect_rollups(db: Session, since: datetime, until: datetime) -> Tuple[Dict[date, dict], Dict[datetime, dict]]:
+    """Счетчики по дням и часам из исходных таблиц за [since, until)"""
+    empty = lambda: {field: 0 for field in ROLLUP_FIELDS}
+    daily: Dict[date, dict] = {}
+    hourly: Dict[datetime, dict] = {}
+    
+    # Транзакции по часам
+    day = func.date(Transaction.created_at)
+    hour = extract('hour', Transaction.created_at)
+    positive = Transaction.amount > 0
+    in_range = and_(Transaction.created_at >= since, Transaction.created_at < until)
+    rows = db.query(
+        day.label('day'),
+        hour.label('hour'),
+        func.count(Transaction.id).label('transactions'),
+        func.count(Transaction.id).filter(positive).label('orders'),
+        func.coalesce(func.sum(Transaction.amount).filter(positive), 0).label('revenue'),
+        func.count(Transaction.id).filter(and_(Transaction.type == "purchase", positive)).label('completed'),
+        func.count(Transaction.id).filter(Transaction.type.in_(["pending", "processing"])).label('processing'),
+        func.count(Transaction.id).filter(Transaction.type.in_(["cancelled", "refunded"])).label('cancelled'),
+        func.count(func.distinct(Transaction.user_id)).label('active_users'),
+    ).filter(in_range).group_by(day, hour).all()
+    
+    for row in rows:
+        row_day = _as_date(row.day)
+        bucket = hourly.setdefault(datetime.combine(row_day, time(int(row.hour))), empty())
+        day_bucket = daily.setdefault(row_day, empty())
+        for field in ("transactions", "orders", "revenue", "completed", "processing", "cancelled"):
+            bucket[field] = getattr(row, field) or 0
+            day_bucket[field] += getattr(row, field) or 0
+        bucket["active_users"] = row.active_users or 0
+    
+    # Уникальные пользователи за день не складываются из часовых значений
+    for row in db.query(
+        day.label('day'),
+        func.count(func.distinct(Transaction.user_id)).label('active_users')
+    ).filter(in_range).group_by(day).all():
+        daily.setdefault(_as_date(row.day), empty())["active_users"] = row.active_users or 0
+    
+    # Регистрации
+    user_day = func.date(User.created_at)
+    user_hour = extract('hour', User.created_at)
+    for row in db.query(
+        user_day.label('day'),
+        user_hour.label('hour'),
+        func.count(User.id).label('new_users')
+    ).filter(
+        User.created_at >= since,
+        User.created_at < until
+    ).group_by(user_day, user_hour).all():
+        row_day = _as_date(row.day)
+        hourly.setdefault(datetime.combine(row_day, time(int(row.hour))), empty())["new_users"] = row.new_users or 0
+        daily.setdefault(row_day, empty())["new_users"] += row.new_users or 0
+    
+    return daily, hourly
+
+
+def _store_rollups(db: Session, model, key_column, first_key, counts: dict) -> int:
+    """Запись агрегатов: обновление существующих интервалов с first_key, вставка новых"""
+    existing = {
+        getattr(row, key_column.key): row
+        for row in db.query(model).filter(key_column >= first_key).all()
+    }
+    for key, row in existing.items():
+        # Интервалы без данных (например, после удаления строк) обнуляются
+        values = counts.get(key) or {field: 0 for field in ROLLUP_FIELDS}
+        for field in ROLLUP_FIELDS:
+            setattr(row, field, values[field])
+    for key, values in counts.items():
+        if key not in existing:
+            db.add(model(**{key_column.key: key}, **values))
+    return len(counts)
+
+
+def refresh_statistics_rollups(db: Session, since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+    """
+    Пересчет агрегатов за интервал (по умолчанию - текущий и, после полуночи, прошлый день)
+    
+    Пересчитываются целые дни начиная с since: уникальных пользователей за
+    день нельзя получить сложением. Возвращает количество обновленных интервалов.
+    """
+    now = datetime.utcnow()
+    until = until or now + timedelta(hours=1)
+    since = _floor_day(since or now - timedelta(hours=1))
+    
+    daily, hourly = _collect_rollups(db, since, until)
+    updated = _store_rollups(db, DailyStatisticsRollup, DailyStatisticsRollup.day, since.date(), daily)
+    updated += _store_rollups(db, HourlyStatisticsRollup, HourlyStatisticsRollup.hour, since, hourly)
+    db.commit()
+    return updated
+
+
+def rebuild_statistics_rollups(db: Session) -> int:
+    """Полный пересчет агрегатов по всей истории"""
+    first = db.query(func.min(Transaction.created_at)).scalar()
+    first_user = db.query(func.min(User.created_at)).scalar()
+    candidates = [value for value in (first, first_user) if value is not None]
+    if not candidates:
+        return 0
+    since = min(value.replace(tzinfo=None) for value in candidates)
+    return refresh_statistics_rollups(db, since=since)
+
+
+def has_statistics_rollups(db: Session) -> bool:
+    return db.query(DailyStatisticsRollup.id).first() is not None
+
+
+def _rollup_sums(db: Session, first_day: date, last_day: date, last_exclusive: bool = False):
+    """Суммы дневных агрегатов за интервал дней"""
+    query = db.query(
+        *[func.coalesce(func.sum(getattr(DailyStatisticsRollup, field)), 0).label(field) for field in ROLLUP_FIELDS]
+    ).filter(DailyStatisticsRollup.day >= first_day)
+    if last_exclusive:
+        query = query.filter(DailyStatisticsRollup.day < last_day)
+    else:
+        query = query.filter(DailyStatisticsRollup.day <= last_day)
+    return query.one()
+
+
+def get_rollup_aggregates(db: Session, previous_start: datetime, start_date: datetime, end_date: datetime) -> SimpleNamespace:
+    """
+    Агрегаты транзакций за период и предыдущий период из дневных агрегатов
+    
+    Те же поля, что у get_transaction_aggregates. Границы периода округляются
+    до дней; period_users - сумма уникальных пользователей по дням.
+    """
+    period = _rollup_sums(db, start_date.date(), end_date.date())
+    previous = _rollup_sums(db, previous_start.date(), start_date.date(), last_exclusive=True)
+    return SimpleNamespace(
+        period_count=int(period.transactions),
+        previous_count=int(previous.transactions),
+        period_revenue=float(period.revenue),
+        previous_revenue=float(previous.revenue),
+        period_avg=float(period.revenue) / period.orders if period.orders else 0.0,
+        previous_avg=float(previous.revenue) / previous.orders if previous.orders else 0.0,
+        period_users=int(period.active_users),
+        completed=int(period.completed),
+        processing=int(period.processing),
+        cancelled=int(period.cancelled),
+    )
+
+
 # ==================== KPIs ====================
 
 def get_kpis(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, period_days: int = 7) -> KPIsResponse:
@@ -50,219 +334,122 @@ def get_kpis(db: Session, start_date: Optional[datetime] = None, end_date: Optio
     start_date, end_date = get_date_range(start_date, end_date, period_days)
     previous_start = start_date - (end_date - start_date)
     
-    # Всего пользователей
-    total_users = db.query(func.count(User.id)).scalar() or 0
-    total_users_previous = db.query(func.count(User.id)).filter(
-        User.created_at < previous_start
-    ).scalar() or 0
-    total_users_period = db.query(func.count(User.id)).filter(
-        User.created_at >= start_date,
-        User.created_at <= end_date
-    ).scalar() or 0
-    
-    # Активные пользователи (за период) - используем left join для пользователей без UserExtended
-    active_users = db.query(func.count(func.distinct(User.id))).outerjoin(
-        UserExtended, User.id == UserExtended.user_id
-    ).filter(
-        User.is_active == True,
-        User.is_blocked == False,
-        or_(
-            UserExtended.updated_at >= start_date,
-            UserExtended.id == None  # Пользователи без UserExtended считаем активными если они активны
-        )
-    ).scalar() or 0
+    users = get_user_aggregates(db, previous_start, start_date, end_date)
+    transactions = get_transaction_aggregates(db, previous_start, start_date, end_date)
     
-    active_users_previous = db.query(func.count(func.distinct(User.id))).outerjoin(
-        UserExtended, User.id == UserExtended.user_id
-    ).filter(
-        User.is_active == True,
-        User.is_blocked == False,
-        or_(
-            and_(
-                UserExtended.updated_at >= previous_start,
-                UserExtended.updated_at < start_date
-            ),
-            UserExtended.id == None
-        )
-    ).scalar() or 0
-    
-    active_users_period = db.query(func.count(func.distinct(User.id))).outerjoin(
-        UserExtended, User.id == UserExtended.user_id
-    ).filter(
-        User.is_active == True,
-        User.is_blocked == False,
-        or_(
-            and_(
-                UserExtended.updated_at >= start_date,
-                UserExtended.updated_at <= end_date
-            ),
-            UserExtended.id == None
-        )
-    ).scalar() or 0
+    total_users, total_users_previous = users.total or 0, users.total_previous or 0
+    active_users, active_users_previous = users.active or 0, users.active_previous or 0
     
     # Всего запросов (транзакций)
-    total_requests = db.query(func.count(Transaction.id)).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date
-    ).scalar() or 0
-    
-    total_requests_previous = db.query(func.count(Transaction.id)).filter(
-        Transaction.created_at >= previous_start,
-        Transaction.created_at < start_date
-    ).scalar() or 0
-    
-    total_requests_period = total_requests
+    total_requests = transactions.period_count or 0
+    total_requests_previous = transactions.previous_count or 0
     
     # Выручка
-    revenue = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date,
-        Transaction.amount > 0
-    ).scalar() or 0.0
-    
-    revenue_previous = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(
-        Transaction.created_at >= previous_start,
-        Transaction.created_at < start_date,
-        Transaction.amount > 0
-    ).scalar() or 0.0
-    
-    revenue_period = revenue
+    revenue = float(transactions.period_revenue or 0)
+    revenue_previous = float(transactions.previous_revenue or 0)
     
     return KPIsResponse(
         total_users=KPIValue(
             value=float(total_users),
             change_percent=calculate_change_percent(total_users, total_users_previous),
             change_value=float(total_users - total_users_previous),
-            period_value=float(total_users_period)
+            period_value=float(users.total_period or 0)
         ),
         active_users=KPIValue(
             value=float(active_users),
             change_percent=calculate_change_percent(active_users, active_users_previous),
             change_value=float(active_users - active_users_previous),
-            period_value=float(active_users_period)
+            period_value=float(users.active_period or 0)
         ),
         total_requests=KPIValue(
             value=float(total_requests),
             change_percent=calculate_change_percent(total_requests, total_requests_previous),
             change_value=float(total_requests - total_requests_previous),
-            period_value=float(total_requests_period)
+            period_value=float(total_requests)
         ),
         revenue=KPIValue(
-            value=float(revenue),
+            value=revenue,
             change_percent=calculate_change_percent(revenue, revenue_previous),
             change_value=float(revenue - revenue_previous),
-            period_value=float(revenue_period)
+            period_value=revenue
         )
     )
 
 
 # ==================== Category Metrics ====================
 
+def build_category_metrics(counts: Dict[str, Tuple[int, int, int]]) -> CategoryMetricsResponse:
+    """Метрики по категориям из счетчиков get_category_counts"""
+    return CategoryMetricsResponse(**{
+        key: CategoryMetric(total=total, active=active, change=added)
+        for key, (total, active, added) in counts.items()
+    })
+
+
 def get_category_metrics(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> CategoryMetricsResponse:
     """Получение метрик по категориям"""
     start_date, end_date = get_date_range(start_date, end_date)
-    previous_start = start_date - (end_date - start_date)
-    
-    # Заправки
-    gas_total = db.query(func.count(GasStation.id)).scalar() or 0
-    gas_active = db.query(func.count(GasStation.id)).filter(
-        GasStation.status == StationStatus.APPROVED
-    ).scalar() or 0
-    gas_change = db.query(func.count(GasStation.id)).filter(
-        GasStation.created_at >= start_date,
-        GasStation.created_at <= end_date
-    ).scalar() or 0
-    
-    # Рестораны
-    restaurant_total = db.query(func.count(Restaurant.id)).scalar() or 0
-    restaurant_active = db.query(func.count(Restaurant.id)).filter(
-        Restaurant.status == RestaurantStatus.APPROVED
-    ).scalar() or 0
-    restaurant_change = db.query(func.count(Restaurant.id)).filter(
-        Restaurant.created_at >= start_date,
-        Restaurant.created_at <= end_date
-    ).scalar() or 0
-    
-    # СТО
-    service_total = db.query(func.count(ServiceStation.id)).scalar() or 0
-    service_active = db.query(func.count(ServiceStation.id)).filter(
-        ServiceStation.status == ServiceStationStatus.APPROVED
-    ).scalar() or 0
-    service_change = db.query(func.count(ServiceStation.id)).filter(
-        ServiceStation.created_at >= start_date,
-        ServiceStation.created_at <= end_date
-    ).scalar() or 0
-    
-    # Автомойки
-    car_wash_total = db.query(func.count(CarWash.id)).scalar() or 0
-    car_wash_active = db.query(func.count(CarWash.id)).filter(
-        CarWash.status == CarWashStatus.APPROVED
-    ).scalar() or 0
-    car_wash_change = db.query(func.count(CarWash.id)).filter(
-        CarWash.created_at >= start_date,
-        CarWash.created_at <= end_date
-    ).scalar() or 0
-    
-    # Электрозаправки
-    electric_total = db.query(func.count(ElectricStation.id)).scalar() or 0
-    electric_active = db.query(func.count(ElectricStation.id)).filter(
-        ElectricStation.status == ElectricStationStatus.APPROVED
-    ).scalar() or 0
-    electric_change = db.query(func.count(ElectricStation.id)).filter(
-        ElectricStation.created_at >= start_date,
-        ElectricStation.created_at <= end_date
-    ).scalar() or 0
-    
-    return CategoryMetricsResponse(
-        gas_stations=CategoryMetric(total=gas_total, active=gas_active, change=gas_change),
-        restaurants=CategoryMetric(total=restaurant_total, active=restaurant_active, change=restaurant_change),
-        service_stations=CategoryMetric(total=service_total, active=service_active, change=service_change),
-        car_washes=CategoryMetric(total=car_wash_total, active=car_wash_active, change=car_wash_change),
-        electric_stations=CategoryMetric(total=electric_total, active=electric_active, change=electric_change)
-    )
+    return build_category_metrics(get_category_counts(db, start_date, end_date))
 
 
 # ==================== Charts ====================
 
-def get_revenue_chart(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, period_days: int = 7) -> RevenueChartResponse:
-    """График выручки"""
-    start_date, end_date = get_date_range(start_date, end_date, period_days)
-    
-    # Группируем по дням или часам в зависимости от периода
+def _chart_buckets(start_date: datetime, end_date: datetime) -> Tuple[bool, List[str], list]:
+    """Режим графика (по часам или по дням), подписи и ключи интервалов"""
     if (end_date - start_date).days <= 1:
         # По часам
-        group_by = extract('hour', Transaction.created_at)
-        labels = [f"{i}ч" for i in range(24)]
-        period_keys = list(range(24))
+        return True, [f"{i}ч" for i in range(24)], list(range(24))
+    # По дням
+    days = (end_date - start_date).days + 1
+    labels = [f"{i}д" for i in range(1, days + 1)]
+    # Генерируем список дат для ключей
+    period_keys = [(start_date + timedelta(days=i)).date() for i in range(days)]
+    return False, labels, period_keys
+
+
+def _rollup_series(db: Session, start_date: datetime, end_date: datetime, fields: List[str]) -> Tuple[List[str], list, Dict]:
+    """
+    Значения полей агрегатов по интервалам графика
+    
+    Возвращает (подписи, ключи интервалов, {ключ: строка с полями})
+    """
+    by_hour, labels, period_keys = _chart_buckets(start_date, end_date)
+    
+    if by_hour:
+        group_by = extract('hour', HourlyStatisticsRollup.hour)
+        rows = db.query(
+            group_by.label('period'),
+            *[func.sum(getattr(HourlyStatisticsRollup, field)).label(field) for field in fields]
+        ).filter(
+            HourlyStatisticsRollup.hour >= _floor_hour(start_date),
+            HourlyStatisticsRollup.hour <= end_date.replace(tzinfo=None)
+        ).group_by(group_by).all()
+        data = {int(row.period): row for row in rows}
     else:
-        # По дням
-        group_by = func.date(Transaction.created_at)
-        days = (end_date - start_date).days + 1
-        labels = [f"{i}д" for i in range(1, days + 1)]
-        # Генерируем список дат для ключей
-        period_keys = [(start_date + timedelta(days=i)).date() for i in range(days)]
-    
-    # Выручка
-    revenue_data = db.query(
-        group_by.label('period'),
-        func.coalesce(func.sum(Transaction.amount), 0).label('revenue'),
-        func.count(Transaction.id).label('orders')
-    ).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date,
-        Transaction.amount > 0
-    ).group_by(group_by).all()
+        rows = db.query(
+            DailyStatisticsRollup.day.label('period'),
+            *[getattr(DailyStatisticsRollup, field).label(field) for field in fields]
+        ).filter(
+            DailyStatisticsRollup.day >= start_date.date(),
+            DailyStatisticsRollup.day <= end_date.date()
+        ).all()
+        data = {_as_date(row.period): row for row in rows}
     
-    # Создаем словари для быстрого доступа
-    revenue_dict = {row.period: row.revenue for row in revenue_data}
-    orders_dict = {row.period: row.orders for row in revenue_data}
+    return labels, period_keys, data
+
+
+def get_revenue_chart(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, period_days: int = 7) -> RevenueChartResponse:
+    """График выручки (из агрегатов по часам или дням в зависимости от периода)"""
+    start_date, end_date = get_date_range(start_date, end_date, period_days)
+    labels, period_keys, data = _rollup_series(db, start_date, end_date, ["revenue", "orders"])
     
     # Заполняем массивы, сопоставляя ключи с метками
     revenue = []
     orders = []
     for key in period_keys:
-        revenue.append(float(revenue_dict.get(key, 0)))
-        orders.append(int(orders_dict.get(key, 0)))
+        row = data.get(key)
+        revenue.append(float(row.revenue or 0) if row else 0.0)
+        orders.append(int(row.orders or 0) if row else 0)
     
     return RevenueChartResponse(
         labels=labels,
@@ -272,29 +459,11 @@ def get_revenue_chart(db: Session, start_date: Optional[datetime] = None, end_da
 
 
 def get_new_users_chart(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, period_days: int = 7) -> NewUsersChartResponse:
-    """График новых пользователей"""
+    """График новых пользователей (из агрегатов)"""
     start_date, end_date = get_date_range(start_date, end_date, period_days)
+    labels, period_keys, data = _rollup_series(db, start_date, end_date, ["new_users"])
     
-    if (end_date - start_date).days <= 1:
-        group_by = extract('hour', User.created_at)
-        labels = [f"{i}ч" for i in range(24)]
-        period_keys = list(range(24))
-    else:
-        group_by = func.date(User.created_at)
-        days = (end_date - start_date).days + 1
-        labels = [f"{i}д" for i in range(1, days + 1)]
-        period_keys = [(start_date + timedelta(days=i)).date() for i in range(days)]
-    
-    users_data = db.query(
-        group_by.label('period'),
-        func.count(User.id).label('count')
-    ).filter(
-        User.created_at >= start_date,
-        User.created_at <= end_date
-    ).group_by(group_by).all()
-    
-    users_dict = {row.period: row.count for row in users_data}
-    users = [int(users_dict.get(key, 0)) for key in period_keys]
+    users = [int(data[key].new_users or 0) if key in data else 0 for key in period_keys]
     
     return NewUsersChartResponse(
         labels=labels,
@@ -303,22 +472,26 @@ def get_new_users_chart(db: Session, start_date: Optional[datetime] = None, end_
 
 
 def get_user_activity_chart(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> UserActivityChartResponse:
-    """График активности пользователей"""
+    """
+    График активности пользователей по часам дня (из часовых агрегатов)
+    
+    Значение часа - сумма уникальных пользователей этого часа по дням периода
+    """
     start_date, end_date = get_date_range(start_date, end_date)
     
-    # Группируем по часам дня
+    hour_of_day = extract('hour', HourlyStatisticsRollup.hour)
     activity_data = db.query(
-        extract('hour', Transaction.created_at).label('hour'),
-        func.count(func.distinct(Transaction.user_id)).label('activity')
+        hour_of_day.label('hour'),
+        func.sum(HourlyStatisticsRollup.active_users).label('activity')
     ).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date
-    ).group_by(extract('hour', Transaction.created_at)).all()
+        HourlyStatisticsRollup.hour >= _floor_hour(start_date),
+        HourlyStatisticsRollup.hour <= end_date.replace(tzinfo=None)
+    ).group_by(hour_of_day).all()
     
     # Создаем массив для 24 часов
-    activity_dict = {row.hour: row.activity for row in activity_data}
+    activity_dict = {int(row.hour): row.activity for row in activity_data}
     labels = [f"{i:02d}:00" for i in range(24)]
-    activity = [int(activity_dict.get(i, 0)) for i in range(24)]
+    activity = [int(activity_dict.get(i) or 0) for i in range(24)]
     
     return UserActivityChartResponse(
         labels=labels,
@@ -326,27 +499,13 @@ def get_user_activity_chart(db: Session, start_date: Optional[datetime] = None,
     )
 
 
-def get_category_distribution(db: Session) -> CategoryDistributionResponse:
-    """Распределение по категориям"""
-    gas_count = db.query(func.count(GasStation.id)).filter(
-        GasStation.status == StationStatus.APPROVED
-    ).scalar() or 0
-    
-    restaurant_count = db.query(func.count(Restaurant.id)).filter(
-        Restaurant.status == RestaurantStatus.APPROVED
-    ).scalar() or 0
-    
-    service_count = db.query(func.count(ServiceStation.id)).filter(
-        ServiceStation.status == ServiceStationStatus.APPROVED
-    ).scalar() or 0
-    
-    car_wash_count = db.query(func.count(CarWash.id)).filter(
-        CarWash.status == CarWashStatus.APPROVED
-    ).scalar() or 0
-    
-    electric_count = db.query(func.count(ElectricStation.id)).filter(
-        ElectricStation.status == ElectricStationStatus.APPROVED
-    ).scalar() or 0
+def build_category_distribution(counts: Dict[str, Tuple[int, int, int]]) -> CategoryDistributionResponse:
+    """Распределение по категориям из счетчиков get_category_counts"""
+    gas_count = counts["gas_stations"][1]
+    restaurant_count = counts["restaurants"][1]
+    service_count = counts["service_stations"][1]
+    car_wash_count = counts["car_washes"][1]
+    electric_count = counts["electric_stations"][1]
     
     total = gas_count + restaurant_count + service_count + car_wash_count + electric_count
     
@@ -388,19 +547,28 @@ def get_category_distribution(db: Session) -> CategoryDistributionResponse:
     return CategoryDistributionResponse(categories=categories)
 
 
+def get_category_distribution(db: Session) -> CategoryDistributionResponse:
+    """Распределение по категориям"""
+    start_date, end_date = get_date_range(None, None)
+    return build_category_distribution(get_category_counts(db, start_date, end_date))
+
+
 # ==================== Transactions ====================
 
 def get_latest_transactions(db: Session, limit: int = 5) -> LatestTransactionsResponse:
-    """Последние транзакции"""
-    transactions = db.query(Transaction).join(
+    """Последние транзакции (имя и телефон пользователя - в том же запросе)"""
+    rows = db.query(
+        Transaction,
+        UserExtended.name.label('user_name'),
+        UserExtended.phone.label('user_phone')
+    ).join(
         UserExtended, Transaction.user_id == UserExtended.id
     ).order_by(
         Transaction.created_at.desc()
     ).limit(limit).all()
     
     transaction_list = []
-    for t in transactions:
-        user_extended = db.query(UserExtended).filter(UserExtended.id == t.user_id).first()
+    for t, user_name, user_phone in rows:
         # Определяем тип категории из extra_data
         category_type = "Другое"
         if t.extra_data:
@@ -424,8 +592,8 @@ def get_latest_transactions(db: Session, limit: int = 5) -> LatestTransactionsRe
         
         transaction_list.append(TransactionListItem(
             id=t.id,
-            user_name=user_extended.name if user_extended else "Неизвестно",
-            user_phone=user_extended.phone if user_extended else "",
+            user_name=user_name or "Неизвестно",
+            user_phone=user_phone or "",
             type=category_type,
             amount=abs(t.amount),
             status=status,
@@ -442,8 +610,8 @@ def get_latest_transactions(db: Session, limit: int = 5) -> LatestTransactionsRe
 
 # ==================== Category Completeness ====================
 
-def get_category_completeness(db: Session) -> CategoryCompletenessResponse:
-    """Заполненность категорий"""
+def build_category_completeness(counts: Dict[str, Tuple[int, int, int]]) -> CategoryCompletenessResponse:
+    """Заполненность категорий из счетчиков get_category_counts"""
     # Целевые значения (можно сделать настраиваемыми)
     targets = {
         "Заправки": 150,
@@ -453,25 +621,11 @@ def get_category_completeness(db: Session) -> CategoryCompletenessResponse:
         "Электрозаправки": 40
     }
     
-    gas_current = db.query(func.count(GasStation.id)).filter(
-        GasStation.status == StationStatus.APPROVED
-    ).scalar() or 0
-    
-    restaurant_current = db.query(func.count(Restaurant.id)).filter(
-        Restaurant.status == RestaurantStatus.APPROVED
-    ).scalar() or 0
-    
-    service_current = db.query(func.count(ServiceStation.id)).filter(
-        ServiceStation.status == ServiceStationStatus.APPROVED
-    ).scalar() or 0
-    
-    car_wash_current = db.query(func.count(CarWash.id)).filter(
-        CarWash.status == CarWashStatus.APPROVED
-    ).scalar() or 0
-    
-    electric_current = db.query(func.count(ElectricStation.id)).filter(
-        ElectricStation.status == ElectricStationStatus.APPROVED
-    ).scalar() or 0
+    gas_current = counts["gas_stations"][1]
+    restaurant_current = counts["restaurants"][1]
+    service_current = counts["service_stations"][1]
+    car_wash_current = counts["car_washes"][1]
+    electric_current = counts["electric_stations"][1]
     
     categories = [
         CategoryCompletenessItem(
@@ -509,89 +663,80 @@ def get_category_completeness(db: Session) -> CategoryCompletenessResponse:
     return CategoryCompletenessResponse(categories=categories)
 
 
+def get_category_completeness(db: Session) -> CategoryCompletenessResponse:
+    """Заполненность категорий"""
+    start_date, end_date = get_date_range(None, None)
+    return build_category_completeness(get_category_counts(db, start_date, end_date))
+
+
 # ==================== Recent Actions ====================
 
+# Описания действий ленты; {label} - имя пользователя или заведения
+RECENT_ACTION_DESCRIPTIONS = {
+    "user_registered": "Новый пользователь зарегистрирован: {label}",
+    "gas_station_added": "Добавлена новая заправка: {label}",
+    "restaurant_added": "Добавлен новый ресторан: {label}",
+    "fuel_price_updated": "Обновлены цены на топливо",
+    "review_added": "Новый отзыв добавлен",
+}
+
+
 def get_recent_actions(db: Session, limit: int = 5) -> RecentActionsResponse:
-    """Последние действия"""
-    # Собираем действия из разных источников
-    actions = []
-    
-    # Новые пользователи
-    new_users = db.query(User).order_by(User.created_at.desc()).limit(limit * 2).all()
-    for user in new_users:
-        time_ago = get_time_ago(user.created_at)
-        actions.append(RecentAction(
-            id=user.id,
-            action_type="user_registered",
-            description=f"Новый пользователь зарегистрирован: {user.fullname or user.phone_number}",
-            created_at=user.created_at,
-            time_ago=time_ago
-        ))
-    
-    # Новые заправки
-    new_stations = db.query(GasStation).order_by(GasStation.created_at.desc()).limit(limit * 2).all()
-    for station in new_stations:
-        time_ago = get_time_ago(station.created_at)
-        actions.append(RecentAction(
-            id=station.id,
-            action_type="gas_station_added",
-            description=f"Добавлена новая заправка: {station.name}",
-            created_at=station.created_at,
-            time_ago=time_ago
-        ))
-    
-    # Новые рестораны
-    new_restaurants = db.query(Restaurant).order_by(Restaurant.created_at.desc()).limit(limit).all()
-    for restaurant in new_restaurants:
-        time_ago = get_time_ago(restaurant.created_at)
-        actions.append(RecentAction(
-            id=restaurant.id,
-            action_type="restaurant_added",
-            description=f"Добавлен новый ресторан: {restaurant.name}",
-            created_at=restaurant.created_at,
-            time_ago=time_ago
-        ))
-    
-    # Обновления цен на топливо (из транзакций с типом fuel_price_update)
-    fuel_updates = db.query(Transaction).filter(
-        Transaction.type == "fuel_price_update"
-    ).order_by(Transaction.created_at.desc()).limit(limit).all()
-    
-    for update in fuel_updates:
-        time_ago = get_time_ago(update.created_at)
-        actions.append(RecentAction(
-            id=update.id,
-            action_type="fuel_price_updated",
-            description="Обновлены цены на топливо",
-            created_at=update.created_at,
-            time_ago=time_ago
-        ))
+    """
+    Последние действия
     
-    # Новые отзывы
-    try:
-        from app.models.gas_station import Review as GasReview
-        new_reviews = db.query(GasReview).order_by(GasReview.created_at.desc()).limit(limit).all()
-        for review in new_reviews:
-            time_ago = get_time_ago(review.created_at)
-            actions.append(RecentAction(
-                id=review.id,
-                action_type="review_added",
-                description=f"Новый отзыв добавлен",
-                created_at=review.created_at,
-                time_ago=time_ago
-            ))
-    except Exception:
-        pass  # Пропускаем если нет отзывов
-    
-    # Сортируем по дате и берем последние
-    actions.sort(key=lambda x: x.created_at, reverse=True)
-    actions = actions[:limit]
+    Лента собирается одним запросом UNION ALL из нескольких источников;
+    каждая ветка берет не больше limit последних строк по индексу created_at,
+    итоговые limit отбираются в БД
+    """
+    from app.models.gas_station import Review as GasReview
     
-    total = len(actions)
+    def branch(action_type: str, id_column, label, created_at_column, *filters):
+        query = select(
+            id_column.label('id'),
+            literal(action_type).label('action_type'),
+            label.label('label'),
+            created_at_column.label('created_at')
+        )
+        if filters:
+            query = query.where(*filters)
+        subquery = query.order_by(created_at_column.desc()).limit(limit).subquery()
+        return select(subquery.c.id, subquery.c.action_type, subquery.c.label, subquery.c.created_at)
+    
+    feed = union_all(
+        # Новые пользователи
+        branch("user_registered", User.id, func.coalesce(User.fullname, User.phone_number), User.created_at),
+        # Новые заправки
+        branch("gas_station_added", GasStation.id, GasStation.name, GasStation.created_at),
+        # Новые рестораны
+        branch("restaurant_added", Restaurant.id, Restaurant.name, Restaurant.created_at),
+        # Обновления цен на топливо (из транзакций с типом fuel_price_update)
+        branch(
+            "fuel_price_updated", Transaction.id, literal(None, String), Transaction.created_at,
+            Transaction.type == "fuel_price_update"
+        ),
+        # Новые отзывы
+        branch("review_added", GasReview.id, literal(None, String), GasReview.created_at),
+    ).subquery()
+    
+    rows = db.execute(
+        select(feed).order_by(feed.c.created_at.desc()).limit(limit)
+    ).all()
+    
+    actions = [
+        RecentAction(
+            id=row.id,
+            action_type=row.action_type,
+            description=RECENT_ACTION_DESCRIPTIONS[row.action_type].format(label=row.label),
+            created_at=row.created_at,
+            time_ago=get_time_ago(row.created_at)
+        )
+        for row in rows
+    ]
     
     return RecentActionsResponse(
         actions=actions,
-        total=total
+        total=len(actions)
     )
 
 
@@ -626,33 +771,12 @@ def get_time_ago(dt: datetime) -> str:
 
 # ==================== Order Statistics ====================
 
-def get_order_statistics(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> OrderStatisticsResponse:
-    """Статистика заказов"""
-    start_date, end_date = get_date_range(start_date, end_date)
-    
-    total_orders = db.query(func.count(Transaction.id)).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date
-    ).scalar() or 0
-    
-    completed = db.query(func.count(Transaction.id)).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date,
-        Transaction.type == "purchase",
-        Transaction.amount > 0
-    ).scalar() or 0
-    
-    processing = db.query(func.count(Transaction.id)).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date,
-        Transaction.type.in_(["pending", "processing"])
-    ).scalar() or 0
-    
-    cancelled = db.query(func.count(Transaction.id)).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date,
-        Transaction.type.in_(["cancelled", "refunded"])
-    ).scalar() or 0
+def build_order_statistics(transactions) -> OrderStatisticsResponse:
+    """Статистика заказов из агрегатов транзакций (get_rollup_aggregates)"""
+    total_orders = transactions.period_count or 0
+    completed = transactions.completed or 0
+    processing = transactions.processing or 0
+    cancelled = transactions.cancelled or 0
     
     statuses = []
     if total_orders > 0:
@@ -680,53 +804,45 @@ def get_order_statistics(db: Session, start_date: Optional[datetime] = None, end
     )
 
 
-# ==================== System Activity ====================
-
-def get_system_activity(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> SystemActivityResponse:
-    """Активность системы"""
+def get_order_statistics(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> OrderStatisticsResponse:
+    """Статистика заказов"""
     start_date, end_date = get_date_range(start_date, end_date)
     previous_start = start_date - (end_date - start_date)
+    return build_order_statistics(get_rollup_aggregates(db, previous_start, start_date, end_date))
+
+
+# ==================== System Activity ====================
+
+def build_system_activity(db: Session, transactions) -> SystemActivityResponse:
+    """Активность системы из агрегатов транзакций (get_rollup_aggregates)"""
+    from app.models.gas_station import Review as GasReview
+    from app.models.restaurant import RestaurantReview
     
     # Общая активность (транзакции)
-    total_activity = db.query(func.count(Transaction.id)).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date
-    ).scalar() or 0
-    
-    total_activity_previous = db.query(func.count(Transaction.id)).filter(
-        Transaction.created_at >= previous_start,
-        Transaction.created_at < start_date
-    ).scalar() or 0
+    total_activity = transactions.period_count or 0
+    total_activity_previous = transactions.previous_count or 0
     
     # Средний чек
-    avg_check = db.query(func.coalesce(func.avg(Transaction.amount), 0)).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date,
-        Transaction.amount > 0
-    ).scalar() or 0.0
+    avg_check = float(transactions.period_avg or 0)
+    avg_check_previous = float(transactions.previous_avg or 0)
     
-    avg_check_previous = db.query(func.coalesce(func.avg(Transaction.amount), 0)).filter(
-        Transaction.created_at >= previous_start,
-        Transaction.created_at < start_date,
-        Transaction.amount > 0
-    ).scalar() or 0.0
+    # Всего пользователей и средние рейтинги отзывов одним запросом
+    totals = db.query(
+        select(func.count(User.id)).scalar_subquery().label("users"),
+        select(func.coalesce(func.avg(GasReview.rating), 0)).scalar_subquery().label("gas_rating"),
+        select(func.coalesce(func.avg(RestaurantReview.rating), 0)).scalar_subquery().label("restaurant_rating"),
+    ).one()
     
     # Конверсия (процент пользователей, совершивших транзакцию)
-    total_users = db.query(func.count(User.id)).scalar() or 1
-    users_with_transactions = db.query(func.count(func.distinct(Transaction.user_id))).filter(
-        Transaction.created_at >= start_date,
-        Transaction.created_at <= end_date
-    ).scalar() or 0
-    
+    total_users = totals.users or 1
+    # Сумма по дням может учесть пользователя несколько раз - ограничиваем общим числом
+    users_with_transactions = min(transactions.period_users or 0, total_users)
     conversion = (users_with_transactions / total_users) * 100 if total_users > 0 else 0.0
     
     # Удовлетворенность (средний рейтинг из отзывов)
-    from app.models.gas_station import Review as GasReview
-    from app.models.restaurant import RestaurantReview
-    
-    satisfaction = db.query(func.coalesce(func.avg(GasReview.rating), 0)).scalar() or 0.0
+    satisfaction = totals.gas_rating or 0.0
     if satisfaction == 0:
-        satisfaction = db.query(func.coalesce(func.avg(RestaurantReview.rating), 0)).scalar() or 0.0
+        satisfaction = totals.restaurant_rating or 0.0
     
     return SystemActivityResponse(
         total_activity=KPIValue(
@@ -735,7 +851,7 @@ def get_system_activity(db: Session, start_date: Optional[datetime] = None, end_
             change_value=float(total_activity - total_activity_previous)
         ),
         average_check=KPIValue(
-            value=float(avg_check),
+            value=avg_check,
             change_percent=calculate_change_percent(avg_check, avg_check_previous),
             change_value=float(avg_check - avg_check_previous)
         ),
@@ -743,3 +859,39 @@ def get_system_activity(db: Session, start_date: Optional[datetime] = None, end_
         satisfaction=float(satisfaction)
     )
 
+
+def get_system_activity(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> SystemActivityResponse:
+    """Активность системы"""
+    start_date, end_date = get_date_range(start_date, end_date)
+    previous_start = start_date - (end_date - start_date)
+    return build_system_activity(db, get_rollup_aggregates(db, previous_start, start_date, end_date))
+
+
+# ==================== Dashboard Sections ====================
+# Независимые части дашборда; каждая выполняется в своей сессии (соединении)
+
+def get_category_sections(
+    db: Session,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Tuple[CategoryMetricsResponse, CategoryDistributionResponse, CategoryCompletenessResponse]:
+    """Метрики, распределение и заполненность категорий по одному запросу"""
+    start_date, end_date = get_date_range(start_date, end_date)
+    counts = get_category_counts(db, start_date, end_date)
+    return (
+        build_category_metrics(counts),
+        build_category_distribution(counts),
+        build_category_completeness(counts),
+    )
+
+
+def get_activity_sections(
+    db: Session,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Tuple[OrderStatisticsResponse, SystemActivityResponse]:
+    """Статистика заказов и активность системы по одним дневным агрегатам"""
+    start_date, end_date = get_date_range(start_date, end_date)
+    previous_start = start_date - (end_date - start_date)
+    transactions = get_rollup_aggregates(db, previous_start, start_date, end_date)
+    return build_order_statistics(transactions), build_system_activity(db, transactions)
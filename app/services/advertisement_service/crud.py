@@ -1,15 +1,35 @@
 """
 CRUD операции для Advertisement Service
 """
-from typing import Optional, List, Tuple
-from datetime import datetime, timedelta
+import logging
+import threading
+from typing import Optional, List, Tuple, Dict
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func as sql_func, distinct
+from sqlalchemy import and_, or_, func as sql_func, distinct, insert, update, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.hyperloglog import HyperLogLog
+from app.core.archive import (
+    month_start,
+    add_months,
+    hot_cutoff,
+    move_to_archive,
+    archived_months,
+    drop_month,
+)
+from app.services.advertisement_service.serving_index import advertisement_index, IndexedAdvertisement
+from app.services.advertisement_service.selection import advertisement_selector
 
 from app.models.advertisement import (
     Advertisement,
     AdvertisementView,
     AdvertisementClick,
+    AdvertisementDailyStats,
+    AdvertisementViewArchive,
+    AdvertisementClickArchive,
     AdvertisementType,
     AdvertisementStatus,
     AdvertisementPosition,
@@ -22,9 +42,27 @@ from app.schemas.advertisement import (
     AdvertisementClickCreate,
 )
 
+logger = logging.getLogger(__name__)
+
 
 # ==================== Advertisement CRUD ====================
 
+def rebuild_serving_state(db: Session):
+    """Построение индекса выдачи и синхронизация пейсинга с дневными счетчиками"""
+    advertisement_index.rebuild(db)
+    advertisement_selector.sync_pacing(db)
+
+
+def refresh_advertisement_index(db: Session):
+    """Перестроение индекса выдачи после изменения рекламы"""
+    try:
+        rebuild_serving_state(db)
+    except Exception as e:
+        # Индекс перестроится при следующем запросе выдачи
+        logger.error(f"Advertisement index rebuild error: {str(e)}")
+        advertisement_index.invalidate()
+
+
 def create_advertisement(
     db: Session,
     advertisement_data: AdvertisementCreate,
@@ -38,6 +76,7 @@ def create_advertisement(
     db.add(db_advertisement)
     db.commit()
     db.refresh(db_advertisement)
+    refresh_advertisement_index(db)
     return db_advertisement
 
 
@@ -103,43 +142,59 @@ def get_active_advertisements_for_position(
     position: AdvertisementPosition,
     user_id: Optional[int] = None,
     target_audience: Optional[str] = None
-) -> List[Advertisement]:
-    """Получение активных реклам для определенной позиции"""
-    now = datetime.utcnow()
+) -> List[IndexedAdvertisement]:
+    """
+    Получение активных реклам для определенной позиции
     
-    query = db.query(Advertisement).filter(
-        and_(
-            Advertisement.status == AdvertisementStatus.ACTIVE,
-            Advertisement.is_active == True,
-            Advertisement.position == position.value,
-            or_(
-                Advertisement.start_date.is_(None),
-                Advertisement.start_date <= now
-            ),
-            or_(
-                Advertisement.end_date.is_(None),
-                Advertisement.end_date >= now
-            )
-        )
-    )
-    
-    # Фильтр по целевой аудитории
-    if target_audience:
-        query = query.filter(
-            or_(
-                Advertisement.target_audience.is_(None),
-                Advertisement.target_audience == target_audience,
-                Advertisement.target_audience == "all"
-            )
-        )
-    
-    # Сортируем по приоритету и порядку
-    advertisements = query.order_by(
-        Advertisement.priority.desc(),
-        Advertisement.display_order.asc()
-    ).all()
+    Выдача идет из индекса в памяти; БД запрашивается только для
+    построения индекса (первый запрос или после сброса).
+    """
+    if not advertisement_index.ready:
+        rebuild_serving_state(db)
+    return advertisement_index.lookup(position, target_audience=target_audience)
+
+
+def advertisement_exists(db: Session, advertisement_id: int) -> bool:
+    """
+    Проверка рекламы перед приемом просмотра или клика
     
-    return advertisements
+    Реклама из построенного индекса принимается без БД. Индекс содержит
+    только выдаваемые рекламы, поэтому остальные (приостановленные,
+    закончившиеся, пока пользователь их смотрел) проверяются по БД.
+    """
+    if advertisement_index.ready and advertisement_index.get(advertisement_id) is not None:
+        return True
+    return get_advertisement_by_id(db, advertisement_id) is not None
+
+
+def select_advertisements_for_position(
+    db: Session,
+    position: AdvertisementPosition,
+    limit: int,
+    user_key: Optional[str] = None,
+    target_audience: Optional[str] = None,
+    device_type: Optional[str] = None,
+    app_version: Optional[str] = None
+) -> List[IndexedAdvertisement]:
+    """Выбор top-k реклам позиции с учетом приоритета, частотных ограничений и пейсинга"""
+    candidates = get_active_advertisements_for_position(db, position, target_audience=target_audience)
+    return advertisement_selector.select(
+        candidates,
+        limit,
+        user_key=user_key,
+        device_type=device_type,
+        app_version=app_version
+    )
+
+
+def record_served_view(advertisement_id: int, user_key: Optional[str]):
+    """Учет просмотра для частотных ограничений и пейсинга (в памяти)"""
+    entry = advertisement_index.get(advertisement_id)
+    advertisement_selector.record_view(
+        advertisement_id,
+        user_key,
+        entry.show_conditions if entry else None
+    )
 
 
 def update_advertisement(
@@ -158,6 +213,7 @@ def update_advertisement(
     
     db.commit()
     db.refresh(advertisement)
+    refresh_advertisement_index(db)
     return advertisement
 
 
@@ -169,23 +225,26 @@ def delete_advertisement(db: Session, advertisement_id: int) -> bool:
     
     db.delete(advertisement)
     db.commit()
+    refresh_advertisement_index(db)
     return True
 
 
-def increment_views_count(db: Session, advertisement_id: int):
-    """Увеличение счетчика просмотров"""
-    advertisement = get_advertisement_by_id(db, advertisement_id)
-    if advertisement:
-        advertisement.views_count += 1
-        db.commit()
+def increment_views_count(db: Session, advertisement_id: int, count: int = 1):
+    """Увеличение счетчика просмотров (атомарно в БД, без commit)"""
+    db.execute(
+        update(Advertisement)
+        .where(Advertisement.id == advertisement_id)
+        .values(views_count=Advertisement.views_count + count)
+    )
 
 
-def increment_clicks_count(db: Session, advertisement_id: int):
-    """Увеличение счетчика кликов"""
-    advertisement = get_advertisement_by_id(db, advertisement_id)
-    if advertisement:
-        advertisement.clicks_count += 1
-        db.commit()
+def increment_clicks_count(db: Session, advertisement_id: int, count: int = 1):
+    """Увеличение счетчика кликов (атомарно в БД, без commit)"""
+    db.execute(
+        update(Advertisement)
+        .where(Advertisement.id == advertisement_id)
+        .values(clicks_count=Advertisement.clicks_count + count)
+    )
 
 
 # ==================== Advertisement View CRUD ====================
@@ -209,6 +268,12 @@ def create_advertisement_view(
     
     # Увеличиваем счетчик просмотров
     increment_views_count(db, advertisement_id)
+    update_daily_stats(db, [{
+        "event": "view",
+        "advertisement_id": advertisement_id,
+        "user_id": user_id,
+        "occurred_at": datetime.now(timezone.utc),
+    }])
     
     db.commit()
     db.refresh(view)
@@ -220,14 +285,9 @@ def get_advertisement_views(
     advertisement_id: int,
     skip: int = 0,
     limit: int = 100
-) -> Tuple[List[AdvertisementView], int]:
-    """Получение просмотров рекламы"""
-    query = db.query(AdvertisementView).filter(
-        AdvertisementView.advertisement_id == advertisement_id
-    )
-    total = query.count()
-    views = query.order_by(AdvertisementView.viewed_at.desc()).offset(skip).limit(limit).all()
-    return views, total
+) -> Tuple[List[AdvertisementView], bool]:
+    """Получение просмотров рекламы (горячая таблица, затем архив) и признака следующей страницы"""
+    return _paginate_events(db, "view", advertisement_id, skip, limit)
 
 
 def get_unique_views_count(db: Session, advertisement_id: int) -> int:
@@ -247,13 +307,7 @@ def get_views_count_by_period(
     end_date: datetime
 ) -> int:
     """Получение количества просмотров за период"""
-    return db.query(AdvertisementView).filter(
-        and_(
-            AdvertisementView.advertisement_id == advertisement_id,
-            AdvertisementView.viewed_at >= start_date,
-            AdvertisementView.viewed_at <= end_date
-        )
-    ).count()
+    return _count_events_by_period(db, "view", advertisement_id, start_date, end_date)
 
 
 # ==================== Advertisement Click CRUD ====================
@@ -276,6 +330,12 @@ def create_advertisement_click(
     
     # Увеличиваем счетчик кликов
     increment_clicks_count(db, advertisement_id)
+    update_daily_stats(db, [{
+        "event": "click",
+        "advertisement_id": advertisement_id,
+        "user_id": user_id,
+        "occurred_at": datetime.now(timezone.utc),
+    }])
     
     db.commit()
     db.refresh(click)
@@ -287,14 +347,9 @@ def get_advertisement_clicks(
     advertisement_id: int,
     skip: int = 0,
     limit: int = 100
-) -> Tuple[List[AdvertisementClick], int]:
-    """Получение кликов по рекламе"""
-    query = db.query(AdvertisementClick).filter(
-        AdvertisementClick.advertisement_id == advertisement_id
-    )
-    total = query.count()
-    clicks = query.order_by(AdvertisementClick.clicked_at.desc()).offset(skip).limit(limit).all()
-    return clicks, total
+) -> Tuple[List[AdvertisementClick], bool]:
+    """Получение кликов по рекламе (горячая таблица, затем архив) и признака следующей страницы"""
+    return _paginate_events(db, "click", advertisement_id, skip, limit)
 
 
 def get_unique_clicks_count(db: Session, advertisement_id: int) -> int:
@@ -314,17 +369,388 @@ def get_clicks_count_by_period(
     end_date: datetime
 ) -> int:
     """Получение количества кликов за период"""
-    return db.query(AdvertisementClick).filter(
-        and_(
-            AdvertisementClick.advertisement_id == advertisement_id,
-            AdvertisementClick.clicked_at >= start_date,
-            AdvertisementClick.clicked_at <= end_date
+    return _count_events_by_period(db, "click", advertisement_id, start_date, end_date)
+
+
+# ==================== Archive ====================
+
+# Тип события: (архивная модель, поле времени)
+AD_EVENT_ARCHIVES = {
+    "view": (AdvertisementViewArchive, "viewed_at"),
+    "click": (AdvertisementClickArchive, "clicked_at"),
+}
+
+
+def _events_cutoff() -> date:
+    return hot_cutoff(settings.AD_EVENTS_HOT_MONTHS)
+
+
+def _paginate_events(db: Session, event_type: str, advertisement_id: int, skip: int, limit: int):
+    """
+    Страница событий от новых к старым и признак следующей страницы
+    
+    Все строки горячей таблицы новее архивных, поэтому архив читается,
+    только если страница выходит за пределы горячей таблицы. Общее
+    количество не считается: подсчет затрагивал бы все месяцы архива.
+    """
+    model = AD_EVENT_TYPES[event_type][0]
+    archive, time_field = AD_EVENT_ARCHIVES[event_type]
+    
+    hot_query = db.query(model).filter(model.advertisement_id == advertisement_id)
+    # Лишняя строка - признак следующей страницы
+    items = hot_query.order_by(getattr(model, time_field).desc()).offset(skip).limit(limit + 1).all()
+    if len(items) <= limit:
+        # Страница дошла до конца горячей таблицы - продолжение в архиве
+        hot_total = skip + len(items) if items else hot_query.count()
+        archive_skip = max(skip - hot_total, 0)
+        items += db.query(archive).filter(archive.advertisement_id == advertisement_id).order_by(
+            archive.month.desc(),
+            getattr(archive, time_field).desc()
+        ).offset(archive_skip).limit(limit + 1 - len(items)).all()
+    return items[:limit], len(items) > limit
+
+
+def _count_events_by_period(db: Session, event_type: str, advertisement_id: int, start_date: datetime, end_date: datetime) -> int:
+    """Количество событий за период; архив читается только для периодов старше горячего окна"""
+    model, _, time_field = AD_EVENT_TYPES[event_type]
+    time_column = getattr(model, time_field)
+    count = db.query(sql_func.count(model.id)).filter(
+        model.advertisement_id == advertisement_id,
+        time_column >= start_date,
+        time_column <= end_date
+    ).scalar() or 0
+    
+    if month_start(start_date) < _events_cutoff():
+        archive, _ = AD_EVENT_ARCHIVES[event_type]
+        archive_time = getattr(archive, time_field)
+        count += db.query(sql_func.count(archive.id)).filter(
+            archive.advertisement_id == advertisement_id,
+            archive.month >= month_start(start_date),
+            archive.month <= month_start(end_date),
+            archive_time >= start_date,
+            archive_time <= end_date
+        ).scalar() or 0
+    return count
+
+
+def _summarize_archived_month(db: Session, month: date):
+    """
+    Дневные счетчики для архивного месяца перед удалением
+    
+    Счетчики ведутся при записи событий; здесь досчитываются рекламы,
+    события которых записаны до появления счетчиков.
+    """
+    month_end = add_months(month, 1)
+    summarized = set(db.execute(
+        select(AdvertisementDailyStats.advertisement_id).distinct().where(
+            AdvertisementDailyStats.day >= month,
+            AdvertisementDailyStats.day < month_end
         )
-    ).count()
+    ).scalars())
+    existing_ads = select(Advertisement.id)
+    
+    for event_type, (archive, time_field) in AD_EVENT_ARCHIVES.items():
+        query = db.query(archive.advertisement_id, archive.user_id, getattr(archive, time_field)).filter(
+            archive.month == month,
+            archive.advertisement_id.in_(existing_ads)
+        )
+        if summarized:
+            query = query.filter(archive.advertisement_id.notin_(summarized))
+        _replay_events(db, event_type, query)
+
+
+def rotate_advertisement_events(db: Session) -> dict:
+    """
+    Ротация просмотров и кликов
+    
+    События старше AD_EVENTS_HOT_MONTHS месяцев переносятся в помесячный архив;
+    месяцы архива старше AD_EVENTS_RETENTION_MONTHS удаляются после досчета
+    дневных счетчиков.
+    """
+    cutoff = _events_cutoff()
+    retention_cutoff = hot_cutoff(settings.AD_EVENTS_RETENTION_MONTHS)
+    result = {"archived": 0, "dropped_months": []}
+    
+    for event_type, (archive, time_field) in AD_EVENT_ARCHIVES.items():
+        model = AD_EVENT_TYPES[event_type][0]
+        result["archived"] += move_to_archive(
+            db,
+            model.__table__,
+            archive.__table__,
+            time_field,
+            cutoff,
+            batch_size=settings.ARCHIVE_BATCH_SIZE
+        )
+    
+    expired = sorted({
+        month
+        for archive, _ in AD_EVENT_ARCHIVES.values()
+        for month in archived_months(db, archive.__table__)
+        if month < retention_cutoff
+    })
+    for month in expired:
+        _summarize_archived_month(db, month)
+        for archive, _ in AD_EVENT_ARCHIVES.values():
+            drop_month(db, archive.__table__, month)
+        db.commit()
+        result["dropped_months"].append(month)
+    return result
+
+
+# ==================== Batched Events ====================
+
+# Тип события: (модель, поле счетчика, поле времени)
+AD_EVENT_TYPES = {
+    "view": (AdvertisementView, "views_count", "viewed_at"),
+    "click": (AdvertisementClick, "clicks_count", "clicked_at"),
+}
+
+
+def persist_advertisement_events(db: Session, events: List[dict]) -> None:
+    """
+    Запись пакета событий просмотров и кликов
+    
+    Событие - dict с полями event ("view"/"click"), advertisement_id, user_id,
+    occurred_at и данными AdvertisementViewCreate/AdvertisementClickCreate.
+    На каждый тип - один многострочный INSERT, на каждую рекламу - одно
+    атомарное увеличение счетчика; дневные счетчики и скетчи уникальных
+    пользователей обновляются в той же транзакции.
+    События удаленных к моменту записи реклам отбрасываются.
+    """
+    for attempt in range(2):
+        try:
+            _persist_advertisement_events(db, events)
+            return
+        except IntegrityError:
+            # Дневную строку одновременно создал другой воркер - повторяем пакет
+            db.rollback()
+            if attempt:
+                raise
+
+
+def _persist_advertisement_events(db: Session, events: List[dict]) -> None:
+    ad_ids = {event["advertisement_id"] for event in events}
+    existing_ids = set(db.execute(
+        select(Advertisement.id).where(Advertisement.id.in_(ad_ids))
+    ).scalars())
+    accepted = [event for event in events if event["advertisement_id"] in existing_ids]
+    
+    for event_type, (model, counter_field, time_field) in AD_EVENT_TYPES.items():
+        rows = []
+        for event in accepted:
+            if event["event"] != event_type:
+                continue
+            row = {column: value for column, value in event.items() if column not in ("event", "occurred_at")}
+            row[time_field] = event["occurred_at"]
+            rows.append(row)
+        if not rows:
+            continue
+        
+        db.execute(insert(model), rows)
+        
+        counts = Counter(row["advertisement_id"] for row in rows)
+        for advertisement_id, count in counts.items():
+            db.execute(
+                update(Advertisement)
+                .where(Advertisement.id == advertisement_id)
+                .values({counter_field: getattr(Advertisement, counter_field) + count})
+            )
+    
+    update_daily_stats(db, accepted)
+    db.commit()
+
+
+def update_daily_stats(db: Session, events: List[dict]) -> None:
+    """Увеличение дневных счетчиков и скетчей уникальных пользователей (без commit)"""
+    if not events:
+        return
+    
+    # (реклама, день) -> просмотры, клики, пользователи
+    buckets: Dict[Tuple[int, object], dict] = {}
+    for event in events:
+        key = (event["advertisement_id"], event["occurred_at"].date())
+        bucket = buckets.setdefault(key, {"views": 0, "clicks": 0, "viewers": set(), "clickers": set()})
+        if event["event"] == "view":
+            bucket["views"] += 1
+            if event.get("user_id") is not None:
+                bucket["viewers"].add(event["user_id"])
+        else:
+            bucket["clicks"] += 1
+            if event.get("user_id") is not None:
+                bucket["clickers"].add(event["user_id"])
+    
+    # Блокируем существующие строки: скетчи обновляются чтением-изменением-записью
+    existing = {
+        (row.advertisement_id, row.day): row
+        for row in db.query(AdvertisementDailyStats).filter(
+            tuple_(AdvertisementDailyStats.advertisement_id, AdvertisementDailyStats.day).in_(list(buckets))
+        ).with_for_update().all()
+    }
+    
+    for key, bucket in buckets.items():
+        row = existing.get(key)
+        if row is None:
+            row = AdvertisementDailyStats(advertisement_id=key[0], day=key[1], views=0, clicks=0)
+            db.add(row)
+        row.views = (row.views or 0) + bucket["views"]
+        row.clicks = (row.clicks or 0) + bucket["clicks"]
+        if bucket["viewers"]:
+            sketch = HyperLogLog.from_bytes(row.unique_viewers_hll).update(bucket["viewers"])
+            row.unique_viewers_hll = sketch.to_bytes()
+        if bucket["clickers"]:
+            sketch = HyperLogLog.from_bytes(row.unique_clickers_hll).update(bucket["clickers"])
+            row.unique_clickers_hll = sketch.to_bytes()
+    db.flush()
+    
+    # События, сброшенные после полуночи, попадают во вчерашний день
+    today = datetime.now(timezone.utc).date()
+    for advertisement_id, day in buckets:
+        if day < today:
+            reset_past_uniques(advertisement_id)
+
+
+def _daily_stats_source_start(db: Session, advertisement_id: Optional[int] = None) -> Optional[date]:
+    """
+    Первый день, за который исходные события еще хранятся (горячие или архив)
+
+    Архив всегда старше горячих таблиц, а месяцы удаляются целиком, поэтому
+    достаточно самого старого месяца архива или самого старого горячего события.
+    """
+    months = []
+    for archive, _ in AD_EVENT_ARCHIVES.values():
+        query = db.query(sql_func.min(archive.month))
+        if advertisement_id is not None:
+            query = query.filter(archive.advertisement_id == advertisement_id)
+        months.append(query.scalar())
+    months = [month for month in months if month is not None]
+    if months:
+        return min(months)
+    
+    for model, _, time_field in AD_EVENT_TYPES.values():
+        query = db.query(sql_func.min(getattr(model, time_field)))
+        if advertisement_id is not None:
+            query = query.filter(model.advertisement_id == advertisement_id)
+        oldest = query.scalar()
+        if oldest is not None:
+            months.append(month_start(oldest))
+    return min(months) if months else None
+
+
+def _replay_events(db: Session, event_type: str, query):
+    """Досчет дневных счетчиков по запросу (advertisement_id, user_id, время) порциями"""
+    batch = []
+    for ad_id, user_id, occurred_at in query.yield_per(5000):
+        batch.append({"event": event_type, "advertisement_id": ad_id, "user_id": user_id, "occurred_at": occurred_at})
+        if len(batch) >= 5000:
+            update_daily_stats(db, batch)
+            batch = []
+    update_daily_stats(db, batch)
+
+
+def rebuild_daily_stats(db: Session, advertisement_id: Optional[int] = None) -> int:
+    """
+    Пересчет дневных счетчиков из исходных просмотров и кликов
+    
+    Нужен для данных, записанных до появления счетчиков. Источник - горячие
+    таблицы и архив. Дни до самого старого хранящегося события не трогаются:
+    после удаления месяцев архива счетчики - единственная запись о них.
+    Возвращает количество строк счетчиков.
+    """
+    source_start = _daily_stats_source_start(db, advertisement_id)
+    if source_start is not None:
+        stats_query = db.query(AdvertisementDailyStats).filter(AdvertisementDailyStats.day >= source_start)
+        if advertisement_id is not None:
+            stats_query = stats_query.filter(AdvertisementDailyStats.advertisement_id == advertisement_id)
+        stats_query.delete(synchronize_session=False)
+        
+        existing_ads = select(Advertisement.id)
+        for event_type, (model, _, time_field) in AD_EVENT_TYPES.items():
+            archive, _ = AD_EVENT_ARCHIVES[event_type]
+            # Архив хранит события удаленных реклам - для них счетчиков нет
+            archive_query = db.query(archive.advertisement_id, archive.user_id, getattr(archive, time_field)).filter(
+                archive.advertisement_id.in_(existing_ads)
+            )
+            hot_query = db.query(model.advertisement_id, model.user_id, getattr(model, time_field))
+            if advertisement_id is not None:
+                archive_query = archive_query.filter(archive.advertisement_id == advertisement_id)
+                hot_query = hot_query.filter(model.advertisement_id == advertisement_id)
+            # Потоково, порциями - таблицы событий могут быть большими
+            _replay_events(db, event_type, archive_query)
+            _replay_events(db, event_type, hot_query)
+    
+    db.commit()
+    reset_past_uniques(advertisement_id)
+    stats_query = db.query(sql_func.count(AdvertisementDailyStats.id))
+    if advertisement_id is not None:
+        stats_query = stats_query.filter(AdvertisementDailyStats.advertisement_id == advertisement_id)
+    return stats_query.scalar() or 0
+
+
+def build_advertisement_event(
+    event_type: str,
+    advertisement_id: int,
+    event_data,
+    user_id: Optional[int] = None
+) -> dict:
+    """Событие для persist_advertisement_events (время фиксируется при приеме)"""
+    return {
+        "event": event_type,
+        "advertisement_id": advertisement_id,
+        "user_id": user_id,
+        "occurred_at": datetime.now(timezone.utc),
+        **event_data.model_dump(),
+    }
 
 
 # ==================== Statistics ====================
 
+# Реклама -> (день расчета, скетч зрителей, скетч кликнувших) за дни до дня расчета
+_past_uniques: "OrderedDict[int, Tuple[date, bytes, bytes]]" = OrderedDict()
+_past_uniques_lock = threading.Lock()
+
+
+def _past_unique_sketches(db: Session, advertisement_id: int, today: date) -> Tuple[HyperLogLog, HyperLogLog]:
+    """
+    Скетчи уникальных пользователей за все дни до today
+    
+    Прошедшие дни не меняются, поэтому скетчи всей истории объединяются
+    один раз в день на рекламу, дальше к ним добавляется только сегодняшний.
+    """
+    with _past_uniques_lock:
+        cached = _past_uniques.get(advertisement_id)
+        if cached is not None and cached[0] == today:
+            _past_uniques.move_to_end(advertisement_id)
+            return HyperLogLog.from_bytes(cached[1]), HyperLogLog.from_bytes(cached[2])
+    
+    viewers = HyperLogLog()
+    clickers = HyperLogLog()
+    rows = db.query(AdvertisementDailyStats.unique_viewers_hll, AdvertisementDailyStats.unique_clickers_hll).filter(
+        AdvertisementDailyStats.advertisement_id == advertisement_id,
+        AdvertisementDailyStats.day < today
+    ).all()
+    for viewers_hll, clickers_hll in rows:
+        if viewers_hll:
+            viewers.merge(HyperLogLog.from_bytes(viewers_hll))
+        if clickers_hll:
+            clickers.merge(HyperLogLog.from_bytes(clickers_hll))
+    
+    with _past_uniques_lock:
+        _past_uniques[advertisement_id] = (today, viewers.to_bytes(), clickers.to_bytes())
+        _past_uniques.move_to_end(advertisement_id)
+        while len(_past_uniques) > settings.AD_STATS_UNIQUES_CACHE_SIZE:
+            _past_uniques.popitem(last=False)
+    return viewers, clickers
+
+
+def reset_past_uniques(advertisement_id: Optional[int] = None):
+    """Сброс кэша скетчей прошедших дней (после пересчета дневных счетчиков)"""
+    with _past_uniques_lock:
+        if advertisement_id is None:
+            _past_uniques.clear()
+        else:
+            _past_uniques.pop(advertisement_id, None)
+
+
 def get_advertisement_statistics(
     db: Session,
     advertisement_id: int
@@ -334,22 +760,41 @@ def get_advertisement_statistics(
     if not advertisement:
         return None
     
-    now = datetime.utcnow()
-    today_start = datetime(now.year, now.month, now.day)
-    week_start = today_start - timedelta(days=now.weekday())
-    month_start = datetime(now.year, now.month, 1)
-    
-    views_today = get_views_count_by_period(db, advertisement_id, today_start, now)
-    clicks_today = get_clicks_count_by_period(db, advertisement_id, today_start, now)
+    # Периоды и уникальные пользователи - из дневных счетчиков (UTC дни)
+    today = datetime.now(timezone.utc).date()
+    week_start = today - timedelta(days=today.weekday())
+    current_month = today.replace(day=1)
     
-    views_this_week = get_views_count_by_period(db, advertisement_id, week_start, now)
-    clicks_this_week = get_clicks_count_by_period(db, advertisement_id, week_start, now)
+    # Счетчикам периодов нужны только дни текущей недели и месяца
+    rows = db.query(AdvertisementDailyStats).filter(
+        AdvertisementDailyStats.advertisement_id == advertisement_id,
+        AdvertisementDailyStats.day >= min(week_start, current_month),
+        AdvertisementDailyStats.day <= today
+    ).all()
     
-    views_this_month = get_views_count_by_period(db, advertisement_id, month_start, now)
-    clicks_this_month = get_clicks_count_by_period(db, advertisement_id, month_start, now)
+    views_today = clicks_today = 0
+    views_this_week = clicks_this_week = 0
+    views_this_month = clicks_this_month = 0
+    # Уникальные за все время: прошедшие дни из кэша, плюс сегодняшний скетч
+    viewers, clickers = _past_unique_sketches(db, advertisement_id, today)
+    for row in rows:
+        if row.day == today:
+            views_today += row.views
+            clicks_today += row.clicks
+            if row.unique_viewers_hll:
+                viewers.merge(HyperLogLog.from_bytes(row.unique_viewers_hll))
+            if row.unique_clickers_hll:
+                clickers.merge(HyperLogLog.from_bytes(row.unique_clickers_hll))
+        if week_start <= row.day:
+            views_this_week += row.views
+            clicks_this_week += row.clicks
+        if current_month <= row.day:
+            views_this_month += row.views
+            clicks_this_month += row.clicks
     
-    unique_views = get_unique_views_count(db, advertisement_id)
-    unique_clicks = get_unique_clicks_count(db, advertisement_id)
+    # Оценка HyperLogLog: погрешность ~2%, точна для малых значений
+    unique_views = viewers.count()
+    unique_clicks = clickers.count()
     
     # CTR (Click-Through Rate) в процентах
     ctr = 0.0
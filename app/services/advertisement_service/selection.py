@@ -0,0 +1,199 @@
+"""
+Выбор рекламы на сервере: взвешенная ротация, частотные ограничения, пейсинг
+
+Из кандидатов позиции (индекс выдачи) выбираются top-k реклам случайно
+с весом по приоритету (взвешенная выборка без повторений). Условия показа
+берутся из show_conditions (JSON, AdvertisementShowConditions):
+
+- "max_per_user": показов одному пользователю за окно (частотное ограничение)
+- "cap_window_hours": окно частотного ограничения, по умолчанию 24 часа
+- "daily_views_target": цель просмотров в день (пейсинг)
+- "min_app_version": минимальная версия приложения
+- "device_types": список типов устройств
+
+Состояние (частоты и просмотры за день) хранится в памяти воркера; просмотры
+за день синхронизируются с дневными счетчиками БД при перестроении индекса.
+"""
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.advertisement import AdvertisementDailyStats
+from app.schemas.advertisement import AdvertisementShowConditions
+from app.services.advertisement_service.serving_index import IndexedAdvertisement
+
+
+def _version_tuple(version: str) -> Tuple[int, ...]:
+    parts = []
+    for part in str(version).split("."):
+        digits = "".join(ch for ch in part if ch.isdigit())
+        parts.append(int(digits) if digits else 0)
+    return tuple(parts)
+
+
+class FrequencyCapStore:
+    """
+    Время последних показов по паре (пользователь, реклама)
+
+    На пару хранится не больше max_per_user отметок; самые давние пары
+    вытесняются при превышении max_entries.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], deque]" = OrderedDict()
+
+    def count(self, user_key: str, advertisement_id: int, window_seconds: float, now: float) -> int:
+        stamps = self._entries.get((user_key, advertisement_id))
+        if not stamps:
+            return 0
+        while stamps and now - stamps[0] > window_seconds:
+            stamps.popleft()
+        return len(stamps)
+
+    def record(self, user_key: str, advertisement_id: int, limit: int, now: float):
+        key = (user_key, advertisement_id)
+        stamps = self._entries.get(key)
+        if stamps is None or stamps.maxlen != limit:
+            stamps = deque(stamps or (), maxlen=limit)
+            self._entries[key] = stamps
+        stamps.append(now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class AdvertisementSelector:
+    """Выбор top-k реклам с учетом весов, частот и пейсинга"""
+
+    def __init__(self, max_cap_entries: int = 100000, rng: Optional[random.Random] = None):
+        self._lock = threading.Lock()
+        self.caps = FrequencyCapStore(max_cap_entries)
+        self.rng = rng or random.Random()
+        self._day: date = datetime.now(timezone.utc).date()
+        # Реклама -> просмотров за текущий день (UTC)
+        self._views_today: Dict[int, int] = {}
+
+    def _roll_day(self, today: date):
+        if today != self._day:
+            self._day = today
+            self._views_today = {}
+
+    def sync_pacing(self, db: Session):
+        """Просмотры за сегодня из дневных счетчиков (учитывает другие воркеры)"""
+        today = datetime.now(timezone.utc).date()
+        rows = db.query(AdvertisementDailyStats.advertisement_id, AdvertisementDailyStats.views).filter(
+            AdvertisementDailyStats.day == today
+        ).all()
+        with self._lock:
+            self._roll_day(today)
+            for advertisement_id, views in rows:
+                # Локальные просмотры могли еще не дойти до БД
+                self._views_today[advertisement_id] = max(self._views_today.get(advertisement_id, 0), views or 0)
+
+    def record_view(
+        self,
+        advertisement_id: int,
+        user_key: Optional[str],
+        conditions: Optional[AdvertisementShowConditions] = None
+    ):
+        """Учет просмотра: частотное ограничение и пейсинг"""
+        with self._lock:
+            self._roll_day(datetime.now(timezone.utc).date())
+            self._views_today[advertisement_id] = self._views_today.get(advertisement_id, 0) + 1
+            if user_key and conditions is not None and conditions.max_per_user:
+                self.caps.record(user_key, advertisement_id, conditions.max_per_user, time.monotonic())
+
+    def reset(self):
+        with self._lock:
+            self.caps.clear()
+            self._views_today = {}
+
+    def views_today(self, advertisement_id: int) -> int:
+        return self._views_today.get(advertisement_id, 0)
+
+    def _eligible(
+        self,
+        entry: IndexedAdvertisement,
+        user_key: Optional[str],
+        device_type: Optional[str],
+        app_version: Optional[str],
+        now: float
+    ) -> bool:
+        conditions = entry.show_conditions
+        if conditions.device_types and device_type and device_type not in conditions.device_types:
+            return False
+        min_version = conditions.min_app_version
+        if min_version and app_version and _version_tuple(app_version) < _version_tuple(min_version):
+            return False
+        limit = conditions.max_per_user
+        if limit and user_key:
+            window = conditions.cap_window_hours * 3600
+            if self.caps.count(user_key, entry.id, window, now) >= limit:
+                return False
+        return True
+
+    def _pacing_factor(self, entry: IndexedAdvertisement, now: datetime) -> float:
+        """
+        Множитель веса по пейсингу
+
+        Цель дня распределяется равномерно: реклама, опередившая график,
+        показывается реже, выполнившая цель - не показывается.
+        """
+        target = entry.show_conditions.daily_views_target
+        if not target:
+            return 1.0
+        delivered = self.views_today(entry.id)
+        if delivered >= target:
+            return 0.0
+        day_fraction = (now.hour * 3600 + now.minute * 60 + now.second + 1) / 86400
+        expected = target * day_fraction
+        if delivered <= expected:
+            return 1.0
+        return max(expected / delivered, 0.05)
+
+    def select(
+        self,
+        candidates: Iterable[IndexedAdvertisement],
+        limit: int,
+        user_key: Optional[str] = None,
+        device_type: Optional[str] = None,
+        app_version: Optional[str] = None
+    ) -> List[IndexedAdvertisement]:
+        """
+        top-k реклам: вес = (priority + 1) * пейсинг
+
+        Взвешенная выборка без повторений (ключ random^(1/вес)): реклама
+        с вдвое большим весом выбирается первой вдвое чаще.
+        """
+        now = datetime.now(timezone.utc)
+        monotonic_now = time.monotonic()
+        keyed = []
+        with self._lock:
+            self._roll_day(now.date())
+            for entry in candidates:
+                if not self._eligible(entry, user_key, device_type, app_version, monotonic_now):
+                    continue
+                weight = (max(entry.priority, 0) + 1) * self._pacing_factor(entry, now)
+                if weight <= 0:
+                    continue
+                key = math.log(self.rng.random() or 1e-12) / weight
+                keyed.append((key, entry))
+        keyed.sort(key=lambda item: item[0], reverse=True)
+        return [entry for _, entry in keyed[:limit]]
+
+
+advertisement_selector = AdvertisementSelector(max_cap_entries=settings.AD_FREQUENCY_CAP_ENTRIES)
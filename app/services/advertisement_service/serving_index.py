@@ -0,0 +1,174 @@
+"""
+Индекс выдачи рекламы в памяти воркера
+
+Активные рекламы хранятся по позициям, заранее отсортированными по приоритету
+и порядку отображения, вместе с окнами показа и целевой аудиторией. Выдача -
+поиск в памяти без запросов к БД.
+
+- Индекс перестраивается из БД после изменения рекламы (create/update/delete)
+  и по событию шины pub/sub от других воркеров.
+- Окна показа (start_date/end_date) продвигаются в памяти: на ближайшей
+  границе окна списки позиций пересчитываются без обращения к БД.
+"""
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models.advertisement import Advertisement, AdvertisementStatus, AdvertisementPosition
+from app.schemas.advertisement import AdvertisementForClientResponse, AdvertisementShowConditions
+
+logger = logging.getLogger(__name__)
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Даты без часового пояса (SQLite) считаются UTC"""
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _parse_conditions(raw: Optional[str]) -> AdvertisementShowConditions:
+    """
+    Условия показа из JSON; некорректные значения пропускаются
+
+    Схемы создания и обновления проверяют условия, но строки, записанные
+    раньше, могут содержать что угодно - выдача не должна из-за них падать.
+    """
+    if not raw:
+        return AdvertisementShowConditions()
+    try:
+        conditions = json.loads(raw)
+    except (TypeError, ValueError):
+        conditions = None
+    if not isinstance(conditions, dict):
+        logger.warning(f"Некорректные show_conditions: {raw!r}")
+        return AdvertisementShowConditions()
+    try:
+        return AdvertisementShowConditions.model_validate(conditions)
+    except ValidationError as e:
+        invalid = {error["loc"][0] for error in e.errors() if error["loc"]}
+        logger.warning(f"Некорректные show_conditions {sorted(invalid)}: {raw!r}")
+    try:
+        return AdvertisementShowConditions.model_validate(
+            {key: value for key, value in conditions.items() if key not in invalid}
+        )
+    except ValidationError:
+        return AdvertisementShowConditions()
+
+
+class IndexedAdvertisement:
+    """Снимок рекламы для выдачи (не зависит от сессии БД)"""
+
+    def __init__(self, advertisement: Advertisement):
+        self.id = advertisement.id
+        self.position = AdvertisementPosition(advertisement.position)
+        self.priority = advertisement.priority or 0
+        self.display_order = advertisement.display_order or 0
+        self.start_date = _as_utc(advertisement.start_date)
+        self.end_date = _as_utc(advertisement.end_date)
+        self.target_audience = advertisement.target_audience
+        self.show_conditions = _parse_conditions(advertisement.show_conditions)
+        self.payload = AdvertisementForClientResponse.model_validate(advertisement)
+
+    def is_live(self, now: datetime) -> bool:
+        """Попадает ли момент в окно показа"""
+        if self.start_date is not None and self.start_date > now:
+            return False
+        if self.end_date is not None and self.end_date < now:
+            return False
+        return True
+
+    def matches_audience(self, target_audience: Optional[str]) -> bool:
+        if not target_audience:
+            return True
+        return self.target_audience in (None, "all", target_audience)
+
+
+class AdvertisementIndex:
+    """Отсортированные активные рекламы по позициям"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Все активные рекламы, включая еще не начавшиеся
+        self._entries: List[IndexedAdvertisement] = []
+        self._by_id: Dict[int, IndexedAdvertisement] = {}
+        # Позиция -> рекламы в окне показа, по приоритету и порядку
+        self._live: Dict[AdvertisementPosition, List[IndexedAdvertisement]] = {}
+        self._next_boundary: Optional[datetime] = None
+        self.ready = False
+        self.built_at: Optional[datetime] = None
+        self.version = 0
+
+    def rebuild(self, db: Session):
+        """Загрузка активных реклам из БД (один запрос)"""
+        now = datetime.now(timezone.utc)
+        advertisements = db.query(Advertisement).filter(
+            Advertisement.status == AdvertisementStatus.ACTIVE,
+            Advertisement.is_active == True,
+            or_(
+                Advertisement.end_date.is_(None),
+                Advertisement.end_date >= now
+            )
+        ).all()
+        entries = [IndexedAdvertisement(advertisement) for advertisement in advertisements]
+        entries.sort(key=lambda entry: (-entry.priority, entry.display_order))
+        with self._lock:
+            self._entries = entries
+            self._by_id = {entry.id: entry for entry in entries}
+            self._advance(now)
+            self.ready = True
+            self.built_at = now
+            self.version += 1
+
+    def invalidate(self):
+        """Сброс: следующий запрос перестроит индекс из БД"""
+        with self._lock:
+            self.ready = False
+
+    def advance(self, now: Optional[datetime] = None):
+        """Пересчет списков позиций на текущий момент (без БД)"""
+        with self._lock:
+            self._advance(now or datetime.now(timezone.utc))
+
+    def _advance(self, now: datetime):
+        live: Dict[AdvertisementPosition, List[IndexedAdvertisement]] = {}
+        boundaries = []
+        for entry in self._entries:
+            if entry.is_live(now):
+                live.setdefault(entry.position, []).append(entry)
+            for boundary in (entry.start_date, entry.end_date):
+                if boundary is not None and boundary > now:
+                    boundaries.append(boundary)
+        self._live = live
+        self._next_boundary = min(boundaries) if boundaries else None
+
+    def get(self, advertisement_id: int) -> Optional[IndexedAdvertisement]:
+        return self._by_id.get(advertisement_id)
+
+    @property
+    def next_boundary(self) -> Optional[datetime]:
+        """Ближайшее начало или окончание окна показа"""
+        return self._next_boundary
+
+    def lookup(
+        self,
+        position: AdvertisementPosition,
+        target_audience: Optional[str] = None,
+        now: Optional[datetime] = None
+    ) -> List[IndexedAdvertisement]:
+        """Рекламы позиции в окне показа, по приоритету и порядку"""
+        now = now or datetime.now(timezone.utc)
+        if self._next_boundary is not None and now >= self._next_boundary:
+            # Граница окна прошла раньше срабатывания таймера
+            self.advance(now)
+        entries = self._live.get(AdvertisementPosition(position), [])
+        return [entry for entry in entries if entry.matches_audience(target_audience)]
+
+
+advertisement_index = AdvertisementIndex()
@@ -24,6 +24,7 @@ from app.schemas.car_wash import (
     CarWashReviewCreate,
     CarWashReviewUpdate,
 )
+from app.services.media_service.crud import release_media
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -219,8 +220,11 @@ def delete_car_wash(db: Session, car_wash_id: int) -> bool:
     if not car_wash:
         return False
     
+    photo_urls = [photo.photo_url for photo in car_wash.photos]
     db.delete(car_wash)
     db.commit()
+    for photo_url in photo_urls:
+        release_media(db, photo_url)
     return True
 
 
@@ -382,8 +386,10 @@ def delete_car_wash_photo(db: Session, photo_id: int) -> bool:
     if not photo:
         return False
     
+    photo_url = photo.photo_url
     db.delete(photo)
     db.commit()
+    release_media(db, photo_url)
     return True
 
 
@@ -25,6 +25,7 @@ from app.schemas.electric_station import (
     ElectricStationReviewCreate,
     ElectricStationReviewUpdate,
 )
+from app.services.media_service.crud import release_media
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -272,8 +273,11 @@ def delete_electric_station(db: Session, station_id: int) -> bool:
     if not station:
         return False
     
+    photo_urls = [photo.photo_url for photo in station.photos]
     db.delete(station)
     db.commit()
+    for photo_url in photo_urls:
+        release_media(db, photo_url)
     return True
 
 
@@ -467,8 +471,10 @@ def delete_electric_station_photo(db: Session, photo_id: int) -> bool:
     if not photo:
         return False
     
+    photo_url = photo.photo_url
     db.delete(photo)
     db.commit()
+    release_media(db, photo_url)
     return True
 
 
@@ -3,17 +3,31 @@ CRUD операции для Global Chat Service
 """
 from typing import Optional, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func as sql_func, exists
+from sqlalchemy import and_, or_, func as sql_func, exists, text, table, column, literal_column, insert, select
 from datetime import datetime, timezone
+import re
+import time
+
+from app.core.config import settings
+from app.core.archive import hot_cutoff, move_to_archive, archived_months, drop_month
 
 from app.models.global_chat import (
     GlobalChatMessage,
     UserBlock,
     HiddenGlobalChatMessage,
-    MessageType
+    GlobalChatUserState,
+    GlobalChatMessageArchive,
+    HiddenGlobalChatMessageArchive,
+    GlobalChatMonthlySummary,
+    MessageType,
+    SEARCH_TEXT_CONFIG,
+    SQLITE_FTS_TABLE,
 )
 from app.schemas.global_chat import GlobalChatMessageCreate
 
+# Максимальное количество слов в поисковом запросе
+SEARCH_MAX_TERMS = 10
+
 
 def create_message(
     db: Session,
@@ -39,6 +53,36 @@ def create_message(
     return message
 
 
+def create_messages_bulk(
+    db: Session,
+    items: List[Tuple[int, GlobalChatMessageCreate]]
+) -> List[GlobalChatMessage]:
+    """
+    Пакетное создание сообщений (group commit): одна транзакция на пакет
+    
+    items: [(user_id, данные сообщения)]. created_at задается на стороне приложения,
+    чтобы после вставки не перечитывать строки.
+    """
+    now = datetime.now(timezone.utc)
+    messages = []
+    for user_id, message_data in items:
+        attachments_json = None
+        if message_data.attachments:
+            attachments_json = [att.model_dump() for att in message_data.attachments]
+        messages.append(GlobalChatMessage(
+            user_id=user_id,
+            message=message_data.message,
+            message_type=message_data.message_type,
+            attachments=attachments_json,
+            extra_metadata=message_data.extra_metadata,
+            created_at=now
+        ))
+    
+    db.add_all(messages)
+    db.commit()
+    return messages
+
+
 def get_message_by_id(db: Session, message_id: int) -> Optional[GlobalChatMessage]:
     """Получение сообщения по ID"""
     return db.query(GlobalChatMessage).filter(
@@ -49,49 +93,204 @@ def get_message_by_id(db: Session, message_id: int) -> Optional[GlobalChatMessag
     ).first()
 
 
+def get_cleared_before_id(db: Session, user_id: int) -> int:
+    """Водяной знак очистки истории: сообщения с id меньше значения скрыты"""
+    cleared_before_id = db.query(GlobalChatUserState.cleared_before_id).filter(
+        GlobalChatUserState.user_id == user_id
+    ).scalar()
+    return cleared_before_id or 0
+
+
+# Таблица сообщений -> таблица скрытых для пользователя сообщений
+_HIDDEN_TABLES = {
+    GlobalChatMessage: HiddenGlobalChatMessage,
+    GlobalChatMessageArchive: HiddenGlobalChatMessageArchive,
+}
+
+
+def _visible_messages(db: Session, model, user_id: int, cleared_before_id: int):
+    """
+    Сообщения горячей таблицы или архива, видимые пользователю
+    
+    Исключает удаленные, скрытые для пользователя, от заблокированных им
+    пользователей и сообщения до водяного знака очистки истории.
+    """
+    hidden = _HIDDEN_TABLES[model]
+    query = db.query(model).filter(
+        model.deleted_at.is_(None),
+        ~exists().where(
+            and_(
+                UserBlock.blocker_id == user_id,
+                UserBlock.blocked_id == model.user_id
+            )
+        ),
+        ~exists().where(
+            and_(
+                hidden.message_id == model.id,
+                hidden.user_id == user_id
+            )
+        )
+    )
+    if cleared_before_id:
+        # Диапазон по первичному ключу
+        query = query.filter(model.id >= cleared_before_id)
+    return query
+
+
+def _archive_reached(db: Session, after_id: int) -> bool:
+    """Курсор after_id старше горячей таблицы - догрузка начинается в архиве"""
+    oldest_hot_id = db.query(sql_func.min(GlobalChatMessage.id)).scalar()
+    return oldest_hot_id is None or after_id < oldest_hot_id - 1
+
+
 def get_messages(
     db: Session,
     user_id: int,
     skip: int = 0,
-    limit: int = 100
-) -> Tuple[List[GlobalChatMessage], int]:
+    limit: int = 100,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None
+) -> Tuple[List[GlobalChatMessage], bool]:
     """
     Получение сообщений глобального чата для пользователя
     
+    Keyset-пагинация по первичному ключу, сообщения от новых к старым:
+    - before_id: страница сообщений старше указанного (прокрутка вверх)
+    - after_id: ближайшие сообщения новее указанного (догрузка после переподключения)
+    - skip: устаревшая OFFSET-пагинация, используется только без курсоров
+    
+    Возвращает (сообщения, есть_еще). Общее количество не считается.
+    Архив старше горячего окна id меньше любого сообщения горячей таблицы,
+    поэтому страница продолжается в архиве (GlobalChatMessageArchive),
+    только когда горячая таблица исчерпана.
+    
     Исключает:
     - Удаленные сообщения (deleted_at IS NOT NULL)
     - Сообщения от заблокированных пользователей
     - Скрытые сообщения для этого пользователя
+    - Сообщения до водяного знака очистки истории
     """
-    # Базовый запрос
-    query = db.query(GlobalChatMessage).filter(
-        GlobalChatMessage.deleted_at.is_(None)  # Не удаленные
-    )
+    cleared_before_id = get_cleared_before_id(db, user_id)
+    hot_query = _visible_messages(db, GlobalChatMessage, user_id, cleared_before_id)
+    archive_query = _visible_messages(db, GlobalChatMessageArchive, user_id, cleared_before_id)
     
-    # Исключаем сообщения от заблокированных пользователей
-    query = query.filter(
-        ~exists().where(
-            and_(
-                UserBlock.blocker_id == user_id,
-                UserBlock.blocked_id == GlobalChatMessage.user_id
-            )
-        )
-    )
+    if after_id is not None:
+        # Берем ближайшие к курсору сообщения и разворачиваем в порядок "новые сверху"
+        rows = []
+        if _archive_reached(db, after_id):
+            archive_query = archive_query.filter(GlobalChatMessageArchive.id > after_id)
+            if before_id is not None:
+                archive_query = archive_query.filter(GlobalChatMessageArchive.id < before_id)
+            rows = archive_query.order_by(GlobalChatMessageArchive.id.asc()).limit(limit + 1).all()
+        if len(rows) <= limit:
+            hot_query = hot_query.filter(GlobalChatMessage.id > after_id)
+            if before_id is not None:
+                hot_query = hot_query.filter(GlobalChatMessage.id < before_id)
+            rows += hot_query.order_by(GlobalChatMessage.id.asc()).limit(limit + 1 - len(rows)).all()
+        has_more = len(rows) > limit
+        return list(reversed(rows[:limit])), has_more
     
-    # Исключаем скрытые сообщения
-    query = query.filter(
-        ~exists().where(
-            and_(
-                HiddenGlobalChatMessage.message_id == GlobalChatMessage.id,
-                HiddenGlobalChatMessage.user_id == user_id
-            )
-        )
-    )
+    page_query = hot_query.order_by(GlobalChatMessage.id.desc())
+    if before_id is not None:
+        page_query = page_query.filter(GlobalChatMessage.id < before_id)
+    elif skip:
+        page_query = page_query.offset(skip)
+    rows = page_query.limit(limit + 1).all()
     
-    total = query.count()
-    messages = query.order_by(GlobalChatMessage.created_at.desc()).offset(skip).limit(limit).all()
+    if len(rows) <= limit:
+        # Горячая таблица исчерпана - продолжение в архиве
+        archive_query = archive_query.order_by(GlobalChatMessageArchive.id.desc())
+        if before_id is not None:
+            archive_query = archive_query.filter(GlobalChatMessageArchive.id < before_id)
+        elif skip and not rows:
+            archive_query = archive_query.offset(max(skip - hot_query.count(), 0))
+        rows += archive_query.limit(limit + 1 - len(rows)).all()
     
-    return messages, total
+    has_more = len(rows) > limit
+    return rows[:limit], has_more
+
+
+# Кэш приблизительного количества сообщений: (значение, время расчета)
+_message_count_cache: dict = {"value": None, "computed_at": 0.0}
+
+
+def get_approximate_message_count(db: Session) -> int:
+    """
+    Приблизительное количество сообщений в чате
+    
+    Без учета персональных фильтров (блокировки, очистка истории),
+    пересчитывается не чаще CHAT_TOTAL_CACHE_SECONDS
+    """
+    now = time.monotonic()
+    cached = _message_count_cache["value"]
+    if cached is not None and now - _message_count_cache["computed_at"] < settings.CHAT_TOTAL_CACHE_SECONDS:
+        return cached
+    
+    value = db.query(sql_func.count(GlobalChatMessage.id)).filter(
+        GlobalChatMessage.deleted_at.is_(None)
+    ).scalar() or 0
+    _message_count_cache["value"] = value
+    _message_count_cache["computed_at"] = now
+    return value
+
+
+def _search_terms(query_text: str) -> List[str]:
+    """Слова поискового запроса (без операторов полнотекстового синтаксиса)"""
+    return [term.lower() for term in re.findall(r"\w+", query_text)][:SEARCH_MAX_TERMS]
+
+
+def _sqlite_fts_available(db: Session) -> bool:
+    """Есть ли FTS5 таблица в SQLite базе"""
+    return db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": SQLITE_FTS_TABLE}
+    ).first() is not None
+
+
+def _search_in(db: Session, model, user_id: int, cleared_before_id: int, query_text: str, terms: List[str]):
+    """
+    Поисковый запрос по горячей таблице или архиву: (запрос, ранжирование, подсветка)
+    
+    FTS5 в SQLite есть только у горячей таблицы, архив там ищется по подстрокам слов.
+    """
+    search_query = _visible_messages(db, model, user_id, cleared_before_id)
+    dialect = db.bind.dialect.name
+    
+    if terms and dialect == "postgresql":
+        tsquery = sql_func.to_tsquery(SEARCH_TEXT_CONFIG, " & ".join(f"{term}:*" for term in terms))
+        search_vector = model.search_vector()
+        snippet = sql_func.ts_headline(
+            SEARCH_TEXT_CONFIG,
+            sql_func.coalesce(model.message, ""),
+            tsquery,
+            "StartSel=<b>, StopSel=</b>, MaxWords=20, MinWords=5, MaxFragments=2"
+        )
+        return (
+            search_query.filter(search_vector.op("@@")(tsquery)),
+            sql_func.ts_rank(search_vector, tsquery).desc(),
+            snippet
+        )
+    if terms and dialect == "sqlite" and model is GlobalChatMessage and _sqlite_fts_available(db):
+        fts = table(SQLITE_FTS_TABLE, column("rowid"))
+        search_query = search_query.join(fts, fts.c.rowid == model.id).filter(
+            literal_column(SQLITE_FTS_TABLE).op("MATCH")(" ".join(f'"{term}"*' for term in terms))
+        )
+        return (
+            search_query,
+            literal_column(f"bm25({SQLITE_FTS_TABLE})").asc(),
+            literal_column(f"snippet({SQLITE_FTS_TABLE}, 0, '<b>', '</b>', '…', 12)")
+        )
+    if terms and dialect == "sqlite":
+        return search_query.filter(and_(*(model.message.ilike(f"%{term}%") for term in terms))), None, None
+    return search_query.filter(model.message.ilike(f"%{query_text}%")), None, None
+
+
+def _search_page(search_query, model, rank, snippet, skip: int, limit: int):
+    if snippet is None:
+        messages = search_query.order_by(model.id.desc()).offset(skip).limit(limit).all()
+        return [(message, None) for message in messages]
+    rows = search_query.add_columns(snippet).order_by(rank, model.id.desc()).offset(skip).limit(limit).all()
+    return [(message, message_snippet) for message, message_snippet in rows]
 
 
 def search_messages(
@@ -100,40 +299,40 @@ def search_messages(
     query_text: str,
     skip: int = 0,
     limit: int = 100
-) -> Tuple[List[GlobalChatMessage], int]:
-    """Поиск сообщений в глобальном чате"""
-    # Поиск по тексту сообщения
-    search_query = db.query(GlobalChatMessage).filter(
-        and_(
-            GlobalChatMessage.deleted_at.is_(None),
-            GlobalChatMessage.message.ilike(f"%{query_text}%")
-        )
-    )
+) -> Tuple[List[Tuple[GlobalChatMessage, Optional[str]]], int]:
+    """
+    Полнотекстовый поиск сообщений в глобальном чате
     
-    # Исключаем сообщения от заблокированных пользователей
-    search_query = search_query.filter(
-        ~exists().where(
-            and_(
-                UserBlock.blocker_id == user_id,
-                UserBlock.blocked_id == GlobalChatMessage.user_id
-            )
-        )
-    )
+    - PostgreSQL: tsvector + GIN индекс, ранжирование ts_rank, подсветка ts_headline
+    - SQLite: FTS5 таблица, ранжирование bm25, подсветка snippet
+    - Иначе (или запрос без слов): поиск подстроки без ранжирования
     
-    # Исключаем скрытые сообщения
-    search_query = search_query.filter(
-        ~exists().where(
-            and_(
-                HiddenGlobalChatMessage.message_id == GlobalChatMessage.id,
-                HiddenGlobalChatMessage.user_id == user_id
-            )
-        )
+    Слова запроса ищутся по префиксу и объединяются через И. Сначала идут
+    найденные в горячей таблице (по релевантности), затем в архиве.
+    Возвращает ([(сообщение, фрагмент с подсветкой <b>...</b>)], общее количество)
+    """
+    terms = _search_terms(query_text)
+    cleared_before_id = get_cleared_before_id(db, user_id)
+    hot_query, hot_rank, hot_snippet = _search_in(
+        db, GlobalChatMessage, user_id, cleared_before_id, query_text, terms
     )
+    archive_query, archive_rank, archive_snippet = _search_in(
+        db, GlobalChatMessageArchive, user_id, cleared_before_id, query_text, terms
+    )
+    hot_total = hot_query.count()
+    total = hot_total + archive_query.count()
     
-    total = search_query.count()
-    messages = search_query.order_by(GlobalChatMessage.created_at.desc()).offset(skip).limit(limit).all()
-    
-    return messages, total
+    results = _search_page(hot_query, GlobalChatMessage, hot_rank, hot_snippet, skip, limit)
+    if len(results) < limit:
+        results += _search_page(
+            archive_query,
+            GlobalChatMessageArchive,
+            archive_rank,
+            archive_snippet,
+            max(skip - hot_total, 0),
+            limit - len(results)
+        )
+    return results, total
 
 
 def block_user(
@@ -198,6 +397,17 @@ def get_blocked_users(
     ).order_by(UserBlock.created_at.desc()).all()
 
 
+def get_blocked_user_ids(
+    db: Session,
+    user_id: int
+) -> set[int]:
+    """Получение множества ID пользователей, заблокированных пользователем"""
+    rows = db.query(UserBlock.blocked_id).filter(
+        UserBlock.blocker_id == user_id
+    ).all()
+    return {blocked_id for (blocked_id,) in rows}
+
+
 def is_user_blocked(
     db: Session,
     blocker_id: int,
@@ -246,33 +456,81 @@ def clear_chat_history_for_user(
     """
     Очистка истории чата для конкретного пользователя
     
-    Скрывает все сообщения для этого пользователя
+    Сдвигает водяной знак пользователя за последнее сообщение (одна строка),
+    возвращает количество скрытых сообщений
     """
-    # Получаем все сообщения, которые еще не скрыты
-    all_messages = db.query(GlobalChatMessage.id).filter(
-        GlobalChatMessage.deleted_at.is_(None)
-    ).all()
+    last_message_id = db.query(sql_func.max(GlobalChatMessage.id)).scalar()
+    if last_message_id is None:
+        return 0
     
-    count = 0
-    for (message_id,) in all_messages:
-        # Проверяем, не скрыто ли уже
-        existing = db.query(HiddenGlobalChatMessage).filter(
-            and_(
-                HiddenGlobalChatMessage.message_id == message_id,
-                HiddenGlobalChatMessage.user_id == user_id
-            )
+    state = db.query(GlobalChatUserState).filter(
+        GlobalChatUserState.user_id == user_id
+    ).first()
+    previous_before_id = state.cleared_before_id if state else 0
+    new_before_id = last_message_id + 1
+    
+    if new_before_id <= previous_before_id:
+        return 0
+    
+    count = db.query(sql_func.count(GlobalChatMessage.id)).filter(
+        and_(
+            GlobalChatMessage.id >= previous_before_id,
+            GlobalChatMessage.id < new_before_id,
+            GlobalChatMessage.deleted_at.is_(None)
+        )
+    ).scalar()
+    
+    if state:
+        state.cleared_before_id = new_before_id
+        state.cleared_at = datetime.now(timezone.utc)
+    else:
+        db.add(GlobalChatUserState(
+            user_id=user_id,
+            cleared_before_id=new_before_id,
+            cleared_at=datetime.now(timezone.utc)
+        ))
+    
+    db.commit()
+    return count
+
+
+def migrate_hidden_messages_to_watermarks(db: Session) -> int:
+    """
+    Перенос скрытых сообщений (по строке на сообщение) в водяные знаки
+    
+    Строки HiddenGlobalChatMessage создавались только очисткой истории, поэтому
+    максимальный скрытый id пользователя - это граница его последней очистки.
+    Возвращает количество обработанных пользователей.
+    """
+    rows = db.query(
+        HiddenGlobalChatMessage.user_id,
+        sql_func.max(HiddenGlobalChatMessage.message_id)
+    ).group_by(HiddenGlobalChatMessage.user_id).all()
+    
+    for user_id, max_hidden_id in rows:
+        new_before_id = max_hidden_id + 1
+        state = db.query(GlobalChatUserState).filter(
+            GlobalChatUserState.user_id == user_id
         ).first()
+        if state:
+            if state.cleared_before_id < new_before_id:
+                state.cleared_before_id = new_before_id
+        else:
+            db.add(GlobalChatUserState(
+                user_id=user_id,
+                cleared_before_id=new_before_id
+            ))
         
-        if not existing:
-            hidden = HiddenGlobalChatMessage(
-                message_id=message_id,
-                user_id=user_id
+        # Строки ниже водяного знака больше не нужны
+        db.query(HiddenGlobalChatMessage).filter(
+            and_(
+                HiddenGlobalChatMessage.user_id == user_id,
+                HiddenGlobalChatMessage.message_id < new_before_id
             )
-            db.add(hidden)
-            count += 1
+        ).delete(synchronize_session=False)
+        db.commit()
     
-    db.commit()
-    return count
+    return len(rows)
 
 
 def delete_message(
@@ -294,3 +552,78 @@ def delete_message(
     db.commit()
     return True
 
+
+# ==================== Archive ====================
+
+def _archive_hidden_rows(db: Session, message_ids: List[int]):
+    """Перенос строк скрытия архивируемых сообщений (исходные ссылаются на горячую таблицу)"""
+    db.execute(insert(HiddenGlobalChatMessageArchive).from_select(
+        ["user_id", "message_id"],
+        select(HiddenGlobalChatMessage.user_id, HiddenGlobalChatMessage.message_id).where(
+            HiddenGlobalChatMessage.message_id.in_(message_ids)
+        )
+    ))
+    db.query(HiddenGlobalChatMessage).filter(
+        HiddenGlobalChatMessage.message_id.in_(message_ids)
+    ).delete(synchronize_session=False)
+
+
+def _drop_archived_month(db: Session, month):
+    """Удаление месяца архива вместе со строками скрытия его сообщений"""
+    db.query(HiddenGlobalChatMessageArchive).filter(
+        HiddenGlobalChatMessageArchive.message_id.in_(
+            select(GlobalChatMessageArchive.id).where(GlobalChatMessageArchive.month == month)
+        )
+    ).delete(synchronize_session=False)
+    drop_month(db, GlobalChatMessageArchive.__table__, month)
+
+
+def summarize_archived_month(db: Session, month) -> GlobalChatMonthlySummary:
+    """Итоги месяца по архиву (повторный вызов перезаписывает итоги)"""
+    row = db.query(
+        sql_func.count(GlobalChatMessageArchive.id),
+        sql_func.count(GlobalChatMessageArchive.deleted_at),
+        sql_func.count(GlobalChatMessageArchive.id).filter(
+            GlobalChatMessageArchive.message_type != MessageType.TEXT
+        ),
+        sql_func.count(sql_func.distinct(GlobalChatMessageArchive.user_id)),
+    ).filter(GlobalChatMessageArchive.month == month).one()
+    
+    summary = db.query(GlobalChatMonthlySummary).filter(GlobalChatMonthlySummary.month == month).first()
+    if summary is None:
+        summary = GlobalChatMonthlySummary(month=month)
+        db.add(summary)
+    summary.messages, summary.deleted_messages, summary.media_messages, summary.senders = row
+    db.flush()
+    return summary
+
+
+def rotate_chat_messages(db: Session) -> dict:
+    """
+    Ротация сообщений глобального чата
+    
+    Сообщения старше CHAT_HOT_MONTHS месяцев переносятся в помесячный архив
+    вместе со строками скрытия; лента и поиск читают архив, когда горячая
+    таблица исчерпана. Месяцы архива старше CHAT_ARCHIVE_RETENTION_MONTHS
+    удаляются после сохранения итогов месяца.
+    """
+    result = {"archived": 0, "dropped_months": []}
+    result["archived"] = move_to_archive(
+        db,
+        GlobalChatMessage.__table__,
+        GlobalChatMessageArchive.__table__,
+        "created_at",
+        hot_cutoff(settings.CHAT_HOT_MONTHS),
+        batch_size=settings.ARCHIVE_BATCH_SIZE,
+        before_delete=_archive_hidden_rows
+    )
+    
+    retention_cutoff = hot_cutoff(settings.CHAT_ARCHIVE_RETENTION_MONTHS)
+    for month in archived_months(db, GlobalChatMessageArchive.__table__):
+        if month >= retention_cutoff:
+            break
+        summarize_archived_month(db, month)
+        _drop_archived_month(db, month)
+        db.commit()
+        result["dropped_months"].append(month)
+    return result
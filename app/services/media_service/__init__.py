@@ -0,0 +1,3 @@
+"""
+Media Service
+"""
@@ -0,0 +1,207 @@
+"""
+CRUD операции контентно-адресуемого хранилища загрузок
+
+Файл регистрируется по SHA-256 содержимого: повторная загрузка того же
+содержимого только увеличивает счетчик ссылок, а временный файл удаляется.
+Освобождение ссылки уменьшает счетчик; файлы без ссылок физически удаляет
+sweep_media после MEDIA_ORPHAN_GRACE. Пока файл не удален, новая загрузка
+того же содержимого снова на него ссылается.
+
+Порядок операций исключает потерю файла при гонке загрузки и очистки:
+- загрузка размещает файл до commit новой строки;
+- очистка удаляет файл до commit удаления строки. Строка при этом
+  заблокирована, поэтому параллельная загрузка увеличит счетчик только после
+  commit очистки, увидит, что строки нет, и разместит файл заново.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.media import (
+    MEDIA_STORE_SUBDIR,
+    media_path,
+    media_file_paths,
+    relative_media_path,
+    variant_lookup,
+)
+from app.models.media import MediaFile
+
+logger = logging.getLogger(__name__)
+
+
+def _unlink(path: Path) -> bool:
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def register_media(db: Session, sha256: str, relative_path: str, size: int, temp_path: str) -> tuple[MediaFile, bool]:
+    """
+    Регистрация загруженного файла (ссылка +1)
+
+    temp_path - записанный временный файл в той же файловой системе.
+    Возвращает (файл, был ли он уже в хранилище).
+    """
+    for _ in range(2):
+        updated = db.query(MediaFile).filter(MediaFile.sha256 == sha256).update(
+            {MediaFile.ref_count: MediaFile.ref_count + 1, MediaFile.released_at: None},
+            synchronize_session=False
+        )
+        if updated:
+            db.commit()
+            media = db.query(MediaFile).filter(MediaFile.sha256 == sha256).first()
+            target = media_path(media.relative_path)
+            if target.exists():
+                _unlink(Path(temp_path))
+            else:
+                # Файл пропал с диска - восстанавливаем из новой загрузки
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temp_path, target)
+            return media, True
+
+        media = MediaFile(sha256=sha256, relative_path=relative_path, size=size, ref_count=1)
+        db.add(media)
+        try:
+            db.flush()
+            target = media_path(relative_path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp_path, target)
+            db.commit()
+            return media, False
+        except IntegrityError:
+            # То же содержимое одновременно загрузил другой запрос
+            db.rollback()
+
+    _unlink(Path(temp_path))
+    raise RuntimeError(f"Не удалось зарегистрировать файл {sha256}")
+
+
+def release_media(db: Session, file_url: Optional[str]) -> bool:
+    """
+    Освобождение ссылки на файл по URL
+
+    Файлы хранилища удаляются очисткой, когда ссылок не осталось. Файлы
+    старой схемы (без учета ссылок) удаляются сразу вместе с миниатюрами.
+    Возвращает True, если ссылка освобождена или файл удален.
+    """
+    relative_path = relative_media_path(file_url)
+    if relative_path is None:
+        return False
+
+    try:
+        media = db.query(MediaFile).filter(MediaFile.relative_path == relative_path).first()
+        if media is not None:
+            db.query(MediaFile).filter(
+                MediaFile.id == media.id,
+                MediaFile.ref_count > 0
+            ).update({MediaFile.ref_count: MediaFile.ref_count - 1}, synchronize_session=False)
+            db.query(MediaFile).filter(
+                MediaFile.id == media.id,
+                MediaFile.ref_count == 0,
+                MediaFile.released_at.is_(None)
+            ).update({MediaFile.released_at: datetime.now(timezone.utc)}, synchronize_session=False)
+            db.commit()
+            return True
+
+        if relative_path.startswith(f"{MEDIA_STORE_SUBDIR}/"):
+            return False
+        removed = [_unlink(path) for path in media_file_paths(relative_path)]
+        variant_lookup.forget(media_path(relative_path))
+        return removed[0]
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error releasing file {file_url}: {str(e)}")
+        return False
+
+
+def _sweep_released(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """Удаление файлов, у которых не осталось ссылок"""
+    rows = db.query(MediaFile.id, MediaFile.relative_path).filter(
+        MediaFile.ref_count == 0,
+        MediaFile.released_at < cutoff
+    ).limit(batch_size).all()
+
+    deleted = 0
+    for media_id, relative_path in rows:
+        # Условное удаление: ссылка могла появиться после выборки
+        if db.query(MediaFile).filter(MediaFile.id == media_id, MediaFile.ref_count == 0).delete(synchronize_session=False):
+            for path in media_file_paths(relative_path):
+                _unlink(path)
+            variant_lookup.forget(media_path(relative_path))
+            deleted += 1
+        db.commit()
+    return deleted
+
+
+def _sweep_untracked(db: Session, grace_seconds: int) -> int:
+    """Удаление файлов хранилища без строки в БД и брошенных временных файлов"""
+    root = media_path(MEDIA_STORE_SUBDIR)
+    if not root.is_dir():
+        return 0
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for directory, _, names in os.walk(root):
+        old = [name for name in names if os.path.getmtime(os.path.join(directory, name)) < cutoff]
+        if not old:
+            continue
+        # Миниатюры (<sha256>.<size>.webp) принадлежат файлу с тем же хешем
+        hashes = {name.split(".", 1)[0] for name in old if not name.startswith(".")}
+        known = {
+            row[0] for row in db.query(MediaFile.sha256).filter(MediaFile.sha256.in_(hashes)).all()
+        } if hashes else set()
+        for name in old:
+            if name.startswith(".") or name.split(".", 1)[0] not in known:
+                if _unlink(Path(directory) / name):
+                    removed += 1
+    return removed
+
+
+def sweep_media(db: Session, grace_seconds: Optional[int] = None, batch_size: int = 1000) -> dict:
+    """
+    Очистка хранилища
+
+    Удаляет файлы без ссылок дольше grace_seconds, а также файлы дерева
+    хранилища, не зарегистрированные в БД (оборванные загрузки).
+    """
+    grace_seconds = settings.MEDIA_ORPHAN_GRACE if grace_seconds is None else grace_seconds
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    released = 0
+    while True:
+        deleted = _sweep_released(db, cutoff, batch_size)
+        released += deleted
+        if deleted < batch_size:
+            break
+    untracked = _sweep_untracked(db, grace_seconds)
+    if released or untracked:
+        logger.info(f"Очистка хранилища: удалено файлов без ссылок {released}, незарегистрированных {untracked}")
+    return {"released": released, "untracked": untracked}
+
+
+def get_media_stats(db: Session) -> dict:
+    """Файлы, ссылки и объем хранилища"""
+    files, references, size = db.query(
+        func.count(MediaFile.id),
+        func.coalesce(func.sum(MediaFile.ref_count), 0),
+        func.coalesce(func.sum(MediaFile.size), 0)
+    ).one()
+    unreferenced = db.query(func.count(MediaFile.id)).filter(MediaFile.ref_count == 0).scalar()
+    return {
+        "files": files,
+        "references": int(references),
+        "size": int(size),
+        # Сэкономлено дедупликацией: повторные ссылки не занимают места
+        "deduplicated_size": int(db.query(
+            func.coalesce(func.sum(MediaFile.size * (MediaFile.ref_count - 1)), 0)
+        ).filter(MediaFile.ref_count > 1).scalar()),
+        "unreferenced": unreferenced,
+    }
@@ -0,0 +1,121 @@
+"""
+Производные изображения (миниатюры WebP)
+
+После загрузки фотографии заведения, аватара или изображения чата создаются
+уменьшенные WebP копии размеров IMAGE_VARIANT_SIZES (по длинной стороне).
+Декодирование и сжатие выполняются в пуле процессов, чтобы не занимать
+event loop и GIL воркера. Каждая копия записывается во временный файл и
+атомарно переименовывается.
+
+Требуется Pillow; без него генерация пропускается, и ответы API отдают
+исходные изображения.
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence, Set
+
+from app.core.config import settings
+from app.core.media import variant_relative_path, variant_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def pillow_available() -> bool:
+    return importlib.util.find_spec("PIL") is not None
+
+
+def render_variants(source: str, sizes: Sequence[int], quality: int) -> List[int]:
+    """
+    Создание WebP копий изображения source (выполняется в процессе пула)
+
+    Изображения меньше размера не увеличиваются. Возвращает созданные размеры.
+    """
+    from PIL import Image, ImageOps
+
+    created = []
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+        for size in sorted(sizes):
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            target = variant_relative_path(source, size)
+            temp_name = f"{target}.{os.getpid()}.part"
+            try:
+                variant.save(temp_name, "WEBP", quality=quality, method=4)
+                os.replace(temp_name, target)
+            except BaseException:
+                if os.path.exists(temp_name):
+                    os.unlink(temp_name)
+                raise
+            created.append(size)
+    return created
+
+
+class ImageDerivativePipeline:
+    """Очередь генерации производных изображений в пуле процессов"""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._warned = False
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+        return self._executor
+
+    def enqueue(self, path: Path) -> Optional[asyncio.Task]:
+        """
+        Постановка изображения в очередь
+
+        Возвращает задачу (ее можно дождаться, если варианты нужны в ответе)
+        или None, если Pillow не установлен.
+        """
+        if not pillow_available():
+            if not self._warned:
+                logger.warning("Pillow не установлен: миниатюры изображений не создаются")
+                self._warned = True
+            return None
+        task = asyncio.create_task(self._render(path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _render(self, path: Path) -> List[int]:
+        loop = asyncio.get_running_loop()
+        try:
+            created = await loop.run_in_executor(
+                self._pool(),
+                render_variants,
+                str(path),
+                tuple(settings.IMAGE_VARIANT_SIZES),
+                settings.IMAGE_VARIANT_QUALITY
+            )
+            variant_lookup.mark_ready(path, created)
+            return created
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Image variants error for {path}: {str(e)}")
+            return []
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def stop(self):
+        """Ожидание поставленных задач и остановка пула"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+image_pipeline = ImageDerivativePipeline()
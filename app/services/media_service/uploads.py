@@ -0,0 +1,150 @@
+"""
+Сохранение загруженных файлов
+
+Файл копируется из UploadFile порциями UPLOAD_CHUNK_SIZE во временный файл
+в директории хранилища. Копирование выполняется в пуле потоков, поэтому event
+loop не блокируется. Размер проверяется по ходу копирования: при превышении
+лимита вида файла запись прерывается, а временный файл удаляется. Попутно
+считается SHA-256: файл хранится по хешу содержимого (см. app.core.media),
+повторная загрузка того же содержимого ссылается на уже сохраненный файл.
+Новый файл атомарно переименовывается (os.replace) в итоговое имя, так что
+по URL никогда не отдается частично записанный файл.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.media import (
+    MEDIA_STORE_SUBDIR,
+    media_url,
+    media_path,
+    store_relative_path,
+    variant_lookup,
+)
+from app.services.media_service.crud import register_media
+from app.services.media_service.derivatives import image_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Вид файла -> настройка с максимальным размером
+UPLOAD_SIZE_LIMITS = {
+    "image": "MAX_FILE_SIZE",
+    "chat_image": "MAX_CHAT_IMAGE_SIZE",
+    "video": "MAX_CHAT_VIDEO_SIZE",
+    "audio": "MAX_CHAT_AUDIO_SIZE",
+    "file": "MAX_CHAT_FILE_SIZE",
+}
+
+_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+
+class UploadTooLarge(Exception):
+    """Загружаемый файл превышает лимит своего вида"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        super().__init__(f"Файл больше {limit} байт")
+
+
+class StoredUpload:
+    """Сохраненный файл"""
+
+    def __init__(self, path: Path, relative_path: str, size: int, sha256: str, deduplicated: bool = False):
+        self.path = path
+        # Путь относительно UPLOAD_DIR (media/ab/cd/<sha256>.jpg)
+        self.relative_path = relative_path
+        self.size = size
+        self.sha256 = sha256
+        # Такое содержимое уже было в хранилище
+        self.deduplicated = deduplicated
+        # Задача генерации миниатюр (None, если не ставилась)
+        self.variants_task: Optional[asyncio.Task] = None
+
+    @property
+    def url(self) -> str:
+        return media_url(self.relative_path)
+
+
+def upload_limit(kind: str) -> int:
+    return getattr(settings, UPLOAD_SIZE_LIMITS[kind])
+
+
+def _extension(filename: Optional[str], default: str) -> str:
+    """Расширение из имени файла клиента (только простые расширения)"""
+    suffix = Path(filename).suffix.lower() if filename else ""
+    return suffix if _EXTENSION_RE.match(suffix) else default
+
+
+def write_stream(source: BinaryIO, directory: Path, limit: int, chunk_size: int) -> Tuple[str, int, str]:
+    """
+    Копирование потока во временный файл в directory (блокирующее)
+
+    Возвращает (путь временного файла, размер, SHA-256). При превышении limit
+    выбрасывает UploadTooLarge; временный файл в этом случае удаляется.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(prefix=".upload-", suffix=".part", dir=directory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(limit)
+                digest.update(chunk)
+                buffer.write(chunk)
+            buffer.flush()
+            os.fsync(buffer.fileno())
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    return temp_name, size, digest.hexdigest()
+
+
+async def save_upload(
+    db: Session,
+    file: UploadFile,
+    kind: str = "image",
+    default_extension: str = ".jpg",
+    variants: bool = False
+) -> StoredUpload:
+    """
+    Сохранение загруженного файла в хранилище (ссылка на файл +1)
+
+    Лимит размера берется по виду файла kind (см. UPLOAD_SIZE_LIMITS).
+    variants=True ставит изображение в очередь генерации миниатюр, если их
+    еще нет. Ссылка освобождается release_media при удалении владельца.
+    """
+    limit = upload_limit(kind)
+    # Размер уже известен, если multipart парсер его посчитал
+    if file.size is not None and file.size > limit:
+        raise UploadTooLarge(limit)
+
+    await asyncio.to_thread(file.file.seek, 0)
+    temp_name, size, sha256 = await asyncio.to_thread(
+        write_stream, file.file, media_path(MEDIA_STORE_SUBDIR), limit, settings.UPLOAD_CHUNK_SIZE
+    )
+    relative_path = store_relative_path(sha256, _extension(file.filename, default_extension))
+    media, deduplicated = register_media(db, sha256, relative_path, size, temp_name)
+    logger.debug(f"Сохранен файл {media.relative_path} ({size} байт, повтор: {deduplicated})")
+
+    stored = StoredUpload(media_path(media.relative_path), media.relative_path, size, sha256, deduplicated)
+    if variants and not variant_lookup.ready(stored.path).issuperset(settings.IMAGE_VARIANT_SIZES):
+        stored.variants_task = image_pipeline.enqueue(stored.path)
+    return stored
@@ -3,10 +3,10 @@ CRUD операции для Notification Service
 """
 from typing import Optional, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, not_
+from sqlalchemy import or_, and_, not_, exists, func
 from datetime import datetime, timezone
 
-from app.models.notification import Notification, NotificationReadStatus
+from app.models.notification import Notification, NotificationReadStatus, NotificationUserState
 from app.schemas.notification import NotificationCreate, NotificationUpdate
 
 
@@ -34,6 +34,53 @@ def get_notification_by_id(db: Session, notification_id: int) -> Optional[Notifi
     return db.query(Notification).filter(Notification.id == notification_id).first()
 
 
+def get_user_state(db: Session, user_id: int) -> Tuple[int, int]:
+    """Водяные знаки глобальных уведомлений пользователя: (read_up_to_id, cleared_up_to_id)"""
+    row = db.query(
+        NotificationUserState.read_up_to_id,
+        NotificationUserState.cleared_up_to_id
+    ).filter(NotificationUserState.user_id == user_id).first()
+    if not row:
+        return 0, 0
+    return row[0] or 0, row[1] or 0
+
+
+def _get_or_create_user_state(db: Session, user_id: int) -> NotificationUserState:
+    state = db.query(NotificationUserState).filter(
+        NotificationUserState.user_id == user_id
+    ).first()
+    if not state:
+        state = NotificationUserState(user_id=user_id, read_up_to_id=0, cleared_up_to_id=0)
+        db.add(state)
+    return state
+
+
+def _status_exists(user_id: int, *conditions):
+    """EXISTS по точечному статусу глобального уведомления для пользователя"""
+    return exists().where(
+        and_(
+            NotificationReadStatus.notification_id == Notification.id,
+            NotificationReadStatus.user_id == user_id,
+            *conditions
+        )
+    )
+
+
+def _visible_global_filter(user_id: int, cleared_up_to_id: int):
+    """Глобальные уведомления выше водяного знака очистки и не скрытые точечно"""
+    return and_(
+        Notification.user_id.is_(None),
+        Notification.id > cleared_up_to_id,
+        ~_status_exists(user_id, NotificationReadStatus.is_deleted == True)
+    )
+
+
+def _max_global_notification_id(db: Session) -> int:
+    return db.query(func.max(Notification.id)).filter(
+        Notification.user_id.is_(None)
+    ).scalar() or 0
+
+
 def get_user_notifications(
     db: Session,
     user_id: int,
@@ -50,33 +97,28 @@ def get_user_notifications(
     
     Исключает:
     - Удаленные персональные уведомления
+    - Глобальные уведомления ниже водяного знака очистки (cleared_up_to_id)
     - Скрытые глобальные уведомления (через NotificationReadStatus.is_deleted)
     """
-    from sqlalchemy import exists
+    read_up_to_id, cleared_up_to_id = get_user_state(db, user_id)
     
-    # Базовый запрос: персональные + глобальные уведомления
-    # Исключаем скрытые глобальные уведомления
+    # Базовый запрос: персональные + видимые глобальные уведомления
     query = db.query(Notification).filter(
         or_(
             Notification.user_id == user_id,  # Персональные
-            and_(
-                Notification.user_id.is_(None),  # Глобальные
-                ~exists().where(
-                    and_(
-                        NotificationReadStatus.notification_id == Notification.id,
-                        NotificationReadStatus.user_id == user_id,
-                        NotificationReadStatus.is_deleted == True
-                    )
-                )
-            )
+            _visible_global_filter(user_id, cleared_up_to_id)  # Глобальные
         )
     )
     
+    # Глобальное прочитано: ниже водяного знака прочтения или точечная отметка
+    global_read = or_(
+        Notification.id <= read_up_to_id,
+        _status_exists(user_id, NotificationReadStatus.is_read == True)
+    )
+    
     # Фильтр по статусу прочтения
     if unread_only is not None:
         if unread_only:
-            # Непрочитанные: персональные с is_read=False 
-            # или глобальные без записи в NotificationReadStatus с is_read=True
             query = query.filter(
                 or_(
                     and_(
@@ -85,19 +127,11 @@ def get_user_notifications(
                     ),
                     and_(
                         Notification.user_id.is_(None),
-                        ~exists().where(
-                            and_(
-                                NotificationReadStatus.notification_id == Notification.id,
-                                NotificationReadStatus.user_id == user_id,
-                                NotificationReadStatus.is_read == True
-                            )
-                        )
+                        ~global_read
                     )
                 )
             )
         else:
-            # Прочитанные: персональные с is_read=True 
-            # или глобальные с is_read=True в NotificationReadStatus
             query = query.filter(
                 or_(
                     and_(
@@ -106,13 +140,7 @@ def get_user_notifications(
                     ),
                     and_(
                         Notification.user_id.is_(None),
-                        exists().where(
-                            and_(
-                                NotificationReadStatus.notification_id == Notification.id,
-                                NotificationReadStatus.user_id == user_id,
-                                NotificationReadStatus.is_read == True
-                            )
-                        )
+                        global_read
                     )
                 )
             )
@@ -127,38 +155,52 @@ def get_user_notifications(
 
 
 def get_unread_count(db: Session, user_id: int) -> int:
-    """Получение количества непрочитанных уведомлений"""
-    from sqlalchemy import exists
+    """
+    Получение количества непрочитанных уведомлений
     
-    # Непрочитанные: персональные с is_read=False 
-    # или глобальные без записи в NotificationReadStatus с is_read=True и не скрытые
-    return db.query(Notification).filter(
-        or_(
-            and_(
-                Notification.user_id == user_id,
-                Notification.is_read == False
-            ),
-            and_(
-                Notification.user_id.is_(None),
-                # Не скрыто
-                ~exists().where(
-                    and_(
-                        NotificationReadStatus.notification_id == Notification.id,
-                        NotificationReadStatus.user_id == user_id,
-                        NotificationReadStatus.is_deleted == True
-                    )
-                ),
-                # Не прочитано
-                ~exists().where(
-                    and_(
-                        NotificationReadStatus.notification_id == Notification.id,
-                        NotificationReadStatus.user_id == user_id,
-                        NotificationReadStatus.is_read == True
-                    )
-                )
+    Глобальные считаются только выше обоих водяных знаков (диапазон по id),
+    точечные статусы проверяются лишь для этого диапазона
+    """
+    read_up_to_id, cleared_up_to_id = get_user_state(db, user_id)
+    
+    personal_unread = db.query(func.count(Notification.id)).filter(
+        and_(
+            Notification.user_id == user_id,
+            Notification.is_read == False
+        )
+    ).scalar() or 0
+    
+    global_unread = db.query(func.count(Notification.id)).filter(
+        and_(
+            Notification.user_id.is_(None),
+            Notification.id > max(read_up_to_id, cleared_up_to_id),
+            ~_status_exists(
+                user_id,
+                or_(NotificationReadStatus.is_read == True, NotificationReadStatus.is_deleted == True)
             )
         )
-    ).count()
+    ).scalar() or 0
+    
+    return personal_unread + global_unread
+
+
+def get_notification_counts(db: Session, user_id: int) -> Tuple[int, int]:
+    """
+    Количество уведомлений пользователя: (всего, непрочитанных)
+    
+    Считается агрегатами без загрузки строк
+    """
+    _, cleared_up_to_id = get_user_state(db, user_id)
+    
+    personal_total = db.query(func.count(Notification.id)).filter(
+        Notification.user_id == user_id
+    ).scalar() or 0
+    
+    global_total = db.query(func.count(Notification.id)).filter(
+        _visible_global_filter(user_id, cleared_up_to_id)
+    ).scalar() or 0
+    
+    return personal_total + global_total, get_unread_count(db, user_id)
 
 
 def mark_notification_as_read(
@@ -170,7 +212,8 @@ def mark_notification_as_read(
     Отметить уведомление как прочитанное
     
     - Персональные уведомления: обновляем is_read в Notification
-    - Глобальные уведомления: создаем/обновляем запись в NotificationReadStatus
+    - Глобальные уведомления: ниже водяного знака уже прочитаны,
+      выше - создаем/обновляем точечную запись в NotificationReadStatus
     """
     notification = get_notification_by_id(db, notification_id)
     
@@ -189,6 +232,10 @@ def mark_notification_as_read(
         db.refresh(notification)
         return notification
     
+    read_up_to_id, _ = get_user_state(db, user_id)
+    if notification.id <= read_up_to_id:
+        return notification
+    
     # Глобальное уведомление - создаем/обновляем запись в NotificationReadStatus
     read_status = db.query(NotificationReadStatus).filter(
         and_(
@@ -220,14 +267,15 @@ def mark_all_as_read(db: Session, user_id: int) -> int:
     """
     Отметить все уведомления пользователя как прочитанные
     
-    - Персональные уведомления: обновляем is_read в Notification
-    - Глобальные уведомления: создаем/обновляем записи в NotificationReadStatus
+    - Персональные уведомления: один UPDATE is_read в Notification
+    - Глобальные уведомления: сдвиг водяного знака read_up_to_id (одна строка)
+    
+    Возвращает количество уведомлений, ставших прочитанными
     """
-    count = 0
     now = datetime.now(timezone.utc)
     
     # Обновляем персональные уведомления
-    personal_updated = db.query(Notification).filter(
+    count = db.query(Notification).filter(
         and_(
             Notification.user_id == user_id,
             Notification.is_read == False
@@ -235,38 +283,35 @@ def mark_all_as_read(db: Session, user_id: int) -> int:
     ).update({
         Notification.is_read: True,
         Notification.read_at: now
-    })
-    count += personal_updated
+    }, synchronize_session=False)
     
-    # Получаем все глобальные уведомления
-    global_notifications = db.query(Notification.id).filter(
-        Notification.user_id.is_(None)
-    ).all()
+    max_global_id = _max_global_notification_id(db)
+    state = _get_or_create_user_state(db, user_id)
+    previous_read_up_to = state.read_up_to_id or 0
     
-    # Для каждого глобального уведомления создаем/обновляем запись
-    for (notification_id,) in global_notifications:
-        read_status = db.query(NotificationReadStatus).filter(
+    if max_global_id > previous_read_up_to:
+        # Непрочитанные видимые глобальные уведомления в сдвигаемом диапазоне
+        count += db.query(func.count(Notification.id)).filter(
             and_(
-                NotificationReadStatus.notification_id == notification_id,
-                NotificationReadStatus.user_id == user_id
+                Notification.user_id.is_(None),
+                Notification.id > max(previous_read_up_to, state.cleared_up_to_id or 0),
+                Notification.id <= max_global_id,
+                ~_status_exists(
+                    user_id,
+                    or_(NotificationReadStatus.is_read == True, NotificationReadStatus.is_deleted == True)
+                )
             )
-        ).first()
+        ).scalar() or 0
+        state.read_up_to_id = max_global_id
         
-        if read_status:
-            if not read_status.is_read:
-                read_status.is_read = True
-                read_status.read_at = now
-                count += 1
-        else:
-            read_status = NotificationReadStatus(
-                notification_id=notification_id,
-                user_id=user_id,
-                is_read=True,
-                read_at=now,
-                is_deleted=False
+        # Точечные отметки прочтения ниже водяного знака больше не нужны
+        db.query(NotificationReadStatus).filter(
+            and_(
+                NotificationReadStatus.user_id == user_id,
+                NotificationReadStatus.notification_id <= max_global_id,
+                NotificationReadStatus.is_deleted == False
             )
-            db.add(read_status)
-            count += 1
+        ).delete(synchronize_session=False)
     
     db.commit()
     return count
@@ -277,7 +322,8 @@ def delete_notification(db: Session, notification_id: int, user_id: int) -> bool
     Удаление уведомления для пользователя
     
     - Персональные уведомления: полностью удаляются из БД
-    - Глобальные уведомления: помечаются как удаленные через NotificationReadStatus
+    - Глобальные уведомления: ниже водяного знака очистки уже скрыты,
+      выше - помечаются как удаленные через NotificationReadStatus
     """
     notification = get_notification_by_id(db, notification_id)
     
@@ -294,6 +340,10 @@ def delete_notification(db: Session, notification_id: int, user_id: int) -> bool
         db.commit()
         return True
     
+    _, cleared_up_to_id = get_user_state(db, user_id)
+    if notification.id <= cleared_up_to_id:
+        return True
+    
     # Глобальное уведомление - создаем/обновляем запись в NotificationReadStatus с is_deleted=True
     read_status = db.query(NotificationReadStatus).filter(
         and_(
@@ -325,48 +375,39 @@ def delete_all_user_notifications(db: Session, user_id: int) -> int:
     """
     Удаление всех уведомлений пользователя
     
+    - Персональные уведомления: один DELETE
+    - Глобальные уведомления: сдвиг водяного знака cleared_up_to_id (одна строка)
+    
     Возвращает количество удаленных уведомлений
     """
-    count = 0
-    
     # Удаляем все персональные уведомления
-    personal_deleted = db.query(Notification).filter(
+    count = db.query(Notification).filter(
         Notification.user_id == user_id
-    ).delete()
-    count += personal_deleted
-    
-    # Помечаем все глобальные уведомления как удаленные
-    # Получаем все глобальные уведомления
-    global_notifications = db.query(Notification.id).filter(
-        Notification.user_id.is_(None)
-    ).all()
+    ).delete(synchronize_session=False)
     
-    global_ids = [n[0] for n in global_notifications]
+    max_global_id = _max_global_notification_id(db)
+    state = _get_or_create_user_state(db, user_id)
+    previous_cleared_up_to = state.cleared_up_to_id or 0
     
-    # Для каждого глобального уведомления создаем/обновляем запись с is_deleted=True
-    for notification_id in global_ids:
-        read_status = db.query(NotificationReadStatus).filter(
+    if max_global_id > previous_cleared_up_to:
+        # Видимые глобальные уведомления в сдвигаемом диапазоне
+        count += db.query(func.count(Notification.id)).filter(
             and_(
-                NotificationReadStatus.notification_id == notification_id,
-                NotificationReadStatus.user_id == user_id
+                Notification.user_id.is_(None),
+                Notification.id > previous_cleared_up_to,
+                Notification.id <= max_global_id,
+                ~_status_exists(user_id, NotificationReadStatus.is_deleted == True)
             )
-        ).first()
+        ).scalar() or 0
+        state.cleared_up_to_id = max_global_id
         
-        if read_status:
-            if not read_status.is_deleted:
-                read_status.is_deleted = True
-                read_status.deleted_at = datetime.now(timezone.utc)
-                count += 1
-        else:
-            read_status = NotificationReadStatus(
-                notification_id=notification_id,
-                user_id=user_id,
-                is_read=False,
-                is_deleted=True,
-                deleted_at=datetime.now(timezone.utc)
+        # Точечные статусы ниже водяного знака очистки больше не нужны
+        db.query(NotificationReadStatus).filter(
+            and_(
+                NotificationReadStatus.user_id == user_id,
+                NotificationReadStatus.notification_id <= max_global_id
             )
-            db.add(read_status)
-            count += 1
+        ).delete(synchronize_session=False)
     
     db.commit()
     return count
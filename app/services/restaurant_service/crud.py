@@ -27,6 +27,7 @@ from app.schemas.restaurant import (
     RestaurantReviewCreate,
     RestaurantReviewUpdate,
 )
+from app.services.media_service.crud import release_media
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -218,8 +219,11 @@ def delete_restaurant(db: Session, restaurant_id: int) -> bool:
     if not restaurant:
         return False
     
+    photo_urls = [photo.photo_url for photo in restaurant.photos]
     db.delete(restaurant)
     db.commit()
+    for photo_url in photo_urls:
+        release_media(db, photo_url)
     return True
 
 
@@ -428,8 +432,10 @@ def delete_restaurant_photo(db: Session, photo_id: int) -> bool:
     if not photo:
         return False
     
+    photo_url = photo.photo_url
     db.delete(photo)
     db.commit()
+    release_media(db, photo_url)
     return True
 
 
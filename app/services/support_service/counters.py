@@ -0,0 +1,94 @@
+"""
+Счетчики тикетов поддержки для панели администратора
+
+Количество тикетов по статусам и непрочитанных администратором хранится
+в памяти воркера. CRUD функции, меняющие статус или прочитанность тикета,
+применяют изменение к счетчикам и копят его для публикации другим воркерам
+через шину pub/sub. Значения загружаются одним GROUP BY запросом и
+периодически сверяются с БД.
+"""
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from app.models.support import TicketStatus
+
+# Счетчик непрочитанных администратором тикетов
+UNREAD_KEY = "unread"
+
+# Состояние тикета для счетчиков: (статус, не прочитан администратором)
+TicketState = Tuple[str, bool]
+
+
+def _status_key(status) -> str:
+    return TicketStatus(status).value
+
+
+class TicketCounters:
+    """Счетчики тикетов по статусам и непрочитанных администратором"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Optional[Dict[str, int]] = None
+        # Изменения, еще не отправленные другим воркерам
+        self._pending: Counter = Counter()
+
+    @property
+    def ready(self) -> bool:
+        return self._counts is not None
+
+    def load(self, stats: dict):
+        """Значения из БД (результат get_ticket_stats)"""
+        with self._lock:
+            self._counts = {
+                **{status.value: stats.get(status.value, 0) for status in TicketStatus},
+                UNREAD_KEY: stats.get(UNREAD_KEY, 0),
+            }
+
+    def invalidate(self):
+        with self._lock:
+            self._counts = None
+
+    def snapshot(self) -> Optional[dict]:
+        """Текущие значения в формате get_ticket_stats или None, если не загружены"""
+        with self._lock:
+            if self._counts is None:
+                return None
+            counts = {key: max(value, 0) for key, value in self._counts.items()}
+        counts["total"] = sum(counts[status.value] for status in TicketStatus)
+        return counts
+
+    def record(self, before: Optional[TicketState], after: Optional[TicketState]) -> dict:
+        """Изменение состояния тикета (None - тикета не было / больше нет)"""
+        delta: Counter = Counter()
+        if before is not None:
+            delta[_status_key(before[0])] -= 1
+            delta[UNREAD_KEY] -= int(before[1])
+        if after is not None:
+            delta[_status_key(after[0])] += 1
+            delta[UNREAD_KEY] += int(after[1])
+        delta = {key: value for key, value in delta.items() if value}
+        if delta:
+            self.apply(delta)
+            with self._lock:
+                self._pending.update(delta)
+        return delta
+
+    def apply(self, delta: dict):
+        """Применение изменения (своего или полученного от другого воркера)"""
+        with self._lock:
+            if self._counts is None:
+                return
+            for key, value in delta.items():
+                if key in self._counts:
+                    self._counts[key] += value
+
+    def take_pending(self) -> dict:
+        """Накопленные изменения для публикации (очищаются)"""
+        with self._lock:
+            pending = {key: value for key, value in self._pending.items() if value}
+            self._pending.clear()
+        return pending
+
+
+ticket_counters = TicketCounters()
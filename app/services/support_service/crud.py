@@ -7,6 +7,7 @@ from sqlalchemy import and_, or_, func as sql_func
 from datetime import datetime, timezone
 
 from app.models.support import SupportTicket, SupportMessage, TicketStatus, TicketPriority
+from app.services.support_service.counters import ticket_counters, UNREAD_KEY
 from app.schemas.support import (
     SupportTicketCreate,
     SupportTicketUpdate,
@@ -14,6 +15,11 @@ from app.schemas.support import (
 )
 
 
+def _ticket_state(ticket: SupportTicket):
+    """Состояние тикета для счетчиков: (статус, не прочитан администратором)"""
+    return ticket.status, not ticket.is_read_by_admin
+
+
 def create_ticket(
     db: Session,
     user_id: int,
@@ -43,6 +49,7 @@ def create_ticket(
     
     db.commit()
     db.refresh(ticket)
+    ticket_counters.record(None, _ticket_state(ticket))
     return ticket
 
 
@@ -110,6 +117,7 @@ def update_ticket(
     if not ticket:
         return None
     
+    before = _ticket_state(ticket)
     update_data = ticket_update.model_dump(exclude_unset=True)
     
     for field, value in update_data.items():
@@ -124,6 +132,7 @@ def update_ticket(
     
     db.commit()
     db.refresh(ticket)
+    ticket_counters.record(before, _ticket_state(ticket))
     return ticket
 
 
@@ -143,6 +152,8 @@ def add_message(
     if is_from_user and ticket.user_id != user_id:
         return None
     
+    before = _ticket_state(ticket)
+    
     # Если пользователь отправил сообщение, помечаем как непрочитанное для админа
     if is_from_user:
         ticket.is_read_by_admin = False
@@ -175,6 +186,7 @@ def add_message(
     
     db.commit()
     db.refresh(message)
+    ticket_counters.record(before, _ticket_state(ticket))
     return message
 
 
@@ -213,6 +225,7 @@ def mark_ticket_as_read(
     if not is_admin and ticket.user_id != user_id:
         return None
     
+    before = _ticket_state(ticket)
     if is_admin:
         ticket.is_read_by_admin = True
     else:
@@ -220,15 +233,14 @@ def mark_ticket_as_read(
     
     db.commit()
     db.refresh(ticket)
+    ticket_counters.record(before, _ticket_state(ticket))
     return ticket
 
 
 def get_unread_tickets_count(db: Session, user_id: int, is_admin: bool = False) -> int:
     """Получение количества непрочитанных тикетов"""
     if is_admin:
-        return db.query(SupportTicket).filter(
-            SupportTicket.is_read_by_admin == False
-        ).count()
+        return get_cached_ticket_stats(db)[UNREAD_KEY]
     else:
         return db.query(SupportTicket).filter(
             and_(
@@ -239,18 +251,30 @@ def get_unread_tickets_count(db: Session, user_id: int, is_admin: bool = False)
 
 
 def get_ticket_stats(db: Session) -> dict:
-    """Получение статистики тикетов (для администратора)"""
-    total = db.query(SupportTicket).count()
-    open_count = db.query(SupportTicket).filter(SupportTicket.status == TicketStatus.OPEN).count()
-    in_progress_count = db.query(SupportTicket).filter(SupportTicket.status == TicketStatus.IN_PROGRESS).count()
-    resolved_count = db.query(SupportTicket).filter(SupportTicket.status == TicketStatus.RESOLVED).count()
-    closed_count = db.query(SupportTicket).filter(SupportTicket.status == TicketStatus.CLOSED).count()
+    """
+    Получение статистики тикетов (для администратора)
+    
+    Один GROUP BY по статусу: количество тикетов и непрочитанных администратором
+    """
+    rows = db.query(
+        SupportTicket.status,
+        sql_func.count(SupportTicket.id),
+        sql_func.count(SupportTicket.id).filter(SupportTicket.is_read_by_admin == False),
+    ).group_by(SupportTicket.status).all()
     
-    return {
-        "total": total,
-        "open": open_count,
-        "in_progress": in_progress_count,
-        "resolved": resolved_count,
-        "closed": closed_count
-    }
+    stats = {status.value: 0 for status in TicketStatus}
+    stats[UNREAD_KEY] = 0
+    for status, count, unread in rows:
+        stats[TicketStatus(status).value] = count
+        stats[UNREAD_KEY] += unread
+    stats["total"] = sum(stats[status.value] for status in TicketStatus)
+    return stats
+
 
+def get_cached_ticket_stats(db: Session) -> dict:
+    """Статистика из счетчиков; при первом обращении загружается из БД"""
+    snapshot = ticket_counters.snapshot()
+    if snapshot is None:
+        ticket_counters.load(get_ticket_stats(db))
+        snapshot = ticket_counters.snapshot()
+    return snapshot
@@ -1,7 +1,7 @@
 """
 CRUD операции для User Service
 """
-from typing import Optional, List
+from typing import Optional, List, Dict
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 
@@ -14,6 +14,15 @@ def get_user_extended_by_id(db: Session, user_id: int) -> Optional[UserExtended]
     return db.query(UserExtended).filter(UserExtended.user_id == user_id).first()
 
 
+def get_users_extended_by_ids(db: Session, user_ids: List[int]) -> Dict[int, UserExtended]:
+    """Пакетное получение расширенных пользователей: user_id -> UserExtended"""
+    unique_ids = set(user_ids)
+    if not unique_ids:
+        return {}
+    users = db.query(UserExtended).filter(UserExtended.user_id.in_(unique_ids)).all()
+    return {user.user_id: user for user in users}
+
+
 def get_user_extended_by_phone(db: Session, phone: str) -> Optional[UserExtended]:
     """Получение расширенного пользователя по телефону"""
     return db.query(UserExtended).filter(UserExtended.phone == phone).first()
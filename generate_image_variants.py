@@ -0,0 +1,90 @@
+"""
+Скрипт создания миниатюр WebP для уже загруженных изображений
+
+Новые фотографии заведений, аватары и изображения чата получают миниатюры
+при загрузке. Скрипт обрабатывает файлы, загруженные раньше, и изображения
+без миниатюр после изменения IMAGE_VARIANT_SIZES. Повторный запуск
+безопасен: изображения со всеми миниатюрами пропускаются.
+
+Использование:
+    python generate_image_variants.py [--workers N]
+"""
+import sys
+import io
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Настройка кодировки для Windows
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.config import settings
+from app.core.media import variant_relative_path
+from app.services.media_service.derivatives import pillow_available, render_variants
+
+# Директории изображений, для которых нужны миниатюры
+IMAGE_SUBDIRS = [
+    "avatars",
+    "global_chat/images",
+    "gas_stations",
+    "electric_stations",
+    "restaurants",
+    "service_stations",
+    "car_washes",
+]
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def find_images_without_variants():
+    upload_dir = Path(settings.UPLOAD_DIR)
+    for subdir in IMAGE_SUBDIRS:
+        directory = upload_dir / subdir
+        if not directory.is_dir():
+            continue
+        for path in directory.iterdir():
+            # Сами миниатюры имеют вид name.<size>.webp
+            if not path.is_file() or path.suffix.lower() not in IMAGE_EXTENSIONS or path.stem.split(".")[-1].isdigit():
+                continue
+            if all(Path(variant_relative_path(str(path), size)).is_file() for size in settings.IMAGE_VARIANT_SIZES):
+                continue
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Создание миниатюр WebP для загруженных изображений")
+    parser.add_argument("--workers", type=int, default=settings.IMAGE_VARIANT_WORKERS, help="Количество процессов")
+    args = parser.parse_args()
+
+    if not pillow_available():
+        print("[ERROR] Pillow не установлен: pip install Pillow")
+        sys.exit(1)
+
+    images = list(find_images_without_variants())
+    print(f"Изображений без миниатюр: {len(images)}")
+
+    done = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(render_variants, str(path), tuple(settings.IMAGE_VARIANT_SIZES), settings.IMAGE_VARIANT_QUALITY): path
+            for path in images
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"[WARNING] {futures[future]}: {str(e)}")
+
+    print(f"[SUCCESS] Обработано: {done}, ошибок: {failed}")
+
+
+if __name__ == "__main__":
+    main()
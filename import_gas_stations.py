@@ -1,12 +1,28 @@
 """
 Скрипт для импорта данных о заправках из CSV файлов в базу данных
+
+Использование:
+    python import_gas_stations.py [places.csv] [prices.csv] [--batch-size N] [--dry-run]
+
+Существующие заправки и электрозаправки загружаются один раз в индекс по
+координатам, CSV читаются потоково. Строки обрабатываются пачками: новые
+станции вставляются одним INSERT ... RETURNING, цены - одним
+INSERT ... ON CONFLICT (gas_station_id, fuel_type) DO UPDATE (неизменившиеся
+цены не перезаписываются), зарядные точки новых электрозаправок - одним
+INSERT. Пачка фиксируется одним commit. Данные существующих станций не
+меняются, обновляются только цены. Повторный запуск безопасен.
+
+--dry-run ничего не пишет и выводит различия с базой:
+    + новая станция или цена
+    ~ изменившаяся цена (старая -> новая) или другое название на тех же координатах
 """
+import argparse
 import csv
 import sys
 import io
+import time
 from pathlib import Path
-from typing import Dict, List, Optional
-from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Настройка кодировки для Windows
 if sys.platform == 'win32':
@@ -16,6 +32,7 @@ if sys.platform == 'win32':
 # Добавляем путь к проекту
 sys.path.insert(0, str(Path(__file__).parent))
 
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine, Base
 from app.models.gas_station import GasStation, FuelPrice, FuelType, StationStatus
@@ -24,8 +41,13 @@ from app.models.electric_station import ElectricStation, ChargingPoint, Connecto
 # Создаем таблицы если их нет
 Base.metadata.create_all(bind=engine)
 
+DEFAULT_PLACES_FILE = r"c:\Users\User\Downloads\Telegram Desktop\togo-places.csv"
+DEFAULT_PRICES_FILE = r"c:\Users\User\Downloads\Telegram Desktop\togp-fuel-price .csv"
+
+# Строк CSV в одной пачке (один commit)
+BATCH_SIZE = 1000
+
 # Маппинг типов топлива из CSV в enum
-# Проверяем доступные типы в FuelType
 FUEL_TYPE_MAPPING = {
     "АИ-80": FuelType.AI_80,
     "АИ-91": FuelType.AI_91,
@@ -33,9 +55,12 @@ FUEL_TYPE_MAPPING = {
     "АИ-98": FuelType.AI_98,
     "Дизель": FuelType.DIESEL,
     "Газ": FuelType.GAS,
-    # АИ-92, Метан и Пропан могут быть не в модели, пропускаем их или используем ближайший тип
+    # АИ-92, Метан и Пропан нет в модели - такие цены пропускаются
 }
 
+Coordinates = Tuple[float, float]
+
+
 # Маппинг boolean значений из CSV
 def parse_bool(value: str) -> bool:
     """Парсинг boolean значений из CSV"""
@@ -48,7 +73,7 @@ def parse_coordinates(coords_str: str) -> tuple[Optional[float], Optional[float]
     """Парсинг координат из строки формата 'latitude, longitude'"""
     if not coords_str or coords_str.strip() == "":
         return None, None
-    
+
     try:
         # Убираем кавычки и пробелы
         coords_str = coords_str.strip().strip('"').strip("'")
@@ -59,7 +84,7 @@ def parse_coordinates(coords_str: str) -> tuple[Optional[float], Optional[float]
             return lat, lon
     except (ValueError, IndexError):
         pass
-    
+
     return None, None
 
 
@@ -67,13 +92,13 @@ def parse_working_hours(working_hours: str) -> tuple[bool, Optional[str]]:
     """Парсинг режима работы"""
     if not working_hours or working_hours.strip() == "" or working_hours.strip().lower() == "нет информации":
         return False, None
-    
+
     working_hours = working_hours.strip()
-    
+
     # Проверяем на 24/7
     if "24/7" in working_hours.lower() or "24 соат" in working_hours.lower() or "24 часа" in working_hours.lower():
         return True, None
-    
+
     return False, working_hours
 
 
@@ -84,343 +109,376 @@ def parse_phone(phone: str) -> Optional[str]:
     return phone.strip()
 
 
-def load_csv_data(places_file: str, prices_file: str) -> tuple[Dict, Dict]:
-    """Загрузка данных из CSV файлов"""
-    places_data = {}
-    prices_data = {}
-    
-    # Загружаем данные о местах
-    with open(places_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            row_id = row.get('🔒 Row ID', '').strip()
-            if row_id:
-                places_data[row_id] = row
-    
-    # Загружаем данные о ценах
-    with open(prices_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+def normalize_name(name: Optional[str]) -> str:
+    return " ".join((name or "").lower().split())
+
+
+def read_places(places_file: str) -> Iterator[Dict]:
+    """Потоковое чтение мест (строки без Row ID пропускаются)"""
+    with open(places_file, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get('🔒 Row ID', '').strip():
+                yield row
+
+
+def read_prices(prices_file: str) -> Dict[str, Dict[FuelType, float]]:
+    """
+    Потоковое чтение цен: stationID -> {тип топлива: цена}
+
+    При повторах берется последняя цена; типы, которых нет в модели, пропускаются.
+    """
+    prices: Dict[str, Dict[FuelType, float]] = {}
+    with open(prices_file, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
             station_id = row.get('stationID', '').strip()
-            if station_id:
-                if station_id not in prices_data:
-                    prices_data[station_id] = []
-                prices_data[station_id].append(row)
-    
-    return places_data, prices_data
-
-
-def import_gas_stations(db: Session, places_data: Dict, prices_data: Dict):
-    """Импорт заправок в базу данных"""
-    imported_count = 0
-    skipped_count = 0
-    error_count = 0
-    
-    # Получаем первого админа для created_by_admin_id
-    from app.models.user import User
-    admin = db.query(User).filter(User.is_admin == True).first()
-    admin_id = admin.id if admin else None
-    
-    if not admin_id:
-        print("ВНИМАНИЕ: Не найден администратор. Заправки будут созданы без created_by_admin_id")
-    
-    for row_id, place in places_data.items():
-        try:
-            # Пропускаем если это не АЗС
-            category = place.get('category', '').strip()
-            if category != 'АЗС':
-                continue
-            
-            # Проверяем, есть ли уже заправка с таким Row ID (можно использовать name + coordinates)
-            name = place.get('name', '').strip()
-            if not name:
-                skipped_count += 1
+            fuel_type = FUEL_TYPE_MAPPING.get(row.get('fuel_type', '').strip())
+            if not station_id or fuel_type is None:
                 continue
-            
-            # Парсим координаты
-            coords_str = place.get('coordinates', '').strip()
-            latitude, longitude = parse_coordinates(coords_str)
-            
-            if latitude is None or longitude is None:
-                print(f"Пропущена заправка '{name}': нет координат")
-                skipped_count += 1
+            try:
+                price = float(row.get('price', '').strip())
+            except ValueError:
                 continue
-            
-            # Проверяем, существует ли уже заправка с такими координатами
-            existing = db.query(GasStation).filter(
-                GasStation.latitude == latitude,
-                GasStation.longitude == longitude
-            ).first()
-            
-            if existing:
-                print(f"Пропущена заправка '{name}': уже существует (ID: {existing.id})")
-                skipped_count += 1
-                # Обновляем цены для существующей заправки
-                if row_id in prices_data:
-                    update_fuel_prices(db, existing.id, prices_data[row_id], admin_id)
-                continue
-            
-            # Парсим режим работы
-            working_hours_str = place.get('working_hours', '').strip()
-            is_24_7, working_hours = parse_working_hours(working_hours_str)
-            
-            # Создаем заправку
-            gas_station = GasStation(
-                name=name,
-                address=place.get('address', '').strip() or name,
-                latitude=latitude,
-                longitude=longitude,
-                phone=parse_phone(place.get('phone_number', '').strip()),
-                is_24_7=is_24_7,
-                working_hours=working_hours,
-                status=StationStatus.APPROVED,  # Сразу одобряем импортированные
-                created_by_admin_id=admin_id,
-                category="Заправка"
-            )
-            
-            db.add(gas_station)
-            db.flush()  # Получаем ID
-            
-            # Добавляем цены на топливо
-            if row_id in prices_data:
-                add_fuel_prices(db, gas_station.id, prices_data[row_id], admin_id)
-            
-            # Также проверяем поля из CSV для типов топлива
-            add_fuel_prices_from_csv_columns(db, gas_station.id, place, admin_id)
-            
-            imported_count += 1
-            
-            if imported_count % 10 == 0:
-                print(f"Импортировано {imported_count} заправок...")
-                db.commit()
-        
-        except Exception as e:
-            error_count += 1
-            print(f"Ошибка при импорте заправки '{place.get('name', 'Unknown')}': {str(e)}")
-            db.rollback()
-            continue
-    
-    db.commit()
-    print(f"\nИмпорт заправок завершен:")
-    print(f"   - Импортировано: {imported_count}")
-    print(f"   - Пропущено: {skipped_count}")
-    print(f"   - Ошибок: {error_count}")
-
-
-def add_fuel_prices(db: Session, station_id: int, prices: List[Dict], admin_id: Optional[int]):
-    """Добавление цен на топливо из данных о ценах"""
-    # Собираем все цены по типам топлива, берем последнюю (самую актуальную)
-    prices_by_type = {}
-    for price_row in prices:
-        fuel_type_str = price_row.get('fuel_type', '').strip()
-        price_str = price_row.get('price', '').strip()
-        
-        if not fuel_type_str or not price_str:
-            continue
-        
-        try:
-            price = float(price_str)
-            prices_by_type[fuel_type_str] = price  # Перезаписываем, если есть дубликаты
-        except ValueError:
-            continue
-    
-    # Добавляем/обновляем цены
-    for fuel_type_str, price in prices_by_type.items():
-        try:
-            # Маппим тип топлива
-            fuel_type = FUEL_TYPE_MAPPING.get(fuel_type_str)
-            if not fuel_type:
-                # Пропускаем типы, которых нет в модели (АИ-92, Метан, Пропан)
-                continue
-            
-            # Проверяем, есть ли уже такая цена
-            existing = db.query(FuelPrice).filter(
-                FuelPrice.gas_station_id == station_id,
-                FuelPrice.fuel_type == fuel_type
-            ).first()
-            
-            if existing:
-                # Обновляем цену
-                existing.price = price
-                existing.updated_by_admin_id = admin_id
-            else:
-                # Создаем новую цену
-                fuel_price = FuelPrice(
-                    gas_station_id=station_id,
-                    fuel_type=fuel_type,
-                    price=price,
-                    updated_by_admin_id=admin_id
-                )
-                db.add(fuel_price)
-        
-        except Exception as e:
-            print(f"Ошибка при добавлении цены {fuel_type_str}: {str(e)}")
-            continue
-
-
-def add_fuel_prices_from_csv_columns(db: Session, station_id: int, place: Dict, admin_id: Optional[int]):
-    """Добавление цен на топливо из колонок CSV (ai-80, ai-92 и т.д.)"""
-    # Маппинг колонок CSV на типы топлива (только те, что есть в модели)
-    # АИ-92 нет в модели, пропускаем
-    column_mapping = {
-        'ai-80': FuelType.AI_80,
-        'ai-91': FuelType.AI_91,
-        'ai-95': FuelType.AI_95,
-        'ai-98': FuelType.AI_98,
-        'diesel': FuelType.DIESEL,
-        'gas': FuelType.GAS,
-    }
-    
-    # Просто проверяем наличие, цены добавляются из prices_data
-    # Эта функция может использоваться для логирования или будущих улучшений
-
-
-def update_fuel_prices(db: Session, station_id: int, prices: List[Dict], admin_id: Optional[int]):
-    """Обновление цен на топливо для существующей заправки"""
-    add_fuel_prices(db, station_id, prices, admin_id)
-
-
-def import_electric_stations(db: Session, places_data: Dict):
-    """Импорт электрозаправок в базу данных"""
-    imported_count = 0
-    skipped_count = 0
-    error_count = 0
-    
-    # Получаем первого админа
-    from app.models.user import User
-    admin = db.query(User).filter(User.is_admin == True).first()
-    admin_id = admin.id if admin else None
-    
-    for row_id, place in places_data.items():
-        try:
-            # Проверяем, есть ли электрозарядка
-            electric_charging = parse_bool(place.get('electric_charging', ''))
-            if not electric_charging:
-                continue
-            
-            # Пропускаем если это не АЗС (но может быть электрозаправка)
-            category = place.get('category', '').strip()
-            
-            name = place.get('name', '').strip()
-            if not name:
-                skipped_count += 1
-                continue
-            
-            # Парсим координаты
-            coords_str = place.get('coordinates', '').strip()
-            latitude, longitude = parse_coordinates(coords_str)
-            
-            if latitude is None or longitude is None:
-                print(f"Пропущена электрозаправка '{name}': нет координат")
-                skipped_count += 1
-                continue
-            
-            # Проверяем, существует ли уже электрозаправка с такими координатами
-            existing = db.query(ElectricStation).filter(
-                ElectricStation.latitude == latitude,
-                ElectricStation.longitude == longitude
-            ).first()
-            
-            if existing:
-                print(f"Пропущена электрозаправка '{name}': уже существует (ID: {existing.id})")
-                skipped_count += 1
-                continue
-            
-            # Парсим режим работы
-            working_hours_str = place.get('working_hours', '').strip()
-            is_24_7, working_hours = parse_working_hours(working_hours_str)
-            
-            # Создаем электрозаправку
-            electric_station = ElectricStation(
-                name=name,
-                address=place.get('address', '').strip() or name,
-                latitude=latitude,
-                longitude=longitude,
-                phone=parse_phone(place.get('phone_number', '').strip()),
-                is_24_7=is_24_7,
-                working_hours=working_hours,
-                has_parking=parse_bool(place.get('parking', '')),
-                has_cafe=parse_bool(place.get('cafe', '')),
-                has_waiting_room=True,  # По умолчанию
-                has_restroom=parse_bool(place.get('wc', '')),
-                accepts_cards=True,  # По умолчанию
-                status=ElectricStationStatus.APPROVED,
-                created_by_admin_id=admin_id,
-                category="Электрозаправка"
-            )
-            
-            db.add(electric_station)
-            db.flush()
-            
-            # Добавляем зарядную точку по умолчанию (Type 2, 50 кВт)
-            charging_point = ChargingPoint(
-                electric_station_id=electric_station.id,
-                connector_type=ConnectorType.TYPE_2,
-                power_kw=50.0,
-                status=ChargingPointStatus.AVAILABLE
-            )
-            db.add(charging_point)
-            
-            # Обновляем счетчики
-            electric_station.total_points = 1
-            electric_station.available_points = 1
-            
-            imported_count += 1
-            
-            if imported_count % 5 == 0:
-                print(f"Импортировано {imported_count} электрозаправок...")
-                db.commit()
-        
-        except Exception as e:
-            error_count += 1
-            print(f"Ошибка при импорте электрозаправки '{place.get('name', 'Unknown')}': {str(e)}")
-            db.rollback()
-            continue
-    
-    db.commit()
-    print(f"\nИмпорт электрозаправок завершен:")
-    print(f"   - Импортировано: {imported_count}")
-    print(f"   - Пропущено: {skipped_count}")
-    print(f"   - Ошибок: {error_count}")
+            prices.setdefault(station_id, {})[fuel_type] = price
+    return prices
+
+
+def batched(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def upsert_insert(db: Session):
+    """INSERT с поддержкой ON CONFLICT для диалекта базы"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise RuntimeError(f"ON CONFLICT не поддерживается для {dialect}")
+    return dialect_insert
+
+
+class StationIndex:
+    """Существующие станции: координаты -> (ID, название)"""
+
+    def __init__(self, db: Session, model):
+        self.stations: Dict[Coordinates, Tuple[Optional[int], str]] = {}
+        # Добавленные в текущей пачке (убираются при ее откате)
+        self.pending: List[Coordinates] = []
+        rows = db.query(model.id, model.name, model.latitude, model.longitude).yield_per(10000)
+        for station_id, name, latitude, longitude in rows:
+            self.stations.setdefault((latitude, longitude), (station_id, name))
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def get(self, coordinates: Coordinates) -> Optional[Tuple[Optional[int], str]]:
+        return self.stations.get(coordinates)
+
+    def add(self, coordinates: Coordinates, station_id: Optional[int], name: str):
+        self.stations[coordinates] = (station_id, name)
+        self.pending.append(coordinates)
+
+    def commit(self):
+        self.pending = []
+
+    def rollback(self):
+        for coordinates in self.pending:
+            self.stations.pop(coordinates, None)
+        self.pending = []
+
+
+class ImportStats:
+    """Счетчики и скорость импорта"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.rows = 0
+        self.gas_created = 0
+        self.gas_existing = 0
+        self.electric_created = 0
+        self.electric_existing = 0
+        self.points_created = 0
+        self.prices_created = 0
+        self.prices_changed = 0
+        self.prices_unchanged = 0
+        self.skipped = 0
+        self.errors = 0
+
+    @property
+    def elapsed(self) -> float:
+        return max(time.monotonic() - self.started, 1e-9)
+
+    def progress(self) -> str:
+        return f"Обработано {self.rows} строк ({self.rows / self.elapsed:.0f} строк/с)"
+
+    def report(self, dry_run: bool):
+        title = "Проверка завершена (--dry-run, изменения не записаны)" if dry_run else "Импорт завершен"
+        print(f"\n{title} за {self.elapsed:.1f} с ({self.rows / self.elapsed:.0f} строк/с):")
+        print(f"   - Строк: {self.rows}")
+        print(f"   - Заправок новых: {self.gas_created}, существующих: {self.gas_existing}")
+        print(f"   - Электрозаправок новых: {self.electric_created}, существующих: {self.electric_existing}")
+        print(f"   - Зарядных точек новых: {self.points_created}")
+        print(f"   - Цен новых: {self.prices_created}, измененных: {self.prices_changed}, без изменений: {self.prices_unchanged}")
+        print(f"   - Пропущено: {self.skipped}")
+        print(f"   - Ошибок: {self.errors}")
+
+
+class StationImporter:
+    """Пакетный импорт заправок, цен и электрозаправок"""
+
+    def __init__(
+        self,
+        db: Session,
+        prices: Dict[str, Dict[FuelType, float]],
+        admin_id: Optional[int],
+        dry_run: bool = False
+    ):
+        self.db = db
+        self.prices = prices
+        self.admin_id = admin_id
+        self.dry_run = dry_run
+        self.stats = ImportStats()
+        self.gas_index = StationIndex(db, GasStation)
+        self.electric_index = StationIndex(db, ElectricStation)
+
+    def run(self, places: Iterable[Dict], batch_size: int = BATCH_SIZE) -> ImportStats:
+        for batch in batched(places, batch_size):
+            try:
+                self._import_batch(batch)
+                if not self.dry_run:
+                    self.db.commit()
+                self.gas_index.commit()
+                self.electric_index.commit()
+            except Exception as e:
+                self.db.rollback()
+                self.gas_index.rollback()
+                self.electric_index.rollback()
+                self.stats.errors += len(batch)
+                print(f"Ошибка при импорте пачки из {len(batch)} строк: {str(e)}")
+            self.stats.rows += len(batch)
+            print(self.stats.progress())
+        return self.stats
+
+    def _diff(self, line: str):
+        if self.dry_run:
+            print(line)
+
+    def _parse_place(self, place: Dict, kind: str) -> Optional[Tuple[Coordinates, Dict]]:
+        """Координаты и общие поля станции (None - строка пропущена)"""
+        name = place.get('name', '').strip()
+        if not name:
+            self.stats.skipped += 1
+            return None
+        latitude, longitude = parse_coordinates(place.get('coordinates', '').strip())
+        if latitude is None or longitude is None:
+            print(f"Пропущена {kind} '{name}': нет координат")
+            self.stats.skipped += 1
+            return None
+        is_24_7, working_hours = parse_working_hours(place.get('working_hours', '').strip())
+        return (latitude, longitude), {
+            "name": name,
+            "address": place.get('address', '').strip() or name,
+            "latitude": latitude,
+            "longitude": longitude,
+            "phone": parse_phone(place.get('phone_number', '').strip()),
+            "is_24_7": is_24_7,
+            "working_hours": working_hours,
+            "created_by_admin_id": self.admin_id,
+        }
+
+    def _match(self, index: StationIndex, coordinates: Coordinates, name: str, new: Dict[Coordinates, Dict]) -> bool:
+        """True, если станция с этими координатами уже есть (в базе или в пачке)"""
+        if coordinates in new:
+            return True
+        existing = index.get(coordinates)
+        if existing is None:
+            return False
+        if normalize_name(existing[1]) != normalize_name(name):
+            self._diff(f"~ {existing[1]} {coordinates}: в CSV название '{name}' (не обновляется)")
+        return True
+
+    def _import_batch(self, batch: List[Dict]):
+        new_gas: Dict[Coordinates, Dict] = {}
+        new_electric: Dict[Coordinates, Dict] = {}
+        station_prices: Dict[Coordinates, Dict[FuelType, float]] = {}
+
+        for place in batch:
+            row_id = place['🔒 Row ID'].strip()
+
+            if place.get('category', '').strip() == 'АЗС':
+                parsed = self._parse_place(place, "заправка")
+                if parsed:
+                    coordinates, values = parsed
+                    if self._match(self.gas_index, coordinates, values["name"], new_gas):
+                        self.stats.gas_existing += 1
+                    else:
+                        new_gas[coordinates] = {**values, "status": StationStatus.APPROVED, "category": "Заправка"}
+                    if row_id in self.prices:
+                        station_prices.setdefault(coordinates, {}).update(self.prices[row_id])
+
+            if parse_bool(place.get('electric_charging', '')):
+                parsed = self._parse_place(place, "электрозаправка")
+                if parsed:
+                    coordinates, values = parsed
+                    if self._match(self.electric_index, coordinates, values["name"], new_electric):
+                        self.stats.electric_existing += 1
+                    else:
+                        new_electric[coordinates] = {
+                            **values,
+                            "has_parking": parse_bool(place.get('parking', '')),
+                            "has_cafe": parse_bool(place.get('cafe', '')),
+                            "has_waiting_room": True,  # По умолчанию
+                            "has_restroom": parse_bool(place.get('wc', '')),
+                            "accepts_cards": True,  # По умолчанию
+                            "status": ElectricStationStatus.APPROVED,
+                            "category": "Электрозаправка",
+                            "total_points": 1,
+                            "available_points": 1,
+                        }
+
+        self._insert_stations(GasStation, self.gas_index, new_gas, "заправка")
+        self.stats.gas_created += len(new_gas)
+        self._upsert_prices(station_prices)
+
+        electric_ids = self._insert_stations(ElectricStation, self.electric_index, new_electric, "электрозаправка")
+        self.stats.electric_created += len(new_electric)
+        self._insert_charging_points(electric_ids)
+
+    def _insert_stations(self, model, index: StationIndex, stations: Dict[Coordinates, Dict], kind: str) -> List[int]:
+        """Вставка новых станций одним запросом; ID попадают в индекс"""
+        if not stations:
+            return []
+        if self.dry_run:
+            for coordinates, values in stations.items():
+                self._diff(f"+ {kind} {values['name']} {coordinates}")
+                index.add(coordinates, None, values["name"])
+            return []
+
+        rows = list(stations.values())
+        ids = self.db.connection().execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        for coordinates, values, station_id in zip(stations, rows, ids):
+            index.add(coordinates, station_id, values["name"])
+        return list(ids)
+
+    def _upsert_prices(self, station_prices: Dict[Coordinates, Dict[FuelType, float]]):
+        """Цены пачки: новые и изменившиеся одним upsert"""
+        resolved = {}
+        for coordinates, prices in station_prices.items():
+            station_id, name = self.gas_index.get(coordinates)
+            resolved[coordinates] = (station_id, name, prices)
+
+        station_ids = [station_id for station_id, _, _ in resolved.values() if station_id is not None]
+        current: Dict[Tuple[int, FuelType], float] = {}
+        if station_ids:
+            current = {
+                (station_id, fuel_type): price
+                for station_id, fuel_type, price in self.db.query(
+                    FuelPrice.gas_station_id, FuelPrice.fuel_type, FuelPrice.price
+                ).filter(FuelPrice.gas_station_id.in_(station_ids))
+            }
+
+        rows = []
+        for station_id, name, prices in resolved.values():
+            for fuel_type, price in prices.items():
+                old_price = current.get((station_id, fuel_type)) if station_id is not None else None
+                if old_price is None:
+                    self.stats.prices_created += 1
+                    self._diff(f"+ {name}: {fuel_type.value} {price:g}")
+                elif old_price != price:
+                    self.stats.prices_changed += 1
+                    self._diff(f"~ {name}: {fuel_type.value} {old_price:g} -> {price:g}")
+                else:
+                    self.stats.prices_unchanged += 1
+                    continue
+                rows.append({
+                    "gas_station_id": station_id,
+                    "fuel_type": fuel_type,
+                    "price": price,
+                    "updated_by_admin_id": self.admin_id,
+                })
+
+        if not rows or self.dry_run:
+            return
+        stmt = upsert_insert(self.db)(FuelPrice)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FuelPrice.gas_station_id, FuelPrice.fuel_type],
+            set_={
+                "price": stmt.excluded.price,
+                "updated_by_admin_id": stmt.excluded.updated_by_admin_id,
+                "updated_at": func.now(),
+            },
+            where=FuelPrice.price != stmt.excluded.price
+        )
+        self.db.connection().execute(stmt, rows)
+
+    def _insert_charging_points(self, station_ids: List[int]):
+        """Зарядная точка по умолчанию (Type 2, 50 кВт) для новых электрозаправок"""
+        if not station_ids:
+            return
+        self.db.connection().execute(insert(ChargingPoint), [
+            {
+                "electric_station_id": station_id,
+                "connector_type": ConnectorType.TYPE_2,
+                "power_kw": 50.0,
+                "status": ChargingPointStatus.AVAILABLE,
+            }
+            for station_id in station_ids
+        ])
+        self.stats.points_created += len(station_ids)
 
 
 def main():
     """Основная функция импорта"""
-    places_file = r"c:\Users\User\Downloads\Telegram Desktop\togo-places.csv"
-    prices_file = r"c:\Users\User\Downloads\Telegram Desktop\togp-fuel-price .csv"
-    
-    if not Path(places_file).exists():
-        print(f"Файл не найден: {places_file}")
-        return
-    
-    if not Path(prices_file).exists():
-        print(f"Файл не найден: {prices_file}")
-        return
-    
-    print("Загрузка данных из CSV файлов...")
-    places_data, prices_data = load_csv_data(places_file, prices_file)
-    print(f"Загружено {len(places_data)} мест и {sum(len(prices) for prices in prices_data.values())} цен")
-    
+    parser = argparse.ArgumentParser(description="Импорт заправок и электрозаправок из CSV")
+    parser.add_argument("places_file", nargs="?", default=DEFAULT_PLACES_FILE, help="CSV с местами")
+    parser.add_argument("prices_file", nargs="?", default=DEFAULT_PRICES_FILE, help="CSV с ценами на топливо")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Строк CSV в одной пачке")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать различия с базой")
+    args = parser.parse_args()
+
+    for path in (args.places_file, args.prices_file):
+        if not Path(path).exists():
+            print(f"Файл не найден: {path}")
+            return
+
+    started = time.monotonic()
+    prices = read_prices(args.prices_file)
+    print(f"Загружены цены для {len(prices)} мест за {time.monotonic() - started:.1f} с")
+
     db = SessionLocal()
     try:
-        print("\nИмпорт заправок...")
-        import_gas_stations(db, places_data, prices_data)
-        
-        print("\nИмпорт электрозаправок...")
-        import_electric_stations(db, places_data)
-        
-        print("\nИмпорт завершен успешно!")
-    
+        # Первый админ - автор импортированных станций и цен
+        from app.models.user import User
+        admin = db.query(User).filter(User.is_admin == True).first()
+        admin_id = admin.id if admin else None
+        if not admin_id:
+            print("ВНИМАНИЕ: Не найден администратор. Станции будут созданы без created_by_admin_id")
+
+        importer = StationImporter(db, prices, admin_id, dry_run=args.dry_run)
+        print(f"В базе {len(importer.gas_index)} заправок и {len(importer.electric_index)} электрозаправок")
+
+        stats = importer.run(read_places(args.places_file), args.batch_size)
+        stats.report(args.dry_run)
+
     except Exception as e:
         print(f"\nКритическая ошибка: {str(e)}")
         import traceback
         traceback.print_exc()
         db.rollback()
-    
+
     finally:
         db.close()
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,45 @@
+"""
+Скрипт переноса скрытых сообщений глобального чата в водяные знаки очистки истории
+
+Раньше очистка истории создавала строку hidden_global_chat_messages на каждое
+сообщение. Скрипт вычисляет для каждого пользователя водяной знак
+(global_chat_user_states.cleared_before_id) и удаляет ставшие ненужными строки.
+Повторный запуск безопасен.
+"""
+import sys
+import io
+from pathlib import Path
+
+# Настройка кодировки для Windows
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.database import SessionLocal, engine, Base
+from app.models import GlobalChatUserState  # noqa: F401 - регистрация таблицы
+from app.services.global_chat_service.crud import migrate_hidden_messages_to_watermarks
+
+# Создаем таблицы если их нет
+Base.metadata.create_all(bind=engine)
+
+
+def main():
+    db = SessionLocal()
+    try:
+        users = migrate_hidden_messages_to_watermarks(db)
+        print(f"[SUCCESS] Водяные знаки обновлены для {users} пользователей")
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Ошибка миграции: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Скрипт пересчета дневных счетчиков и скетчей уникальных пользователей рекламы
+
+Счетчики ведутся при записи просмотров и кликов. Скрипт нужен для данных,
+накопленных до их появления, и после ручного удаления событий. Учитываются
+горячие таблицы и архив; дни удаленных месяцев архива не пересчитываются.
+Повторный запуск безопасен.
+"""
+import sys
+import io
+from pathlib import Path
+
+# Настройка кодировки для Windows
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.database import SessionLocal, engine, Base
+from app.models import AdvertisementDailyStats  # noqa: F401 - регистрация таблиц
+from app.services.advertisement_service.crud import rebuild_daily_stats
+
+# Создаем таблицы если их нет
+Base.metadata.create_all(bind=engine)
+
+
+def main():
+    db = SessionLocal()
+    try:
+        rows = rebuild_daily_stats(db)
+        print(f"[SUCCESS] Пересчитано дневных счетчиков: {rows}")
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Ошибка пересчета: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
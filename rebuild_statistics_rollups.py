@@ -0,0 +1,44 @@
+"""
+Скрипт полного пересчета дневных и часовых агрегатов статистики
+
+Фоновая задача приложения обновляет только текущий день. Скрипт нужен после
+массового импорта или удаления транзакций/пользователей за прошлые дни.
+Повторный запуск безопасен.
+"""
+import sys
+import io
+from pathlib import Path
+
+# Настройка кодировки для Windows
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.database import SessionLocal, engine, Base
+from app.models import DailyStatisticsRollup, HourlyStatisticsRollup  # noqa: F401 - регистрация таблиц
+from app.services.admin_statistics_service.crud import rebuild_statistics_rollups
+
+# Создаем таблицы если их нет
+Base.metadata.create_all(bind=engine)
+
+
+def main():
+    db = SessionLocal()
+    try:
+        updated = rebuild_statistics_rollups(db)
+        print(f"[SUCCESS] Пересчитано интервалов: {updated}")
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Ошибка пересчета: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
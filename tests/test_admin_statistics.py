@@ -0,0 +1,214 @@
+"""
+Тесты статистики администратора
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import status
+
+from app.models.user_extended import UserExtended, Transaction
+from app.models.statistics_rollup import DailyStatisticsRollup
+from app.services.admin_statistics_service.crud import (
+    get_kpis,
+    get_category_sections,
+    get_activity_sections,
+    get_revenue_chart,
+    get_new_users_chart,
+    refresh_statistics_rollups,
+    rebuild_statistics_rollups,
+)
+
+
+@pytest.fixture
+def transactions(db_session, test_user):
+    """Транзакции пользователя за последние дни"""
+    extended = UserExtended(user_id=test_user.id, phone=test_user.phone_number, name="Test User")
+    db_session.add(extended)
+    db_session.commit()
+
+    now = datetime.utcnow()
+    rows = [
+        Transaction(user_id=extended.id, type="purchase", amount=100, created_at=now - timedelta(days=1)),
+        Transaction(user_id=extended.id, type="purchase", amount=300, created_at=now - timedelta(days=2)),
+        Transaction(user_id=extended.id, type="pending", amount=-50, created_at=now - timedelta(days=1)),
+        Transaction(user_id=extended.id, type="refunded", amount=-20, created_at=now - timedelta(days=3)),
+        # Предыдущий период
+        Transaction(user_id=extended.id, type="purchase", amount=200, created_at=now - timedelta(days=10)),
+    ]
+    db_session.add_all(rows)
+    db_session.commit()
+    rebuild_statistics_rollups(db_session)
+    return rows
+
+
+class TestAggregates:
+    """Агрегаты дашборда с условной агрегацией"""
+
+    def test_kpis(self, db_session, transactions, test_admin):
+        """KPI считаются по периоду и предыдущему периоду"""
+        kpis = get_kpis(db_session)
+
+        assert kpis.total_users.value == 2
+        assert kpis.total_requests.value == 4
+        assert kpis.revenue.value == 400
+        assert kpis.revenue.change_value == 200
+
+    def test_order_statistics_and_activity(self, db_session, transactions):
+        """Статистика заказов и активность из одних агрегатов"""
+        orders, activity = get_activity_sections(db_session)
+
+        counts = {s.status: s.count for s in orders.statuses}
+        assert orders.total_orders == 4
+        assert counts == {"Завершено": 2, "В обработке": 1, "Отменено": 1}
+        assert activity.average_check.value == 200
+        assert activity.conversion == 100.0
+
+    def test_category_sections_empty(self, db_session):
+        """Пустые категории не ломают расчет"""
+        metrics, distribution, completeness = get_category_sections(db_session)
+
+        assert metrics.gas_stations.total == 0
+        assert distribution.categories == []
+        assert len(completeness.categories) == 5
+
+
+class TestRollups:
+    """Дневные и часовые агрегаты"""
+
+    def test_revenue_chart_from_rollups(self, db_session, transactions):
+        """График выручки строится по дневным агрегатам"""
+        chart = get_revenue_chart(db_session)
+
+        assert len(chart.labels) == 8
+        assert sum(chart.revenue) == 400
+        assert sum(chart.orders) == 2
+        assert db_session.query(DailyStatisticsRollup).count() == 5
+
+    def test_incremental_refresh(self, db_session, transactions):
+        """Обновление текущего дня подхватывает новые записи"""
+        extended_id = transactions[0].user_id
+        db_session.add(Transaction(user_id=extended_id, type="purchase", amount=50))
+        db_session.commit()
+
+        refresh_statistics_rollups(db_session)
+
+        assert sum(get_revenue_chart(db_session).revenue) == 450
+        assert sum(get_new_users_chart(db_session).users) == 1
+
+    def test_refresh_is_idempotent(self, db_session, transactions):
+        """Повторный пересчет не дублирует интервалы"""
+        rebuild_statistics_rollups(db_session)
+        rebuild_statistics_rollups(db_session)
+
+        assert db_session.query(DailyStatisticsRollup).count() == 5
+        assert sum(get_revenue_chart(db_session).revenue) == 400
+
+
+class TestDashboardEndpoint:
+    """Эндпоинт полного дашборда"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        from app.api.v1.admin_statistics import dashboard_cache
+        dashboard_cache.invalidate()
+        yield
+        dashboard_cache.invalidate()
+
+    def test_dashboard(self, client, admin_token, transactions):
+        """Дашборд собирается из всех частей"""
+        response = client.get(
+            "/api/v1/admin/statistics/dashboard",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["kpis"]["total_requests"]["value"] == 4
+        assert data["order_statistics"]["total_orders"] == 4
+        assert len(data["latest_transactions"]["transactions"]) == 5
+        assert data["computed_at"] is not None
+
+    def test_dashboard_served_from_cache(self, client, admin_token, transactions, db_session):
+        """Повторный запрос отдает закэшированный результат с тем же computed_at"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        first = client.get("/api/v1/admin/statistics/dashboard", headers=headers).json()
+
+        db_session.add(Transaction(user_id=transactions[0].user_id, type="purchase", amount=5))
+        db_session.commit()
+
+        second = client.get("/api/v1/admin/statistics/dashboard", headers=headers).json()
+        assert second["computed_at"] == first["computed_at"]
+        assert second["kpis"]["total_requests"]["value"] == 4
+
+        forced = client.get("/api/v1/admin/statistics/dashboard?refresh=true", headers=headers).json()
+        assert forced["kpis"]["total_requests"]["value"] == 5
+
+
+class TestStaleWhileRevalidate:
+    """Кэш stale-while-revalidate"""
+
+    async def test_concurrent_misses_share_one_computation(self):
+        """Одновременные запросы без значения ждут одно вычисление"""
+        import asyncio
+        from app.core.swr_cache import StaleWhileRevalidateCache
+
+        cache = StaleWhileRevalidateCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        results = await asyncio.gather(*(cache.get("key", compute) for _ in range(5)))
+
+        assert len(calls) == 1
+        assert {value for value, _ in results} == {1}
+
+    async def test_stale_value_served_while_refreshing(self):
+        """Устаревшее значение отдается сразу, обновление идет в фоне"""
+        import asyncio
+        from app.core.swr_cache import StaleWhileRevalidateCache
+
+        cache = StaleWhileRevalidateCache(fresh_seconds=0, max_stale_seconds=60)
+        values = iter(range(1, 10))
+
+        async def compute():
+            return next(values)
+
+        assert (await cache.get("key", compute))[0] == 1
+        assert (await cache.get("key", compute))[0] == 1
+        await asyncio.sleep(0)
+        assert (await cache.get("key", compute))[0] == 2
+
+
+class TestFeeds:
+    """Ленты последних транзакций и действий"""
+
+    def test_latest_transactions_with_user_names(self, db_session, transactions):
+        """Имена пользователей подставляются без запросов в цикле"""
+        from app.services.admin_statistics_service.crud import get_latest_transactions
+
+        result = get_latest_transactions(db_session, limit=2)
+
+        assert result.total == 5
+        assert [t.user_name for t in result.transactions] == ["Test User", "Test User"]
+        assert result.transactions[0].created_at >= result.transactions[1].created_at
+
+    def test_recent_actions_merged_and_limited(self, db_session, test_user, test_admin):
+        """Действия из разных источников объединяются и сортируются в БД"""
+        from app.models.gas_station import GasStation
+        from app.services.admin_statistics_service.crud import get_recent_actions
+
+        station = GasStation(
+            name="Metan Plus", address="Tashkent", latitude=41.3, longitude=69.2,
+            created_at=datetime.utcnow() + timedelta(minutes=1)
+        )
+        db_session.add(station)
+        db_session.commit()
+
+        result = get_recent_actions(db_session, limit=2)
+
+        assert result.total == 2
+        assert result.actions[0].action_type == "gas_station_added"
+        assert result.actions[0].description == "Добавлена новая заправка: Metan Plus"
+        assert result.actions[1].action_type == "user_registered"
@@ -0,0 +1,404 @@
+"""
+Тесты рекламы: прием событий, статистика, выдача
+"""
+from datetime import datetime, timedelta, timezone
+
+import json
+import random
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.batch_writer import BatchWriter
+from app.core.hyperloglog import HyperLogLog
+from app.models.advertisement import (
+    Advertisement,
+    AdvertisementView,
+    AdvertisementClick,
+    AdvertisementDailyStats,
+    AdvertisementViewArchive,
+    AdvertisementPosition,
+)
+from app.schemas.advertisement import AdvertisementViewCreate, AdvertisementClickCreate
+from app.services.advertisement_service.crud import (
+    persist_advertisement_events,
+    build_advertisement_event,
+    get_advertisement_statistics,
+    rebuild_daily_stats,
+    reset_past_uniques,
+    update_advertisement,
+    rotate_advertisement_events,
+    get_advertisement_views,
+    get_views_count_by_period,
+)
+from app.services.advertisement_service.serving_index import advertisement_index
+from app.services.advertisement_service.selection import AdvertisementSelector, advertisement_selector
+from app.schemas.advertisement import AdvertisementUpdate
+
+
+@pytest.fixture(autouse=True)
+def reset_advertisement_index():
+    """Индекс выдачи - общий для процесса, а БД у каждого теста своя"""
+    advertisement_index.invalidate()
+    advertisement_selector.reset()
+    reset_past_uniques()
+    yield
+    advertisement_index.invalidate()
+    advertisement_selector.reset()
+    reset_past_uniques()
+
+
+@pytest.fixture
+def advertisement(db_session, test_admin):
+    """Активная реклама на главной"""
+    ad = Advertisement(
+        title="Metan -10%",
+        image_url="http://localhost/ad.png",
+        position=AdvertisementPosition.HOME_TOP,
+        created_by_admin_id=test_admin.id,
+    )
+    db_session.add(ad)
+    db_session.commit()
+    db_session.refresh(ad)
+    return ad
+
+
+def _view(advertisement_id, user_id=None):
+    return build_advertisement_event("view", advertisement_id, AdvertisementViewCreate(device_type="mobile"), user_id)
+
+
+def _click(advertisement_id, user_id=None):
+    return build_advertisement_event("click", advertisement_id, AdvertisementClickCreate(), user_id)
+
+
+class TestEventIngestion:
+    """Пакетная запись просмотров и кликов"""
+
+    def test_batch_insert_and_counters(self, db_session, advertisement, test_user):
+        """Пакет записывается целиком, счетчики увеличиваются на размер пакета"""
+        events = [_view(advertisement.id, test_user.id) for _ in range(3)] + [_click(advertisement.id)]
+
+        persist_advertisement_events(db_session, events)
+        db_session.refresh(advertisement)
+
+        assert advertisement.views_count == 3
+        assert advertisement.clicks_count == 1
+        assert db_session.query(AdvertisementView).count() == 3
+        assert db_session.query(AdvertisementClick).count() == 1
+
+    def test_events_of_deleted_ads_dropped(self, db_session, advertisement):
+        """События несуществующей рекламы не ломают пакет"""
+        persist_advertisement_events(db_session, [_view(advertisement.id), _view(advertisement.id + 100)])
+
+        assert db_session.query(AdvertisementView).count() == 1
+
+    async def test_writer_flushes_on_stop(self, db_session, advertisement):
+        """Буфер дописывает события при остановке"""
+        session_factory = sessionmaker(bind=db_session.get_bind(), expire_on_commit=False)
+        writer = BatchWriter(persist_advertisement_events, interval_ms=1000, session_factory=session_factory)
+
+        for _ in range(5):
+            writer.submit_nowait(_view(advertisement.id))
+        await writer.stop()
+
+        db_session.refresh(advertisement)
+        assert advertisement.views_count == 5
+        assert writer.flushed_batches == 1
+
+
+class TestDailyStats:
+    """Дневные счетчики и скетчи уникальных пользователей"""
+
+    def test_hyperloglog_estimate_and_merge(self):
+        """Оценка в пределах погрешности, объединение равно скетчу объединения"""
+        first = HyperLogLog().update(range(0, 6000))
+        second = HyperLogLog().update(range(4000, 10000))
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+
+        assert abs(merged.count() - 10000) / 10000 < 0.05
+        assert merged.to_bytes() == HyperLogLog().update(range(0, 10000)).to_bytes()
+        assert HyperLogLog().update([1, 2, 3, 3]).count() == 3
+
+    def test_statistics_from_daily_rows(self, db_session, advertisement, test_user, test_admin):
+        """Периоды и уникальные пользователи считаются по дневным строкам"""
+        events = [
+            _view(advertisement.id, test_user.id),
+            _view(advertisement.id, test_user.id),
+            _view(advertisement.id, test_admin.id),
+            _view(advertisement.id),
+            _click(advertisement.id, test_user.id),
+        ]
+        persist_advertisement_events(db_session, events[:2])
+        persist_advertisement_events(db_session, events[2:])
+
+        assert db_session.query(AdvertisementDailyStats).count() == 1
+        stats = get_advertisement_statistics(db_session, advertisement.id)
+
+        assert stats["views_today"] == stats["views_this_month"] == 4
+        assert stats["clicks_today"] == 1
+        assert stats["unique_views"] == 2
+        assert stats["unique_clicks"] == 1
+        assert stats["click_through_rate"] == 25.0
+
+    def test_past_uniques_merged_once_per_day(self, db_session, advertisement, test_user, test_admin):
+        """Скетчи прошедших дней объединяются один раз, сегодняшние - на каждом запросе"""
+        yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+        past_view = _view(advertisement.id, test_user.id)
+        past_view["occurred_at"] = yesterday
+        persist_advertisement_events(db_session, [past_view])
+
+        assert get_advertisement_statistics(db_session, advertisement.id)["unique_views"] == 1
+
+        # Прошедший день больше не читается: правка строки в обход счетчиков не видна
+        db_session.query(AdvertisementDailyStats).update({"unique_viewers_hll": None})
+        db_session.commit()
+        persist_advertisement_events(db_session, [_view(advertisement.id, test_admin.id)])
+        assert get_advertisement_statistics(db_session, advertisement.id)["unique_views"] == 2
+
+        # Пересчет сбрасывает кэш
+        assert rebuild_daily_stats(db_session, advertisement.id) == 2
+        assert get_advertisement_statistics(db_session, advertisement.id)["unique_views"] == 2
+
+    def test_rebuild_matches_incremental(self, db_session, advertisement, test_user):
+        """Пересчет из исходных событий дает те же счетчики"""
+        persist_advertisement_events(db_session, [_view(advertisement.id, test_user.id), _click(advertisement.id)])
+        before = get_advertisement_statistics(db_session, advertisement.id)
+
+        assert rebuild_daily_stats(db_session) == 1
+        db_session.expire_all()
+        assert get_advertisement_statistics(db_session, advertisement.id) == before
+
+
+class TestServingIndex:
+    """Индекс выдачи рекламы в памяти"""
+
+    def test_served_without_queries(self, client, db_session, advertisement):
+        """После построения индекса выдача не обращается к БД"""
+        client.get("/api/v1/advertisements/", params={"position": "home_top"})
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            response = client.get("/api/v1/advertisements/", params={"position": "home_top"})
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+
+        assert [ad["id"] for ad in response.json()] == [advertisement.id]
+        assert not [sql for sql in statements if "advertisements" in sql]
+
+    def test_events_checked_against_index(self, client, db_session, advertisement):
+        """Реклама из индекса принимается без БД, остальные проверяются по БД"""
+        assert client.post(f"/api/v1/advertisements/{advertisement.id}/view").status_code == 201
+        assert client.post("/api/v1/advertisements/999999/view").status_code == 404
+
+        advertisement_index.rebuild(db_session)
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            assert client.post(f"/api/v1/advertisements/{advertisement.id}/view").status_code == 201
+            assert client.post(f"/api/v1/advertisements/{advertisement.id}/click").status_code == 201
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+
+        assert not [sql for sql in statements if "advertisements" in sql]
+        assert client.post("/api/v1/advertisements/999999/click").status_code == 404
+
+        # Приостановленной рекламы нет в индексе, но события по ней принимаются
+        advertisement.is_active = False
+        db_session.commit()
+        advertisement_index.rebuild(db_session)
+        assert advertisement_index.get(advertisement.id) is None
+        assert client.post(f"/api/v1/advertisements/{advertisement.id}/click").status_code == 201
+
+    def test_rebuilt_on_update(self, db_session, advertisement, test_admin):
+        """Изменение рекламы сразу отражается в выдаче"""
+        second = Advertisement(
+            title="Мойка",
+            image_url="http://localhost/wash.png",
+            position=AdvertisementPosition.HOME_TOP,
+            created_by_admin_id=test_admin.id,
+        )
+        db_session.add(second)
+        db_session.commit()
+        advertisement_index.rebuild(db_session)
+
+        update_advertisement(db_session, second.id, AdvertisementUpdate(priority=10))
+        assert [entry.id for entry in advertisement_index.lookup(AdvertisementPosition.HOME_TOP)] == [second.id, advertisement.id]
+
+        update_advertisement(db_session, second.id, AdvertisementUpdate(is_active=False))
+        assert [entry.id for entry in advertisement_index.lookup(AdvertisementPosition.HOME_TOP)] == [advertisement.id]
+
+    def test_window_boundaries_advance_in_memory(self, db_session, advertisement):
+        """Начало и окончание окна показа учитываются без перестроения"""
+        now = datetime.now(timezone.utc)
+        advertisement.start_date = now + timedelta(hours=1)
+        advertisement.end_date = now + timedelta(hours=2)
+        db_session.commit()
+        advertisement_index.rebuild(db_session)
+        version = advertisement_index.version
+
+        assert advertisement_index.lookup(AdvertisementPosition.HOME_TOP, now=now) == []
+        assert advertisement_index.next_boundary == now + timedelta(hours=1)
+        assert len(advertisement_index.lookup(AdvertisementPosition.HOME_TOP, now=now + timedelta(minutes=90))) == 1
+        assert advertisement_index.lookup(AdvertisementPosition.HOME_TOP, now=now + timedelta(hours=3)) == []
+        assert advertisement_index.version == version
+
+
+def _add_ad(db_session, admin, title, priority=0, conditions=None):
+    ad = Advertisement(
+        title=title,
+        image_url="http://localhost/ad.png",
+        position=AdvertisementPosition.HOME_TOP,
+        priority=priority,
+        show_conditions=json.dumps(conditions) if conditions else None,
+        created_by_admin_id=admin.id,
+    )
+    db_session.add(ad)
+    db_session.commit()
+    return ad
+
+
+class TestSelection:
+    """Выбор реклам: веса, частотные ограничения, пейсинг"""
+
+    def test_weighted_by_priority(self, db_session, test_admin):
+        """Реклама с большим приоритетом выбирается первой пропорционально весу"""
+        heavy = _add_ad(db_session, test_admin, "Тяжелая", priority=3)
+        _add_ad(db_session, test_admin, "Легкая", priority=0)
+        advertisement_index.rebuild(db_session)
+        selector = AdvertisementSelector(rng=random.Random(42))
+        candidates = advertisement_index.lookup(AdvertisementPosition.HOME_TOP)
+
+        first = [selector.select(candidates, 1)[0].id for _ in range(2000)]
+
+        share = first.count(heavy.id) / len(first)
+        assert 0.75 < share < 0.85  # 4 / (4 + 1)
+        assert len(selector.select(candidates, 5)) == 2
+
+    def test_frequency_cap(self, client, db_session, test_admin):
+        """После max_per_user просмотров реклама больше не выдается"""
+        capped = _add_ad(db_session, test_admin, "Раз в день", conditions={"max_per_user": 1})
+        params = {"position": "home_top"}
+
+        assert [ad["id"] for ad in client.get("/api/v1/advertisements/", params=params).json()] == [capped.id]
+        client.post(f"/api/v1/advertisements/{capped.id}/view")
+
+        assert client.get("/api/v1/advertisements/", params=params).json() == []
+
+    def test_pacing_and_conditions(self, db_session, test_admin):
+        """Выполнившая дневную цель и неподходящая по версии реклама не выбираются"""
+        paced = _add_ad(db_session, test_admin, "Цель 2", conditions={"daily_views_target": 2})
+        versioned = _add_ad(db_session, test_admin, "Новое приложение", conditions={"min_app_version": "2.1"})
+        advertisement_index.rebuild(db_session)
+        selector = AdvertisementSelector()
+        candidates = advertisement_index.lookup(AdvertisementPosition.HOME_TOP)
+
+        assert {ad.id for ad in selector.select(candidates, 5, app_version="2.10.0")} == {paced.id, versioned.id}
+        assert [ad.id for ad in selector.select(candidates, 5, app_version="2.0.9")] == [paced.id]
+
+        selector.record_view(paced.id, None)
+        selector.record_view(paced.id, None)
+        assert [ad.id for ad in selector.select(candidates, 5, app_version="2.10.0")] == [versioned.id]
+
+    def test_invalid_conditions_ignored(self, client, db_session, test_admin):
+        """Некорректное значение условия пропускается и не ломает выдачу позиции"""
+        broken = _add_ad(db_session, test_admin, "Сломанная", conditions={"max_per_user": "x", "device_types": "mobile"})
+        rooted = _add_ad(db_session, test_admin, "Список", conditions=["max_per_user"])
+
+        response = client.get("/api/v1/advertisements/", params={"position": "home_top", "device_type": "mobile"})
+
+        assert response.status_code == 200
+        assert {ad["id"] for ad in response.json()} == {broken.id, rooted.id}
+        conditions = advertisement_index.get(broken.id).show_conditions
+        assert conditions.max_per_user is None
+        # Строка - один тип устройства, а не поиск подстроки
+        assert conditions.device_types == ["mobile"]
+        response = client.get("/api/v1/advertisements/", params={"position": "home_top", "device_type": "mob"})
+        assert [ad["id"] for ad in response.json()] == [rooted.id]
+
+    def test_invalid_conditions_rejected(self, client, admin_token):
+        """Администратор не может сохранить некорректные условия показа"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        payload = {"title": "Реклама", "image_url": "http://localhost/ad.png"}
+
+        for conditions in ['{"max_per_user": "x"}', '["max_per_user"]', "not json"]:
+            response = client.post(
+                "/api/v1/admin/advertisements/", json={**payload, "show_conditions": conditions}, headers=headers
+            )
+            assert response.status_code == 422
+
+        response = client.post(
+            "/api/v1/admin/advertisements/",
+            json={**payload, "show_conditions": '{"max_per_user": 2, "device_types": ["ios"]}'},
+            headers=headers,
+        )
+        assert response.status_code == 201
+
+
+class TestArchiveRotation:
+    """Архив просмотров и кликов"""
+
+    def test_rotation_keeps_queries_complete(self, db_session, advertisement):
+        """Архивные просмотры видны в списке и подсчете за период; просроченные остаются в дневных счетчиках"""
+        now = datetime.now(timezone.utc)
+        ages = [0, 1, 5 * 31, 30 * 31]
+        views = [
+            AdvertisementView(advertisement_id=advertisement.id, viewed_at=now - timedelta(days=days))
+            for days in ages
+        ]
+        db_session.add_all(views)
+        db_session.commit()
+        view_ids = [view.id for view in views]
+
+        result = rotate_advertisement_events(db_session)
+
+        assert result["archived"] == 2
+        assert len(result["dropped_months"]) == 1
+        assert db_session.query(AdvertisementView).count() == 2
+        assert db_session.query(AdvertisementViewArchive).count() == 1
+
+        page, has_more = get_advertisement_views(db_session, advertisement.id, skip=1, limit=10)
+        assert not has_more
+        assert [view.id for view in page] == [view_ids[1], view_ids[2]]
+        # Страница внутри горячей таблицы не обращается к архиву
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            page, has_more = get_advertisement_views(db_session, advertisement.id, skip=0, limit=1)
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+        assert has_more
+        assert [view.id for view in page] == [view_ids[0]]
+        assert not [sql for sql in statements if AdvertisementViewArchive.__tablename__ in sql]
+        assert get_views_count_by_period(db_session, advertisement.id, now - timedelta(days=365), now) == 3
+        assert get_views_count_by_period(db_session, advertisement.id, now - timedelta(days=7), now) == 2
+
+        dropped_day = (now - timedelta(days=30 * 31)).date()
+        stats = db_session.query(AdvertisementDailyStats).filter(AdvertisementDailyStats.day == dropped_day).one()
+        assert stats.views == 1
+
+    def test_rebuild_after_rotation_keeps_counters(self, db_session, advertisement, test_user):
+        """Пересчет после ротации учитывает архив и не трогает дни удаленных месяцев"""
+        now = datetime.now(timezone.utc)
+        ages = [0, 5 * 31, 30 * 31]
+        db_session.add_all([
+            AdvertisementView(advertisement_id=advertisement.id, user_id=test_user.id, viewed_at=now - timedelta(days=days))
+            for days in ages
+        ])
+        db_session.commit()
+        assert rebuild_daily_stats(db_session) == 3
+
+        result = rotate_advertisement_events(db_session)
+        assert result["archived"] == 2 and len(result["dropped_months"]) == 1
+
+        assert rebuild_daily_stats(db_session) == 3
+        db_session.expire_all()
+        days = {
+            row.day: row.views for row in db_session.query(AdvertisementDailyStats).all()
+        }
+        assert days == {(now - timedelta(days=days_ago)).date(): 1 for days_ago in ages}
+        assert rebuild_daily_stats(db_session, advertisement.id) == 3
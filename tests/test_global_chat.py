@@ -0,0 +1,340 @@
+"""
+Тесты CRUD операций глобального чата
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.core.batch_writer import BatchWriter
+from app.core.config import settings
+from app.crud.user import add_token_to_blacklist
+
+from app.core.archive import month_start
+from app.models.global_chat import (
+    HiddenGlobalChatMessage,
+    GlobalChatUserState,
+    GlobalChatMessageArchive,
+    HiddenGlobalChatMessageArchive,
+    GlobalChatMonthlySummary,
+)
+from app.schemas.global_chat import GlobalChatMessageCreate
+from app.services.global_chat_service.crud import (
+    create_message,
+    get_messages,
+    search_messages,
+    clear_chat_history_for_user,
+    migrate_hidden_messages_to_watermarks,
+    create_messages_bulk,
+    rotate_chat_messages,
+)
+
+
+def _post(db_session, user_id, text):
+    return create_message(db_session, user_id, GlobalChatMessageCreate(message=text))
+
+
+class TestClearHistory:
+    """Очистка истории через водяной знак"""
+
+    def test_clear_hides_existing_messages_only(self, db_session, test_user, test_admin):
+        """Очистка скрывает старые сообщения, новые остаются видимыми"""
+        _post(db_session, test_admin.id, "first")
+        _post(db_session, test_admin.id, "second")
+
+        assert clear_chat_history_for_user(db_session, test_user.id) == 2
+        assert db_session.query(HiddenGlobalChatMessage).count() == 0
+
+        messages, _ = get_messages(db_session, test_user.id)
+        assert messages == []
+
+        _post(db_session, test_admin.id, "third")
+        messages, _ = get_messages(db_session, test_user.id)
+        assert [m.message for m in messages] == ["third"]
+
+        # У другого пользователя история не тронута
+        messages, _ = get_messages(db_session, test_admin.id)
+        assert len(messages) == 3
+
+        found, _ = search_messages(db_session, test_user.id, "first")
+        assert found == []
+
+    def test_repeated_clear_is_noop(self, db_session, test_user, test_admin):
+        """Повторная очистка без новых сообщений ничего не скрывает"""
+        _post(db_session, test_admin.id, "hello")
+        assert clear_chat_history_for_user(db_session, test_user.id) == 1
+        assert clear_chat_history_for_user(db_session, test_user.id) == 0
+
+    def test_migrate_hidden_rows(self, db_session, test_user, test_admin):
+        """Старые строки скрытия переносятся в водяной знак"""
+        first = _post(db_session, test_admin.id, "first")
+        second = _post(db_session, test_admin.id, "second")
+        for message in (first, second):
+            db_session.add(HiddenGlobalChatMessage(message_id=message.id, user_id=test_user.id))
+        db_session.commit()
+        _post(db_session, test_admin.id, "third")
+
+        assert migrate_hidden_messages_to_watermarks(db_session) == 1
+
+        state = db_session.query(GlobalChatUserState).filter_by(user_id=test_user.id).one()
+        assert state.cleared_before_id == second.id + 1
+        assert db_session.query(HiddenGlobalChatMessage).count() == 0
+
+        messages, _ = get_messages(db_session, test_user.id)
+        assert [m.message for m in messages] == ["third"]
+
+
+class TestKeysetPagination:
+    """Keyset-пагинация истории чата"""
+
+    def test_before_and_after_cursors(self, db_session, test_user, test_admin):
+        """Курсоры before_id/after_id возвращают соседние страницы"""
+        posted = [_post(db_session, test_admin.id, f"m{i}") for i in range(5)]
+        ids = [m.id for m in posted]
+
+        page, has_more = get_messages(db_session, test_user.id, limit=2)
+        assert [m.id for m in page] == [ids[4], ids[3]]
+        assert has_more is True
+
+        page, has_more = get_messages(db_session, test_user.id, limit=2, before_id=ids[3])
+        assert [m.id for m in page] == [ids[2], ids[1]]
+        assert has_more is True
+
+        page, has_more = get_messages(db_session, test_user.id, limit=2, before_id=ids[1])
+        assert [m.id for m in page] == [ids[0]]
+        assert has_more is False
+
+        page, has_more = get_messages(db_session, test_user.id, limit=2, after_id=ids[1])
+        assert [m.id for m in page] == [ids[3], ids[2]]
+        assert has_more is True
+
+
+class TestSearch:
+    """Полнотекстовый поиск по сообщениям"""
+
+    def test_prefix_search_with_snippet(self, db_session, test_user, test_admin):
+        """Поиск по префиксу слова с подсветкой, без учета регистра"""
+        _post(db_session, test_admin.id, "Где заправиться метаном в Ташкенте?")
+        _post(db_session, test_admin.id, "Benzin narxi qancha?")
+        _post(db_session, test_admin.id, "Всем привет")
+
+        results, total = search_messages(db_session, test_user.id, "ташкент")
+        assert total == 1
+        message, snippet = results[0]
+        assert "Ташкенте" in message.message
+        assert "<b>Ташкенте</b>" in snippet
+
+        results, total = search_messages(db_session, test_user.id, "NARX")
+        assert total == 1
+
+    def test_all_terms_required(self, db_session, test_user, test_admin):
+        """Все слова запроса должны присутствовать в сообщении"""
+        _post(db_session, test_admin.id, "метан дешевле бензина")
+        _post(db_session, test_admin.id, "метан закончился")
+
+        results, total = search_messages(db_session, test_user.id, "метан бензин")
+        assert total == 1
+        assert results[0][0].message == "метан дешевле бензина"
+
+    def test_punctuation_only_query(self, db_session, test_user, test_admin):
+        """Запрос без слов не ломает поиск"""
+        _post(db_session, test_admin.id, "???")
+
+        results, total = search_messages(db_session, test_user.id, "?")
+        assert total == 1
+
+
+class TestBatchedPersistence:
+    """Групповая запись сообщений из WebSocket"""
+
+    async def test_concurrent_submits_share_one_commit(self, db_session, test_user):
+        """Одновременные отправки записываются одним пакетом и получают ID"""
+        session_factory = sessionmaker(bind=db_session.get_bind(), expire_on_commit=False)
+        writer = BatchWriter(
+            lambda db, items: [m.id for m in create_messages_bulk(db, items)],
+            interval_ms=20,
+            session_factory=session_factory,
+        )
+
+        items = [(test_user.id, GlobalChatMessageCreate(message=f"ws {i}")) for i in range(5)]
+        ids = await asyncio.gather(*(writer.submit(item) for item in items))
+        await writer.stop()
+
+        assert len(set(ids)) == 5
+        assert writer.flushed_batches == 1
+        messages, _ = get_messages(db_session, test_user.id)
+        assert sorted(m.id for m in messages) == sorted(ids)
+
+    async def test_stop_flushes_pending(self, db_session, test_user):
+        """Остановка дописывает накопленные элементы"""
+        session_factory = sessionmaker(bind=db_session.get_bind(), expire_on_commit=False)
+        writer = BatchWriter(
+            lambda db, items: create_messages_bulk(db, items) and None,
+            interval_ms=1000,
+            session_factory=session_factory,
+        )
+
+        writer.submit_nowait((test_user.id, GlobalChatMessageCreate(message="late")))
+        await writer.stop()
+
+        messages, _ = get_messages(db_session, test_user.id)
+        assert [m.message for m in messages] == ["late"]
+
+
+class TestArchiveRotation:
+    """Перенос старых сообщений в архив и удаление по сроку хранения"""
+
+    def test_old_messages_archived_and_summarized(self, db_session, test_user, test_admin):
+        """Старые сообщения уходят в архив вместе со скрытием, просроченные месяцы - в итоги"""
+        now = datetime.now(timezone.utc)
+        expired = _post(db_session, test_user.id, "очень старое")
+        archived = _post(db_session, test_admin.id, "старое")
+        fresh = _post(db_session, test_user.id, "новое")
+        expired.created_at = now - timedelta(days=40 * 31)
+        archived.created_at = now - timedelta(days=13 * 31)
+        db_session.add(HiddenGlobalChatMessage(message_id=archived.id, user_id=test_user.id))
+        db_session.commit()
+        archived_id, fresh_id = archived.id, fresh.id
+
+        result = rotate_chat_messages(db_session)
+
+        assert result["archived"] == 2
+        assert result["dropped_months"] == [month_start(now - timedelta(days=40 * 31))]
+        messages, _ = get_messages(db_session, user_id=test_user.id)
+        assert [m.id for m in messages] == [fresh_id]
+        assert [row.id for row in db_session.query(GlobalChatMessageArchive).all()] == [archived_id]
+        assert db_session.query(HiddenGlobalChatMessage).count() == 0
+        # Скрытое пользователем архивное сообщение по-прежнему скрыто
+        assert db_session.query(HiddenGlobalChatMessageArchive).count() == 1
+
+        summary = db_session.query(GlobalChatMonthlySummary).one()
+        assert (summary.messages, summary.senders) == (1, 1)
+        assert rotate_chat_messages(db_session) == {"archived": 0, "dropped_months": []}
+
+    def test_feed_and_search_continue_into_archive(self, db_session, test_user, test_admin):
+        """Лента и поиск продолжаются в архиве после исчерпания горячей таблицы"""
+        now = datetime.now(timezone.utc)
+        posted = [_post(db_session, test_admin.id, f"метан {i}") for i in range(4)]
+        for message in posted[:2]:
+            message.created_at = now - timedelta(days=13 * 31)
+        db_session.commit()
+        ids = [message.id for message in posted]
+        assert rotate_chat_messages(db_session)["archived"] == 2
+
+        page, has_more = get_messages(db_session, test_user.id, limit=3)
+        assert [m.id for m in page] == [ids[3], ids[2], ids[1]]
+        assert has_more is True
+        page, has_more = get_messages(db_session, test_user.id, limit=3, before_id=ids[1])
+        assert [m.id for m in page] == [ids[0]]
+        assert has_more is False
+        page, has_more = get_messages(db_session, test_user.id, limit=2, after_id=ids[0])
+        assert [m.id for m in page] == [ids[2], ids[1]]
+        assert has_more is True
+
+        results, total = search_messages(db_session, test_user.id, "метан")
+        assert total == 4
+        assert {message.id for message, _ in results} == set(ids)
+        results, total = search_messages(db_session, test_user.id, "метан", skip=3, limit=5)
+        assert [message.id for message, _ in results] == [ids[0]]
+
+        # Водяной знак очистки истории действует и на архив
+        clear_chat_history_for_user(db_session, test_user.id)
+        assert get_messages(db_session, test_user.id) == ([], False)
+        assert search_messages(db_session, test_user.id, "метан") == ([], 0)
+
+
+@pytest.fixture
+def websocket_db(client, monkeypatch):
+    """WebSocket эндпоинт открывает сессию через get_db напрямую, минуя dependency_overrides"""
+    from app.main import app
+    from app.database import get_db
+    import app.api.v1.global_chat as global_chat_api
+
+    monkeypatch.setattr(global_chat_api, "get_db", app.dependency_overrides[get_db])
+    return client
+
+
+class _FakeWebSocket:
+    """Серверная сторона соединения для тестов менеджера"""
+
+    def __init__(self):
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
+
+class TestWebSocketAccess:
+    """Авторизация и лимиты WebSocket чата"""
+
+    def _connect_rejected(self, client, token):
+        from starlette.websockets import WebSocketDisconnect
+
+        with pytest.raises(WebSocketDisconnect) as error:
+            with client.websocket_connect(f"/api/v1/global-chat/ws?token={token}") as websocket:
+                websocket.receive_json()
+        return error.value.code
+
+    def test_blacklisted_token_rejected(self, websocket_db, db_session, test_user, user_token):
+        """Токен после выхода из аккаунта не подключается"""
+        add_token_to_blacklist(db_session, user_token, user_id=test_user.id)
+
+        assert self._connect_rejected(websocket_db, user_token) == 1008
+
+    def test_blocked_user_rejected(self, websocket_db, db_session, test_user, user_token):
+        """Заблокированный пользователь не подключается"""
+        test_user.is_blocked = True
+        db_session.commit()
+
+        assert self._connect_rejected(websocket_db, user_token) == 1008
+
+    async def test_revoked_connections_closed(self, db_session, test_user, test_admin, monkeypatch):
+        """Перепроверка закрывает соединения после блокировки и выхода из аккаунта"""
+        import app.api.v1.global_chat as global_chat_api
+
+        def override_get_db():
+            yield sessionmaker(bind=db_session.get_bind())()
+
+        monkeypatch.setattr(global_chat_api, "get_db", override_get_db)
+        manager = global_chat_api.GlobalChatConnectionManager()
+        user_socket, admin_socket = _FakeWebSocket(), _FakeWebSocket()
+        await manager.connect(user_socket, test_user.id, set(), "user-token")
+        await manager.connect(admin_socket, test_admin.id, set(), "admin-token")
+
+        assert await manager.revalidate_connections() == 0
+
+        test_user.is_blocked = True
+        add_token_to_blacklist(db_session, "admin-token", user_id=test_admin.id)
+
+        assert await manager.revalidate_connections() == 2
+        assert user_socket.closed_with == admin_socket.closed_with == 1008
+        assert manager.presence.online_count == 0
+        assert manager.connection_tokens == {}
+
+    def test_send_rate_limited(self, websocket_db, user_token, monkeypatch):
+        """Отправка сверх лимита соединения отклоняется без записи"""
+        import app.api.v1.global_chat as global_chat_api
+
+        submitted = []
+
+        async def submit(item):
+            submitted.append(item)
+            return {"id": len(submitted), "user_id": item[0], "message": item[1].message}
+
+        monkeypatch.setattr(global_chat_api.message_writer, "submit", submit)
+        monkeypatch.setattr(settings, "CHAT_WS_SEND_RATE_LIMIT", 2)
+
+        with websocket_db.websocket_connect(f"/api/v1/global-chat/ws?token={user_token}") as websocket:
+            assert websocket.receive_json()["type"] == "connection"
+            replies = []
+            for number in range(3):
+                websocket.send_json({"type": "send_message", "client_id": str(number), "message": "привет"})
+                replies.append(websocket.receive_json())
+
+        assert [reply["type"] for reply in replies] == ["message_ack", "message_ack", "message_error"]
+        assert replies[2]["client_id"] == "2"
+        assert len(submitted) == 2
@@ -0,0 +1,99 @@
+"""
+Тесты импорта заправок из CSV
+"""
+import csv
+
+import pytest
+
+from import_gas_stations import StationImporter, read_places, read_prices
+from app.models.gas_station import GasStation, FuelPrice, FuelType
+from app.models.electric_station import ElectricStation, ChargingPoint
+
+PLACES_FIELDS = ['🔒 Row ID', 'name', 'category', 'coordinates', 'address', 'working_hours',
+                 'phone_number', 'electric_charging', 'parking', 'cafe', 'wc']
+
+
+def _write_csv(path, fields, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def _place(row_id, name, coordinates, category="АЗС", electric=""):
+    return {'🔒 Row ID': row_id, 'name': name, 'category': category, 'coordinates': coordinates,
+            'address': '', 'working_hours': '24/7', 'phone_number': '', 'electric_charging': electric,
+            'parking': 'да', 'cafe': '', 'wc': ''}
+
+
+@pytest.fixture
+def csv_files(tmp_path):
+    places = _write_csv(tmp_path / "places.csv", PLACES_FIELDS, [
+        _place("r1", "Uzbekneftegaz", "41.31, 69.28"),
+        _place("r2", "Lukoil", "41.32, 69.29", electric="true"),
+        _place("r3", "Без координат", ""),
+        _place("r4", "Uzbekneftegaz 2", "41.31, 69.28"),
+        _place("r5", "Tok", "41.40, 69.10", category="Зарядка", electric="да"),
+    ])
+    prices = _write_csv(tmp_path / "prices.csv", ['stationID', 'fuel_type', 'price'], [
+        {'stationID': 'r1', 'fuel_type': 'АИ-95', 'price': '11000'},
+        {'stationID': 'r1', 'fuel_type': 'АИ-92', 'price': '9000'},
+        {'stationID': 'r2', 'fuel_type': 'Дизель', 'price': '10500'},
+        {'stationID': 'r4', 'fuel_type': 'АИ-80', 'price': '8000'},
+    ])
+    return places, prices
+
+
+def _run(db_session, places, prices, dry_run=False, batch_size=2):
+    importer = StationImporter(db_session, read_prices(prices), None, dry_run=dry_run)
+    return importer.run(read_places(places), batch_size)
+
+
+class TestImportGasStations:
+    """Пакетный импорт с upsert цен"""
+
+    def test_import(self, db_session, csv_files):
+        """Станции, цены и зарядные точки создаются пачками"""
+        stats = _run(db_session, *csv_files)
+
+        assert db_session.query(GasStation).count() == 2
+        assert db_session.query(ElectricStation).count() == 2
+        assert db_session.query(ChargingPoint).count() == 2
+        station = db_session.query(GasStation).filter(GasStation.name == "Uzbekneftegaz").one()
+        prices = {price.fuel_type: price.price for price in station.fuel_prices}
+        # Цены дубля по координатам (r4) относятся к той же станции, АИ-92 нет в модели
+        assert prices == {FuelType.AI_95: 11000, FuelType.AI_80: 8000}
+        assert station.is_24_7
+        assert (stats.rows, stats.gas_created, stats.gas_existing, stats.skipped) == (5, 2, 1, 1)
+        assert stats.prices_created == 3
+
+    def test_rerun_updates_only_changed_prices(self, db_session, csv_files, tmp_path):
+        """Повторный импорт не создает дублей и обновляет только изменившиеся цены"""
+        places, prices = csv_files
+        _run(db_session, places, prices)
+        changed = _write_csv(tmp_path / "prices2.csv", ['stationID', 'fuel_type', 'price'], [
+            {'stationID': 'r1', 'fuel_type': 'АИ-95', 'price': '11500'},
+            {'stationID': 'r2', 'fuel_type': 'Дизель', 'price': '10500'},
+        ])
+
+        stats = _run(db_session, places, changed)
+
+        assert db_session.query(GasStation).count() == 2
+        assert db_session.query(ChargingPoint).count() == 2
+        assert (stats.gas_created, stats.electric_created) == (0, 0)
+        assert (stats.prices_created, stats.prices_changed, stats.prices_unchanged) == (0, 1, 1)
+        price = db_session.query(FuelPrice).filter(FuelPrice.fuel_type == FuelType.AI_95).one()
+        db_session.refresh(price)
+        assert price.price == 11500
+
+    def test_dry_run(self, db_session, csv_files, capsys):
+        """--dry-run выводит различия и ничего не записывает"""
+        stats = _run(db_session, *csv_files, dry_run=True)
+
+        assert db_session.query(GasStation).count() == 0
+        assert db_session.query(FuelPrice).count() == 0
+        assert stats.gas_created == 2 and stats.prices_created == 3
+        output = capsys.readouterr().out
+        assert "+ заправка Uzbekneftegaz (41.31, 69.28)" in output
+        assert "+ Uzbekneftegaz: AI-95 11000" in output
@@ -0,0 +1,415 @@
+"""
+Тесты хранения и раздачи загруженных файлов, дедупликации и миниатюр
+"""
+import gzip
+import hashlib
+import io
+import os
+import time
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.core.media_files import media_access_stats
+from app.core.media import media_url, variant_relative_path, image_variants, thumbnail_url, variant_lookup
+from app.models.media import MediaFile
+from app.schemas.gas_station import GasStationPhotoResponse
+from app.services.media_service import derivatives
+from app.services.media_service.crud import release_media, sweep_media, get_media_stats
+from app.services.media_service.uploads import save_upload, UploadTooLarge
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    """Загрузки пишутся во временную директорию"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _upload(content: bytes, filename: str = "photo.JPG") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename)
+
+
+class TestUploads:
+    """Потоковая запись загрузок"""
+
+    async def test_save_upload(self, db_session, upload_dir, monkeypatch):
+        """Файл записывается порциями и атомарно появляется под именем по хешу"""
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 4)
+        content = b"0123456789" * 3
+        sha256 = hashlib.sha256(content).hexdigest()
+
+        stored = await save_upload(db_session, _upload(content))
+
+        assert stored.size == len(content)
+        assert stored.sha256 == sha256
+        assert stored.relative_path == f"media/{sha256[:2]}/{sha256[2:4]}/{sha256}.jpg"
+        assert stored.url == f"{settings.BASE_URL}/uploads/{stored.relative_path}"
+        assert (upload_dir / stored.relative_path).read_bytes() == content
+        # Временных файлов не осталось
+        assert [p.name for p in (upload_dir / "media").iterdir()] == [sha256[:2]]
+
+    async def test_limit_enforced_while_streaming(self, db_session, upload_dir, monkeypatch):
+        """Превышение лимита прерывает запись и не оставляет файлов"""
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 4)
+        monkeypatch.setattr(settings, "MAX_CHAT_AUDIO_SIZE", 10)
+
+        with pytest.raises(UploadTooLarge):
+            await save_upload(db_session, _upload(b"x" * 11, "voice.ogg"), kind="audio")
+
+        assert list((upload_dir / "media").iterdir()) == []
+        assert db_session.query(MediaFile).count() == 0
+
+    async def test_unsafe_extension_replaced(self, db_session):
+        """Расширение из имени клиента берется только простое"""
+        stored = await save_upload(db_session, _upload(b"data", "../../evil.ph p"), kind="file", default_extension=".bin")
+        assert stored.relative_path.endswith(f"{stored.sha256}.bin")
+
+    def test_chat_upload_too_large(self, client, user_token, monkeypatch):
+        """Эндпоинт чата отвечает 400 при превышении лимита типа файла"""
+        monkeypatch.setattr(settings, "MAX_CHAT_VIDEO_SIZE", 8)
+
+        response = client.post(
+            "/api/v1/global-chat/messages/upload?file_type=video",
+            files={"file": ("clip.mp4", b"x" * 16, "video/mp4")},
+            headers={"Authorization": f"Bearer {user_token}"},
+        )
+
+        assert response.status_code == 400
+        assert "слишком большой" in response.json()["detail"]
+
+    def test_chat_upload(self, client, user_token, upload_dir):
+        """Загрузка файла чата возвращает URL и размер"""
+        response = client.post(
+            "/api/v1/global-chat/messages/upload?file_type=audio",
+            files={"file": ("voice.ogg", b"abc", "audio/ogg")},
+            headers={"Authorization": f"Bearer {user_token}"},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["attachment"]["size"] == 3
+        relative_path = data["file_url"].split("/uploads/", 1)[1]
+        assert (upload_dir / relative_path).read_bytes() == b"abc"
+
+
+class TestImageVariants:
+    """Миниатюры изображений"""
+
+    def _variant(self, upload_dir, relative_path, size):
+        """Миниатюра создана и отмечена, как это делает конвейер генерации"""
+        path = upload_dir / variant_relative_path(relative_path, size)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"webp")
+        variant_lookup.mark_ready(upload_dir / relative_path, [size])
+
+    def test_variant_urls_only_when_ready(self, upload_dir):
+        """URL миниатюр вычисляются из URL оригинала, пока их нет - отдается оригинал"""
+        url = media_url("gas_stations/7_abc.jpg")
+
+        assert variant_relative_path("gas_stations/7_abc.jpg", 512) == "gas_stations/7_abc.512.webp"
+        assert image_variants(url) == {}
+        assert thumbnail_url(url, 512) == url
+
+        self._variant(upload_dir, "gas_stations/7_abc.jpg", 512)
+
+        assert image_variants(url) == {"512": media_url("gas_stations/7_abc.512.webp")}
+        assert thumbnail_url(url, 512) == media_url("gas_stations/7_abc.512.webp")
+        assert thumbnail_url("https://cdn.example.com/a.jpg", 512) == "https://cdn.example.com/a.jpg"
+        assert thumbnail_url(None, 512) is None
+
+    def test_photo_response_variants(self, upload_dir):
+        """Ответ с фотографией содержит готовые миниатюры"""
+        for size in settings.IMAGE_VARIANT_SIZES:
+            self._variant(upload_dir, "gas_stations/1_x.png", size)
+
+        photo = GasStationPhotoResponse(
+            id=1, gas_station_id=1, photo_url=media_url("gas_stations/1_x.png"), created_at=datetime.now()
+        )
+
+        assert sorted(photo.variants, key=int) == [str(size) for size in settings.IMAGE_VARIANT_SIZES]
+
+    def test_lookup_checks_disk_once(self, upload_dir, monkeypatch):
+        """Диск проверяется при первом обращении, неполный набор - не чаще IMAGE_VARIANT_RECHECK"""
+        url = media_url("gas_stations/3_y.jpg")
+        checks = []
+        original_is_file = Path.is_file
+        monkeypatch.setattr(Path, "is_file", lambda path: checks.append(path) or original_is_file(path))
+
+        assert image_variants(url) == {}
+        assert thumbnail_url(url, 512) == url
+        assert len(checks) == len(settings.IMAGE_VARIANT_SIZES)
+
+        # Миниатюру создал другой воркер - видна после перепроверки
+        variant = upload_dir / variant_relative_path("gas_stations/3_y.jpg", 512)
+        variant.parent.mkdir(parents=True, exist_ok=True)
+        variant.write_bytes(b"webp")
+        assert thumbnail_url(url, 512) == url
+        monkeypatch.setattr(settings, "IMAGE_VARIANT_RECHECK", 0)
+        assert thumbnail_url(url, 512) == media_url("gas_stations/3_y.512.webp")
+
+        # Полный набор больше не перепроверяется
+        for size in settings.IMAGE_VARIANT_SIZES:
+            self._variant(upload_dir, "gas_stations/3_y.jpg", size)
+        checks.clear()
+        for _ in range(3):
+            assert len(image_variants(url)) == len(settings.IMAGE_VARIANT_SIZES)
+        assert checks == []
+
+    async def test_pipeline_without_pillow(self, db_session, monkeypatch):
+        """Без Pillow генерация пропускается"""
+        monkeypatch.setattr(derivatives, "pillow_available", lambda: False)
+
+        stored = await save_upload(db_session, _upload(b"img"), variants=True)
+
+        assert stored.variants_task is None
+
+    def test_render_variants(self, upload_dir):
+        """WebP копии создаются без увеличения маленьких изображений"""
+        Image = pytest.importorskip("PIL.Image")
+        source = upload_dir / "avatars" / "1_big.png"
+        source.parent.mkdir(parents=True)
+        Image.new("RGB", (800, 400), "red").save(source)
+
+        created = derivatives.render_variants(str(source), (128, 1024), 80)
+
+        assert created == [128, 1024]
+        with Image.open(variant_relative_path(str(source), 128)) as small:
+            assert small.format == "WEBP" and small.size == (128, 64)
+        with Image.open(variant_relative_path(str(source), 1024)) as large:
+            assert large.size == (800, 400)
+
+    def test_chat_image_upload_variants(self, client, user_token, upload_dir):
+        """Изображение чата возвращается с миниатюрами, созданными в пуле процессов"""
+        Image = pytest.importorskip("PIL.Image")
+        buffer = io.BytesIO()
+        Image.new("RGB", (1600, 1200), "blue").save(buffer, "JPEG")
+
+        response = client.post(
+            "/api/v1/global-chat/messages/upload?file_type=image",
+            files={"file": ("photo.jpg", buffer.getvalue(), "image/jpeg")},
+            headers={"Authorization": f"Bearer {user_token}"},
+        )
+
+        attachment = response.json()["attachment"]
+        assert sorted(attachment["variants"], key=int) == [str(size) for size in settings.IMAGE_VARIANT_SIZES]
+        assert attachment["thumbnail"] == attachment["variants"][str(settings.IMAGE_LIST_THUMBNAIL_SIZE)]
+
+
+class TestMediaStore:
+    """Дедупликация и очистка хранилища"""
+
+    def _age(self, db_session, media, seconds):
+        media.released_at = datetime.utcnow() - timedelta(seconds=seconds)
+        db_session.commit()
+
+    async def test_duplicate_upload_shares_file(self, db_session, upload_dir):
+        """Повторная загрузка того же содержимого ссылается на тот же файл"""
+        first = await save_upload(db_session, _upload(b"same", "a.png"))
+        second = await save_upload(db_session, _upload(b"same", "b.jpg"))
+
+        assert second.url == first.url
+        assert not first.deduplicated and second.deduplicated
+        media = db_session.query(MediaFile).one()
+        assert media.ref_count == 2
+        assert get_media_stats(db_session)["deduplicated_size"] == 4
+        assert len([p for p in (upload_dir / "media").rglob("*") if p.is_file()]) == 1
+
+    async def test_release_and_sweep(self, db_session, upload_dir):
+        """Файл удаляется очисткой только когда ссылок не осталось и прошла выдержка"""
+        first = await save_upload(db_session, _upload(b"photo"))
+        await save_upload(db_session, _upload(b"photo"))
+        variant = upload_dir / variant_relative_path(first.relative_path, 128)
+        variant.write_bytes(b"webp")
+        variant_lookup.mark_ready(first.path, [128])
+        media = db_session.query(MediaFile).one()
+
+        assert release_media(db_session, first.url)
+        db_session.refresh(media)
+        assert media.ref_count == 1 and media.released_at is None
+        assert sweep_media(db_session, grace_seconds=0)["released"] == 0
+
+        release_media(db_session, first.url)
+        db_session.refresh(media)
+        assert media.ref_count == 0 and media.released_at is not None
+        # Выдержка еще не прошла
+        assert sweep_media(db_session, grace_seconds=3600) == {"released": 0, "untracked": 0}
+
+        self._age(db_session, media, 7200)
+        assert sweep_media(db_session, grace_seconds=3600)["released"] == 1
+        assert db_session.query(MediaFile).count() == 0
+        assert not first.path.exists() and not variant.exists()
+        assert image_variants(first.url) == {}
+
+    async def test_reupload_revives_released_file(self, db_session):
+        """Загрузка освобожденного, но не удаленного файла снова на него ссылается"""
+        first = await save_upload(db_session, _upload(b"again"))
+        release_media(db_session, first.url)
+
+        second = await save_upload(db_session, _upload(b"again"))
+
+        media = db_session.query(MediaFile).one()
+        assert second.deduplicated
+        assert media.ref_count == 1 and media.released_at is None
+        assert sweep_media(db_session, grace_seconds=0)["released"] == 0
+        assert first.path.exists()
+
+    def test_sweep_untracked_files(self, db_session, upload_dir):
+        """Незарегистрированные файлы и брошенные временные файлы удаляются после выдержки"""
+        store = upload_dir / "media" / "ab" / "cd"
+        store.mkdir(parents=True)
+        orphan = store / ("ab" + "0" * 62 + ".jpg")
+        temp = upload_dir / "media" / ".upload-x.part"
+        fresh = store / ("ab" + "1" * 62 + ".jpg")
+        for path in (orphan, temp, fresh):
+            path.write_bytes(b"x")
+        old = time.time() - 7200
+        os.utime(orphan, (old, old))
+        os.utime(temp, (old, old))
+
+        assert sweep_media(db_session, grace_seconds=3600)["untracked"] == 2
+        assert not orphan.exists() and not temp.exists() and fresh.exists()
+
+    def test_legacy_file_removed_immediately(self, upload_dir, db_session):
+        """Файлы старой схемы (без учета ссылок) удаляются сразу"""
+        legacy = upload_dir / "avatars" / "1_old.jpg"
+        legacy.parent.mkdir()
+        legacy.write_bytes(b"x")
+
+        assert release_media(db_session, media_url("avatars/1_old.jpg"))
+        assert not legacy.exists()
+        assert not release_media(db_session, "https://cdn.example.com/a.jpg")
+
+    def test_admin_media_endpoints(self, client, admin_token, user_token):
+        """Статистика и ручная очистка доступны только администратору"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+
+        response = client.get("/api/v1/admin/media/", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["files"] == 0
+
+        response = client.post("/api/v1/admin/media/sweep", headers=headers)
+        assert response.status_code == 200
+        assert response.json() == {"released": 0, "untracked": 0}
+
+        response = client.get("/api/v1/admin/media/", headers={"Authorization": f"Bearer {user_token}"})
+        assert response.status_code == 403
+
+
+class TestMediaServing:
+    """Раздача /uploads: кэширование, Range, метрики"""
+
+    @pytest.fixture(autouse=True)
+    def serving_dir(self, upload_dir, monkeypatch):
+        from app.main import app
+
+        media_files = next(route.app for route in app.routes if getattr(route, "name", None) == "uploads")
+        monkeypatch.setattr(media_files, "directory", str(upload_dir))
+        monkeypatch.setattr(media_files, "all_directories", [str(upload_dir)])
+        media_access_stats.reset()
+
+    def _file(self, upload_dir, relative_path, content):
+        path = upload_dir / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return f"/uploads/{relative_path}"
+
+    def test_store_file_immutable(self, client, upload_dir):
+        """Файл хранилища кэшируется навсегда, повторный запрос по ETag - 304"""
+        url = self._file(upload_dir, "media/ab/cd/abcd.jpg", b"jpeg")
+
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert response.content == b"jpeg"
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert response.headers["etag"] == '"abcd.jpg"'
+        assert response.headers["accept-ranges"] == "bytes"
+
+        response = client.get(url, headers={"If-None-Match": 'W/"other", "abcd.jpg"'})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_legacy_file_revalidated(self, client, upload_dir):
+        """Файл старой схемы кэшируется на MEDIA_CACHE_MAX_AGE"""
+        url = self._file(upload_dir, "avatars/1_a.jpg", b"jpeg")
+
+        response = client.get(url)
+
+        assert response.headers["cache-control"] == f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+        assert client.get(url, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+    def test_range_requests(self, client, upload_dir):
+        """Видео чата отдается диапазонами"""
+        url = self._file(upload_dir, "global_chat/videos/1_clip.mp4", bytes(range(100)))
+
+        response = client.get(url, headers={"Range": "bytes=10-19"})
+        assert response.status_code == 206
+        assert response.content == bytes(range(10, 20))
+        assert response.headers["content-range"] == "bytes 10-19/100"
+        assert response.headers["content-length"] == "10"
+
+        response = client.get(url, headers={"Range": "bytes=-5"})
+        assert response.status_code == 206
+        assert response.content == bytes(range(95, 100))
+
+        response = client.get(url, headers={"Range": "bytes=90-"})
+        assert response.content == bytes(range(90, 100))
+
+        response = client.get(url, headers={"Range": "bytes=200-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == "bytes */100"
+
+        # Несколько диапазонов не поддерживаются - отдается весь файл
+        response = client.get(url, headers={"Range": "bytes=0-1,5-6"})
+        assert response.status_code == 200 and len(response.content) == 100
+
+    def test_if_range(self, client, upload_dir):
+        """Диапазон по устаревшему ETag игнорируется"""
+        url = self._file(upload_dir, "media/aa/bb/aabb.ogg", b"0123456789")
+
+        response = client.get(url, headers={"Range": "bytes=2-3", "If-Range": '"aabb.ogg"'})
+        assert response.status_code == 206 and response.content == b"23"
+
+        response = client.get(url, headers={"Range": "bytes=2-3", "If-Range": '"old"'})
+        assert response.status_code == 200 and response.content == b"0123456789"
+
+    def test_precompressed(self, client, upload_dir):
+        """Для текстовых файлов отдается готовая сжатая копия"""
+        url = self._file(upload_dir, "media/cc/dd/ccdd.json", b'{"a": 1}')
+        compressed = gzip.compress(b'{"a": 1}')
+        (upload_dir / "media/cc/dd/ccdd.json.gz").write_bytes(compressed)
+
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.json() == {"a": 1}
+        assert response.headers["etag"] == '"ccdd.json.gz"'
+
+    def test_accel_redirect(self, client, upload_dir, monkeypatch):
+        """С MEDIA_ACCEL_REDIRECT_PREFIX тело отдает nginx"""
+        monkeypatch.setattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/_uploads/")
+        url = self._file(upload_dir, "media/ee/ff/eeff.mp4", b"video")
+
+        response = client.get(url, headers={"Range": "bytes=0-1"})
+
+        assert response.status_code == 200
+        assert response.headers["x-accel-redirect"] == "/_uploads/media/ee/ff/eeff.mp4"
+        assert response.content == b""
+
+    def test_access_metrics(self, client, upload_dir):
+        """Запросы и переданные байты считаются по директориям"""
+        url = self._file(upload_dir, "global_chat/audio/1_v.ogg", b"0123456789")
+        client.get(url)
+        client.get(url, headers={"Range": "bytes=0-3"})
+        client.get("/uploads/global_chat/audio/missing.ogg")
+
+        stats = media_access_stats.snapshot()["global_chat/audio"]
+
+        assert stats["requests"] == 3
+        assert stats["bytes"] == 14
+        assert (stats["200"], stats["206"], stats["404"]) == (1, 1, 1)
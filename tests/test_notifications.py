@@ -0,0 +1,165 @@
+"""
+Тесты состояния уведомлений пользователя (водяные знаки)
+"""
+import pytest
+
+from app.models.notification import NotificationReadStatus, NotificationUserState
+from app.schemas.notification import NotificationCreate
+from app.services.notification_service.crud import (
+    create_notification,
+    get_user_notifications,
+    get_unread_count,
+    mark_notification_as_read,
+    mark_all_as_read,
+    delete_notification,
+    delete_all_user_notifications,
+)
+
+
+@pytest.fixture
+async def connection_manager():
+    """Менеджер уведомлений; диспетчер рассылок останавливается после теста"""
+    from app.api.v1.notifications import ConnectionManager
+
+    manager = ConnectionManager()
+    yield manager
+    await manager.stop()
+
+
+def _notify(db_session, title, user_id=None):
+    return create_notification(db_session, NotificationCreate(title=title, message=title, user_id=user_id))
+
+
+class TestNotificationWatermarks:
+    """Прочтение и очистка глобальных уведомлений через водяные знаки"""
+
+    def test_mark_all_is_single_state_row(self, db_session, test_user):
+        """Отметка всех прочитанными не создает строк на каждое уведомление"""
+        for i in range(3):
+            _notify(db_session, f"global {i}")
+        _notify(db_session, "personal", user_id=test_user.id)
+        assert get_unread_count(db_session, test_user.id) == 4
+
+        assert mark_all_as_read(db_session, test_user.id) == 4
+        assert get_unread_count(db_session, test_user.id) == 0
+        assert db_session.query(NotificationReadStatus).count() == 0
+        assert db_session.query(NotificationUserState).filter_by(user_id=test_user.id).count() == 1
+
+        # Новое глобальное уведомление выше водяного знака - непрочитано
+        _notify(db_session, "fresh")
+        assert get_unread_count(db_session, test_user.id) == 1
+        unread, total = get_user_notifications(db_session, test_user.id, unread_only=True)
+        assert [n.title for n in unread] == ["fresh"]
+        assert mark_all_as_read(db_session, test_user.id) == 1
+
+    def test_sparse_read_above_watermark(self, db_session, test_user):
+        """Точечная отметка прочтения учитывается в счетчике и не дублируется"""
+        first = _notify(db_session, "first")
+        _notify(db_session, "second")
+
+        mark_notification_as_read(db_session, first.id, test_user.id)
+        assert get_unread_count(db_session, test_user.id) == 1
+        read, _ = get_user_notifications(db_session, test_user.id, unread_only=False)
+        assert [n.title for n in read] == ["first"]
+
+        assert mark_all_as_read(db_session, test_user.id) == 1
+        assert db_session.query(NotificationReadStatus).count() == 0
+
+    def test_delete_all_hides_globals(self, db_session, test_user, test_admin):
+        """Очистка скрывает глобальные уведомления только для пользователя"""
+        hidden = _notify(db_session, "hidden")
+        _notify(db_session, "other")
+        delete_notification(db_session, hidden.id, test_user.id)
+        _notify(db_session, "personal", user_id=test_user.id)
+
+        assert delete_all_user_notifications(db_session, test_user.id) == 2
+        notifications, total = get_user_notifications(db_session, test_user.id)
+        assert total == 0
+        assert get_unread_count(db_session, test_user.id) == 0
+        assert db_session.query(NotificationReadStatus).count() == 0
+
+        _, total = get_user_notifications(db_session, test_admin.id)
+        assert total == 2
+
+        _notify(db_session, "after")
+        notifications, _ = get_user_notifications(db_session, test_user.id)
+        assert [n.title for n in notifications] == ["after"]
+
+
+class TestUnreadCounters:
+    """Кэш счетчиков уведомлений и их доставка через WebSocket"""
+
+    def test_global_increment_is_relative(self):
+        """Глобальное уведомление увеличивает только уже закэшированные значения"""
+        from app.core.unread_counters import UnreadCounterCache
+
+        cache = UnreadCounterCache()
+        cache.set(1, total=5, unread=2)
+        cache.add_global()
+        cache.set(2, total=1, unread=1)
+        cache.add_global()
+
+        assert cache.get(1) == (7, 4)
+        assert cache.get(2) == (2, 2)
+        assert cache.get(3) is None
+
+    def test_counts_match_crud(self, db_session, test_user):
+        """Агрегатные счетчики совпадают со списком уведомлений"""
+        from app.services.notification_service.crud import get_notification_counts
+
+        first = _notify(db_session, "first")
+        _notify(db_session, "second")
+        _notify(db_session, "personal", user_id=test_user.id)
+        mark_notification_as_read(db_session, first.id, test_user.id)
+
+        _, total = get_user_notifications(db_session, test_user.id)
+        assert get_notification_counts(db_session, test_user.id) == (total, 2)
+
+    async def test_counters_pushed_to_socket(self, connection_manager):
+        """Изменение счетчиков отправляется сокетам пользователя"""
+        from tests.test_pubsub import FakeWebSocket
+
+        manager = connection_manager
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, user_id=1)
+
+        await manager.handle_event({"event": "counters", "user_id": 1, "total": 3, "unread": 1})
+        await manager.handle_event({"event": "global", "message": {"type": "notification"}})
+        await manager.fanout.join()
+
+        assert websocket.sent == [
+            {"type": "unread_count", "total": 3, "unread_count": 1},
+            {"type": "notification", "unread_count": 2},
+        ]
+        assert manager.counters.get(1) == (4, 2)
+
+
+class TestGlobalFanout:
+    """Фоновая порционная рассылка глобальных уведомлений"""
+
+    async def test_broadcast_runs_in_background(self, connection_manager):
+        """Публикация не ждет доставки, прогресс считается по рассылке"""
+        from app.core.fanout import FanoutDispatcher
+        from tests.test_pubsub import FakeWebSocket
+
+        class BrokenWebSocket(FakeWebSocket):
+            async def send_json(self, data):
+                raise RuntimeError("closed")
+
+        manager = connection_manager
+        manager.fanout = FanoutDispatcher(chunk_size=2, concurrency=2)
+        sockets = [FakeWebSocket() for _ in range(4)]
+        for user_id, websocket in enumerate(sockets, start=1):
+            await manager.connect(websocket, user_id=user_id)
+        await manager.connect(BrokenWebSocket(), user_id=99)
+
+        job = await manager._deliver_global({"type": "notification"}, "b1")
+        assert job.status == "queued"
+        assert all(websocket.sent == [] for websocket in sockets)
+
+        await manager.fanout.join()
+
+        assert job.status == "done"
+        assert (job.total, job.sent, job.failed) == (5, 4, 1)
+        assert all(websocket.sent == [{"type": "notification"}] for websocket in sockets)
+        assert 99 not in manager.active_connections
@@ -0,0 +1,44 @@
+"""
+Тесты периодических фоновых задач
+"""
+import asyncio
+import threading
+
+from app.core.periodic import PeriodicJob
+
+
+class TestPeriodicJob:
+    """Запуск по интервалу и вручную"""
+
+    async def test_run_executes_in_thread(self):
+        """Синхронная функция выполняется вне event loop, результат запоминается"""
+        loop_thread = threading.get_ident()
+        job = PeriodicJob("test", lambda value: (value, threading.get_ident() != loop_thread), 60)
+
+        assert await job.run(5) == (5, True)
+        assert job.last_result == (5, True)
+        assert job.last_run is not None
+
+    async def test_errors_do_not_stop_loop(self):
+        """Ошибка запуска логируется, следующие запуски продолжаются"""
+        calls = []
+
+        async def tick():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return len(calls)
+
+        job = PeriodicJob("test", tick, lambda: 0.01, run_at_start=True)
+        await job.start()
+        try:
+            for _ in range(100):
+                if len(calls) >= 3:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await job.stop()
+
+        assert len(calls) >= 3
+        assert job.last_result >= 2
+        assert job._task is None
@@ -0,0 +1,272 @@
+"""
+Тесты шины pub/sub для real-time событий
+"""
+import asyncio
+import socket
+
+import pytest
+
+from app.core.config import settings
+from app.core.pubsub import InMemoryPubSub, PostgresPubSub
+
+
+class FakeWebSocket:
+    """Заглушка WebSocket, собирающая отправленные сообщения"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+class TestInMemoryPubSub:
+    """Тесты in-memory шины"""
+
+    async def test_publish_delivers_to_subscribers(self):
+        """Событие доставляется всем обработчикам канала"""
+        bus = InMemoryPubSub(channel_prefix="test")
+        received = []
+
+        async def handler(message):
+            received.append(message)
+
+        bus.subscribe("chat", handler)
+        bus.subscribe("chat", handler)
+        await bus.publish("chat", {"event": "ping"})
+        await bus.publish("other", {"event": "ignored"})
+
+        assert received == [{"event": "ping"}, {"event": "ping"}]
+
+    async def test_handler_error_does_not_break_delivery(self):
+        """Ошибка одного обработчика не мешает остальным"""
+        bus = InMemoryPubSub()
+        received = []
+
+        async def broken(message):
+            raise RuntimeError("boom")
+
+        async def handler(message):
+            received.append(message)
+
+        bus.subscribe("chat", broken)
+        bus.subscribe("chat", handler)
+        await bus.publish("chat", {"value": 1})
+
+        assert received == [{"value": 1}]
+
+
+class TestManagersThroughBus:
+    """Менеджеры WebSocket доставляют события через шину"""
+
+    async def test_personal_notification(self):
+        """Персональное уведомление доходит только до сокетов пользователя"""
+        from app.api.v1.notifications import ConnectionManager
+
+        manager = ConnectionManager()
+        own, other = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(own, user_id=1)
+        await manager.connect(other, user_id=2)
+
+        await manager.handle_event({"event": "personal", "user_id": 1, "message": {"type": "notification"}})
+
+        assert own.sent == [{"type": "notification"}]
+        assert other.sent == []
+
+    async def test_global_chat_excludes_sender(self):
+        """Сообщение чата не отправляется автору"""
+        from app.api.v1.global_chat import GlobalChatConnectionManager
+
+        manager = GlobalChatConnectionManager()
+        author, reader = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(author, 1)
+        await manager.connect(reader, 2)
+
+        await manager.handle_event({"event": "new_message", "message": {"id": 5}, "exclude_user_id": 1})
+
+        assert author.sent == []
+        assert reader.sent == [{"type": "new_message", "message": {"id": 5}}]
+
+
+class TestPresence:
+    """Тесты присутствия в глобальном чате"""
+
+    async def test_multiple_devices_per_user(self):
+        """Второе устройство не вытесняет первое"""
+        from app.api.v1.global_chat import GlobalChatConnectionManager
+
+        manager = GlobalChatConnectionManager()
+        phone, tablet = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(phone, 1)
+        await manager.connect(tablet, 1)
+
+        assert manager.get_online_count() == 1
+        await manager.handle_event({"event": "new_message", "message": {"id": 1}})
+        assert len(phone.sent) == 1 and len(tablet.sent) == 1
+
+        manager.disconnect(1, phone)
+        assert manager.get_online_count() == 1
+        manager.disconnect(1, tablet)
+        assert manager.get_online_count() == 0
+
+    async def test_online_count_broadcast_is_coalesced(self):
+        """Серия подключений дает одну рассылку онлайн-счетчика"""
+        from app.api.v1.global_chat import GlobalChatConnectionManager
+
+        manager = GlobalChatConnectionManager()
+        sockets = [FakeWebSocket() for _ in range(5)]
+        for user_id, websocket in enumerate(sockets, start=1):
+            await manager.connect(websocket, user_id)
+
+        await manager.presence_tick()
+        await manager.presence_tick()
+
+        counts = [m for m in sockets[0].sent if m["type"] == "online_count"]
+        assert len(counts) == 1
+        assert counts[0]["online_count"] == 5
+
+    async def test_remote_workers_are_counted(self):
+        """Онлайн-счетчик учитывает пользователей других воркеров"""
+        from app.api.v1.global_chat import GlobalChatConnectionManager
+
+        manager = GlobalChatConnectionManager()
+        await manager.connect(FakeWebSocket(), 1)
+        await manager.handle_event({"event": "presence", "worker_id": "other", "online_count": 3})
+
+        assert manager.get_online_count() == 4
+
+    def test_stale_connections_expire(self):
+        """Соединения без heartbeat удаляются"""
+        from app.core.presence import PresenceRegistry
+
+        registry = PresenceRegistry(heartbeat_timeout=0)
+        websocket = FakeWebSocket()
+        registry.add(1, websocket)
+
+        assert registry.expire_stale() == [(1, websocket)]
+        assert registry.online_count == 0
+
+
+class TestBlockAwareDelivery:
+    """Доставка сообщений чата с учетом блокировок"""
+
+    async def test_blocked_author_not_delivered(self):
+        """Сообщения заблокированного автора не доходят до заблокировавшего"""
+        from app.api.v1.global_chat import GlobalChatConnectionManager
+
+        manager = GlobalChatConnectionManager()
+        blocker, reader = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(blocker, 1, blocked_ids={3})
+        await manager.connect(reader, 2, blocked_ids=set())
+
+        await manager.handle_event({"event": "new_message", "message": {"id": 1, "user_id": 3}})
+
+        assert blocker.sent == []
+        assert len(reader.sent) == 1
+
+    async def test_block_updates_apply_live(self):
+        """Блокировка и разблокировка применяются без переподключения"""
+        from app.api.v1.global_chat import GlobalChatConnectionManager
+
+        manager = GlobalChatConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, 1, blocked_ids=set())
+
+        await manager.handle_event({"event": "block", "blocker_id": 1, "blocked_id": 3, "is_blocked": True})
+        await manager.handle_event({"event": "new_message", "message": {"id": 1, "user_id": 3}})
+        assert websocket.sent == []
+
+        await manager.handle_event({"event": "block", "blocker_id": 1, "blocked_id": 3, "is_blocked": False})
+        await manager.handle_event({"event": "new_message", "message": {"id": 2, "user_id": 3}})
+        assert len(websocket.sent) == 1
+
+
+class FakeListenConnection:
+    """Соединение LISTEN: чтение из пары сокетов, poll() падает после обрыва"""
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.notifies = []
+        self.broken = False
+        self.closed = False
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def poll(self):
+        self.reader.recv(1024)
+        if self.broken:
+            raise ConnectionError("server closed the connection unexpectedly")
+
+    def close(self):
+        self.closed = True
+        self.reader.close()
+        self.writer.close()
+
+
+class TestPostgresPubSub:
+    """Переподключение LISTEN и ограничение размера NOTIFY"""
+
+    @pytest.fixture
+    def bus(self, monkeypatch):
+        bus = PostgresPubSub("postgresql://localhost/test")
+        connections = []
+
+        def connect():
+            if len(connections) == 1 and bus.failures:
+                bus.failures -= 1
+                raise ConnectionError("connection refused")
+            connections.append(FakeListenConnection())
+            return connections[-1]
+
+        bus.failures = 0
+        bus.connections = connections
+        monkeypatch.setattr(bus, "_connect", connect)
+        monkeypatch.setattr(settings, "PUBSUB_RECONNECT_MIN_DELAY", 0.01)
+        return bus
+
+    async def test_reconnects_after_connection_loss(self, bus):
+        """Оборванное соединение закрывается, новое подключается с повторами"""
+        bus.failures = 2
+        await bus.start()
+        first = bus.connections[0]
+
+        first.broken = True
+        first.writer.send(b"x")
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if bus._listen_conn is not None and bus._listen_conn is not first:
+                break
+
+        assert first.closed
+        assert len(bus.connections) == 2
+        assert bus._listen_conn is bus.connections[1]
+        await bus.stop()
+        assert bus.connections[1].closed
+
+    async def test_publish_errors_do_not_propagate(self, bus, monkeypatch):
+        """Большие события не уходят в NOTIFY, ошибки NOTIFY не доходят до вызывающего"""
+        await bus.start()
+        notified, delivered = [], []
+
+        async def handler(message):
+            delivered.append(message)
+
+        bus.subscribe("chat", handler)
+        monkeypatch.setattr(bus, "_notify", lambda channel, payload: notified.append(payload))
+
+        await bus.publish("chat", {"text": "x" * 9000})
+        assert notified == [] and len(delivered) == 1
+
+        await bus.publish("chat", {"text": "short"})
+        assert len(notified) == 1
+
+        def broken(channel, payload):
+            raise RuntimeError("connection lost")
+
+        monkeypatch.setattr(bus, "_notify", broken)
+        await bus.publish("chat", {"text": "short"})
+        await bus.stop()
@@ -0,0 +1,105 @@
+"""
+Тесты поддержки: статистика тикетов и счетчики
+"""
+import pytest
+
+from app.models.support import TicketStatus
+from app.schemas.support import SupportTicketCreate, SupportTicketUpdate, SupportMessageCreate
+from app.services.support_service.counters import ticket_counters
+from app.services.support_service.crud import (
+    create_ticket,
+    update_ticket,
+    add_message,
+    mark_ticket_as_read,
+    get_ticket_stats,
+    get_cached_ticket_stats,
+    get_unread_tickets_count,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_ticket_counters():
+    """Счетчики - общие для процесса, а БД у каждого теста своя"""
+    ticket_counters.invalidate()
+    ticket_counters.take_pending()
+    yield
+    ticket_counters.invalidate()
+    ticket_counters.take_pending()
+
+
+@pytest.fixture
+def websocket_db(client, monkeypatch):
+    """WebSocket эндпоинты открывают сессию через get_db напрямую, минуя dependency_overrides"""
+    from app.main import app
+    from app.database import get_db
+    import app.api.v1.support as support_api
+
+    monkeypatch.setattr(support_api, "get_db", app.dependency_overrides[get_db])
+    return client
+
+
+def _ticket(db_session, user_id, subject="Не работает оплата"):
+    return create_ticket(db_session, user_id, SupportTicketCreate(subject=subject, message="Помогите"))
+
+
+class TestTicketStats:
+    """Статистика тикетов"""
+
+    def test_grouped_stats(self, db_session, test_user):
+        """Все статусы и непрочитанные считаются одним запросом"""
+        first = _ticket(db_session, test_user.id)
+        _ticket(db_session, test_user.id)
+        update_ticket(db_session, first.id, SupportTicketUpdate(status=TicketStatus.RESOLVED))
+        mark_ticket_as_read(db_session, first.id, 0, is_admin=True)
+
+        stats = get_ticket_stats(db_session)
+
+        assert stats["total"] == 2
+        assert stats["open"] == 1
+        assert stats["resolved"] == 1
+        assert stats["in_progress"] == stats["closed"] == stats["waiting_for_user"] == 0
+        assert stats["unread"] == 1
+
+    def test_counters_follow_crud(self, db_session, test_user, test_admin):
+        """Счетчики после CRUD операций совпадают с пересчетом из БД"""
+        get_cached_ticket_stats(db_session)
+
+        ticket = _ticket(db_session, test_user.id)
+        add_message(db_session, ticket.id, test_admin.id, SupportMessageCreate(message="Смотрим"), is_from_user=False)
+        other = _ticket(db_session, test_user.id)
+        update_ticket(db_session, other.id, SupportTicketUpdate(status=TicketStatus.CLOSED))
+        add_message(db_session, other.id, test_user.id, SupportMessageCreate(message="Снова"), is_from_user=True)
+        mark_ticket_as_read(db_session, other.id, test_admin.id, is_admin=True)
+
+        assert ticket_counters.snapshot() == get_ticket_stats(db_session)
+        assert get_unread_tickets_count(db_session, test_admin.id, is_admin=True) == 0
+        assert ticket_counters.take_pending()["in_progress"] == 1
+
+    def test_admin_socket_receives_stats(self, websocket_db, test_admin, admin_token, user_token):
+        """Панель администратора получает счетчики при подключении и после изменений"""
+        client = websocket_db
+        with client.websocket_connect(f"/api/v1/support/ws/admin?token={admin_token}") as websocket:
+            assert websocket.receive_json() == {
+                "type": "ticket_stats",
+                "stats": {"total": 0, "open": 0, "in_progress": 0, "waiting_for_user": 0,
+                          "resolved": 0, "closed": 0, "unread": 0},
+            }
+
+            response = client.post(
+                "/api/v1/support",
+                json={"subject": "Вопрос", "message": "Текст"},
+                headers={"Authorization": f"Bearer {user_token}"},
+            )
+            assert response.status_code == 200
+
+            messages = [websocket.receive_json(), websocket.receive_json()]
+            stats = [m for m in messages if m["type"] == "ticket_stats"][0]["stats"]
+            assert (stats["total"], stats["open"], stats["unread"]) == (1, 1, 1)
+
+    def test_admin_socket_requires_admin(self, websocket_db, user_token):
+        """Обычный пользователь не подключается к панели"""
+        from starlette.websockets import WebSocketDisconnect
+
+        with pytest.raises(WebSocketDisconnect):
+            with websocket_db.websocket_connect(f"/api/v1/support/ws/admin?token={user_token}") as websocket:
+                websocket.receive_json()